@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark do roteador por palavras-chave
+
+Compara o custo por mensagem da cadeia de `in content.lower()` (uma busca por regra)
+com o autômato compilado (uma passada pelo texto) à medida que o número de regras cresce.
+
+Uso: python benchmarks/keyword_router_benchmark.py
+"""
+
+import os
+import random
+import string
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.orchestrator.keyword_router import KeywordRouter
+
+MESSAGES = [
+    "Olá, preciso de ajuda com meu pedido",
+    "Estou tendo problemas para acessar o sistema desde ontem à noite",
+    "Quero saber sobre meu reembolso, já faz duas semanas que solicitei",
+    "Bom dia! Como faço para emitir a segunda via do boleto do mês passado?",
+]
+
+
+def random_keyword(rng: random.Random) -> str:
+    return ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(5, 10)))
+
+
+def naive_route(rules, content):
+    """Equivalente à cadeia original: reduz o texto e testa cada regra em sequência"""
+    for keyword, agent_id in rules:
+        if keyword in content.lower():
+            return agent_id
+    return None
+
+
+def run(rule_counts=(6, 50, 200, 1000, 5000), repeat=2000):
+    rng = random.Random(42)
+    print(f"{'regras':>8} {'cadeia (µs/msg)':>16} {'compilado (µs/msg)':>19} {'ganho':>7}")
+    for count in rule_counts:
+        rules = [(random_keyword(rng), f"agent_{i % 5}") for i in range(count)]
+        router = KeywordRouter(default_rules=[])
+        router.set_custom_rules(dict(rules))
+        router.route('')  # compilar fora da medição
+
+        naive = timeit.timeit(lambda: [naive_route(rules, m) for m in MESSAGES], number=repeat)
+        compiled = timeit.timeit(lambda: [router.route(m) for m in MESSAGES], number=repeat)
+        per_message = repeat * len(MESSAGES)
+        naive_us = naive / per_message * 1e6
+        compiled_us = compiled / per_message * 1e6
+        print(f"{count:>8} {naive_us:>16.2f} {compiled_us:>19.2f} {naive_us / compiled_us:>6.1f}x")
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Benchmark de ponta a ponta do process_incoming_message contra os substitutos locais
+
+Sobe os substitutos da OpenAI e do Chatwoot (src.standins), aponta OPENAI_BASE_URL e
+CHATWOOT_BASE_URL para eles e dispara webhooks concorrentes no ChatwootBot real. A latência de
+cada mensagem é medida do webhook até a chegada da primeira e da última resposta no Chatwoot.
+Nenhuma chamada sai da máquina; com a mesma semente, as latências sorteadas se repetem.
+
+O limitador de taxa usa o Redis de REDIS_HOST; sem um Redis local, --fake-redis usa o fakeredis
+(pip install fakeredis) no lugar do cliente redis.
+
+Uso: python benchmarks/pipeline_benchmark.py --messages 200 --latency-median 0.8 --latency-p95 2.5
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.standins import LatencyModel, OpenAIStandIn, ChatwootStandIn
+
+MESSAGES = [
+    "Olá, preciso de ajuda com meu pedido",
+    "Quero mudar o endereço de entrega da minha compra",
+    "Qual o horário de atendimento?",
+    "O aplicativo está muito lento desde ontem",
+    "Quero saber sobre meu reembolso, já faz duas semanas que solicitei",
+    "Vocês entregam no sábado? Preciso receber antes do aniversário da minha mãe",
+]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=8, help='webhooks processados em paralelo')
+    parser.add_argument('--latency', choices=['fixed', 'uniform', 'lognormal'], default='lognormal')
+    parser.add_argument('--latency-median', type=float, default=0.8)
+    parser.add_argument('--latency-p95', type=float, default=2.5)
+    parser.add_argument('--token-latency', type=float, default=0.02)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--chatwoot-latency', type=float, default=0.03)
+    parser.add_argument('--streaming', action='store_true', help='RESPONSE_STREAMING_ENABLED=true')
+    parser.add_argument('--fake-redis', action='store_true', help='usa fakeredis no lugar do Redis')
+    parser.add_argument('--seed', type=int, default=42)
+    return parser.parse_args()
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def run(args):
+    openai_server = OpenAIStandIn(
+        latency=LatencyModel(args.latency, median=args.latency_median, p95=args.latency_p95,
+                             low=args.latency_median / 2, high=args.latency_p95, seed=args.seed),
+        token_latency=LatencyModel.fixed(args.token_latency),
+        rate_limit_rate=args.rate_limit_rate, retry_after=0.5, seed=args.seed
+    ).start()
+    chatwoot_server = ChatwootStandIn(latency=LatencyModel.fixed(args.chatwoot_latency)).start()
+
+    # A configuração é lida na importação de src.main
+    os.environ.update({
+        'OPENAI_API_KEY': 'stand-in',
+        'OPENAI_BASE_URL': openai_server.base_url,
+        'CHATWOOT_API_KEY': 'stand-in',
+        'CHATWOOT_ACCOUNT_ID': '1',
+        'CHATWOOT_BASE_URL': chatwoot_server.base_url,
+        'RESPONSE_STREAMING_ENABLED': 'true' if args.streaming else 'false',
+        'BATCH_MODE_ENABLED': 'false',
+        'COALESCE_WINDOW': '0'
+    })
+    if args.fake_redis:
+        import fakeredis
+        import redis
+        redis.Redis = fakeredis.FakeRedis
+    from src.main import chatwoot_bot
+    logging.getLogger().setLevel(logging.WARNING)
+
+    sent = {}
+
+    def webhook(i):
+        conversation_id = str(i + 1)
+        sent[conversation_id] = time.time()
+        chatwoot_bot.process_incoming_message({
+            'message': {'content': MESSAGES[i % len(MESSAGES)]},
+            'conversation': {'id': conversation_id},
+            'contact': {'id': f"contato-{i % 50}", 'name': 'Benchmark'}
+        })
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        list(executor.map(webhook, range(args.messages)))
+    elapsed = time.monotonic() - started
+
+    first, last = {}, {}
+    for message in chatwoot_server.get_messages():
+        conversation_id = message['conversation_id']
+        first.setdefault(conversation_id, message['received_at'])
+        last[conversation_id] = message['received_at']
+    first_latency = [first[c] - sent[c] for c in first]
+    total_latency = [last[c] - sent[c] for c in last]
+
+    print(f"{'mensagens':<24}{args.messages:>10}")
+    print(f"{'respondidas':<24}{len(first):>10}")
+    print(f"{'vazão (msg/s)':<24}{args.messages / elapsed:>10.1f}")
+    for label, values in (('primeira resposta', first_latency), ('resposta completa', total_latency)):
+        print(f"{label + ' p50/p95/p99 (s)':<36}"
+              f"{percentile(values, 0.5):>7.3f}{percentile(values, 0.95):>7.3f}{percentile(values, 0.99):>7.3f}")
+    print(f"{'openai':<24}{openai_server.get_stats()}")
+    tiers = chatwoot_bot.orchestrator.get_system_status()['response_tiers'] or {}
+    print(f"{'respostas por regra':<24}{tiers.get('rule_hits', 0):>10}")
+
+    openai_server.stop()
+    chatwoot_server.stop()
+
+
+if __name__ == '__main__':
+    run(parse_args())
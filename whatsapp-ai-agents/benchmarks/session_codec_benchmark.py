@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark dos codecs de sessão
+
+Compara o tamanho gravado no Redis e o custo de codificar/decodificar uma sessão (campos do
+hash e turnos do histórico, um valor por campo ou turno, como o SessionManager grava) para
+conversas em português de tamanhos diferentes. A linha "json (antigo)" é o json.dumps padrão
+usado antes dos codecs. Codecs cujas dependências não estão instaladas são omitidos.
+
+Uso: python benchmarks/session_codec_benchmark.py [--threshold 1024]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.utils.session_codec import COMPRESSORS, SERIALIZERS, SessionCodec
+from src.utils.session_schema import flatten_session
+
+USER_MESSAGES = [
+    "Olá, preciso de ajuda com meu pedido",
+    "Estou tendo problemas para acessar o sistema desde ontem à noite",
+    "Quero saber sobre meu reembolso, já faz duas semanas que solicitei e não recebi nenhuma resposta",
+    "Bom dia! Como faço para emitir a segunda via do boleto do mês passado?",
+    "A cobrança veio duplicada no cartão, vocês podem verificar?",
+]
+
+ASSISTANT_MESSAGES = [
+    "Olá! Claro, posso ajudar. Você poderia me informar o número do pedido para que eu verifique o status?",
+    "Sinto muito pelo transtorno. Vou verificar o histórico de acessos da sua conta. Enquanto isso, "
+    "tente limpar o cache do navegador e redefinir a senha pelo link \"Esqueci minha senha\".",
+    "Verifiquei aqui: o reembolso foi aprovado e deve aparecer na fatura em até dois ciclos. "
+    "Caso não apareça, responda esta mensagem que abriremos uma contestação junto à operadora.",
+    "A segunda via está disponível na área do cliente, em Financeiro > Boletos. Também posso enviar "
+    "o código de barras por aqui, se preferir.",
+]
+
+
+class _LegacyJson:
+    """json.dumps padrão (ASCII escapado, separadores com espaço), como antes dos codecs"""
+
+    def encode(self, value):
+        return json.dumps(value)
+
+    def decode(self, raw):
+        return json.loads(raw)
+
+
+def session_fixture(turns: int, rng: random.Random):
+    """Sessão do orquestrador e histórico com `turns` turnos alternando usuário e assistente"""
+    history = [{'role': 'user' if i % 2 == 0 else 'assistant',
+                'content': rng.choice(USER_MESSAGES if i % 2 == 0 else ASSISTANT_MESSAGES),
+                'agent': 'customer_service' if i % 2 else None}
+               for i in range(turns)]
+    session = {
+        'session_id': '5511999990000',
+        'user_id': '5511999990000',
+        'created_at': '2024-05-02T14:03:11.512904',
+        'last_activity': '2024-05-02T14:21:45.100233',
+        'active_agent': 'customer_service',
+        'history_length': turns,
+        'data': {
+            'language': 'pt',
+            'customer': {'name': 'João da Conceição', 'plan': 'premium', 'city': 'São Paulo'},
+            'history_summary': {
+                'content': ' '.join(rng.choice(ASSISTANT_MESSAGES) for _ in range(3)),
+                'tokens': 180, 'covered': max(0, turns - 20)},
+        },
+    }
+    return session, history
+
+
+def measure(codec, session, history, repeat):
+    def encode():
+        return flatten_session(session, codec), [codec.encode(turn) for turn in history]
+
+    fields, turns = encode()
+
+    def decode():
+        return [codec.decode(v) for k, v in fields.items() if k != 'history_length'], \
+            [codec.decode(t) for t in turns]
+
+    size = sum(len(k) + len(v.encode('utf-8')) for k, v in fields.items()) + \
+        sum(len(t.encode('utf-8')) for t in turns)
+    encode_us = timeit.timeit(encode, number=repeat) / repeat * 1e6
+    decode_us = timeit.timeit(decode, number=repeat) / repeat * 1e6
+    return size, encode_us, decode_us
+
+
+def run(turn_counts=(10, 50, 200), threshold=1024, repeat=200):
+    rng = random.Random(42)
+    codecs = [('json (antigo)', _LegacyJson())]
+    for serializer, entry in SERIALIZERS.items():
+        for compression, option in COMPRESSORS.items():
+            if entry[3] and option[3]:
+                codecs.append((f"{serializer}+{compression}", SessionCodec(serializer, compression, threshold)))
+
+    for turns in turn_counts:
+        session, history = session_fixture(turns, rng)
+        # Valor grande (histórico inteiro num campo, como antes da lista própria): mostra a compressão
+        session['data']['notes'] = history
+        print(f"\n{turns} turnos")
+        print(f"{'codec':>16} {'bytes':>9} {'relativo':>9} {'codificar (µs)':>15} {'decodificar (µs)':>17}")
+        baseline = None
+        for name, codec in codecs:
+            size, encode_us, decode_us = measure(codec, session, history, repeat)
+            baseline = baseline or size
+            print(f"{name:>16} {size:>9} {size / baseline:>8.2f}x {encode_us:>15.1f} {decode_us:>17.1f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threshold', type=int, default=1024, help='bytes a partir dos quais comprimir')
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+    run(threshold=args.threshold, repeat=args.repeat)
@@ -0,0 +1,15 @@
+"""
+Fixtures compartilhadas pelos testes
+"""
+
+import pytest
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """Clientes redis.Redis e redis.asyncio.Redis criados pelo código apontam para um único servidor em memória"""
+    fakeredis = pytest.importorskip('fakeredis')
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr('redis.Redis', lambda *args, **kwargs: fakeredis.FakeRedis(server=server, decode_responses=True))
+    monkeypatch.setattr('redis.asyncio.Redis', lambda *args, **kwargs: fakeredis.FakeAsyncRedis(server=server, decode_responses=True))
+    return server
@@ -1,6 +1,10 @@
-import openai
+import asyncio
 import logging
-from typing import List, Dict, Any
+import time
+from contextlib import nullcontext
+from typing import List, Dict, Any, AsyncIterator, Iterator
+from src.agents.history_manager import DEFAULT_TOKEN_BUDGETS, HistoryManager, estimate_tokens
+from src.utils.llm_client import get_llm_registry
 
 class BaseAgent:
     """Classe base para agentes de IA"""
@@ -9,27 +13,277 @@ class BaseAgent:
         self.name = name
         self.model = model
         self.logger = logging.getLogger(__name__)
+        # Clientes da API (compartilhados pelo processo, ver LLMClientRegistry.configure_agent)
         self.openai_client = None
+        self.async_openai_client = None
+        # Cache de respostas compartilhado (opt-in por agente, ver enable_response_cache)
+        self.response_cache = None
+        # Limitador de taxa/concorrência por modelo (ver enable_rate_limiter)
+        self.rate_limiter = None
+        # Política de latência: SLO, hedge e fallback (ver set_response_policy)
+        self.response_policy = None
+        # Agentes que sobrescrevem stream_message/astream_message entregam a resposta em partes
+        self.supports_streaming = False
+        # Agentes cuja resposta é uma única chamada de chat (build_messages -> generate_response)
+        # podem ser respondidos pela API de batch fora do horário de atendimento
+        self.supports_batch = False
+        # Histórico com orçamento de tokens; mensagens antigas viram um resumo incremental
+        self.summary_model = "gpt-3.5-turbo"
+        self.history = HistoryManager(model, summarizer=self.summarize, async_summarizer=self.asummarize)
         
-    def initialize_openai(self, api_key: str):
-        """Inicializa o cliente OpenAI"""
-        openai.api_key = api_key
-        self.openai_client = openai
+    def initialize_openai(self, api_key: str, base_url: str = None):
+        """Inicializa o cliente OpenAI (compartilhado com os demais agentes da mesma base URL)"""
+        self.openai_client = get_llm_registry().client_for(api_key, base_url)
+        
+    def initialize_async_openai(self, api_key: str, base_url: str = None):
+        """Inicializa o cliente OpenAI assíncrono (compartilhado com os demais agentes da mesma base URL)"""
+        self.async_openai_client = get_llm_registry().async_client_for(api_key, base_url)
+    
+    def set_model(self, model: str):
+        """Troca o modelo do agente, ajustando o orçamento padrão de tokens do histórico"""
+        if self.history.token_budget == DEFAULT_TOKEN_BUDGETS.get(self.history.model, 1500):
+            self.history.token_budget = DEFAULT_TOKEN_BUDGETS.get(model, 1500)
+        self.model = model
+        self.history.model = model
+        
+    def enable_rate_limiter(self, rate_limiter):
+        """Ativa o limitador de taxa compartilhado (RateLimiterRegistry) para as chamadas do agente"""
+        self.rate_limiter = rate_limiter
+    
+    def _limited(self, model: str, messages: List[Dict[str, str]]):
+        """Contexto que aguarda vaga no limitador do modelo (sem limitador, não faz nada)"""
+        if self.rate_limiter is None:
+            return nullcontext()
+        return self.rate_limiter.limit_call(model, estimate_tokens(messages, model))
+    
+    def _alimited(self, model: str, messages: List[Dict[str, str]]):
+        """Versão assíncrona de _limited"""
+        if self.rate_limiter is None:
+            return nullcontext()
+        return self.rate_limiter.alimit_call(model, estimate_tokens(messages, model))
+    
+    def _complete(self, messages: List[Dict[str, str]], temperature: float = 0.7, model: str = None,
+                  max_tokens: int = None) -> str:
+        """Chamada direta à API OpenAI (propaga erros)"""
+        model = model or self.model
+        options = {'max_tokens': max_tokens} if max_tokens else {}
+        with self._limited(model, messages):
+            response = self.openai_client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                **options
+            )
+        return response.choices[0].message.content.strip()
+    
+    async def _acomplete(self, messages: List[Dict[str, str]], temperature: float = 0.7, model: str = None,
+                         max_tokens: int = None) -> str:
+        """Versão assíncrona de _complete"""
+        model = model or self.model
+        options = {'max_tokens': max_tokens} if max_tokens else {}
+        async with self._alimited(model, messages):
+            response = await self.async_openai_client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                **options
+            )
+        return response.choices[0].message.content.strip()
+    
+    def summarize(self, messages: List[Dict[str, str]]) -> str:
+        """Gera o resumo incremental do histórico com o modelo de resumo"""
+        return self._complete(messages, temperature=0.2, model=self.summary_model,
+                              max_tokens=self.history.summary_max_tokens())
+    
+    async def asummarize(self, messages: List[Dict[str, str]]) -> str:
+        """Versão assíncrona de summarize"""
+        return await self._acomplete(messages, temperature=0.2, model=self.summary_model,
+                                     max_tokens=self.history.summary_max_tokens())
+    
+    def configure_history(self, token_budget: int = None, summary_model: str = None):
+        """Ajusta o orçamento de tokens do histórico e o modelo usado nos resumos"""
+        if token_budget:
+            self.history.token_budget = token_budget
+        if summary_model:
+            self.summary_model = summary_model
+    
+    def set_response_policy(self, response_policy):
+        """Define a política de SLO/hedge/fallback (ResponsePolicy) do agente"""
+        self.response_policy = response_policy
+    
+    def calls_model(self, message: str) -> bool:
+        """Indica se responder à mensagem exige uma chamada ao modelo (estimativa de custo)"""
+        return self.supports_batch
+    
+    def enable_response_cache(self, response_cache):
+        """Ativa o cache de respostas para este agente"""
+        self.response_cache = response_cache
         
     def generate_response(self, messages: List[Dict[str, str]], temperature: float = 0.7) -> str:
         """Gera uma resposta usando a API OpenAI"""
+        if self.response_cache is not None:
+            cached = self.response_cache.get(self.model, messages)
+            if cached is not None:
+                return cached
         try:
-            response = self.openai_client.ChatCompletion.create(
-                model=self.model,
-                messages=messages,
-                temperature=temperature
-            )
-            return response.choices[0].message.content.strip()
+            started = time.monotonic()
+            if self.response_policy is not None:
+                content, model = self.response_policy.complete(self, messages, temperature)
+            else:
+                content, model = self._complete(messages, temperature), self.model
+            # Respostas de hedge/fallback ficam na chave do modelo que de fato respondeu
+            if self.response_cache is not None:
+                self.response_cache.set(model, messages, content, time.monotonic() - started)
+            return content
+        except Exception as e:
+            self.logger.error(f"Erro ao gerar resposta para agente {self.name}: {e}")
+            return "Desculpe, ocorreu um erro ao processar sua solicitação."
+    
+    async def agenerate_response(self, messages: List[Dict[str, str]], temperature: float = 0.7) -> str:
+        """Gera uma resposta usando a API OpenAI sem bloquear o event loop"""
+        if self.response_cache is not None:
+            cached = await self.response_cache.aget(self.model, messages)
+            if cached is not None:
+                return cached
+        try:
+            started = time.monotonic()
+            if self.response_policy is not None:
+                content, model = await self.response_policy.acomplete(self, messages, temperature)
+            else:
+                content, model = await self._acomplete(messages, temperature), self.model
+            if self.response_cache is not None:
+                await self.response_cache.aset(model, messages, content, time.monotonic() - started)
+            return content
         except Exception as e:
             self.logger.error(f"Erro ao gerar resposta para agente {self.name}: {e}")
             return "Desculpe, ocorreu um erro ao processar sua solicitação."
     
+    @staticmethod
+    def _delta_content(chunk: Any) -> str:
+        """Extrai o texto de um chunk de streaming da API OpenAI"""
+        if not chunk.choices:
+            return ''
+        return getattr(chunk.choices[0].delta, 'content', None) or ''
+    
+    def stream_response(self, messages: List[Dict[str, str]], temperature: float = 0.7) -> Iterator[str]:
+        """Gera a resposta em partes, à medida que os tokens chegam da API OpenAI"""
+        if self.response_cache is not None:
+            cached = self.response_cache.get(self.model, messages)
+            if cached is not None:
+                yield cached
+                return
+        parts = []
+        try:
+            started = time.monotonic()
+            with self._limited(self.model, messages):
+                stream = self.openai_client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    temperature=temperature,
+                    stream=True
+                )
+                for chunk in stream:
+                    token = self._delta_content(chunk)
+                    if token:
+                        parts.append(token)
+                        yield token
+            if self.response_cache is not None and parts:
+                self.response_cache.set(self.model, messages, ''.join(parts).strip(), time.monotonic() - started)
+        except Exception as e:
+            self.logger.error(f"Erro ao gerar resposta para agente {self.name}: {e}")
+            if not parts:
+                yield self._stream_fallback(messages, temperature, e)
+    
+    def _stream_fallback(self, messages: List[Dict[str, str]], temperature: float, error: Exception) -> str:
+        """Resposta completa pelos modelos de fallback quando o stream falha antes do primeiro token"""
+        if self.response_policy is not None:
+            try:
+                return self.response_policy.fallback(self, messages, temperature, error)[0]
+            except Exception as e:
+                self.logger.error(f"Fallback falhou para agente {self.name}: {e}")
+        return "Desculpe, ocorreu um erro ao processar sua solicitação."
+    
+    async def _astream_fallback(self, messages: List[Dict[str, str]], temperature: float, error: Exception) -> str:
+        """Versão assíncrona de _stream_fallback"""
+        if self.response_policy is not None:
+            try:
+                return (await self.response_policy.afallback(self, messages, temperature, error))[0]
+            except Exception as e:
+                self.logger.error(f"Fallback falhou para agente {self.name}: {e}")
+        return "Desculpe, ocorreu um erro ao processar sua solicitação."
+    
+    async def astream_response(self, messages: List[Dict[str, str]], temperature: float = 0.7) -> AsyncIterator[str]:
+        """Versão assíncrona de stream_response"""
+        if self.response_cache is not None:
+            cached = await self.response_cache.aget(self.model, messages)
+            if cached is not None:
+                yield cached
+                return
+        parts = []
+        try:
+            started = time.monotonic()
+            async with self._alimited(self.model, messages):
+                stream = await self.async_openai_client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    temperature=temperature,
+                    stream=True
+                )
+                async for chunk in stream:
+                    token = self._delta_content(chunk)
+                    if token:
+                        parts.append(token)
+                        yield token
+            if self.response_cache is not None and parts:
+                await self.response_cache.aset(self.model, messages, ''.join(parts).strip(), time.monotonic() - started)
+        except Exception as e:
+            self.logger.error(f"Erro ao gerar resposta para agente {self.name}: {e}")
+            if not parts:
+                yield await self._astream_fallback(messages, temperature, e)
+    
+    def build_messages(self, message: str, context: Dict[str, Any] = None) -> List[Dict[str, str]]:
+        """Monta a lista de mensagens com prompt de sistema, resumo e histórico recente"""
+        messages = [
+            {"role": "system", "content": getattr(self, 'system_prompt', '')}
+        ]
+        
+        # Adicionar resumo e histórico da conversa (dentro do orçamento de tokens)
+        messages.extend(self.history.prompt_messages(context))
+        
+        # Adicionar a nova mensagem do usuário
+        messages.append({"role": "user", "content": message})
+        return messages
+    
+    def record_turn(self, context: Dict[str, Any], message: str, response: str):
+        """Acrescenta o turno ao histórico no contexto (o resumo fica para compact_history)"""
+        if context is not None:
+            self.history.append_turn(context, message, response)
+    
+    async def arecord_turn(self, context: Dict[str, Any], message: str, response: str):
+        """Versão assíncrona de record_turn"""
+        self.record_turn(context, message, response)
+    
+    def compact_history(self, context: Dict[str, Any]):
+        """Resume o histórico que passou do orçamento; chamado depois que a resposta foi entregue"""
+        self.history.compact(context)
+    
+    async def acompact_history(self, context: Dict[str, Any]):
+        """Versão assíncrona de compact_history (o resumo não bloqueia o event loop)"""
+        await self.history.acompact(context)
+    
     def process_message(self, message: str, context: Dict[str, Any] = None) -> str:
         """Processa uma mensagem recebida e retorna uma resposta"""
         # Este método deve ser implementado pelas subclasses
-        raise NotImplementedError("Método process_message deve ser implementado pela subclasse")
\ No newline at end of file
+        raise NotImplementedError("Método process_message deve ser implementado pela subclasse")
+    
+    async def aprocess_message(self, message: str, context: Dict[str, Any] = None) -> Any:
+        """Versão assíncrona de process_message (executa a versão síncrona em thread por padrão)"""
+        return await asyncio.to_thread(self.process_message, message, context)
+    
+    def stream_message(self, message: str, context: Dict[str, Any] = None) -> Iterator[str]:
+        """Processa uma mensagem entregando a resposta em partes (implementado pelos agentes com streaming)"""
+        raise NotImplementedError("Método stream_message deve ser implementado pela subclasse")
+    
+    def astream_message(self, message: str, context: Dict[str, Any] = None) -> AsyncIterator[str]:
+        """Versão assíncrona de stream_message"""
+        raise NotImplementedError("Método astream_message deve ser implementado pela subclasse")
\ No newline at end of file
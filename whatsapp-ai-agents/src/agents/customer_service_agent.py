@@ -1,7 +1,51 @@
 from src.agents.base_agent import BaseAgent
-from typing import List, Dict, Any
+from typing import Dict, Any, AsyncIterator, Iterator
 
-class CustomerServiceAgent(BaseAgent):
+class ConversationalAgent(BaseAgent):
+    """Agente que responde toda mensagem com uma chamada de chat ao LLM (com histórico e streaming)"""
+    
+    def __init__(self, name: str, model: str = "gpt-3.5-turbo"):
+        super().__init__(name, model)
+        self.supports_streaming = True
+        self.supports_batch = True
+        
+    def process_message(self, message: str, context: Dict[str, Any] = None) -> str:
+        """Processa uma mensagem e registra o turno no histórico da conversa"""
+        messages = self.build_messages(message, context)
+        
+        # Gerar resposta usando a API OpenAI
+        response = self.generate_response(messages)
+        
+        # Atualizar o histórico da conversa no contexto
+        self.record_turn(context, message, response)
+        return response
+        
+    async def aprocess_message(self, message: str, context: Dict[str, Any] = None) -> str:
+        """Processa uma mensagem de forma assíncrona"""
+        messages = self.build_messages(message, context)
+        response = await self.agenerate_response(messages)
+        await self.arecord_turn(context, message, response)
+        return response
+        
+    def stream_message(self, message: str, context: Dict[str, Any] = None) -> Iterator[str]:
+        """Processa uma mensagem entregando os tokens à medida que são gerados"""
+        messages = self.build_messages(message, context)
+        parts = []
+        for token in self.stream_response(messages):
+            parts.append(token)
+            yield token
+        self.record_turn(context, message, ''.join(parts).strip())
+        
+    async def astream_message(self, message: str, context: Dict[str, Any] = None) -> AsyncIterator[str]:
+        """Versão assíncrona de stream_message"""
+        messages = self.build_messages(message, context)
+        parts = []
+        async for token in self.astream_response(messages):
+            parts.append(token)
+            yield token
+        await self.arecord_turn(context, message, ''.join(parts).strip())
+
+class CustomerServiceAgent(ConversationalAgent):
     """Agente de atendimento ao cliente para WhatsApp"""
     
     def __init__(self, name: str = "CustomerServiceAgent"):
@@ -19,37 +63,8 @@ class CustomerServiceAgent(BaseAgent):
         - Telefone: [Telefone da empresa]
         - Email: [Email da empresa]
         """
-        
-    def process_message(self, message: str, context: Dict[str, Any] = None) -> str:
-        """Processa uma mensagem de atendimento ao cliente"""
-        # Preparar o histórico da conversa
-        messages = [
-            {"role": "system", "content": self.system_prompt}
-        ]
-        
-        # Adicionar histórico da conversa se disponível
-        if context and 'conversation_history' in context:
-            messages.extend(context['conversation_history'])
-        
-        # Adicionar a nova mensagem do usuário
-        messages.append({"role": "user", "content": message})
-        
-        # Gerar resposta usando a API OpenAI
-        response = self.generate_response(messages)
-        
-        # Atualizar o histórico da conversa no contexto
-        if context is not None:
-            if 'conversation_history' not in context:
-                context['conversation_history'] = []
-            
-            context['conversation_history'].extend([
-                {"role": "user", "content": message},
-                {"role": "assistant", "content": response}
-            ])
-        
-        return response
 
-class TechnicalSupportAgent(BaseAgent):
+class TechnicalSupportAgent(ConversationalAgent):
     """Agente de suporte técnico para WhatsApp"""
     
     def __init__(self, name: str = "TechnicalSupportAgent"):
@@ -66,32 +81,3 @@ class TechnicalSupportAgent(BaseAgent):
         - Resolução de problemas técnicos
         - Dúvidas sobre funcionalidades
         """
-        
-    def process_message(self, message: str, context: Dict[str, Any] = None) -> str:
-        """Processa uma mensagem de suporte técnico"""
-        # Preparar o histórico da conversa
-        messages = [
-            {"role": "system", "content": self.system_prompt}
-        ]
-        
-        # Adicionar histórico da conversa se disponível
-        if context and 'conversation_history' in context:
-            messages.extend(context['conversation_history'])
-        
-        # Adicionar a nova mensagem do usuário
-        messages.append({"role": "user", "content": message})
-        
-        # Gerar resposta usando a API OpenAI
-        response = self.generate_response(messages)
-        
-        # Atualizar o histórico da conversa no contexto
-        if context is not None:
-            if 'conversation_history' not in context:
-                context['conversation_history'] = []
-            
-            context['conversation_history'].extend([
-                {"role": "user", "content": message},
-                {"role": "assistant", "content": response}
-            ])
-        
-        return response
\ No newline at end of file
@@ -0,0 +1,208 @@
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+except ImportError:  # contagem aproximada sem o tokenizer oficial
+    tiktoken = None
+
+# Chaves do contexto da sessão gravadas pelo HistoryManager
+HISTORY_KEYS = ('conversation_history', 'history_summary')
+
+# Tokens extras por mensagem no formato de chat (papel + separadores)
+MESSAGE_OVERHEAD = 4
+
+# Orçamento de tokens do histórico por modelo (sem prompt de sistema e mensagem atual)
+DEFAULT_TOKEN_BUDGETS: Dict[str, int] = {
+    'gpt-3.5-turbo': 1500,
+    'gpt-4': 3000,
+}
+
+SUMMARY_PROMPT = (
+    "Você mantém um resumo curto de uma conversa de atendimento. "
+    "Atualize o resumo anterior incorporando as novas mensagens. "
+    "Preserve nomes, números de pedido, problemas relatados e o que já foi combinado. "
+    "Responda apenas com o resumo atualizado, em no máximo 5 frases."
+)
+
+_encodings: Dict[str, Any] = {}
+
+
+def count_tokens(text: str, model: str = 'gpt-3.5-turbo') -> int:
+    """Conta os tokens do texto (tiktoken se disponível; senão ~4 caracteres por token)"""
+    if not text:
+        return 0
+    if tiktoken is not None:
+        try:
+            encoding = _encodings.get(model)
+            if encoding is None:
+                encoding = _encodings[model] = tiktoken.encoding_for_model(model)
+            return len(encoding.encode(text))
+        except Exception:
+            pass
+    return len(text) // 4 + 1
+
+
+def estimate_tokens(messages: List[Dict[str, str]], model: str = 'gpt-3.5-turbo', completion_tokens: int = 256) -> int:
+    """Estimativa de tokens de uma chamada (prompt + resposta esperada), usada pelo limitador de taxa"""
+    prompt = sum(count_tokens(m.get('content') or '', model) + MESSAGE_OVERHEAD for m in messages)
+    return prompt + completion_tokens
+
+
+class HistoryManager:
+    """Histórico da conversa com orçamento de tokens e resumo incremental das mensagens antigas
+
+    O contexto guarda cada mensagem com sua contagem de tokens em 'conversation_history'
+    e o resumo acumulado em 'history_summary'. Quando o histórico passa do orçamento, as
+    mensagens mais antigas são removidas até sobrar target_ratio do orçamento e incorporadas
+    ao resumo anterior; o resumo nunca é recalculado a partir da conversa inteira e ocupa no
+    máximo metade dessa meta. Os agentes só acrescentam o turno antes de responder; o resumo
+    (compact) roda depois que a resposta foi entregue, e até lá o prompt leva apenas as
+    mensagens mais recentes que cabem no orçamento.
+    """
+
+    def __init__(self, model: str, token_budget: int = None, target_ratio: float = 0.5,
+                 summarizer: Callable[[List[Dict[str, str]]], str] = None,
+                 async_summarizer: Callable[[List[Dict[str, str]]], Awaitable[str]] = None):
+        self.model = model
+        self.token_budget = token_budget or DEFAULT_TOKEN_BUDGETS.get(model, 1500)
+        self.target_ratio = target_ratio
+        self.summarizer = summarizer
+        self.async_summarizer = async_summarizer
+
+    # Montagem do prompt
+
+    def prompt_messages(self, context: Optional[Dict[str, Any]]) -> List[Dict[str, str]]:
+        """Resumo (se houver) e mensagens recentes no formato da API de chat"""
+        if not context:
+            return []
+        messages = []
+        summary = context.get('history_summary')
+        if summary and summary.get('content'):
+            messages.append({"role": "system", "content": f"Resumo da conversa até aqui: {summary['content']}"})
+        for turn in self._recent_turns(context):
+            messages.append({"role": turn['role'], "content": turn['content']})
+        return messages
+
+    def _recent_turns(self, context: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Mensagens mais recentes que cabem no orçamento (as demais aguardam o próximo resumo)"""
+        history = context.get('conversation_history', [])
+        available = self.token_budget - (context.get('history_summary') or {}).get('tokens', 0)
+        start = len(history)
+        while start > 0 and available - self._turn_tokens(history[start - 1]) >= 0:
+            start -= 1
+            available -= history[start]['tokens']
+        # O trecho enviado sempre começa por uma mensagem do usuário
+        while start < len(history) and history[start]['role'] != 'user':
+            start += 1
+        return history[start:]
+
+    # Registro de turnos
+
+    def _turn(self, role: str, content: str) -> Dict[str, Any]:
+        return {"role": role, "content": content, "tokens": count_tokens(content, self.model) + MESSAGE_OVERHEAD}
+
+    def _turn_tokens(self, turn: Dict[str, Any]) -> int:
+        # Históricos antigos não têm a contagem salva
+        if 'tokens' not in turn:
+            turn['tokens'] = count_tokens(turn.get('content', ''), self.model) + MESSAGE_OVERHEAD
+        return turn['tokens']
+
+    def history_tokens(self, context: Dict[str, Any]) -> int:
+        """Total de tokens que o histórico (resumo + mensagens) ocupa no prompt"""
+        summary = context.get('history_summary') or {}
+        return summary.get('tokens', 0) + sum(self._turn_tokens(t) for t in context.get('conversation_history', []))
+
+    def append_turn(self, context: Dict[str, Any], message: str, response: str):
+        """Adiciona o turno ao histórico com a contagem de tokens de cada mensagem"""
+        history = context.setdefault('conversation_history', [])
+        history.extend([self._turn("user", message), self._turn("assistant", response)])
+
+    def _evict(self, context: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Remove as mensagens mais antigas até o histórico caber na meta"""
+        if self.history_tokens(context) <= self.token_budget:
+            return []
+        history = context['conversation_history']
+        target = self.token_budget * self.target_ratio
+        total = self.history_tokens(context)
+        evicted = []
+        # Mantém ao menos o último turno (pergunta + resposta)
+        while len(history) > 2 and total > target:
+            turn = history.pop(0)
+            total -= turn['tokens']
+            evicted.append(turn)
+        # O histórico restante sempre começa por uma mensagem do usuário
+        while len(history) > 2 and history[0]['role'] != 'user':
+            evicted.append(history.pop(0))
+        return evicted
+
+    def _summary_request(self, context: Dict[str, Any], evicted: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+        previous = (context.get('history_summary') or {}).get('content') or '(vazio)'
+        transcript = '\n'.join(f"{t['role']}: {t['content']}" for t in evicted)
+        return [
+            {"role": "system", "content": SUMMARY_PROMPT},
+            {"role": "user", "content": f"Resumo anterior:\n{previous}\n\nNovas mensagens:\n{transcript}"}
+        ]
+
+    def _fallback_summary(self, context: Dict[str, Any], evicted: List[Dict[str, Any]]) -> str:
+        # Sem o modelo, mantém o resumo anterior e o início das perguntas do usuário,
+        # limitado a uma fração do orçamento
+        previous = (context.get('history_summary') or {}).get('content') or ''
+        questions = '; '.join(t['content'][:80] for t in evicted if t['role'] == 'user')
+        summary = f"{previous} Usuário perguntou: {questions}".strip() if questions else previous
+        max_chars = int(self.token_budget * self.target_ratio) * 2
+        return summary[-max_chars:]
+
+    def summary_max_tokens(self) -> int:
+        """Tamanho máximo do resumo: metade da meta após a remoção das mensagens antigas"""
+        return max(1, int(self.token_budget * self.target_ratio / 2))
+
+    def _truncate(self, text: str, max_tokens: int) -> str:
+        # Corte proporcional (ajustado pela recontagem) até caber no limite
+        tokens = count_tokens(text, self.model)
+        while tokens > max_tokens and text:
+            text = text[:max(0, int(len(text) * max_tokens / tokens) - 1)]
+            tokens = count_tokens(text, self.model)
+        return text
+
+    def _store_summary(self, context: Dict[str, Any], evicted: List[Dict[str, Any]], summary: Optional[str]):
+        summary = (summary or '').strip() or self._fallback_summary(context, evicted)
+        summary = self._truncate(summary, self.summary_max_tokens() - MESSAGE_OVERHEAD)
+        covered = (context.get('history_summary') or {}).get('covered', 0) + len(evicted)
+        context['history_summary'] = {
+            'content': summary,
+            'tokens': count_tokens(summary, self.model) + MESSAGE_OVERHEAD,
+            'covered': covered
+        }
+
+    def compact(self, context: Optional[Dict[str, Any]]):
+        """Resume as mensagens que excederem o orçamento (chamado depois de entregar a resposta)"""
+        if context is None:
+            return
+        evicted = self._evict(context)
+        if not evicted:
+            return
+        summary = None
+        if self.summarizer is not None:
+            try:
+                summary = self.summarizer(self._summary_request(context, evicted))
+            except Exception as e:
+                logger.error(f"Erro ao resumir histórico: {e}")
+        self._store_summary(context, evicted, summary)
+
+    async def acompact(self, context: Optional[Dict[str, Any]]):
+        """Versão assíncrona de compact"""
+        if context is None:
+            return
+        evicted = self._evict(context)
+        if not evicted:
+            return
+        summary = None
+        if self.async_summarizer is not None:
+            try:
+                summary = await self.async_summarizer(self._summary_request(context, evicted))
+            except Exception as e:
+                logger.error(f"Erro ao resumir histórico: {e}")
+        self._store_summary(context, evicted, summary)
@@ -0,0 +1,143 @@
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+from src.utils.race import CallRace
+
+logger = logging.getLogger(__name__)
+
+
+class ResponsePolicy:
+    """Política de latência de um agente: SLO, requisição de hedge e cadeia de fallback
+
+    A chamada ao modelo principal recebe latency_slo segundos. Passado o SLO, uma
+    segunda chamada é feita ao hedge_model e vence a primeira resposta válida (ver
+    CallRace). Se todas falharem, os modelos de fallback_models são tentados em ordem.
+    Cada decisão é registrada no MetricsCollector, quando informado.
+    """
+
+    def __init__(self, latency_slo: float = 0, hedge_model: str = None,
+                 fallback_models: List[str] = None, metrics=None, max_workers: int = 16):
+        self.latency_slo = latency_slo
+        self.hedge_model = hedge_model
+        self.fallback_models = list(fallback_models or [])
+        self.metrics = metrics
+        # Corrida entre o modelo principal e o hedge (threads criadas sob demanda)
+        self.race = CallRace(max_workers=max_workers, thread_name_prefix='llm-hedge')
+
+    @classmethod
+    def from_config(cls, settings: Dict[str, Any], metrics=None) -> 'ResponsePolicy':
+        """Cria a política a partir de um dicionário (ex.: entrada de Config.RESPONSE_POLICIES)"""
+        return cls(
+            latency_slo=float(settings.get('latency_slo', 0)),
+            hedge_model=settings.get('hedge_model'),
+            fallback_models=settings.get('fallback_models'),
+            metrics=metrics
+        )
+
+    def _record(self, agent, decision: str, model: str = None):
+        if self.metrics is not None:
+            self.metrics.record_policy_decision(agent.name, decision, model)
+
+    def _hedging(self, agent) -> bool:
+        return bool(self.latency_slo) and bool(self.hedge_model) and self.hedge_model != agent.model
+
+    def _hedge_options(self, agent, errors: List[Exception]) -> Dict[str, Any]:
+        """Parâmetros da corrida entre o modelo principal e o hedge (vale a primeira resposta)"""
+        def on_error(model: str, error: Exception):
+            errors.append(error)
+            self._record(agent, 'error', model)
+
+        def on_backup():
+            self._record(agent, 'slo_exceeded', agent.model)
+            self._record(agent, 'hedge_sent', self.hedge_model)
+
+        return {'accept': lambda model, result: True, 'on_error': on_error,
+                'backup_after': self.latency_slo, 'on_backup': on_backup}
+
+    def _won(self, agent, outcome) -> Tuple[str, str]:
+        self._record(agent, self._winner(outcome, agent), outcome.winner)
+        return outcome.result, outcome.winner
+
+    def complete(self, agent, messages: List[Dict[str, str]], temperature: float = 0.7) -> Tuple[str, str]:
+        """Gera a resposta aplicando SLO, hedge e fallback; retorna (resposta, modelo que respondeu)"""
+        last_error: Optional[Exception] = None
+        if self._hedging(agent):
+            errors: List[Exception] = []
+            outcome = self.race.run(
+                {agent.model: lambda: agent._complete(messages, temperature, agent.model)},
+                backups={self.hedge_model: lambda: agent._complete(messages, temperature, self.hedge_model)},
+                **self._hedge_options(agent, errors)
+            )
+            if outcome.winner is not None:
+                return self._won(agent, outcome)
+            last_error = errors[-1] if errors else None
+        else:
+            try:
+                result = agent._complete(messages, temperature)
+                self._record(agent, 'primary', agent.model)
+                return result, agent.model
+            except Exception as e:
+                last_error = e
+                self._record(agent, 'error', agent.model)
+        return self.fallback(agent, messages, temperature, last_error)
+
+    def fallback(self, agent, messages: List[Dict[str, str]], temperature: float, error: Exception) -> Tuple[str, str]:
+        """Tenta os modelos de fallback em ordem; relança o último erro se todos falharem"""
+        for model in self.fallback_models:
+            try:
+                result = agent._complete(messages, temperature, model)
+                self._record(agent, 'fallback', model)
+                return result, model
+            except Exception as e:
+                logger.warning(f"Fallback para {model} falhou no agente {agent.name}: {e}")
+                error = e
+                self._record(agent, 'error', model)
+        raise error
+
+    # Versão assíncrona (tarefas)
+
+    async def acomplete(self, agent, messages: List[Dict[str, str]], temperature: float = 0.7) -> Tuple[str, str]:
+        """Versão assíncrona de complete"""
+        last_error: Optional[Exception] = None
+        if self._hedging(agent):
+            errors: List[Exception] = []
+            outcome = await self.race.arun(
+                {agent.model: lambda: agent._acomplete(messages, temperature, agent.model)},
+                backups={self.hedge_model: lambda: agent._acomplete(messages, temperature, self.hedge_model)},
+                **self._hedge_options(agent, errors)
+            )
+            if outcome.winner is not None:
+                return self._won(agent, outcome)
+            last_error = errors[-1] if errors else None
+        else:
+            try:
+                result = await agent._acomplete(messages, temperature)
+                self._record(agent, 'primary', agent.model)
+                return result, agent.model
+            except Exception as e:
+                last_error = e
+                self._record(agent, 'error', agent.model)
+        return await self.afallback(agent, messages, temperature, last_error)
+
+    async def afallback(self, agent, messages: List[Dict[str, str]], temperature: float, error: Exception) -> Tuple[str, str]:
+        """Versão assíncrona de fallback"""
+        for model in self.fallback_models:
+            try:
+                result = await agent._acomplete(messages, temperature, model)
+                self._record(agent, 'fallback', model)
+                return result, model
+            except Exception as e:
+                logger.warning(f"Fallback para {model} falhou no agente {agent.name}: {e}")
+                error = e
+                self._record(agent, 'error', model)
+        raise error
+
+    @staticmethod
+    def _winner(outcome, agent) -> str:
+        """Nome da decisão de acordo com quem respondeu primeiro"""
+        if outcome.launched == 1:
+            return 'primary'
+        return 'primary_after_hedge' if outcome.winner == agent.model else 'hedge_won'
+
+    def shutdown(self):
+        """Encerra as threads usadas pelas chamadas com hedge"""
+        self.race.shutdown()
@@ -0,0 +1,418 @@
+"""
+Ponto de entrada ASGI com pipeline assíncrono de mensagens
+
+Executar com: uvicorn src.asgi:app --host 0.0.0.0 --port 8000
+O painel administrativo continua servido pela aplicação Flask (src.main:app).
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+from typing import Any, Dict, Optional, Set
+import aiohttp
+from src.config.config import Config
+from src.orchestrator.orchestrator import AgentOrchestrator
+from src.orchestrator.intent_classifier import load_intent_classifier
+from src.orchestrator.rule_engine import load_rule_engine
+from src.orchestrator.speculative import SpeculativeFanout, classifier_scorer
+from src.orchestrator.metrics import MetricsCollector
+from src.orchestrator.session_manager import AsyncSessionManager
+from src.utils.dedup import WebhookDeduplicator
+from src.utils.response_cache import ResponseCache
+from src.utils.rate_limiter import RateLimiterRegistry, limiter_redis_client
+from src.utils.llm_client import get_llm_registry
+from src.utils.stages import run_stages, timed_stage
+from src.orchestrator.specialized_agents import TechnicalSupportAgent, FinancialAgent
+from src.agents.customer_service_agent import CustomerServiceAgent
+from src.agents.response_policy import ResponsePolicy
+from src.agents.history_manager import HISTORY_KEYS
+
+# Criar diretório de logs se não existir
+if not os.path.exists('logs'):
+    os.makedirs('logs')
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler('logs/app.log'),
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+class AsyncChatwootClient:
+    """Cliente assíncrono para a API do Chatwoot"""
+    def __init__(self, api_key, account_id, base_url, timeout: float = 30):
+        self.api_key = api_key
+        self.account_id = account_id
+        self.base_url = base_url.rstrip('/') if base_url else ''
+        self.headers = {
+            'api_access_token': self.api_key,
+            'Content-Type': 'application/json'
+        }
+        self.timeout = timeout
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    async def start(self):
+        """Abre a sessão HTTP compartilhada"""
+        if self.session is None:
+            self.session = aiohttp.ClientSession(
+                headers=self.headers,
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+
+    async def close(self):
+        """Fecha a sessão HTTP"""
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def send_message(self, conversation_id, message):
+        """Envia uma mensagem para uma conversa no Chatwoot"""
+        await self.start()
+        url = f"{self.base_url}/api/v1/accounts/{self.account_id}/conversations/{conversation_id}/messages"
+        payload = {
+            'content': message,
+            'message_type': 'outgoing'
+        }
+        try:
+            async with self.session.post(url, json=payload) as response:
+                response.raise_for_status()
+                return await response.json()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"Erro ao enviar mensagem para Chatwoot: {e}")
+            return None
+
+
+class AsyncChatwootBot:
+    """Versão assíncrona do ChatwootBot: uma única thread atende muitas conversas"""
+    def __init__(self, config):
+        self.config = config
+        self.sessions = AsyncSessionManager(config)
+        self.chatwoot_client = AsyncChatwootClient(
+            api_key=config.CHATWOOT_API_KEY,
+            account_id=config.CHATWOOT_ACCOUNT_ID,
+            base_url=config.CHATWOOT_BASE_URL
+        )
+
+        intent_classifier = None
+        if config.INTENT_ROUTING_ENABLED:
+            intent_classifier = load_intent_classifier(config.INTENT_MODEL_PATH, config.INTENT_MIN_CONFIDENCE)
+        rule_engine = None
+        if config.RESPONSE_RULES_ENABLED:
+            rule_engine = load_rule_engine(
+                config.RESPONSE_RULES_PATH,
+                config.RESPONSE_RULES_MIN_CONFIDENCE,
+                config.RESPONSE_RULES_RELOAD_INTERVAL
+            )
+        speculative = None
+        if config.SPECULATIVE_ROUTING_ENABLED and intent_classifier is not None:
+            speculative = SpeculativeFanout(
+                classifier_scorer(intent_classifier),
+                max_candidates=config.SPECULATIVE_MAX_CANDIDATES,
+                max_extra_tokens=config.SPECULATIVE_MAX_EXTRA_TOKENS,
+                accept_score=config.SPECULATIVE_ACCEPT_SCORE,
+                margin=config.SPECULATIVE_MARGIN,
+                timeout=config.SPECULATIVE_TIMEOUT
+            )
+        self.orchestrator = AgentOrchestrator(
+            intent_classifier=intent_classifier,
+            routing_cache_size=config.ROUTING_CACHE_SIZE,
+            routing_cache_ttl=config.ROUTING_CACHE_TTL,
+            context_cache_size=config.CONTEXT_CACHE_SIZE,
+            context_ttl=config.CONTEXT_CACHE_TTL,
+            rule_engine=rule_engine,
+            speculative=speculative
+        )
+        self.orchestrator.register_agent('customer_service', CustomerServiceAgent('customer_service'))
+        self.orchestrator.register_agent('technical_support', TechnicalSupportAgent('technical_support', rule_engine=rule_engine))
+        self.orchestrator.register_agent('financial', FinancialAgent('financial', rule_engine=rule_engine))
+        self.rate_limiter = RateLimiterRegistry(
+            limiter_redis_client(config.REDIS_HOST, config.REDIS_PORT, config.REDIS_DB,
+                                 timeout=config.OPENAI_LIMITER_REDIS_TIMEOUT, asynchronous=True),
+            limits=config.OPENAI_RATE_LIMITS,
+            queue_timeout=config.OPENAI_QUEUE_TIMEOUT,
+            redis_retry_interval=config.OPENAI_LIMITER_RETRY_INTERVAL
+        )
+        self.llm_clients = get_llm_registry()
+        for agent_id, agent in self.orchestrator.agents.items():
+            self.llm_clients.configure_agent(agent, agent_id, synchronous=False, asynchronous=True)
+            agent.configure_history(config.HISTORY_TOKEN_BUDGET, config.HISTORY_SUMMARY_MODEL)
+            agent.enable_rate_limiter(self.rate_limiter)
+        self.response_cache = ResponseCache(
+            self.sessions.redis_client,
+            ttl=config.RESPONSE_CACHE_TTL,
+            max_entries=config.RESPONSE_CACHE_MAX_ENTRIES,
+            semantic_threshold=config.RESPONSE_CACHE_SEMANTIC_THRESHOLD
+        )
+        for agent_id in config.RESPONSE_CACHE_AGENTS:
+            if agent_id in self.orchestrator.agents:
+                self.orchestrator.agents[agent_id].enable_response_cache(self.response_cache)
+        self.metrics = MetricsCollector()
+        for agent_id, settings in config.RESPONSE_POLICIES.items():
+            if agent_id in self.orchestrator.agents:
+                self.orchestrator.agents[agent_id].set_response_policy(
+                    ResponsePolicy.from_config(settings, metrics=self.metrics)
+                )
+        self.deduplicator = WebhookDeduplicator(
+            self.sessions.redis_client,
+            ttl=config.DEDUP_TTL,
+            capacity=config.DEDUP_FILTER_CAPACITY
+        )
+
+        logger.info("AsyncChatwootBot inicializado com sucesso")
+
+    async def startup(self):
+        """Abre conexões com Redis e Chatwoot"""
+        await self.sessions.start()
+        await self.chatwoot_client.start()
+
+    async def shutdown(self):
+        """Fecha conexões abertas"""
+        await self.chatwoot_client.close()
+        await self.sessions.close()
+        await self.rate_limiter.redis_client.aclose()
+        await self.llm_clients.aclose()
+        self.orchestrator.shutdown()
+
+    async def process_incoming_message(self, data):
+        """Processa mensagens recebidas do Chatwoot"""
+        try:
+            message_content = data.get('message', {}).get('content', '')
+            conversation_id = data.get('conversation', {}).get('id')
+            contact_id = data.get('contact', {}).get('id')
+            contact_name = data.get('contact', {}).get('name', 'Usuário')
+
+            if not message_content or not conversation_id:
+                logger.warning("Mensagem recebida sem conteúdo ou ID de conversa")
+                return
+
+            logger.info(f"Mensagem recebida de {contact_name} ({contact_id}): {message_content}")
+            started = time.monotonic()
+
+            # Estágios independentes em paralelo: deduplicação e leitura da sessão (com o histórico)
+            # no Redis, roteamento no loop enquanto as respostas do Redis estão a caminho
+            stages = await run_stages(
+                {
+                    'dedup': lambda: self.deduplicator.ais_duplicate(data),
+                    'session': lambda: self.sessions.get_session(str(conversation_id))
+                },
+                cpu_stages={'routing': lambda: self._route(message_content)},
+                metrics=self.metrics
+            )
+            if stages['dedup']:
+                logger.info("Webhook duplicado ignorado")
+                return
+            session = stages['session']
+            if session is None:
+                # Só cria a sessão depois de descartar reenvios (a criação regrava e publica)
+                session = await self.sessions.create_session(str(conversation_id), str(contact_id))
+            context = session['data'] if session else {}
+            agent_id, candidates = stages['routing']
+            logger.info(f"Agente selecionado: {agent_id}")
+
+            delivered = False
+            if self.config.RESPONSE_STREAMING_ENABLED:
+                response, delivered = await self._send_streaming_response(agent_id, conversation_id, message_content,
+                                                                          contact_id, context, started)
+            else:
+                with timed_stage(self.metrics, 'generation'):
+                    if candidates:
+                        agent_id, response = await self.orchestrator.aget_speculative_response(
+                            candidates, message_content, contact_id, context)
+                    else:
+                        response = await self.orchestrator.aget_agent_response(agent_id, message_content, contact_id, context)
+                if response:
+                    with timed_stage(self.metrics, 'delivery'):
+                        delivered = await self._send(conversation_id, response)
+                    if delivered:
+                        self.metrics.record_first_message(agent_id, time.monotonic() - started)
+
+            if response and delivered:
+                logger.info(f"Resposta enviada para {contact_name}: {response}")
+                self.metrics.record_request(agent_id, True, time.monotonic() - started)
+                # O resumo do histórico (chamada ao modelo de resumo) só roda depois da entrega
+                await self.orchestrator.acompact_history(agent_id, contact_id, context)
+                if session:
+                    session['active_agent'] = agent_id
+                    # Só o agente ativo e as chaves do histórico mudam por mensagem
+                    await self.sessions.save_session(str(conversation_id), session, data_keys=HISTORY_KEYS)
+            elif response:
+                # Resposta não entregue: não conta como sucesso nem entra no histórico da sessão
+                logger.error(f"Falha ao enviar resposta para a conversa {conversation_id}")
+                self.metrics.record_request(agent_id, False, time.monotonic() - started, "Falha ao enviar resposta")
+            else:
+                logger.error("Nenhuma resposta gerada pelo agente")
+                self.metrics.record_request(agent_id, False, time.monotonic() - started, "Nenhuma resposta gerada")
+
+        except Exception as e:
+            logger.error(f"Erro ao processar mensagem: {e}")
+
+    def _route(self, message_content):
+        """Agente selecionado e candidatos do fan-out especulativo (vazio se a rota é clara)"""
+        return (self.orchestrator.select_agent(message_content),
+                self.orchestrator.speculative_candidates(message_content))
+
+    async def _send(self, conversation_id, content):
+        """Envia uma mensagem ao Chatwoot; False se o envio falhou"""
+        return bool(await self.chatwoot_client.send_message(conversation_id, content))
+
+    async def _send_streaming_response(self, agent_id, conversation_id, message_content, contact_id, context, started):
+        """Envia ao Chatwoot cada frase/parágrafo da resposta assim que é gerado; (resposta, entregue)"""
+        chunks = []
+        async for chunk in self.orchestrator.astream_agent_response(
+            agent_id, message_content, contact_id, context,
+            min_chars=self.config.RESPONSE_CHUNK_MIN_CHARS,
+            max_chars=self.config.RESPONSE_CHUNK_MAX_CHARS
+        ):
+            chunks.append(chunk)
+            if not await self._send(conversation_id, chunk):
+                # Interrompe a geração: o turno não é registrado no histórico
+                return '\n'.join(chunks), False
+            if len(chunks) == 1:
+                self.metrics.record_first_message(agent_id, time.monotonic() - started)
+        return '\n'.join(chunks), bool(chunks)
+
+
+class WebhookApp:
+    """Aplicação ASGI mínima que recebe os webhooks do Chatwoot"""
+    def __init__(self, config, max_inflight: int = 1000, shutdown_timeout: float = 25):
+        self.config = config
+        self.max_inflight = max_inflight
+        self.shutdown_timeout = shutdown_timeout
+        self.bot: Optional[AsyncChatwootBot] = None
+        self.tasks: Set[asyncio.Task] = set()
+        self.metrics: Dict[str, Any] = {
+            'accepted': 0,
+            'rejected': 0
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        """Inicializa e encerra o bot junto com o servidor"""
+        while True:
+            event = await receive()
+            if event['type'] == 'lifespan.startup':
+                try:
+                    self.config.validate()
+                    self.bot = AsyncChatwootBot(self.config)
+                    await self.bot.startup()
+                    await send({'type': 'lifespan.startup.complete'})
+                except Exception as e:
+                    logger.error(f"Erro ao inicializar AsyncChatwootBot: {e}")
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+            elif event['type'] == 'lifespan.shutdown':
+                await self._drain()
+                if self.bot:
+                    await self.bot.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _drain(self):
+        """Aguarda as mensagens em processamento antes de encerrar"""
+        if not self.tasks:
+            return
+        logger.info(f"Aguardando {len(self.tasks)} mensagens em processamento")
+        _, pending = await asyncio.wait(self.tasks, timeout=self.shutdown_timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            logger.warning(f"{len(pending)} mensagens canceladas no encerramento")
+
+    async def _http(self, scope, receive, send):
+        path = scope['path']
+        method = scope['method']
+        if path == '/webhook' and method == 'POST':
+            body = await self._read_body(receive)
+            status, payload = await self._handle_webhook(body)
+        elif path == '/health' and method == 'GET':
+            status, payload = 200, {'status': 'ok' if self.bot else 'starting'}
+        elif path == '/api/stats' and method == 'GET':
+            status, payload = 200, {'message_queue': self.get_metrics()}
+            if self.bot:
+                payload['deduplication'] = self.bot.deduplicator.get_metrics()
+                payload['response_cache'] = self.bot.response_cache.get_metrics()
+                if self.bot.sessions.near_cache:
+                    payload['session_cache'] = self.bot.sessions.get_cache_metrics()
+                if self.bot.orchestrator.rule_engine:
+                    payload['response_tiers'] = self.bot.orchestrator.rule_engine.get_metrics()
+                if self.bot.orchestrator.speculative:
+                    payload['speculative'] = self.bot.orchestrator.speculative.get_metrics()
+                payload['latency'] = self.bot.metrics.get_latency_summary()
+                payload['stages'] = self.bot.metrics.get_stage_latency()
+                payload['openai_limits'] = self.bot.rate_limiter.get_metrics()
+                payload['policy'] = self.bot.metrics.get_policy_decisions()
+                payload['llm_clients'] = self.bot.llm_clients.get_metrics()
+        else:
+            status, payload = 404, {'error': 'Não encontrado'}
+        await self._send_json(send, status, payload)
+
+    async def _handle_webhook(self, body: bytes):
+        """Agenda o processamento da mensagem e responde imediatamente"""
+        if not self.bot:
+            logger.error("AsyncChatwootBot não foi inicializado corretamente")
+            return 503, {'error': 'Serviço indisponível'}
+        try:
+            data = json.loads(body or b'{}')
+        except ValueError:
+            return 400, {'error': 'JSON inválido'}
+
+        if data.get('message_type') == 'incoming':
+            # A deduplicação roda no processamento, em paralelo com a sessão e o roteamento
+            if len(self.tasks) >= self.max_inflight:
+                self.metrics['rejected'] += 1
+                return 503, {'error': 'Fila de processamento cheia'}
+            task = asyncio.create_task(self.bot.process_incoming_message(data))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+            self.metrics['accepted'] += 1
+
+        return 200, {'status': 'received'}
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Retorna mensagens em processamento e contadores"""
+        return {
+            **self.metrics,
+            'inflight': len(self.tasks),
+            'max_inflight': self.max_inflight
+        }
+
+    @staticmethod
+    async def _read_body(receive) -> bytes:
+        body = b''
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if not message.get('more_body', False):
+                return body
+
+    @staticmethod
+    async def _send_json(send, status: int, payload: Dict[str, Any]):
+        body = json.dumps(payload).encode('utf-8')
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(body)).encode())
+            ]
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+
+app = WebhookApp(
+    Config,
+    max_inflight=Config.ASYNC_MAX_INFLIGHT,
+    shutdown_timeout=Config.WEBHOOK_SHUTDOWN_TIMEOUT
+)
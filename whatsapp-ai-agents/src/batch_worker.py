@@ -0,0 +1,35 @@
+"""
+Worker do modo em lote (BATCH_MODE_ENABLED=true)
+
+Executar com: python -m src.batch_worker
+Envia as mensagens adiadas como jobs da API de batch da OpenAI e entrega as respostas no Chatwoot.
+"""
+
+import signal
+import logging
+import threading
+from src.config.config import Config
+from src.main import chatwoot_bot
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    """Processa os jobs em lote até o sinal de encerramento"""
+    if not chatwoot_bot:
+        logger.error("ChatwootBot não foi inicializado corretamente")
+        return 1
+    if not chatwoot_bot.batch_queue:
+        logger.error("Modo em lote desativado (BATCH_MODE_ENABLED=false)")
+        return 1
+
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+    signal.signal(signal.SIGINT, lambda *_: stop_event.set())
+
+    chatwoot_bot.batch_queue.run(chatwoot_bot.deliver_batch_response, stop_event, Config.BATCH_POLL_INTERVAL)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -1,4 +1,5 @@
 import os
+import json
 from dotenv import load_dotenv
 
 # Carregar variáveis de ambiente do arquivo .env
@@ -7,6 +8,23 @@ load_dotenv()
 class Config:
     # Configurações da API OpenAI
     OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
+    # Limites por modelo (JSON), ex.: {"gpt-4": {"rpm": 500, "tpm": 10000, "max_concurrency": 8, "latency_target": 20}}
+    OPENAI_RATE_LIMITS = json.loads(os.getenv('OPENAI_RATE_LIMITS') or '{}')
+    # Tempo máximo (s) que uma chamada espera na fila do limitador antes de desistir
+    OPENAI_QUEUE_TIMEOUT = float(os.getenv('OPENAI_QUEUE_TIMEOUT', 30))
+    # Cliente Redis do limitador: timeout curto; após um erro usa baldes locais por N segundos
+    OPENAI_LIMITER_REDIS_TIMEOUT = float(os.getenv('OPENAI_LIMITER_REDIS_TIMEOUT', 0.25))
+    OPENAI_LIMITER_RETRY_INTERVAL = float(os.getenv('OPENAI_LIMITER_RETRY_INTERVAL', 30))
+    # Base URL da API (vazio usa a OpenAI; permite apontar para um servidor compatível local)
+    OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL', '')
+    # Provedores adicionais (JSON), ex.: {"local": {"base_url": "http://localhost:8001/v1", "api_key": "local"}}
+    LLM_PROVIDERS = json.loads(os.getenv('LLM_PROVIDERS') or '{}')
+    # Configuração por agente (JSON), ex.: {"technical_support": {"provider": "local", "model": "gpt-4", "timeout": 20}}
+    LLM_AGENT_SETTINGS = json.loads(os.getenv('LLM_AGENT_SETTINGS') or '{}')
+    LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', 60))
+    LLM_CONNECT_TIMEOUT = float(os.getenv('LLM_CONNECT_TIMEOUT', 5))
+    LLM_MAX_CONNECTIONS = int(os.getenv('LLM_MAX_CONNECTIONS', 100))
+    LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', 2))
     
     # Configurações do Chatwoot
     CHATWOOT_API_KEY = os.getenv('CHATWOOT_API_KEY')
@@ -18,6 +36,120 @@ class Config:
     REDIS_PORT = int(os.getenv('REDIS_PORT', 6379))
     REDIS_DB = int(os.getenv('REDIS_DB', 0))
     
+    # Cache local de sessões por processo, invalidado via pub/sub do Redis
+    SESSION_NEAR_CACHE_ENABLED = os.getenv('SESSION_NEAR_CACHE_ENABLED', 'false').lower() == 'true'
+    SESSION_NEAR_CACHE_SIZE = int(os.getenv('SESSION_NEAR_CACHE_SIZE', 1000))
+    SESSION_NEAR_CACHE_TTL = float(os.getenv('SESSION_NEAR_CACHE_TTL', 30))
+    
+    # Histórico da conversa em lista própria: turnos guardados e turnos lidos com a sessão
+    SESSION_HISTORY_MAX_TURNS = int(os.getenv('SESSION_HISTORY_MAX_TURNS', 200))
+    SESSION_HISTORY_WINDOW = int(os.getenv('SESSION_HISTORY_WINDOW', 50))
+    
+    # Codec dos valores de sessão: json ou msgpack, com compressão (none, zlib ou zstd) a partir
+    # de SESSION_COMPRESSION_THRESHOLD bytes
+    SESSION_CODEC = os.getenv('SESSION_CODEC', 'json')
+    SESSION_COMPRESSION = os.getenv('SESSION_COMPRESSION', 'none')
+    SESSION_COMPRESSION_THRESHOLD = int(os.getenv('SESSION_COMPRESSION_THRESHOLD', 1024))
+    
+    # Configurações do pool de processamento do webhook
+    WEBHOOK_WORKERS = int(os.getenv('WEBHOOK_WORKERS', 8))
+    WEBHOOK_QUEUE_SIZE = int(os.getenv('WEBHOOK_QUEUE_SIZE', 1000))
+    WEBHOOK_SHUTDOWN_TIMEOUT = float(os.getenv('WEBHOOK_SHUTDOWN_TIMEOUT', 25))
+    
+    # Deduplicação de webhooks reenviados pelo Chatwoot
+    DEDUP_TTL = int(os.getenv('DEDUP_TTL', 86400))
+    DEDUP_FILTER_CAPACITY = int(os.getenv('DEDUP_FILTER_CAPACITY', 100000))
+    
+    # Agrupamento de rajadas por conversa (0 desativa): espera COALESCE_WINDOW s sem novas
+    # mensagens, até no máximo COALESCE_MAX_WAIT s, antes de chamar o agente
+    COALESCE_WINDOW = float(os.getenv('COALESCE_WINDOW', 1.5))
+    COALESCE_MAX_WAIT = float(os.getenv('COALESCE_MAX_WAIT', 5))
+    
+    # Modo de ingestão do webhook: 'memory' (pool local) ou 'stream' (Redis Streams + src.stream_worker)
+    INGESTION_MODE = os.getenv('INGESTION_MODE', 'memory')
+    STREAM_NAME = os.getenv('STREAM_NAME', 'webhook:incoming')
+    STREAM_GROUP = os.getenv('STREAM_GROUP', 'chatwoot-bot')
+    STREAM_MAXLEN = int(os.getenv('STREAM_MAXLEN', 100000))
+    STREAM_MAX_DELIVERIES = int(os.getenv('STREAM_MAX_DELIVERIES', 5))
+    STREAM_CLAIM_IDLE_MS = int(os.getenv('STREAM_CLAIM_IDLE_MS', 60000))
+    STREAM_CONSUMERS = int(os.getenv('STREAM_CONSUMERS', 8))
+    
+    # Configurações dos clientes HTTP (Chatwoot)
+    HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', 20))
+    HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', 3.05))
+    HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', 30))
+    HTTP_MAX_RETRIES = int(os.getenv('HTTP_MAX_RETRIES', 3))
+    HTTP_BACKOFF_FACTOR = float(os.getenv('HTTP_BACKOFF_FACTOR', 0.5))
+    
+    # Máximo de mensagens em processamento simultâneo no modo assíncrono (src/asgi.py)
+    ASYNC_MAX_INFLIGHT = int(os.getenv('ASYNC_MAX_INFLIGHT', 1000))
+    
+    # Classificador de intenções (fallback do roteamento por palavras-chave);
+    # sem INTENT_MODEL_PATH o modelo é treinado na inicialização com os exemplos embutidos
+    INTENT_ROUTING_ENABLED = os.getenv('INTENT_ROUTING_ENABLED', 'true').lower() == 'true'
+    INTENT_MODEL_PATH = os.getenv('INTENT_MODEL_PATH', '')
+    INTENT_MIN_CONFIDENCE = float(os.getenv('INTENT_MIN_CONFIDENCE', 0.5))
+    
+    # Fan-out especulativo em rotas de baixa confiança: os agentes mais prováveis respondem em
+    # paralelo e a melhor resposta vence (requer o classificador de intenções)
+    SPECULATIVE_ROUTING_ENABLED = os.getenv('SPECULATIVE_ROUTING_ENABLED', 'false').lower() == 'true'
+    SPECULATIVE_MAX_CANDIDATES = int(os.getenv('SPECULATIVE_MAX_CANDIDATES', 2))
+    # Limite de gasto por mensagem: tokens estimados dos candidatos além do primeiro
+    SPECULATIVE_MAX_EXTRA_TOKENS = int(os.getenv('SPECULATIVE_MAX_EXTRA_TOKENS', 2000))
+    SPECULATIVE_ACCEPT_SCORE = float(os.getenv('SPECULATIVE_ACCEPT_SCORE', 0.8))
+    SPECULATIVE_MARGIN = float(os.getenv('SPECULATIVE_MARGIN', 0.1))
+    SPECULATIVE_TIMEOUT = float(os.getenv('SPECULATIVE_TIMEOUT', 30))
+    
+    # Camada de respostas por regras: intenções comuns respondidas sem chamar o LLM
+    # (sem RESPONSE_RULES_PATH usa src/orchestrator/data/response_rules.json; o arquivo é relido ao mudar)
+    RESPONSE_RULES_ENABLED = os.getenv('RESPONSE_RULES_ENABLED', 'true').lower() == 'true'
+    RESPONSE_RULES_PATH = os.getenv('RESPONSE_RULES_PATH', '')
+    # Confiança mínima para responder pela regra (0 usa o valor do arquivo)
+    RESPONSE_RULES_MIN_CONFIDENCE = float(os.getenv('RESPONSE_RULES_MIN_CONFIDENCE', 0))
+    RESPONSE_RULES_RELOAD_INTERVAL = float(os.getenv('RESPONSE_RULES_RELOAD_INTERVAL', 5))
+    
+    # Cache das decisões de roteamento (conteúdo normalizado -> agente)
+    ROUTING_CACHE_SIZE = int(os.getenv('ROUTING_CACHE_SIZE', 10000))
+    ROUTING_CACHE_TTL = float(os.getenv('ROUTING_CACHE_TTL', 300))
+    
+    # Contexto em memória por usuário no servidor Flask (histórico incluído)
+    CONTEXT_CACHE_SIZE = int(os.getenv('CONTEXT_CACHE_SIZE', 10000))
+    CONTEXT_CACHE_TTL = float(os.getenv('CONTEXT_CACHE_TTL', 3600))
+    
+    # Cache de respostas dos agentes no Redis (lista de IDs de agentes; vazio desativa)
+    RESPONSE_CACHE_AGENTS = [a.strip() for a in os.getenv('RESPONSE_CACHE_AGENTS', '').split(',') if a.strip()]
+    RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', 3600))
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', 5000))
+    # Similaridade mínima (0-1) para a camada semântica; 0 desativa
+    RESPONSE_CACHE_SEMANTIC_THRESHOLD = float(os.getenv('RESPONSE_CACHE_SEMANTIC_THRESHOLD', 0))
+    
+    # Entrega progressiva: a resposta é enviada frase a frase enquanto o modelo gera
+    RESPONSE_STREAMING_ENABLED = os.getenv('RESPONSE_STREAMING_ENABLED', 'false').lower() == 'true'
+    RESPONSE_CHUNK_MIN_CHARS = int(os.getenv('RESPONSE_CHUNK_MIN_CHARS', 80))
+    RESPONSE_CHUNK_MAX_CHARS = int(os.getenv('RESPONSE_CHUNK_MAX_CHARS', 1000))
+    
+    # Histórico da conversa: orçamento de tokens (0 usa o padrão de cada modelo)
+    # e modelo que resume as mensagens antigas
+    HISTORY_TOKEN_BUDGET = int(os.getenv('HISTORY_TOKEN_BUDGET', 0))
+    HISTORY_SUMMARY_MODEL = os.getenv('HISTORY_SUMMARY_MODEL', 'gpt-3.5-turbo')
+    
+    # Política de latência por agente (JSON): {"agente": {"latency_slo": s, "hedge_model": ..., "fallback_models": [...]}}
+    RESPONSE_POLICIES = json.loads(os.getenv('RESPONSE_POLICIES') or '{}')
+    
+    # Modo em lote: fora do horário de atendimento as mensagens vão para a API de batch
+    # da OpenAI (processada por src.batch_worker) em vez de competir com o tráfego ao vivo
+    BATCH_MODE_ENABLED = os.getenv('BATCH_MODE_ENABLED', 'false').lower() == 'true'
+    BUSINESS_HOURS_START = int(os.getenv('BUSINESS_HOURS_START', 9))
+    BUSINESS_HOURS_END = int(os.getenv('BUSINESS_HOURS_END', 18))
+    # Dias de atendimento (segunda=0 ... domingo=6)
+    BUSINESS_DAYS = [int(d) for d in os.getenv('BUSINESS_DAYS', '0,1,2,3,4').split(',') if d.strip()]
+    BUSINESS_TIMEZONE = os.getenv('BUSINESS_TIMEZONE', 'America/Sao_Paulo')
+    BATCH_MAX_SIZE = int(os.getenv('BATCH_MAX_SIZE', 500))
+    BATCH_POLL_INTERVAL = float(os.getenv('BATCH_POLL_INTERVAL', 60))
+    BATCH_COMPLETION_WINDOW = os.getenv('BATCH_COMPLETION_WINDOW', '24h')
+    # Mensagem enviada na hora quando a resposta é adiada (vazio não envia)
+    BATCH_ACK_MESSAGE = os.getenv('BATCH_ACK_MESSAGE', '')
+    
     # Configurações de Autenticação do Painel
     ADMIN_USERNAME = os.getenv('ADMIN_USERNAME', 'admin')
     ADMIN_PASSWORD = os.getenv('ADMIN_PASSWORD', 'admin123')
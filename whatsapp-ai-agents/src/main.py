@@ -1,14 +1,32 @@
 import os
 import sys
+import time
+import atexit
 import logging
 from flask import Flask, request, jsonify
 from flask_login import LoginManager
 import redis
 from src.config.config import Config
 from src.orchestrator.orchestrator import AgentOrchestrator
+from src.orchestrator.intent_classifier import load_intent_classifier
+from src.orchestrator.rule_engine import load_rule_engine
+from src.orchestrator.speculative import SpeculativeFanout, classifier_scorer
+from src.orchestrator.metrics import MetricsCollector
 from src.orchestrator.specialized_agents import TechnicalSupportAgent, FinancialAgent
 from src.agents.customer_service_agent import CustomerServiceAgent
+from src.agents.response_policy import ResponsePolicy
 from src.web.routes import web_bp
+from src.utils.worker_pool import WorkerPool
+from src.utils.stream_queue import StreamQueue
+from src.utils.conversation_coalescer import ConversationCoalescer
+from src.utils.dedup import WebhookDeduplicator
+from src.utils.response_cache import ResponseCache
+from src.utils.rate_limiter import RateLimiterRegistry, limiter_redis_client
+from src.utils.batch_queue import BatchQueue, is_business_hours
+from src.utils.http_client import get_http_client, get_http_metrics
+from src.utils.llm_client import get_llm_registry
+from src.utils.stages import timed_stage
+import requests
 import json
 from datetime import datetime
 
@@ -68,17 +86,17 @@ class ChatwootClient:
             'api_access_token': self.api_key,
             'Content-Type': 'application/json'
         }
+        self.http = get_http_client(self.base_url)
         
     def send_message(self, conversation_id, message):
         """Envia uma mensagem para uma conversa no Chatwoot"""
-        import requests
         url = f"{self.base_url}/api/v1/accounts/{self.account_id}/conversations/{conversation_id}/messages"
         payload = {
             'content': message,
             'message_type': 'outgoing'
         }
         try:
-            response = requests.post(url, headers=self.headers, json=payload)
+            response = self.http.post(url, headers=self.headers, json=payload)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
@@ -104,48 +122,203 @@ class ChatwootBot:
         )
         
         # Inicializar orquestrador de agentes
-        self.orchestrator = AgentOrchestrator()
+        intent_classifier = None
+        if config.INTENT_ROUTING_ENABLED:
+            intent_classifier = load_intent_classifier(config.INTENT_MODEL_PATH, config.INTENT_MIN_CONFIDENCE)
+        # Respostas prontas para intenções comuns, antes de qualquer chamada ao LLM
+        rule_engine = None
+        if config.RESPONSE_RULES_ENABLED:
+            rule_engine = load_rule_engine(
+                config.RESPONSE_RULES_PATH,
+                config.RESPONSE_RULES_MIN_CONFIDENCE,
+                config.RESPONSE_RULES_RELOAD_INTERVAL
+            )
+        # Rotas de baixa confiança consultam os agentes mais prováveis em paralelo
+        speculative = None
+        if config.SPECULATIVE_ROUTING_ENABLED and intent_classifier is not None:
+            speculative = SpeculativeFanout(
+                classifier_scorer(intent_classifier),
+                max_candidates=config.SPECULATIVE_MAX_CANDIDATES,
+                max_extra_tokens=config.SPECULATIVE_MAX_EXTRA_TOKENS,
+                accept_score=config.SPECULATIVE_ACCEPT_SCORE,
+                margin=config.SPECULATIVE_MARGIN,
+                timeout=config.SPECULATIVE_TIMEOUT
+            )
+        self.orchestrator = AgentOrchestrator(
+            intent_classifier=intent_classifier,
+            routing_cache_size=config.ROUTING_CACHE_SIZE,
+            routing_cache_ttl=config.ROUTING_CACHE_TTL,
+            context_cache_size=config.CONTEXT_CACHE_SIZE,
+            context_ttl=config.CONTEXT_CACHE_TTL,
+            rule_engine=rule_engine,
+            speculative=speculative
+        )
         
         # Registrar agentes especializados
         self.orchestrator.register_agent('customer_service', CustomerServiceAgent('customer_service'))
-        self.orchestrator.register_agent('technical_support', TechnicalSupportAgent('technical_support'))
-        self.orchestrator.register_agent('financial', FinancialAgent('financial'))
+        self.orchestrator.register_agent('technical_support', TechnicalSupportAgent('technical_support', rule_engine=rule_engine))
+        self.orchestrator.register_agent('financial', FinancialAgent('financial', rule_engine=rule_engine))
+        
+        # Limites de taxa por modelo, coordenados entre workers pelo Redis
+        self.rate_limiter = RateLimiterRegistry(
+            limiter_redis_client(config.REDIS_HOST, config.REDIS_PORT, config.REDIS_DB,
+                                 timeout=config.OPENAI_LIMITER_REDIS_TIMEOUT),
+            limits=config.OPENAI_RATE_LIMITS,
+            queue_timeout=config.OPENAI_QUEUE_TIMEOUT,
+            redis_retry_interval=config.OPENAI_LIMITER_RETRY_INTERVAL
+        )
+        # Clientes de LLM compartilhados: um pool de conexões por provedor/base URL
+        self.llm_clients = get_llm_registry()
+        for agent_id, agent in self.orchestrator.agents.items():
+            self.llm_clients.configure_agent(agent, agent_id)
+            agent.configure_history(config.HISTORY_TOKEN_BUDGET, config.HISTORY_SUMMARY_MODEL)
+            agent.enable_rate_limiter(self.rate_limiter)
+        
+        # Cache de respostas compartilhado entre processos (opt-in por agente)
+        self.response_cache = ResponseCache(
+            self.redis_client,
+            ttl=config.RESPONSE_CACHE_TTL,
+            max_entries=config.RESPONSE_CACHE_MAX_ENTRIES,
+            semantic_threshold=config.RESPONSE_CACHE_SEMANTIC_THRESHOLD
+        )
+        for agent_id in config.RESPONSE_CACHE_AGENTS:
+            if agent_id in self.orchestrator.agents:
+                self.orchestrator.agents[agent_id].enable_response_cache(self.response_cache)
+        
+        # Latência por agente (tempo total e tempo até a primeira mensagem)
+        self.metrics = MetricsCollector()
+        
+        # SLO de latência, hedge e fallback de modelo por agente
+        for agent_id, settings in config.RESPONSE_POLICIES.items():
+            if agent_id in self.orchestrator.agents:
+                self.orchestrator.agents[agent_id].set_response_policy(
+                    ResponsePolicy.from_config(settings, metrics=self.metrics)
+                )
+        
+        # Mensagens fora do horário de atendimento respondidas em lote (src.batch_worker)
+        self.batch_queue = None
+        if config.BATCH_MODE_ENABLED:
+            self.batch_queue = BatchQueue(
+                self.redis_client,
+                self.llm_clients.client(),
+                max_batch_size=config.BATCH_MAX_SIZE,
+                completion_window=config.BATCH_COMPLETION_WINDOW
+            )
         
         logger.info("ChatwootBot inicializado com sucesso")
         
     def process_incoming_message(self, data):
         """Processa mensagens recebidas do Chatwoot"""
         try:
-            # Extrair informações da mensagem
-            message_content = data.get('message', {}).get('content', '')
-            conversation_id = data.get('conversation', {}).get('id')
-            contact_id = data.get('contact', {}).get('id')
-            contact_name = data.get('contact', {}).get('name', 'Usuário')
-            
-            if not message_content or not conversation_id:
-                logger.warning("Mensagem recebida sem conteúdo ou ID de conversa")
-                return
-                
-            logger.info(f"Mensagem recebida de {contact_name} ({contact_id}): {message_content}")
-            
-            # Selecionar agente apropriado com base no conteúdo
-            agent_id = self.orchestrator.select_agent(message_content)
-            logger.info(f"Agente selecionado: {agent_id}")
-            
-            # Obter resposta do agente
-            response = self.orchestrator.get_agent_response(agent_id, message_content, contact_id)
-            
-            if response:
-                # Enviar resposta de volta via Chatwoot
-                self.chatwoot_client.send_message(conversation_id, response)
-                logger.info(f"Resposta enviada para {contact_name}: {response}")
-            else:
-                logger.error("Nenhuma resposta gerada pelo agente")
-                
+            self.handle_message(data)
         except Exception as e:
             logger.error(f"Erro ao processar mensagem: {e}")
             # Enviar mensagem de erro genérica
             # self.chatwoot_client.send_message(conversation_id, "Desculpe, ocorreu um erro ao processar sua mensagem.")
+    
+    def handle_message(self, data):
+        """Processa uma mensagem e levanta exceção se a resposta não foi gerada ou entregue
+
+        Usado pelo consumidor do stream, que só confirma (XACK) a entrada se não houver exceção.
+        """
+        # Extrair informações da mensagem
+        message_content = data.get('message', {}).get('content', '')
+        conversation_id = data.get('conversation', {}).get('id')
+        contact_id = data.get('contact', {}).get('id')
+        contact_name = data.get('contact', {}).get('name', 'Usuário')
+        
+        if not message_content or not conversation_id:
+            logger.warning("Mensagem recebida sem conteúdo ou ID de conversa")
+            return
+            
+        logger.info(f"Mensagem recebida de {contact_name} ({contact_id}): {message_content}")
+        started = time.monotonic()
+        
+        if self.batch_queue is not None:
+            # Respostas em lote entregues pelo worker (outro processo) entram no histórico antes da nova mensagem
+            for turn in self.batch_queue.pop_turns(contact_id):
+                self.orchestrator.complete_batch_request(turn, turn['response'])
+        
+        # Selecionar agente apropriado com base no conteúdo
+        with timed_stage(self.metrics, 'routing'):
+            agent_id = self.orchestrator.select_agent(message_content)
+            candidates = self.orchestrator.speculative_candidates(message_content)
+        logger.info(f"Agente selecionado: {agent_id}")
+        
+        if self._defer_to_batch(agent_id, conversation_id, message_content, contact_id):
+            logger.info(f"Mensagem de {contact_name} adiada para processamento em lote")
+            return
+        
+        if self.config.RESPONSE_STREAMING_ENABLED:
+            # Cada parte da resposta é enviada assim que fica pronta
+            response = self._send_streaming_response(agent_id, conversation_id, message_content, contact_id, started)
+        else:
+            with timed_stage(self.metrics, 'generation'):
+                if candidates:
+                    # Rota incerta: os agentes mais prováveis respondem em paralelo
+                    agent_id, response = self.orchestrator.get_speculative_response(candidates, message_content, contact_id)
+                else:
+                    # Obter resposta do agente
+                    response = self.orchestrator.get_agent_response(agent_id, message_content, contact_id)
+            if response:
+                # Enviar resposta de volta via Chatwoot
+                with timed_stage(self.metrics, 'delivery'):
+                    self._send(conversation_id, response)
+                self.metrics.record_first_message(agent_id, time.monotonic() - started)
+        
+        if not response:
+            self.metrics.record_request(agent_id, False, time.monotonic() - started, "Nenhuma resposta gerada")
+            raise RuntimeError("Nenhuma resposta gerada pelo agente")
+        logger.info(f"Resposta enviada para {contact_name}: {response}")
+        self.metrics.record_request(agent_id, True, time.monotonic() - started)
+        # O resumo do histórico (chamada ao modelo de resumo) só roda depois da entrega
+        self.orchestrator.compact_history(agent_id, contact_id)
+    
+    def _send(self, conversation_id, content):
+        """Envia uma mensagem ao Chatwoot; falhas de envio viram exceção"""
+        if not self.chatwoot_client.send_message(conversation_id, content):
+            raise RuntimeError(f"Falha ao enviar resposta para a conversa {conversation_id}")
+    
+    def _defer_to_batch(self, agent_id, conversation_id, message_content, contact_id):
+        """Enfileira a mensagem para a API de batch quando está fora do horário de atendimento"""
+        if self.batch_queue is None or is_business_hours(
+            start_hour=self.config.BUSINESS_HOURS_START,
+            end_hour=self.config.BUSINESS_HOURS_END,
+            days=self.config.BUSINESS_DAYS,
+            timezone=self.config.BUSINESS_TIMEZONE
+        ):
+            return False
+        batch_request = self.orchestrator.prepare_batch_request(agent_id, message_content, contact_id)
+        if batch_request is None:
+            return False
+        batch_request['conversation_id'] = conversation_id
+        if not self.batch_queue.enqueue(batch_request):
+            return False
+        if self.config.BATCH_ACK_MESSAGE:
+            self.chatwoot_client.send_message(conversation_id, self.config.BATCH_ACK_MESSAGE)
+        return True
+    
+    def deliver_batch_response(self, batch_request, response):
+        """Envia ao Chatwoot a resposta de uma mensagem processada em lote"""
+        if not self.chatwoot_client.send_message(batch_request['conversation_id'], response):
+            raise RuntimeError(f"Falha ao enviar resposta em lote para a conversa {batch_request['conversation_id']}")
+        # O histórico fica na memória do processo do webhook: o turno segue pelo Redis
+        self.batch_queue.save_turn(batch_request, response)
+        logger.info(f"Resposta em lote enviada para a conversa {batch_request['conversation_id']}")
+    
+    def _send_streaming_response(self, agent_id, conversation_id, message_content, contact_id, started):
+        """Envia ao Chatwoot cada frase/parágrafo da resposta assim que é gerado"""
+        chunks = []
+        for chunk in self.orchestrator.stream_agent_response(
+            agent_id, message_content, contact_id,
+            min_chars=self.config.RESPONSE_CHUNK_MIN_CHARS,
+            max_chars=self.config.RESPONSE_CHUNK_MAX_CHARS
+        ):
+            self._send(conversation_id, chunk)
+            if not chunks:
+                self.metrics.record_first_message(agent_id, time.monotonic() - started)
+            chunks.append(chunk)
+        return '\n'.join(chunks)
 
 # Inicializar bot
 try:
@@ -154,6 +327,57 @@ except Exception as e:
     logger.error(f"Erro ao inicializar ChatwootBot: {e}")
     chatwoot_bot = None
 
+# Índice de deduplicação: o Chatwoot reenvia webhooks em caso de timeout
+deduplicator = None
+if chatwoot_bot:
+    # Threads do fan-out especulativo e do hedge; registrado antes do pool para rodar depois dele
+    atexit.register(chatwoot_bot.orchestrator.shutdown)
+    deduplicator = WebhookDeduplicator(
+        chatwoot_bot.redis_client,
+        ttl=Config.DEDUP_TTL,
+        capacity=Config.DEDUP_FILTER_CAPACITY
+    )
+
+# Inicializar fila de ingestão: stream durável no Redis ou pool local de workers
+message_pool = None
+stream_queue = None
+coalescer = None
+if chatwoot_bot and Config.INGESTION_MODE == 'stream':
+    # O webhook só publica no stream; o processamento fica com src.stream_worker
+    stream_queue = StreamQueue(
+        chatwoot_bot.redis_client,
+        stream=Config.STREAM_NAME,
+        group=Config.STREAM_GROUP,
+        maxlen=Config.STREAM_MAXLEN,
+        max_deliveries=Config.STREAM_MAX_DELIVERIES,
+        claim_idle_ms=Config.STREAM_CLAIM_IDLE_MS
+    )
+    stream_queue.ensure_group()
+elif chatwoot_bot:
+    message_handler = chatwoot_bot.process_incoming_message
+    if Config.COALESCE_WINDOW > 0:
+        # Uma conversa por vez; rajadas de mensagens viram um único turno do agente
+        coalescer = ConversationCoalescer(
+            lambda data: message_pool.submit(data),
+            window=Config.COALESCE_WINDOW,
+            max_wait=Config.COALESCE_MAX_WAIT,
+            max_buffered=Config.WEBHOOK_QUEUE_SIZE
+        )
+        message_handler = coalescer.wrap(message_handler)
+    message_pool = WorkerPool(
+        message_handler,
+        num_workers=Config.WEBHOOK_WORKERS,
+        max_queue_size=Config.WEBHOOK_QUEUE_SIZE,
+        name='webhook-worker'
+    )
+    message_pool.start()
+    # Drenar a fila ao encerrar o processo
+    atexit.register(message_pool.shutdown, Config.WEBHOOK_SHUTDOWN_TIMEOUT)
+    if coalescer:
+        coalescer.start()
+        # Registrado depois do pool para rodar antes dele (atexit é LIFO)
+        atexit.register(coalescer.shutdown)
+
 @app.route('/webhook', methods=['POST'])
 def webhook():
     """Endpoint para receber webhooks do Chatwoot"""
@@ -165,10 +389,25 @@ def webhook():
     
     # Verificar se é uma mensagem de entrada
     if data.get('message_type') == 'incoming':
+        # Ignorar reenvios de mensagens já recebidas
+        if deduplicator.is_duplicate(data):
+            logger.info("Webhook duplicado ignorado")
+            return jsonify({'status': 'duplicate'})
+        
         # Processar em background para não bloquear o webhook
-        import threading
-        thread = threading.Thread(target=chatwoot_bot.process_incoming_message, args=(data,))
-        thread.start()
+        error = None
+        if stream_queue:
+            if not stream_queue.publish(data):
+                error = 'Fila de processamento indisponível'
+        elif coalescer:
+            if not coalescer.add(data):
+                error = 'Fila de processamento cheia'
+        elif not message_pool.submit(data):
+            error = 'Fila de processamento cheia'
+        if error:
+            # Sem isso o reenvio do Chatwoot seria tratado como duplicado e a mensagem, perdida
+            deduplicator.release(data)
+            return jsonify({'error': error}), 503
     
     return jsonify({'status': 'received'})
 
@@ -214,6 +453,29 @@ def get_stats():
         'avg_response_time': '1.2s',
         'satisfaction_rate': '94%'
     }
+    if message_pool:
+        stats['message_queue'] = message_pool.get_metrics()
+    if deduplicator:
+        stats['deduplication'] = deduplicator.get_metrics()
+    if coalescer:
+        stats['coalescing'] = coalescer.get_metrics()
+    if stream_queue:
+        stats['message_stream'] = stream_queue.get_metrics()
+    if chatwoot_bot:
+        stats['routing_cache'] = chatwoot_bot.orchestrator.routing_cache.get_metrics()
+        if chatwoot_bot.orchestrator.rule_engine:
+            stats['response_tiers'] = chatwoot_bot.orchestrator.rule_engine.get_metrics()
+        if chatwoot_bot.orchestrator.speculative:
+            stats['speculative'] = chatwoot_bot.orchestrator.speculative.get_metrics()
+        stats['response_cache'] = chatwoot_bot.response_cache.get_metrics()
+        stats['latency'] = chatwoot_bot.metrics.get_latency_summary()
+        stats['stages'] = chatwoot_bot.metrics.get_stage_latency()
+        stats['openai_limits'] = chatwoot_bot.rate_limiter.get_metrics()
+        stats['policy'] = chatwoot_bot.metrics.get_policy_decisions()
+        if chatwoot_bot.batch_queue:
+            stats['batch'] = chatwoot_bot.batch_queue.get_metrics()
+    stats['http_clients'] = get_http_metrics()
+    stats['llm_clients'] = get_llm_registry().get_metrics()
     return jsonify(stats)
 
 if __name__ == '__main__':
@@ -0,0 +1,226 @@
+"""
+Classificador de intenções para roteamento (n-gramas com hashing + camada linear em NumPy)
+
+Treinar um modelo a partir de exemplos rotulados (JSONL com "text" e "agent"):
+    python -m src.orchestrator.intent_classifier train src/orchestrator/data/intent_seed.jsonl models/intent_model.npz
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple
+import json
+import logging
+import os
+import sys
+import threading
+import numpy as np
+from src.utils.text import normalize_text
+
+logger = logging.getLogger(__name__)
+
+SEED_DATA_PATH = os.path.join(os.path.dirname(__file__), 'data', 'intent_seed.jsonl')
+
+_PRIME = np.uint64(1099511628211)
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+_PRIME_INVERSE = np.uint64(pow(int(_PRIME), -1, 2 ** 64))
+# (potências, inversas) trocadas juntas: quem lê a tupla nunca vê tamanhos diferentes
+_power_cache: Tuple[np.ndarray, np.ndarray] = (np.ones(1, dtype=np.uint64), np.ones(1, dtype=np.uint64))
+_power_lock = threading.Lock()
+
+
+def _powers(size: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Potências de P e de P^-1 (módulo 2**64), em cache e ampliadas sob demanda"""
+    global _power_cache
+    cached = _power_cache
+    if len(cached[0]) >= size:
+        return cached
+    with _power_lock:
+        cached = _power_cache
+        if len(cached[0]) < size:
+            size = max(size, 2 * len(cached[0]), 1024)
+            tables = []
+            for base in (_PRIME, _PRIME_INVERSE):
+                values = np.full(size, base, dtype=np.uint64)
+                values[0] = 1
+                tables.append(np.cumprod(values, dtype=np.uint64))
+            cached = _power_cache = (tables[0], tables[1])
+    return cached
+
+
+class IntentClassifier:
+    """Regressão softmax sobre n-gramas de caracteres projetados por hashing"""
+
+    def __init__(self, classes: Sequence[str], num_features: int = 2 ** 14,
+                 ngram_range: Tuple[int, int] = (2, 5), min_confidence: float = 0.5):
+        self.classes = list(classes)
+        # Potência de dois: a coluna é obtida dos bits mais altos do hash
+        self.hash_bits = max(1, int(num_features - 1).bit_length())
+        self.num_features = 2 ** self.hash_bits
+        self.ngram_range = ngram_range
+        self.min_confidence = min_confidence
+        self.weights = np.zeros((self.num_features, len(self.classes)), dtype=np.float32)
+        self.bias = np.zeros(len(self.classes), dtype=np.float32)
+
+    # Extração de características
+
+    def featurize(self, texts: Sequence[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Representação esparsa do lote: (linha, coluna, valor) de cada n-grama com hashing
+
+        Todos os textos são concatenados e os hashes de todos os n-gramas do lote são
+        calculados de uma vez; n-gramas que atravessam a fronteira entre textos são descartados.
+        """
+        low, high = self.ngram_range
+        joined = '\0'.join(f" {normalize_text(text)} " for text in texts) + '\0' * high
+        codes = np.frombuffer(joined.encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+        length = len(codes) - high
+        powers, inverse_powers = _powers(len(codes) + 1)
+
+        # Hash polinomial por prefixos (aritmética módulo 2**64):
+        # prefix[i] = sum(codes[k] * P**(i-1-k) para k < i), logo o n-grama em i vale prefix[i+n] - prefix[i] * P**n
+        prefix = np.zeros(len(codes) + 1, dtype=np.uint64)
+        np.cumsum(codes * inverse_powers[1:len(codes) + 1], out=prefix[1:])
+        prefix *= powers[:len(codes) + 1]
+        # separators[i] = quantidade de separadores antes da posição i (= linha do texto)
+        separators = np.concatenate(([0], np.cumsum(codes == 0)))
+
+        sizes = np.arange(low, high + 1)
+        starts = np.arange(length)[:, None]
+        ends = starts + sizes
+        ngram_hashes = (prefix[ends] - prefix[starts] * powers[sizes]) ^ sizes.astype(np.uint64)
+
+        # Um n-grama é válido se não atravessa a fronteira entre dois textos;
+        # as linhas saem em ordem crescente porque a máscara é percorrida por posição
+        start_rows = separators[starts]
+        valid = separators[ends] == start_rows
+        rows = (start_rows + np.zeros(len(sizes), dtype=start_rows.dtype))[valid]
+        columns = ((ngram_hashes[valid] * _MIX) >> np.uint64(64 - self.hash_bits)).astype(np.intp)
+        lengths = np.bincount(rows, minlength=len(texts)).astype(np.float32)
+        values = (1.0 / np.sqrt(lengths))[rows]
+        return rows, columns, values
+
+    # Inferência
+
+    def _logits(self, rows: np.ndarray, columns: np.ndarray, values: np.ndarray, batch_size: int) -> np.ndarray:
+        # Produto esparso X @ W: uma coleta de linhas de W e uma soma por texto
+        if batch_size == 1:
+            return (values @ self.weights[columns] + self.bias)[None, :]
+        offsets = np.searchsorted(rows, np.arange(batch_size))
+        return np.add.reduceat(self.weights[columns] * values[:, None], offsets, axis=0) + self.bias
+
+    @staticmethod
+    def _softmax(logits: np.ndarray) -> np.ndarray:
+        logits = logits - logits.max(axis=1, keepdims=True)
+        exp = np.exp(logits)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+    def predict_proba(self, texts: Sequence[str]) -> np.ndarray:
+        """Probabilidades por agente para um lote de mensagens (linhas na ordem de entrada)"""
+        return self._softmax(self._logits(*self.featurize(texts), len(texts)))
+
+    def scores(self, text: str) -> Dict[str, float]:
+        """Confiança por agente para uma única mensagem"""
+        return dict(zip(self.classes, self.predict_proba([text])[0].tolist()))
+
+    def classify_batch(self, texts: Sequence[str]) -> List[Tuple[str, float]]:
+        """Melhor agente e confiança para cada mensagem do lote"""
+        probs = self.predict_proba(texts)
+        best = probs.argmax(axis=1)
+        return [(self.classes[i], float(probs[row, i])) for row, i in enumerate(best)]
+
+    def classify(self, text: str) -> Tuple[str, float]:
+        """Melhor agente e confiança para uma mensagem"""
+        return self.classify_batch([text])[0]
+
+    def predict(self, text: str) -> Optional[str]:
+        """Agente previsto, ou None se a confiança ficar abaixo de min_confidence"""
+        agent_id, confidence = self.classify(text)
+        return agent_id if confidence >= self.min_confidence else None
+
+    # Treinamento e persistência
+
+    def fit(self, texts: Sequence[str], labels: Sequence[str], epochs: int = 300,
+            learning_rate: float = 2.0, l2: float = 1e-4) -> 'IntentClassifier':
+        """Treina a camada linear com gradiente descendente em lote completo"""
+        rows, columns, values = self.featurize(texts)
+        targets = np.zeros((len(texts), len(self.classes)), dtype=np.float32)
+        targets[np.arange(len(texts)), [self.classes.index(label) for label in labels]] = 1.0
+
+        for _ in range(epochs):
+            probs = self._softmax(self._logits(rows, columns, values, len(texts)))
+            delta = (probs - targets) / len(texts)
+            grad = np.zeros_like(self.weights)
+            np.add.at(grad, columns, values[:, None] * delta[rows])
+            self.weights -= learning_rate * (grad + l2 * self.weights)
+            self.bias -= learning_rate * delta.sum(axis=0)
+        return self
+
+    def save(self, path: str):
+        """Salva o modelo como artefato NumPy compacto (pesos em float16)"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'wb') as f:
+            np.savez_compressed(
+                f,
+                weights=self.weights.astype(np.float16),
+                bias=self.bias,
+                classes=np.array(self.classes),
+                ngram_range=np.array(self.ngram_range),
+                min_confidence=np.array(self.min_confidence)
+            )
+
+    @classmethod
+    def load(cls, path: str) -> 'IntentClassifier':
+        """Carrega um modelo salvo com save()"""
+        with np.load(path) as data:
+            weights = data['weights'].astype(np.float32)
+            model = cls(
+                data['classes'].tolist(),
+                num_features=weights.shape[0],
+                ngram_range=tuple(int(n) for n in data['ngram_range']),
+                min_confidence=float(data['min_confidence'])
+            )
+            model.weights = weights
+            model.bias = data['bias'].astype(np.float32)
+        return model
+
+
+def load_examples(path: str) -> Tuple[List[str], List[str]]:
+    """Lê exemplos rotulados de um arquivo JSONL ({"text": ..., "agent": ...})"""
+    texts, labels = [], []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                example = json.loads(line)
+                texts.append(example['text'])
+                labels.append(example['agent'])
+    return texts, labels
+
+
+def train_from_file(path: str, **kwargs) -> IntentClassifier:
+    """Treina um classificador a partir de um arquivo JSONL de exemplos"""
+    texts, labels = load_examples(path)
+    return IntentClassifier(sorted(set(labels)), **kwargs).fit(texts, labels)
+
+
+def load_intent_classifier(model_path: str = None, min_confidence: float = 0.5) -> Optional[IntentClassifier]:
+    """Carrega o modelo configurado ou treina um a partir dos exemplos embutidos"""
+    try:
+        if model_path and os.path.exists(model_path):
+            model = IntentClassifier.load(model_path)
+            logger.info(f"Modelo de intenções carregado de {model_path}")
+        else:
+            model = train_from_file(SEED_DATA_PATH)
+            logger.info("Modelo de intenções treinado a partir dos exemplos embutidos")
+        model.min_confidence = min_confidence
+        return model
+    except Exception as e:
+        logger.error(f"Erro ao carregar classificador de intenções: {e}")
+        return None
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 4 or sys.argv[1] != 'train':
+        print("Uso: python -m src.orchestrator.intent_classifier train <exemplos.jsonl> <modelo.npz>")
+        sys.exit(1)
+    classifier = train_from_file(sys.argv[2])
+    classifier.save(sys.argv[3])
+    print(f"Modelo salvo em {sys.argv[3]} (classes: {', '.join(classifier.classes)})")
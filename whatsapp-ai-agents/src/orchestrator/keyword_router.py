@@ -0,0 +1,132 @@
+from typing import Dict, List, Optional, Tuple
+from collections import deque
+import logging
+import threading
+from src.utils.text import normalize_text
+
+logger = logging.getLogger(__name__)
+
+# Regras embutidas, na ordem de prioridade original do orquestrador
+DEFAULT_ROUTING_RULES: List[Tuple[str, str]] = [
+    ('suporte', 'customer_service'),
+    ('ajuda', 'customer_service'),
+    ('financeiro', 'financial'),
+    ('pagamento', 'financial'),
+    ('técnico', 'technical_support'),
+    ('problema', 'technical_support'),
+]
+
+
+class AhoCorasick:
+    """Autômato de Aho-Corasick: encontra todas as palavras-chave em uma única passada"""
+
+    def __init__(self, keywords: List[str]):
+        self.keywords = keywords
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]
+        for index, keyword in enumerate(keywords):
+            self._insert(keyword, index)
+        self._link()
+
+    def _insert(self, keyword: str, index: int):
+        state = 0
+        for ch in keyword:
+            next_state = self._goto[state].get(ch)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][ch] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = next_state
+        self._out[state].append(index)
+
+    def _link(self):
+        """Calcula os links de falha em largura e propaga as saídas"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                self._out[next_state] = self._out[next_state] + self._out[self._fail[next_state]]
+
+    def iter_matches(self, text: str):
+        """Gera (posição final, índice da palavra-chave) para cada ocorrência"""
+        goto, fail, out = self._goto, self._fail, self._out
+        root = goto[0]
+        state = 0
+        for position, ch in enumerate(text):
+            if state:
+                while state and ch not in goto[state]:
+                    state = fail[state]
+                state = goto[state].get(ch, 0)
+            else:
+                state = root.get(ch, 0)
+            if state and out[state]:
+                for index in out[state]:
+                    yield position, index
+
+
+class KeywordRouter:
+    """Roteador por palavras-chave compilado a partir das regras embutidas e personalizadas"""
+
+    def __init__(self, default_rules: List[Tuple[str, str]] = None):
+        self.default_rules = list(DEFAULT_ROUTING_RULES if default_rules is None else default_rules)
+        self.custom_rules: Dict[str, str] = {}
+        self.version = 0
+        self._compiled_version = -1
+        self._automaton: Optional[AhoCorasick] = None
+        self._targets: List[Tuple[int, str]] = []
+        self._lock = threading.Lock()
+
+    def set_custom_rules(self, rules: Dict[str, str]):
+        """Substitui as regras personalizadas; o autômato é recompilado no próximo uso"""
+        with self._lock:
+            self.custom_rules = dict(rules)
+            self.version += 1
+
+    def _compile(self):
+        """Compila as regras; regras personalizadas têm prioridade sobre as embutidas"""
+        rules: Dict[str, Tuple[int, str]] = {}
+        ordered = list(self.custom_rules.items()) + self.default_rules
+        for priority, (keyword, agent_id) in enumerate(ordered):
+            keyword = normalize_text(keyword)
+            if keyword and keyword not in rules:
+                rules[keyword] = (priority, agent_id)
+        keywords = list(rules)
+        self._targets = [rules[keyword] for keyword in keywords]
+        self._automaton = AhoCorasick(keywords)
+        self._compiled_version = self.version
+        logger.info(f"Roteador compilado com {len(keywords)} palavras-chave (versão {self.version})")
+
+    def _current(self) -> Tuple[AhoCorasick, List[Tuple[int, str]]]:
+        with self._lock:
+            if self._compiled_version != self.version or self._automaton is None:
+                self._compile()
+            return self._automaton, self._targets
+
+    def matches(self, content: str) -> List[Tuple[int, int, str, str]]:
+        """Retorna todas as ocorrências como (prioridade, posição, palavra-chave, agente)"""
+        automaton, targets = self._current()
+        result = []
+        for position, index in automaton.iter_matches(normalize_text(content)):
+            keyword = automaton.keywords[index]
+            priority, agent_id = targets[index]
+            result.append((priority, position - len(keyword) + 1, keyword, agent_id))
+        return sorted(result)
+
+    def route(self, content: str) -> Optional[str]:
+        """Retorna o agente da regra de maior prioridade (empate: ocorrência mais à esquerda)"""
+        automaton, targets = self._current()
+        best = None
+        for position, index in automaton.iter_matches(normalize_text(content)):
+            candidate = (targets[index][0], position - len(automaton.keywords[index]) + 1)
+            if best is None or candidate < best[0]:
+                best = (candidate, targets[index][1])
+        return best[1] if best else None
@@ -6,17 +6,28 @@ from collections import defaultdict, deque
 
 logger = logging.getLogger(__name__)
 
+def _percentile(values: List[float], percentile: float) -> float:
+    """Percentil por posição (valores já ordenados)"""
+    if not values:
+        return 0
+    return values[min(len(values) - 1, int(len(values) * percentile))]
+
 class MetricsCollector:
     """Coletor de métricas para o orquestrador de agentes"""
     
     def __init__(self, max_history: int = 1000):
         self.max_history = max_history
         self.request_history = deque(maxlen=max_history)
+        self.policy_history = deque(maxlen=max_history)
+        # Duração de cada estágio do pipeline de mensagens (sessão, deduplicação, roteamento...)
+        self.stage_times = defaultdict(lambda: deque(maxlen=max_history))
         self.agent_metrics = defaultdict(lambda: {
             'total_requests': 0,
             'successful_requests': 0,
             'failed_requests': 0,
             'response_times': deque(maxlen=100),
+            'first_message_times': deque(maxlen=100),
+            'policy_decisions': defaultdict(int),
             'errors': deque(maxlen=100)
         })
         self.system_metrics = {
@@ -66,6 +77,57 @@ class MetricsCollector:
         except Exception as e:
             logger.error(f"Erro ao registrar métrica: {str(e)}")
     
+    def record_first_message(self, agent_id: str, elapsed: float):
+        """Registra o tempo até a primeira mensagem entregue ao usuário"""
+        try:
+            self.agent_metrics[agent_id]['first_message_times'].append(elapsed)
+        except Exception as e:
+            logger.error(f"Erro ao registrar métrica: {str(e)}")
+    
+    def record_policy_decision(self, agent_id: str, decision: str, model: str = None):
+        """Registra uma decisão da política de latência (SLO excedido, hedge, fallback, erro)"""
+        try:
+            self.agent_metrics[agent_id]['policy_decisions'][decision] += 1
+            self.policy_history.append({
+                'timestamp': datetime.now().isoformat(),
+                'agent_id': agent_id,
+                'decision': decision,
+                'model': model
+            })
+        except Exception as e:
+            logger.error(f"Erro ao registrar métrica: {str(e)}")
+    
+    def record_stage(self, stage: str, elapsed: float):
+        """Registra a duração de um estágio do processamento de uma mensagem"""
+        try:
+            self.stage_times[stage].append(elapsed)
+        except Exception as e:
+            logger.error(f"Erro ao registrar métrica: {str(e)}")
+    
+    def get_stage_latency(self) -> Dict[str, Dict[str, float]]:
+        """Retorna p50/p95 e quantidade de execuções de cada estágio do pipeline"""
+        try:
+            summary = {}
+            for stage, times in list(self.stage_times.items()):
+                values = sorted(times)
+                summary[stage] = {
+                    'count': len(values),
+                    'p50': _percentile(values, 0.5),
+                    'p95': _percentile(values, 0.95)
+                }
+            return summary
+        except Exception as e:
+            logger.error(f"Erro ao gerar resumo de latência dos estágios: {str(e)}")
+            return {}
+    
+    def get_policy_decisions(self) -> Dict[str, Dict[str, int]]:
+        """Retorna a contagem de decisões da política de latência por agente"""
+        return {
+            agent_id: dict(metrics['policy_decisions'])
+            for agent_id, metrics in self.agent_metrics.items()
+            if metrics['policy_decisions']
+        }
+    
     def get_agent_metrics(self, agent_id: str) -> Dict[str, Any]:
         """Retorna as métricas de um agente específico"""
         try:
@@ -82,6 +144,12 @@ class MetricsCollector:
                 metrics['min_response_time'] = 0
                 metrics['max_response_time'] = 0
             
+            first_message_times = list(metrics['first_message_times'])
+            if first_message_times:
+                metrics['avg_time_to_first_message'] = sum(first_message_times) / len(first_message_times)
+            else:
+                metrics['avg_time_to_first_message'] = 0
+            
             # Calcular taxa de sucesso
             total = metrics['total_requests']
             if total > 0:
@@ -151,6 +219,24 @@ class MetricsCollector:
             logger.error(f"Erro ao gerar ranking de desempenho: {str(e)}")
             return []
     
+    def get_latency_summary(self) -> Dict[str, Any]:
+        """Retorna p50/p95 do tempo total de resposta e do tempo até a primeira mensagem por agente"""
+        try:
+            summary = {}
+            for agent_id, metrics in self.agent_metrics.items():
+                response_times = sorted(metrics['response_times'])
+                first_message_times = sorted(metrics['first_message_times'])
+                summary[agent_id] = {
+                    'p50_response_time': _percentile(response_times, 0.5),
+                    'p95_response_time': _percentile(response_times, 0.95),
+                    'p50_time_to_first_message': _percentile(first_message_times, 0.5),
+                    'p95_time_to_first_message': _percentile(first_message_times, 0.95)
+                }
+            return summary
+        except Exception as e:
+            logger.error(f"Erro ao gerar resumo de latência: {str(e)}")
+            return {}
+    
     def get_recent_errors(self, limit: int = 50) -> List[Dict[str, Any]]:
         """Retorna os erros recentes de todos os agentes"""
         try:
@@ -172,6 +258,8 @@ class MetricsCollector:
         """Reseta todas as métricas (para testes ou manutenção)"""
         try:
             self.request_history.clear()
+            self.policy_history.clear()
+            self.stage_times.clear()
             self.agent_metrics.clear()
             self.system_metrics.update({
                 'total_requests': 0,
@@ -1,19 +1,40 @@
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, AsyncIterator, Iterator, Tuple
 from datetime import datetime
+import copy
 import logging
 import json
 from .base_orchestrator import BaseOrchestrator
+from .keyword_router import KeywordRouter
 from src.agents.base_agent import BaseAgent
+from src.agents.history_manager import estimate_tokens
+from src.utils.lru_cache import LRUCache
+from src.utils.sentence_chunker import achunk_stream, chunk_stream
+from src.utils.text import normalize_text
 
 logger = logging.getLogger(__name__)
 
 class AgentOrchestrator(BaseOrchestrator):
     """Implementação concreta do orquestrador de agentes"""
     
-    def __init__(self, config: Any = None):
+    def __init__(self, config: Any = None, intent_classifier: Any = None,
+                 routing_cache_size: int = 10000, routing_cache_ttl: float = 300,
+                 rule_engine: Any = None, speculative: Any = None,
+                 context_cache_size: int = 10000, context_ttl: float = 3600):
         super().__init__()
         self.config = config or {}
         self.routing_rules: Dict[str, str] = {}
+        self.router = KeywordRouter()
+        # Classificador de intenções usado quando nenhuma palavra-chave casa
+        self.intent_classifier = intent_classifier
+        # Decisões de roteamento por conteúdo normalizado + versão das regras
+        self.routing_cache = LRUCache(max_size=routing_cache_size, ttl=routing_cache_ttl)
+        # Contexto em memória por usuário quando o chamador não traz a sessão (limitado e com
+        # expiração por inatividade, para não acumular o histórico de todos os usuários)
+        self.active_sessions = LRUCache(max_size=context_cache_size, ttl=context_ttl)
+        # Camada de respostas por regras, consultada antes do agente (RuleEngine)
+        self.rule_engine = rule_engine
+        # Fan-out para os agentes mais prováveis quando a rota é incerta (SpeculativeFanout)
+        self.speculative = speculative
         self.metrics: Dict[str, Any] = {
             'total_requests': 0,
             'successful_requests': 0,
@@ -50,15 +71,7 @@ class AgentOrchestrator(BaseOrchestrator):
             message_type = request_data.get('message_type', 'default')
             content = request_data.get('content', '')
             
-            # Regras de roteamento simples
-            if 'suporte' in content.lower() or 'ajuda' in content.lower():
-                target_agent = 'customer_service'
-            elif 'financeiro' in content.lower() or 'pagamento' in content.lower():
-                target_agent = 'financial'
-            elif 'técnico' in content.lower() or 'problema' in content.lower():
-                target_agent = 'technical_support'
-            else:
-                target_agent = 'customer_service'  # Agente padrão
+            target_agent = self._route_content(content)
             
             # Verificar se o agente existe
             if target_agent not in self.agents:
@@ -81,6 +94,244 @@ class AgentOrchestrator(BaseOrchestrator):
             self.metrics['failed_requests'] += 1
             return None
     
+    def _route_content(self, content: str) -> str:
+        """Decide o agente pelo conteúdo, reaproveitando decisões já tomadas para o mesmo texto"""
+        key = (self.router.version, normalize_text(content))
+        target_agent = self.routing_cache.get(key)
+        if target_agent is not None:
+            return target_agent
+        
+        # Regras embutidas e personalizadas, avaliadas em uma única passada
+        target_agent = self.router.route(content)
+        if target_agent is None and self.intent_classifier is not None:
+            target_agent = self.intent_classifier.predict(content)
+        target_agent = target_agent or 'customer_service'  # Agente padrão
+        self.routing_cache.set(key, target_agent)
+        return target_agent
+    
+    def select_agent(self, content: str) -> Optional[str]:
+        """Seleciona o agente apropriado para o conteúdo de uma mensagem"""
+        return self.route_request({'content': content})
+    
+    def speculative_candidates(self, content: str) -> List[str]:
+        """Agentes candidatos ao fan-out quando a rota é de baixa confiança (vazio se a rota é clara)"""
+        if self.speculative is None or self.intent_classifier is None:
+            return []
+        # Uma palavra-chave decide a rota sem ambiguidade
+        if self.router.route(content) is not None:
+            return []
+        return self.speculative.candidates(
+            self.intent_classifier.scores(content), self.intent_classifier.min_confidence, self.agents
+        )
+    
+    def _speculative_plan(self, candidates: List[str], message: str,
+                          context: Dict[str, Any]) -> List[str]:
+        """Aplica o limite de gasto: custo estimado do prompt de cada candidato extra"""
+        costs = {}
+        for agent_id in candidates[1:]:
+            agent = self.agents[agent_id]
+            if not agent.calls_model(message) or (self.rule_engine and self.rule_engine.can_answer(agent_id, message)):
+                # Agentes baseados em regras (ou respostas prontas) não chamam o modelo
+                costs[agent_id] = 0
+            else:
+                costs[agent_id] = estimate_tokens(agent.build_messages(message, context), agent.model)
+        return self.speculative.within_budget(candidates, costs)
+    
+    def get_speculative_response(self, candidates: List[str], message: str, user_id: Any,
+                                 context: Optional[Dict[str, Any]] = None) -> Tuple[Optional[str], Optional[str]]:
+        """Consulta os candidatos em paralelo e retorna (agente vencedor, resposta)"""
+        context = self._get_context(user_id, context)
+        candidates = self._speculative_plan(candidates, message, context)
+        if len(candidates) == 1:
+            return candidates[0], self.get_agent_response(candidates[0], message, user_id, context)
+        # Cada candidato trabalha em uma cópia do contexto; só o histórico do vencedor é mantido
+        copies = {agent_id: copy.deepcopy(context) for agent_id in candidates}
+        agent_id, response = self.speculative.run({
+            agent_id: (lambda agent_id=agent_id: self.get_agent_response(agent_id, message, user_id, copies[agent_id]))
+            for agent_id in candidates
+        }, message)
+        if agent_id is None:
+            return candidates[0], None
+        context.clear()
+        context.update(copies[agent_id])
+        return agent_id, response
+    
+    async def aget_speculative_response(self, candidates: List[str], message: str, user_id: Any,
+                                        context: Optional[Dict[str, Any]] = None) -> Tuple[Optional[str], Optional[str]]:
+        """Versão assíncrona de get_speculative_response (os perdedores são cancelados)"""
+        context = self._get_context(user_id, context)
+        candidates = self._speculative_plan(candidates, message, context)
+        if len(candidates) == 1:
+            return candidates[0], await self.aget_agent_response(candidates[0], message, user_id, context)
+        copies = {agent_id: copy.deepcopy(context) for agent_id in candidates}
+        agent_id, response = await self.speculative.arun({
+            agent_id: (lambda agent_id=agent_id: self.aget_agent_response(agent_id, message, user_id, copies[agent_id]))
+            for agent_id in candidates
+        }, message)
+        if agent_id is None:
+            return candidates[0], None
+        context.clear()
+        context.update(copies[agent_id])
+        return agent_id, response
+    
+    def _get_context(self, user_id: str, context: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Retorna o contexto informado ou o contexto em memória do usuário"""
+        if context is not None:
+            return context
+        return self.active_sessions.setdefault(user_id, {'user_id': user_id})
+    
+    def _extract_response(self, agent_id: str, result: Any) -> Optional[str]:
+        """Normaliza o retorno dos agentes (texto ou dicionário) e atualiza métricas"""
+        usage = self.metrics['agent_usage'][agent_id]
+        if isinstance(result, dict):
+            if 'error' in result:
+                usage['failed_requests'] += 1
+                self.metrics['failed_requests'] += 1
+                return None
+            result = result.get('response')
+        if not result:
+            usage['failed_requests'] += 1
+            self.metrics['failed_requests'] += 1
+            return None
+        usage['successful_requests'] += 1
+        self.metrics['successful_requests'] += 1
+        return result
+    
+    def _rule_answer(self, agent_id: str, message: str) -> Optional[str]:
+        """Resposta pronta da camada de regras (None escala para o agente)"""
+        if self.rule_engine is None:
+            return None
+        return self.rule_engine.answer(agent_id, message)
+    
+    def get_agent_response(self, agent_id: str, message: str, user_id: Any,
+                           context: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """Obtém a resposta de um agente para a mensagem do usuário"""
+        if agent_id not in self.agents:
+            logger.error(f"Agente {agent_id} não encontrado")
+            return None
+        try:
+            response = self._rule_answer(agent_id, message)
+            if response is not None:
+                self.agents[agent_id].record_turn(self._get_context(user_id, context), message, response)
+                return self._extract_response(agent_id, response)
+            result = self.agents[agent_id].process_message(message, self._get_context(user_id, context))
+            return self._extract_response(agent_id, result)
+        except Exception as e:
+            logger.error(f"Erro ao obter resposta do agente {agent_id}: {str(e)}")
+            self.metrics['agent_usage'][agent_id]['failed_requests'] += 1
+            self.metrics['failed_requests'] += 1
+            return None
+    
+    async def aget_agent_response(self, agent_id: str, message: str, user_id: Any,
+                                  context: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """Versão assíncrona de get_agent_response"""
+        if agent_id not in self.agents:
+            logger.error(f"Agente {agent_id} não encontrado")
+            return None
+        try:
+            response = self._rule_answer(agent_id, message)
+            if response is not None:
+                await self.agents[agent_id].arecord_turn(self._get_context(user_id, context), message, response)
+                return self._extract_response(agent_id, response)
+            result = await self.agents[agent_id].aprocess_message(message, self._get_context(user_id, context))
+            return self._extract_response(agent_id, result)
+        except Exception as e:
+            logger.error(f"Erro ao obter resposta do agente {agent_id}: {str(e)}")
+            self.metrics['agent_usage'][agent_id]['failed_requests'] += 1
+            self.metrics['failed_requests'] += 1
+            return None
+    
+    def prepare_batch_request(self, agent_id: str, message: str, user_id: Any,
+                              context: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """Monta a requisição de chat da mensagem para a API de batch (None se o agente não suporta)"""
+        agent = self.agents.get(agent_id)
+        if agent is None or not agent.supports_batch:
+            return None
+        # Mensagens com resposta pronta na camada de regras não precisam esperar o lote
+        if self.rule_engine is not None and self.rule_engine.can_answer(agent_id, message):
+            return None
+        return {
+            'agent_id': agent_id,
+            'user_id': user_id,
+            'message': message,
+            'model': agent.model,
+            'messages': agent.build_messages(message, self._get_context(user_id, context)),
+            'temperature': 0.7
+        }
+    
+    def complete_batch_request(self, request: Dict[str, Any], response: str,
+                               context: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """Registra no histórico e nas métricas a resposta de uma requisição em lote
+
+        Chamado pelo processo que atende o webhook (dono do histórico em memória) com os turnos
+        que o worker de lote guardou; o resumo roda depois da próxima resposta entregue.
+        """
+        agent_id = request['agent_id']
+        agent = self.agents.get(agent_id)
+        if agent is None:
+            logger.error(f"Agente {agent_id} não encontrado")
+            return None
+        agent.record_turn(self._get_context(request['user_id'], context), request['message'], response)
+        return self._extract_response(agent_id, response)
+    
+    def compact_history(self, agent_id: str, user_id: Any, context: Optional[Dict[str, Any]] = None):
+        """Resume o histórico que passou do orçamento (chamar depois de entregar a resposta)"""
+        agent = self.agents.get(agent_id)
+        if agent is not None:
+            agent.compact_history(self._get_context(user_id, context))
+    
+    async def acompact_history(self, agent_id: str, user_id: Any, context: Optional[Dict[str, Any]] = None):
+        """Versão assíncrona de compact_history"""
+        agent = self.agents.get(agent_id)
+        if agent is not None:
+            await agent.acompact_history(self._get_context(user_id, context))
+    
+    def stream_agent_response(self, agent_id: str, message: str, user_id: Any,
+                              context: Optional[Dict[str, Any]] = None,
+                              min_chars: int = 80, max_chars: int = 1000) -> Iterator[str]:
+        """Obtém a resposta do agente em mensagens parciais, cada uma entregue assim que fica pronta"""
+        agent = self.agents.get(agent_id)
+        if agent is None:
+            logger.error(f"Agente {agent_id} não encontrado")
+            return
+        if not agent.supports_streaming or (self.rule_engine and self.rule_engine.can_answer(agent_id, message)):
+            response = self.get_agent_response(agent_id, message, user_id, context)
+            if response:
+                yield response
+            return
+        chunks = []
+        try:
+            tokens = agent.stream_message(message, self._get_context(user_id, context))
+            for chunk in chunk_stream(tokens, min_chars, max_chars):
+                chunks.append(chunk)
+                yield chunk
+        except Exception as e:
+            logger.error(f"Erro ao obter resposta do agente {agent_id}: {str(e)}")
+        self._extract_response(agent_id, '\n'.join(chunks))
+    
+    async def astream_agent_response(self, agent_id: str, message: str, user_id: Any,
+                                     context: Optional[Dict[str, Any]] = None,
+                                     min_chars: int = 80, max_chars: int = 1000) -> AsyncIterator[str]:
+        """Versão assíncrona de stream_agent_response"""
+        agent = self.agents.get(agent_id)
+        if agent is None:
+            logger.error(f"Agente {agent_id} não encontrado")
+            return
+        if not agent.supports_streaming or (self.rule_engine and self.rule_engine.can_answer(agent_id, message)):
+            response = await self.aget_agent_response(agent_id, message, user_id, context)
+            if response:
+                yield response
+            return
+        chunks = []
+        try:
+            tokens = agent.astream_message(message, self._get_context(user_id, context))
+            async for chunk in achunk_stream(tokens, min_chars, max_chars):
+                chunks.append(chunk)
+                yield chunk
+        except Exception as e:
+            logger.error(f"Erro ao obter resposta do agente {agent_id}: {str(e)}")
+        self._extract_response(agent_id, '\n'.join(chunks))
+    
     def get_agent_status(self, agent_id: str) -> Dict[str, Any]:
         """Retorna o status de um agente específico"""
         if agent_id not in self.agents:
@@ -107,6 +358,9 @@ class AgentOrchestrator(BaseOrchestrator):
             'active_agents': len([a for a in self.agents.values() if hasattr(a, 'is_active') and a.is_active]),
             'agents': agent_statuses,
             'metrics': self.metrics,
+            'routing_cache': self.routing_cache.get_metrics(),
+            'response_tiers': self.rule_engine.get_metrics() if self.rule_engine else None,
+            'speculative': self.speculative.get_metrics() if self.speculative else None,
             'system_health': 'healthy' if len(self.agents) > 0 else 'degraded'
         }
     
@@ -114,6 +368,8 @@ class AgentOrchestrator(BaseOrchestrator):
         """Adiciona uma regra de roteamento personalizada"""
         try:
             self.routing_rules[keyword.lower()] = agent_id
+            self.router.set_custom_rules(self.routing_rules)
+            self.routing_cache.clear()
             logger.info(f"Regra de roteamento adicionada: {keyword} -> {agent_id}")
             return True
         except Exception as e:
@@ -125,9 +381,19 @@ class AgentOrchestrator(BaseOrchestrator):
         try:
             if keyword.lower() in self.routing_rules:
                 del self.routing_rules[keyword.lower()]
+                self.router.set_custom_rules(self.routing_rules)
+                self.routing_cache.clear()
                 logger.info(f"Regra de roteamento removida: {keyword}")
                 return True
             return False
         except Exception as e:
             logger.error(f"Erro ao remover regra de roteamento: {str(e)}")
-            return False
\ No newline at end of file
+            return False
+    
+    def shutdown(self):
+        """Encerra as threads do fan-out especulativo e das políticas de latência dos agentes"""
+        if self.speculative is not None:
+            self.speculative.shutdown()
+        for agent in self.agents.values():
+            if agent.response_policy is not None:
+                agent.response_policy.shutdown()
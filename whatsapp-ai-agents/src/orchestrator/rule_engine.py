@@ -0,0 +1,195 @@
+import json
+import logging
+import os
+import threading
+import time
+from string import Template
+from typing import Any, Dict, List, Optional, Tuple
+from .keyword_router import AhoCorasick
+from src.utils.text import normalize_text
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(__file__), 'data', 'response_rules.json')
+
+
+class _RuleTable:
+    """Tabela de regras compilada: um autômato para todas as palavras-chave"""
+
+    def __init__(self, rules: List[Dict[str, Any]], min_confidence: float):
+        self.min_confidence = min_confidence
+        # (id, agente, template, confiança base) na ordem de prioridade
+        self.rules: List[Tuple[str, str, Template, float]] = []
+        self.agents = set()
+        keyword_rules: Dict[str, int] = {}
+        for rule in rules:
+            index = len(self.rules)
+            self.rules.append((rule['id'], rule['agent'], Template(rule['response']), float(rule.get('confidence', 1.0))))
+            self.agents.add(rule['agent'])
+            for keyword in rule['keywords']:
+                keyword = normalize_text(keyword)
+                if keyword and keyword not in keyword_rules:
+                    keyword_rules[keyword] = index
+        self.automaton = AhoCorasick(list(keyword_rules))
+        self.keyword_rules = [keyword_rules[keyword] for keyword in self.automaton.keywords]
+
+
+def _load_table(path: str, min_confidence: Optional[float]) -> _RuleTable:
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if min_confidence is None:
+        min_confidence = float(data.get('min_confidence', 0.8))
+    return _RuleTable(data['rules'], min_confidence)
+
+
+class RuleEngine:
+    """Camada de respostas determinísticas, consultada antes de qualquer chamada ao LLM
+
+    As regras vêm de um arquivo JSON (a ordem define a prioridade) e são compiladas em um único
+    autômato de Aho-Corasick. A regra responde só com confiança alta: uma única intenção do agente
+    casou e a mensagem é curta (até max_words palavras); o resto segue para o agente. O arquivo é
+    relido quando muda no disco, sem reiniciar o processo.
+    """
+
+    def __init__(self, path: str = None, min_confidence: float = None, max_words: int = 25,
+                 reload_interval: float = 5):
+        self.path = path or DEFAULT_RULES_PATH
+        self._min_confidence = min_confidence
+        self.max_words = max_words
+        self.reload_interval = reload_interval
+        self._table: Optional[_RuleTable] = None
+        self._mtime = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.version = 0
+        self.metrics: Dict[str, Any] = {
+            'rule_hits': 0,
+            'escalations': 0,
+            'reloads': 0,
+            'reload_errors': 0,
+            'by_agent': {},
+            'by_rule': {}
+        }
+        self.load()
+
+    # Carga e recarga da tabela
+
+    def load(self) -> bool:
+        """(Re)carrega a tabela de regras; em caso de erro mantém a tabela atual"""
+        try:
+            mtime = os.path.getmtime(self.path)
+            table = _load_table(self.path, self._min_confidence)
+        except Exception as e:
+            logger.error(f"Erro ao carregar regras de resposta de {self.path}: {e}")
+            with self._lock:
+                self.metrics['reload_errors'] += 1
+            return False
+        with self._lock:
+            self._table = table
+            self._mtime = mtime
+            self.version += 1
+            self.metrics['reloads'] += 1
+        logger.info(f"Regras de resposta carregadas de {self.path}: {len(table.rules)} regras (versão {self.version})")
+        return True
+
+    def _current(self) -> Optional[_RuleTable]:
+        if self.reload_interval:
+            now = time.monotonic()
+            if now - self._checked_at >= self.reload_interval:
+                self._checked_at = now
+                try:
+                    changed = os.path.getmtime(self.path) != self._mtime
+                except OSError:
+                    changed = False
+                if changed:
+                    self.load()
+        return self._table
+
+    # Consulta
+
+    def match(self, agent_id: str, content: str) -> Optional[Tuple[str, Template, float]]:
+        """Regra de maior prioridade do agente que casa com o conteúdo: (id, template, confiança)"""
+        return self._match(self._current(), agent_id, content)
+
+    def _match(self, table: Optional[_RuleTable], agent_id: str, content: str) -> Optional[Tuple[str, Template, float]]:
+        if table is None or agent_id not in table.agents:
+            return None
+        text = normalize_text(content)
+        matched = set()
+        for _, index in table.automaton.iter_matches(text):
+            if table.rules[table.keyword_rules[index]][1] == agent_id:
+                matched.add(table.keyword_rules[index])
+        if not matched:
+            return None
+        rule_id, _, template, confidence = table.rules[min(matched)]
+        # Mais de uma intenção ou mensagem longa: provavelmente precisa de uma resposta elaborada
+        if len(matched) > 1:
+            confidence *= 0.5
+        if len(text.split()) > self.max_words:
+            confidence *= 0.6
+        return rule_id, template, confidence
+
+    def can_answer(self, agent_id: str, content: str) -> bool:
+        """Indica se a camada de regras responderia à mensagem (sem registrar métricas)"""
+        table = self._current()
+        result = self._match(table, agent_id, content)
+        return result is not None and result[2] >= table.min_confidence
+
+    def lookup(self, agent_id: str, content: str, variables: Dict[str, Any] = None) -> Optional[str]:
+        """Resposta da regra de maior prioridade, sem limiar de confiança nem métricas"""
+        result = self.match(agent_id, content)
+        if result is None:
+            return None
+        return result[1].safe_substitute(variables or {})
+
+    def answer(self, agent_id: str, content: str, variables: Dict[str, Any] = None) -> Optional[str]:
+        """Resposta da regra quando a confiança é alta; None escala para o agente"""
+        table = self._current()
+        result = self._match(table, agent_id, content)
+        hit = result is not None and result[2] >= table.min_confidence
+        with self._lock:
+            agent_metrics = self.metrics['by_agent'].setdefault(agent_id, {'rule_hits': 0, 'escalations': 0})
+            if hit:
+                self.metrics['rule_hits'] += 1
+                agent_metrics['rule_hits'] += 1
+                self.metrics['by_rule'][result[0]] = self.metrics['by_rule'].get(result[0], 0) + 1
+            else:
+                self.metrics['escalations'] += 1
+                agent_metrics['escalations'] += 1
+        if not hit:
+            return None
+        return result[1].safe_substitute(variables or {})
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Acertos por camada (regras x agente), por agente e por regra"""
+        with self._lock:
+            metrics = json.loads(json.dumps(self.metrics))
+        total = metrics['rule_hits'] + metrics['escalations']
+        metrics['rule_hit_rate'] = metrics['rule_hits'] / total if total else 0
+        for agent_metrics in metrics['by_agent'].values():
+            agent_total = agent_metrics['rule_hits'] + agent_metrics['escalations']
+            agent_metrics['rule_hit_rate'] = agent_metrics['rule_hits'] / agent_total if agent_total else 0
+        metrics['version'] = self.version
+        metrics['rules'] = len(self._table.rules) if self._table else 0
+        return metrics
+
+
+_default_engine: Optional[RuleEngine] = None
+_default_lock = threading.Lock()
+
+
+def default_rule_engine() -> RuleEngine:
+    """Motor compartilhado com a tabela embutida (usado pelos agentes baseados em regras)"""
+    global _default_engine
+    with _default_lock:
+        if _default_engine is None:
+            _default_engine = RuleEngine()
+        return _default_engine
+
+
+def load_rule_engine(path: str = None, min_confidence: float = None, reload_interval: float = 5) -> Optional[RuleEngine]:
+    """Cria o motor de regras com a tabela configurada (ou a embutida); None se não carregar"""
+    engine = RuleEngine(path, min_confidence=min_confidence or None, reload_interval=reload_interval)
+    if engine.version == 0:
+        return None
+    return engine
@@ -1,12 +1,80 @@
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 from datetime import datetime, timedelta
-import json
 import logging
 import redis
+import redis.asyncio as redis_asyncio
 from src.config.config import Config
+from src.utils.session_cache import SessionNearCache
+from src.utils.session_codec import SessionCodec
+from src.utils.session_schema import (
+    DATA_PREFIX, HISTORY_LENGTH_FIELD, UPDATE_FIELDS_SCRIPT, amigrate_legacy, apply_fields, attach_history,
+    data_fields, flatten_session, history_key, is_wrong_type, migrate_history_field, migrate_legacy,
+    new_turns, replace_history, session_version, summary_covered, unflatten_session, unread_turns, update_args
+)
 
 logger = logging.getLogger(__name__)
 
+# Campo em que o histórico ficava dentro do hash, antes da lista própria
+HISTORY_FIELD = f"{DATA_PREFIX}conversation_history"
+
+
+def _near_cache(config: Config) -> Optional[SessionNearCache]:
+    """Cache local de sessões, se habilitado (todos os workers devem usar a mesma configuração)"""
+    if not config.SESSION_NEAR_CACHE_ENABLED:
+        return None
+    return SessionNearCache(max_size=config.SESSION_NEAR_CACHE_SIZE, ttl=config.SESSION_NEAR_CACHE_TTL)
+
+
+def _codec(config: Config) -> SessionCodec:
+    """Codec dos valores gravados; qualquer codec lê o que os outros gravaram"""
+    return SessionCodec(config.SESSION_CODEC, config.SESSION_COMPRESSION, config.SESSION_COMPRESSION_THRESHOLD)
+
+
+def _notify(near_cache: Optional[SessionNearCache], session_id: str):
+    """Canal e mensagem de invalidação para os scripts (vazios sem cache local)"""
+    return near_cache.notify(session_id) if near_cache else ('', '')
+
+
+def _written(near_cache: Optional[SessionNearCache], session_id: str, version: int, mutate) -> bool:
+    """Repassa ao cache local uma escrita parcial (version 0 = a sessão não existe)"""
+    if near_cache:
+        if version:
+            near_cache.apply(session_id, version, mutate)
+        else:
+            near_cache.invalidate(session_id)
+    return bool(version)
+
+
+def _mutation(fields: Dict[str, Any], removed: List[str], turns: List[Dict[str, Any]]):
+    """A mesma escrita de UPDATE_FIELDS_SCRIPT aplicada a uma sessão já decodificada"""
+    def mutate(session: Dict[str, Any]):
+        apply_fields(session, fields, removed)
+        history = session['data'].get('conversation_history') or []
+        if turns:
+            history = history + [dict(t) for t in turns]
+            session[HISTORY_LENGTH_FIELD] = session.get(HISTORY_LENGTH_FIELD, 0) + len(turns)
+        attach_history(session, history)
+    return mutate
+
+
+def _build_session(raw: Dict[str, str], turns: List[str], codec: SessionCodec) -> Optional[Dict[str, Any]]:
+    """Sessão decodificada a partir do hash e dos turnos não resumidos da lista"""
+    session = unflatten_session(raw, codec)
+    if session is not None:
+        attach_history(session, [codec.decode(t) for t in turns])
+    return session
+
+
+def _split_history(session_data: Dict[str, Any], codec: SessionCodec):
+    """Campos do hash e histórico (lista à parte) de uma sessão gravada por inteiro"""
+    data = session_data.get('data') or {}
+    turns = data.get('conversation_history') or []
+    session_data[HISTORY_LENGTH_FIELD] = summary_covered(session_data) + len(turns)
+    fields = flatten_session({**session_data, 'data': {k: v for k, v in data.items() if k != 'conversation_history'}},
+                             codec)
+    return fields, turns
+
+
 class SessionManager:
     """Gerenciador de sessões para o orquestrador de agentes"""
     
@@ -14,6 +82,10 @@ class SessionManager:
         self.config = config
         self.redis_client = None
         self.session_timeout = 3600  # 1 hora
+        self.history_max_turns = config.SESSION_HISTORY_MAX_TURNS
+        self.history_window = config.SESSION_HISTORY_WINDOW
+        self.codec = _codec(config)
+        self.near_cache = None
         
         # Conectar ao Redis
         try:
@@ -23,13 +95,86 @@ class SessionManager:
                 db=config.REDIS_DB,
                 decode_responses=True
             )
+            # Operações de escrita como script Lua: uma ida ao servidor e atômicas
+            self._update_script = self.redis_client.register_script(UPDATE_FIELDS_SCRIPT)
             # Testar conexão
             self.redis_client.ping()
             logger.info("Conexão com Redis estabelecida com sucesso")
+            self.near_cache = _near_cache(config)
+            if self.near_cache:
+                self.near_cache.start(self.redis_client)
         except Exception as e:
             logger.error(f"Erro ao conectar ao Redis: {str(e)}")
             self.redis_client = None
     
+    def _key(self, session_id: str) -> str:
+        return f"session:{session_id}"
+    
+    def _call(self, session_id: str, operation):
+        """Executa a operação; sessões ainda no formato antigo (string JSON) são migradas para hash"""
+        try:
+            return operation()
+        except redis.ResponseError as e:
+            if is_wrong_type(e) and migrate_legacy(self.redis_client, self._key(session_id), codec=self.codec):
+                return operation()
+            raise
+    
+    def _write(self, session_id: str, fields: Dict[str, Any], removed: List[str] = (),
+               turns: List[Dict[str, Any]] = ()) -> bool:
+        """Grava apenas os campos informados (e last_activity) e acrescenta turnos a uma sessão existente"""
+        fields = {**fields, 'last_activity': datetime.now().isoformat()}
+        args = update_args(self.session_timeout, fields, removed, _notify(self.near_cache, session_id),
+                           turns, self.history_max_turns, self.codec)
+        key = self._key(session_id)
+        version = self._call(session_id, lambda: self._update_script(
+            keys=[key, history_key(key)], args=args, client=self.redis_client))
+        return _written(self.near_cache, session_id, version, _mutation(fields, removed, turns))
+    
+    def _rewrite(self, session_id: str, session_data: Dict[str, Any], replace_hash: bool = True):
+        """Regrava a sessão (ou só o histórico) inteira em uma transação"""
+        key = self._key(session_id)
+        fields, turns = _split_history(session_data, self.codec)
+        with self.redis_client.pipeline(transaction=True) as pipe:
+            if replace_hash:
+                pipe.delete(key)
+                pipe.hset(key, mapping=fields)
+            replace_history(pipe, key, turns, summary_covered(session_data), self.history_max_turns,
+                            self.session_timeout, self.codec)
+            pipe.expire(key, self.session_timeout)
+            if self.near_cache:
+                pipe.publish(*_notify(self.near_cache, session_id))
+            pipe.execute()
+        if self.near_cache:
+            self.near_cache.invalidate(session_id)
+    
+    def _read(self, session_id: str):
+        """Metadados da sessão e os últimos turnos do histórico em uma transação, renovando o TTL"""
+        key = self._key(session_id)
+        
+        def read(window: int = self.history_window):
+            with self.redis_client.pipeline(transaction=True) as pipe:
+                pipe.hgetall(key)
+                pipe.lrange(history_key(key), -window, -1)
+                pipe.expire(key, self.session_timeout)
+                pipe.expire(history_key(key), self.session_timeout)
+                return pipe.execute()[:2]
+        raw, turns = self._call(session_id, read)
+        if HISTORY_FIELD in raw:
+            # Histórico ainda dentro do hash: passa para a lista própria
+            with self.redis_client.pipeline(transaction=True) as pipe:
+                migrate_history_field(pipe, key, raw, HISTORY_FIELD, self.history_max_turns, self.session_timeout,
+                                      self.codec)
+                pipe.execute()
+            raw, turns = read()
+        # Turnos não resumidos antes da janela (o resumo ficou para trás): nova leitura, maior e rara
+        window = self.history_window
+        unread = unread_turns(raw, len(turns), window, self.codec)
+        while unread:
+            window = len(turns) + unread
+            raw, turns = read(window)
+            unread = unread_turns(raw, len(turns), window, self.codec)
+        return raw, turns
+    
     def create_session(self, session_id: str, user_id: str, initial_data: Dict[str, Any] = None) -> bool:
         """Cria uma nova sessão"""
         try:
@@ -43,12 +188,8 @@ class SessionManager:
             }
             
             if self.redis_client:
-                key = f"session:{session_id}"
-                self.redis_client.setex(
-                    key, 
-                    self.session_timeout, 
-                    json.dumps(session_data)
-                )
+                # Metadados no hash (um campo por atributo); histórico em uma lista à parte
+                self._rewrite(session_id, session_data)
                 logger.info(f"Sessão criada: {session_id}")
                 return True
             else:
@@ -60,38 +201,40 @@ class SessionManager:
             return False
     
     def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
-        """Recupera os dados de uma sessão"""
+        """Recupera os dados de uma sessão (do cache local, se estiver lá) com os últimos turnos"""
         try:
             if self.redis_client:
-                key = f"session:{session_id}"
-                session_data = self.redis_client.get(key)
-                if session_data:
-                    # Atualizar TTL da sessão
-                    self.redis_client.expire(key, self.session_timeout)
-                    return json.loads(session_data)
+                if self.near_cache:
+                    session = self.near_cache.get(session_id)
+                    if session is not None:
+                        return session
+                    token = self.near_cache.begin_read(session_id)
+                raw, turns = self._read(session_id)
+                session = _build_session(raw, turns, self.codec)
+                if self.near_cache:
+                    self.near_cache.put(session_id, session, session_version(raw), token)
+                return session
             return None
         except Exception as e:
             logger.error(f"Erro ao recuperar sessão {session_id}: {str(e)}")
             return None
     
     def update_session(self, session_id: str, data: Dict[str, Any]) -> bool:
-        """Atualiza os dados de uma sessão"""
+        """Atualiza os dados de uma sessão (só as chaves informadas são gravadas)
+
+        'conversation_history', se informado, substitui o histórico inteiro; para acrescentar
+        turnos use append_turn.
+        """
         try:
             if self.redis_client:
-                key = f"session:{session_id}"
-                session_data = self.get_session(session_id)
-                if session_data:
-                    # Atualizar dados
-                    session_data['last_activity'] = datetime.now().isoformat()
-                    session_data['data'].update(data)
-                    
-                    # Salvar atualização
-                    self.redis_client.setex(
-                        key, 
-                        self.session_timeout, 
-                        json.dumps(session_data)
-                    )
-                    return True
+                data = dict(data)
+                history = data.pop('conversation_history', None)
+                updated = self._write(session_id, {f"{DATA_PREFIX}{k}": v for k, v in data.items()})
+                if updated and history is not None:
+                    session = _build_session(*self._read(session_id), self.codec)
+                    session['data']['conversation_history'] = history
+                    self._rewrite(session_id, session, replace_hash=False)
+                return updated
             return False
         except Exception as e:
             logger.error(f"Erro ao atualizar sessão {session_id}: {str(e)}")
@@ -100,35 +243,63 @@ class SessionManager:
     def set_active_agent(self, session_id: str, agent_id: str) -> bool:
         """Define o agente ativo para uma sessão"""
         try:
-            session_data = self.get_session(session_id)
-            if session_data:
-                session_data['active_agent'] = agent_id
-                session_data['last_activity'] = datetime.now().isoformat()
-                
-                if self.redis_client:
-                    key = f"session:{session_id}"
-                    self.redis_client.setex(
-                        key, 
-                        self.session_timeout, 
-                        json.dumps(session_data)
-                    )
-                    return True
+            if self.redis_client:
+                return self._write(session_id, {'active_agent': agent_id})
             return False
         except Exception as e:
             logger.error(f"Erro ao definir agente ativo para sessão {session_id}: {str(e)}")
             return False
     
     def get_active_agent(self, session_id: str) -> Optional[str]:
-        """Recupera o agente ativo para uma sessão"""
+        """Recupera o agente ativo para uma sessão (sem ler o histórico)"""
         try:
-            session_data = self.get_session(session_id)
-            if session_data:
-                return session_data.get('active_agent')
+            if self.redis_client:
+                if self.near_cache:
+                    session = self.get_session(session_id)
+                    return session.get('active_agent') if session else None
+                def read():
+                    with self.redis_client.pipeline(transaction=False) as pipe:
+                        pipe.hget(self._key(session_id), 'active_agent')
+                        pipe.expire(self._key(session_id), self.session_timeout)
+                        return pipe.execute()[0]
+                value = self._call(session_id, read)
+                return self.codec.decode(value) if value else None
             return None
         except Exception as e:
             logger.error(f"Erro ao recuperar agente ativo para sessão {session_id}: {str(e)}")
             return None
     
+    def append_turn(self, session_id: str, turns: List[Dict[str, Any]]) -> bool:
+        """Acrescenta turnos ao fim do histórico (custo constante, qualquer que seja o tamanho da conversa)"""
+        try:
+            if self.redis_client:
+                return self._write(session_id, {}, turns=turns)
+            return False
+        except Exception as e:
+            logger.error(f"Erro ao adicionar turno à sessão {session_id}: {str(e)}")
+            return False
+    
+    def get_history(self, session_id: str, last_n: int = 10) -> List[Dict[str, Any]]:
+        """Últimos last_n turnos gravados do histórico, sem ler os metadados da sessão"""
+        try:
+            if self.redis_client:
+                turns = self.redis_client.lrange(history_key(self._key(session_id)), -last_n, -1)
+                return [self.codec.decode(t) for t in turns]
+            return []
+        except Exception as e:
+            logger.error(f"Erro ao recuperar histórico da sessão {session_id}: {str(e)}")
+            return []
+    
+    def touch_session(self, session_id: str) -> bool:
+        """Renova o TTL e last_activity de uma sessão existente"""
+        try:
+            if self.redis_client:
+                return self._write(session_id, {})
+            return False
+        except Exception as e:
+            logger.error(f"Erro ao renovar sessão {session_id}: {str(e)}")
+            return False
+    
     def is_session_active(self, session_id: str) -> bool:
         """Verifica se uma sessão está ativa"""
         try:
@@ -142,4 +313,220 @@ class SessionManager:
     
     def cleanup_expired_sessions(self) -> int:
         """Remove sessões expiradas (não necessário com Redis expirando automaticamente)"""
-        return 0
\ No newline at end of file
+        return 0
+    
+    def get_cache_metrics(self) -> Optional[Dict[str, Any]]:
+        """Métricas do cache local de sessões (None se desabilitado)"""
+        return self.near_cache.get_metrics() if self.near_cache else None
+
+class AsyncSessionManager:
+    """Gerenciador de sessões assíncrono (redis.asyncio) para o pipeline ASGI"""
+    
+    def __init__(self, config: Config):
+        self.config = config
+        self.session_timeout = 3600  # 1 hora
+        self.history_max_turns = config.SESSION_HISTORY_MAX_TURNS
+        self.history_window = config.SESSION_HISTORY_WINDOW
+        self.codec = _codec(config)
+        self.redis_client = redis_asyncio.Redis(
+            host=config.REDIS_HOST,
+            port=config.REDIS_PORT,
+            db=config.REDIS_DB,
+            decode_responses=True
+        )
+        self._update_script = self.redis_client.register_script(UPDATE_FIELDS_SCRIPT)
+        self.near_cache = _near_cache(config)
+    
+    async def start(self) -> bool:
+        """Verifica a conexão e assina as invalidações do cache local de sessões"""
+        connected = await self.ping()
+        if self.near_cache:
+            await self.near_cache.astart(self.redis_client)
+        return connected
+    
+    async def ping(self) -> bool:
+        """Verifica a conexão com o Redis"""
+        try:
+            await self.redis_client.ping()
+            logger.info("Conexão assíncrona com Redis estabelecida com sucesso")
+            return True
+        except Exception as e:
+            logger.error(f"Erro ao conectar ao Redis: {str(e)}")
+            return False
+    
+    async def close(self):
+        """Fecha o pool de conexões"""
+        if self.near_cache:
+            await self.near_cache.astop()
+        await self.redis_client.aclose()
+    
+    def _key(self, session_id: str) -> str:
+        return f"session:{session_id}"
+    
+    async def _call(self, session_id: str, operation):
+        """Versão assíncrona de SessionManager._call"""
+        try:
+            return await operation()
+        except redis.ResponseError as e:
+            if is_wrong_type(e) and await amigrate_legacy(self.redis_client, self._key(session_id), codec=self.codec):
+                return await operation()
+            raise
+    
+    async def _write(self, session_id: str, fields: Dict[str, Any], removed: List[str] = (),
+                     turns: List[Dict[str, Any]] = ()) -> bool:
+        """Grava apenas os campos informados (e last_activity) e acrescenta turnos a uma sessão existente"""
+        fields = {**fields, 'last_activity': datetime.now().isoformat()}
+        args = update_args(self.session_timeout, fields, removed, _notify(self.near_cache, session_id),
+                           turns, self.history_max_turns, self.codec)
+        key = self._key(session_id)
+        try:
+            version = await self._call(session_id, lambda: self._update_script(
+                keys=[key, history_key(key)], args=args, client=self.redis_client))
+            return _written(self.near_cache, session_id, version, _mutation(fields, removed, turns))
+        except Exception as e:
+            logger.error(f"Erro ao salvar sessão {session_id}: {str(e)}")
+            return False
+    
+    async def _rewrite(self, session_id: str, session_data: Dict[str, Any]):
+        """Regrava a sessão inteira (hash e histórico) em uma transação"""
+        key = self._key(session_id)
+        fields, turns = _split_history(session_data, self.codec)
+        async with self.redis_client.pipeline(transaction=True) as pipe:
+            pipe.delete(key)
+            pipe.hset(key, mapping=fields)
+            replace_history(pipe, key, turns, summary_covered(session_data), self.history_max_turns,
+                            self.session_timeout, self.codec)
+            pipe.expire(key, self.session_timeout)
+            if self.near_cache:
+                pipe.publish(*_notify(self.near_cache, session_id))
+            await pipe.execute()
+        if self.near_cache:
+            self.near_cache.invalidate(session_id)
+    
+    async def create_session(self, session_id: str, user_id: str, initial_data: Dict[str, Any] = None) -> Optional[Dict[str, Any]]:
+        """Cria uma nova sessão e retorna seus dados"""
+        try:
+            session_data = {
+                'session_id': session_id,
+                'user_id': user_id,
+                'created_at': datetime.now().isoformat(),
+                'last_activity': datetime.now().isoformat(),
+                'data': initial_data or {},
+                'active_agent': None
+            }
+            await self._rewrite(session_id, session_data)
+            logger.info(f"Sessão criada: {session_id}")
+            return session_data
+        except Exception as e:
+            logger.error(f"Erro ao criar sessão {session_id}: {str(e)}")
+            return None
+    
+    async def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Recupera os dados de uma sessão com os últimos turnos, renovando o TTL (do cache local, se estiver lá)"""
+        if self.near_cache:
+            session = self.near_cache.get(session_id)
+            if session is not None:
+                return session
+            token = self.near_cache.begin_read(session_id)
+        key = self._key(session_id)
+        
+        async def read(window: int = self.history_window):
+            async with self.redis_client.pipeline(transaction=True) as pipe:
+                pipe.hgetall(key)
+                pipe.lrange(history_key(key), -window, -1)
+                pipe.expire(key, self.session_timeout)
+                pipe.expire(history_key(key), self.session_timeout)
+                return (await pipe.execute())[:2]
+        try:
+            raw, turns = await self._call(session_id, read)
+            if HISTORY_FIELD in raw:
+                # Histórico ainda dentro do hash: passa para a lista própria
+                async with self.redis_client.pipeline(transaction=True) as pipe:
+                    migrate_history_field(pipe, key, raw, HISTORY_FIELD, self.history_max_turns,
+                                          self.session_timeout, self.codec)
+                    await pipe.execute()
+                raw, turns = await read()
+            # Turnos não resumidos antes da janela (o resumo ficou para trás): nova leitura, maior e rara
+            window = self.history_window
+            unread = unread_turns(raw, len(turns), window, self.codec)
+            while unread:
+                window = len(turns) + unread
+                raw, turns = await read(window)
+                unread = unread_turns(raw, len(turns), window, self.codec)
+            session = _build_session(raw, turns, self.codec)
+            if self.near_cache:
+                self.near_cache.put(session_id, session, session_version(raw), token)
+            return session
+        except Exception as e:
+            logger.error(f"Erro ao recuperar sessão {session_id}: {str(e)}")
+            return None
+    
+    async def save_session(self, session_id: str, session_data: Dict[str, Any], data_keys: List[str] = None) -> bool:
+        """Persiste uma sessão já carregada e atualizada em memória
+
+        Com data_keys, grava só active_agent, last_activity e essas chaves de 'data' (as que
+        não existirem mais no dicionário são removidas); 'conversation_history' acrescenta à
+        lista apenas os turnos novos desde a leitura. Sem data_keys, regrava a sessão inteira.
+        """
+        session_data['last_activity'] = datetime.now().isoformat()
+        if data_keys is not None:
+            data = session_data.get('data') or {}
+            keys = [k for k in data_keys if k != 'conversation_history']
+            return await self._write(session_id, {
+                'active_agent': session_data.get('active_agent'),
+                **{f"{DATA_PREFIX}{k}": data[k] for k in keys if k in data}
+            }, data_fields(k for k in keys if k not in data),
+                new_turns(session_data) if 'conversation_history' in data_keys else [])
+        try:
+            await self._rewrite(session_id, session_data)
+            return True
+        except Exception as e:
+            logger.error(f"Erro ao salvar sessão {session_id}: {str(e)}")
+            return False
+    
+    async def update_session(self, session_id: str, data: Dict[str, Any]) -> bool:
+        """Atualiza os dados de uma sessão (só as chaves informadas; o histórico muda via append_turn)"""
+        return await self._write(session_id, {f"{DATA_PREFIX}{k}": v for k, v in data.items()
+                                              if k != 'conversation_history'})
+    
+    async def set_active_agent(self, session_id: str, agent_id: str) -> bool:
+        """Define o agente ativo para uma sessão"""
+        return await self._write(session_id, {'active_agent': agent_id})
+    
+    async def get_active_agent(self, session_id: str) -> Optional[str]:
+        """Recupera o agente ativo para uma sessão (sem ler o histórico)"""
+        if self.near_cache:
+            session = await self.get_session(session_id)
+            return session.get('active_agent') if session else None
+        async def read():
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.hget(self._key(session_id), 'active_agent')
+                pipe.expire(self._key(session_id), self.session_timeout)
+                return (await pipe.execute())[0]
+        try:
+            value = await self._call(session_id, read)
+            return self.codec.decode(value) if value else None
+        except Exception as e:
+            logger.error(f"Erro ao recuperar agente ativo para sessão {session_id}: {str(e)}")
+            return None
+    
+    async def append_turn(self, session_id: str, turns: List[Dict[str, Any]]) -> bool:
+        """Acrescenta turnos ao fim do histórico (custo constante, qualquer que seja o tamanho da conversa)"""
+        return await self._write(session_id, {}, turns=turns)
+    
+    async def get_history(self, session_id: str, last_n: int = 10) -> List[Dict[str, Any]]:
+        """Últimos last_n turnos gravados do histórico, sem ler os metadados da sessão"""
+        try:
+            turns = await self.redis_client.lrange(history_key(self._key(session_id)), -last_n, -1)
+            return [self.codec.decode(t) for t in turns]
+        except Exception as e:
+            logger.error(f"Erro ao recuperar histórico da sessão {session_id}: {str(e)}")
+            return []
+    
+    async def touch_session(self, session_id: str) -> bool:
+        """Renova o TTL e last_activity de uma sessão existente"""
+        return await self._write(session_id, {})
+    
+    def get_cache_metrics(self) -> Optional[Dict[str, Any]]:
+        """Métricas do cache local de sessões (None se desabilitado)"""
+        return self.near_cache.get_metrics() if self.near_cache else None
@@ -1,146 +1,96 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, Optional
 from datetime import datetime
 import logging
 from src.agents.base_agent import BaseAgent
+from .rule_engine import RuleEngine, default_rule_engine
 
 logger = logging.getLogger(__name__)
 
-class TechnicalSupportAgent(BaseAgent):
-    """Agente especializado em suporte técnico"""
-    
-    def __init__(self, agent_id: str, config: Dict[str, Any] = None):
-        super().__init__(agent_id, "gpt-4")
+class RuleBasedAgent(BaseAgent):
+    """Agente que responde pela tabela de regras e escala para o LLM quando nenhuma regra casa"""
+
+    # Grupo da tabela de regras e resposta padrão quando não há cliente da API configurado
+    agent_type = None
+    default_response = ""
+
+    def __init__(self, agent_id: str, model: str, config: Dict[str, Any] = None, rule_engine: RuleEngine = None):
+        super().__init__(agent_id, model)
         self.agent_id = agent_id
         self.config = config
-        self.capabilities = ['technical_support', 'troubleshooting', 'system_diagnostics']
+        # Respostas prontas da tabela de regras (src/orchestrator/data/response_rules.json)
+        self.rule_engine = rule_engine or default_rule_engine()
+        self.capabilities = []
         self.is_active = True
         self.last_heartbeat = datetime.now().isoformat()
-        
-    def process_message(self, message: Dict[str, Any]) -> Dict[str, Any]:
-        """Processa mensagens de suporte técnico"""
-        try:
-            self.last_heartbeat = datetime.now().isoformat()
-            
-            # Extrair informações da mensagem
-            content = message.get('content', '')
-            user_id = message.get('user_id', 'unknown')
-            session_id = message.get('session_id', 'unknown')
-            
-            logger.info(f"TechnicalSupportAgent processando mensagem de {user_id}: {content}")
-            
-            # Lógica de processamento específica para suporte técnico
-            response = self._analyze_technical_issue(content, message)
-            
-            return {
-                'agent_id': self.agent_id,
-                'user_id': user_id,
-                'session_id': session_id,
-                'response': response,
-                'timestamp': datetime.now().isoformat(),
-                'requires_followup': False
-            }
-            
-        except Exception as e:
-            logger.error(f"Erro ao processar mensagem no TechnicalSupportAgent: {str(e)}")
-            return {
-                'agent_id': self.agent_id,
-                'error': str(e),
-                'timestamp': datetime.now().isoformat()
-            }
-    
-    def _analyze_technical_issue(self, content: str, message: Dict[str, Any]) -> str:
-        """Analisa problemas técnicos específicos"""
-        content_lower = content.lower()
-        
-        # Análise de problemas comuns
-        if 'não consigo acessar' in content_lower or 'acesso' in content_lower:
-            return "Entendi que você está tendo problemas de acesso. Vamos resolver isso juntos. Primeiro, verifique se sua conexão com a internet está funcionando corretamente."
-        
-        elif 'lento' in content_lower or 'demora' in content_lower:
-            return "Percebi que você está enfrentando lentidão. Isso pode ser causado por vários fatores. Vamos verificar alguns pontos importantes para melhorar o desempenho."
-        
-        elif 'erro' in content_lower or 'não funciona' in content_lower:
-            return "Sinto que você está enfrentando um erro técnico. Para ajudá-lo melhor, preciso de mais detalhes sobre o problema. Pode me descrever exatamente o que acontece?"
-        
-        elif 'instalação' in content_lower or 'instalar' in content_lower:
-            return "Vamos resolver seu problema de instalação. Primeiro, verifique se seu sistema atende aos requisitos mínimos e se você está seguindo os passos corretos."
-        
-        else:
-            return "Entendi que você precisa de ajuda com um problema técnico. Para fornecer a melhor assistência possível, por favor, me descreva detalhadamente o problema que você está enfrentando."
-    
-    def get_status(self) -> Dict[str, Any]:
-        """Retorna o status do agente"""
+
+    def _parse(self, message: Any, context: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Aceita texto simples vindo do orquestrador ou a mensagem já em dicionário"""
+        self.last_heartbeat = datetime.now().isoformat()
+        if isinstance(message, str):
+            message = {**(context or {}), 'content': message}
+        logger.info(f"{type(self).__name__} processando mensagem de {message.get('user_id', 'unknown')}: {message.get('content', '')}")
+        return message
+
+    def _rule_response(self, content: str, client: Any) -> Optional[str]:
+        """Resposta da tabela de regras; None escala para o LLM (só quando há cliente configurado)
+
+        Com cliente, a regra só responde com a confiança mínima da tabela (como a camada de regras
+        do orquestrador): mensagens longas ou com várias intenções vão para o LLM.
+        """
+        if client is None:
+            return self.rule_engine.lookup(self.agent_type, content) or self.default_response
+        if not self.rule_engine.can_answer(self.agent_type, content):
+            return None
+        return self.rule_engine.lookup(self.agent_type, content)
+
+    def calls_model(self, message: str) -> bool:
+        """Só mensagens sem regra correspondente chamam o modelo"""
+        return self._rule_response(message, self.openai_client or self.async_openai_client) is None
+
+    def _result(self, message: Dict[str, Any], response: str) -> Dict[str, Any]:
         return {
             'agent_id': self.agent_id,
-            'is_active': self.is_active,
-            'capabilities': self.capabilities,
-            'last_heartbeat': self.last_heartbeat,
-            'type': 'technical_support'
+            'user_id': message.get('user_id', 'unknown'),
+            'session_id': message.get('session_id', 'unknown'),
+            'response': response,
+            'timestamp': datetime.now().isoformat(),
+            'requires_followup': False
         }
 
-class FinancialAgent(BaseAgent):
-    """Agente especializado em questões financeiras"""
-    
-    def __init__(self, agent_id: str, config: Dict[str, Any] = None):
-        super().__init__(agent_id, "gpt-3.5-turbo")
-        self.agent_id = agent_id
-        self.config = config
-        self.capabilities = ['financial', 'payments', 'billing', 'invoices']
-        self.is_active = True
-        self.last_heartbeat = datetime.now().isoformat()
-        
-    def process_message(self, message: Dict[str, Any]) -> Dict[str, Any]:
-        """Processa mensagens financeiras"""
+    def _error(self, error: Exception) -> Dict[str, Any]:
+        logger.error(f"Erro ao processar mensagem no {type(self).__name__}: {str(error)}")
+        return {
+            'agent_id': self.agent_id,
+            'error': str(error),
+            'timestamp': datetime.now().isoformat()
+        }
+
+    def process_message(self, message: Any, context: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Responde pela tabela de regras ou, sem regra, pelo LLM (com a política do agente)"""
         try:
-            self.last_heartbeat = datetime.now().isoformat()
-            
-            # Extrair informações da mensagem
+            message = self._parse(message, context)
             content = message.get('content', '')
-            user_id = message.get('user_id', 'unknown')
-            session_id = message.get('session_id', 'unknown')
-            
-            logger.info(f"FinancialAgent processando mensagem de {user_id}: {content}")
-            
-            # Lógica de processamento específica para questões financeiras
-            response = self._analyze_financial_issue(content, message)
-            
-            return {
-                'agent_id': self.agent_id,
-                'user_id': user_id,
-                'session_id': session_id,
-                'response': response,
-                'timestamp': datetime.now().isoformat(),
-                'requires_followup': False
-            }
-            
+            response = self._rule_response(content, self.openai_client)
+            if response is None:
+                response = self.generate_response(self.build_messages(content, context))
+                self.record_turn(context, content, response)
+            return self._result(message, response)
         except Exception as e:
-            logger.error(f"Erro ao processar mensagem no FinancialAgent: {str(e)}")
-            return {
-                'agent_id': self.agent_id,
-                'error': str(e),
-                'timestamp': datetime.now().isoformat()
-            }
-    
-    def _analyze_financial_issue(self, content: str, message: Dict[str, Any]) -> str:
-        """Analisa questões financeiras específicas"""
-        content_lower = content.lower()
-        
-        # Análise de problemas financeiros comuns
-        if 'pagamento' in content_lower or 'paguei' in content_lower:
-            return "Entendi que você tem uma dúvida sobre pagamento. Para verificar o status do seu pagamento, preciso do número da transação ou ID do pedido."
-        
-        elif 'fatura' in content_lower or 'boleto' in content_lower:
-            return "Sobre sua fatura, posso ajudá-lo a verificar valores, datas de vencimento ou segunda via. Por favor, me informe o número da fatura ou o período de referência."
-        
-        elif 'reembolso' in content_lower or 'devolução' in content_lower:
-            return "Sobre reembolsos, nosso processo geralmente leva de 5 a 10 dias úteis após a aprovação. Posso verificar o status do seu reembolso específico se você me fornecer o número do pedido."
-        
-        elif 'desconto' in content_lower or 'promoção' in content_lower:
-            return "Temos várias opções de descontos e promoções disponíveis. Posso verificar quais estão ativas para o seu perfil e ajudá-lo a aproveitá-las."
-        
-        else:
-            return "Entendi que você precisa de ajuda com uma questão financeira. Para fornecer a assistência mais precisa, por favor, detalhe sua dúvida sobre pagamentos, faturas, reembolsos ou qualquer outro assunto financeiro."
-    
+            return self._error(e)
+
+    async def aprocess_message(self, message: Any, context: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Versão assíncrona de process_message"""
+        try:
+            message = self._parse(message, context)
+            content = message.get('content', '')
+            response = self._rule_response(content, self.async_openai_client)
+            if response is None:
+                response = await self.agenerate_response(self.build_messages(content, context))
+                await self.arecord_turn(context, content, response)
+            return self._result(message, response)
+        except Exception as e:
+            return self._error(e)
+
     def get_status(self) -> Dict[str, Any]:
         """Retorna o status do agente"""
         return {
@@ -148,5 +98,37 @@ class FinancialAgent(BaseAgent):
             'is_active': self.is_active,
             'capabilities': self.capabilities,
             'last_heartbeat': self.last_heartbeat,
-            'type': 'financial'
-        }
\ No newline at end of file
+            'type': self.agent_type
+        }
+
+class TechnicalSupportAgent(RuleBasedAgent):
+    """Agente especializado em suporte técnico"""
+
+    agent_type = 'technical_support'
+    default_response = "Entendi que você precisa de ajuda com um problema técnico. Para fornecer a melhor assistência possível, por favor, me descreva detalhadamente o problema que você está enfrentando."
+
+    def __init__(self, agent_id: str, config: Dict[str, Any] = None, rule_engine: RuleEngine = None):
+        super().__init__(agent_id, "gpt-4", config, rule_engine)
+        self.capabilities = ['technical_support', 'troubleshooting', 'system_diagnostics']
+        self.system_prompt = """
+        Você é um especialista em suporte técnico.
+        Ajude os usuários com problemas de acesso, lentidão, erros e dúvidas sobre o sistema.
+        Seja detalhado e claro em suas explicações.
+        Se o problema for complexo, recomende que o usuário entre em contato com o suporte especializado.
+        """
+
+class FinancialAgent(RuleBasedAgent):
+    """Agente especializado em questões financeiras"""
+
+    agent_type = 'financial'
+    default_response = "Entendi que você precisa de ajuda com uma questão financeira. Para fornecer a assistência mais precisa, por favor, detalhe sua dúvida sobre pagamentos, faturas, reembolsos ou qualquer outro assunto financeiro."
+
+    def __init__(self, agent_id: str, config: Dict[str, Any] = None, rule_engine: RuleEngine = None):
+        super().__init__(agent_id, "gpt-3.5-turbo", config, rule_engine)
+        self.capabilities = ['financial', 'payments', 'billing', 'invoices']
+        self.system_prompt = """
+        Você é um especialista em atendimento financeiro.
+        Ajude os clientes com pagamentos, faturas, boletos, reembolsos e descontos.
+        Seja objetivo e nunca solicite senhas ou dados completos de cartão.
+        Se a solicitação exigir análise da conta, recomende que o cliente fale com um atendente humano.
+        """
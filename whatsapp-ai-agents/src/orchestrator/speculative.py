@@ -0,0 +1,154 @@
+import logging
+import threading
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from src.utils.race import CallRace
+
+logger = logging.getLogger(__name__)
+
+ERROR_RESPONSE = "Desculpe, ocorreu um erro ao processar sua solicitação."
+
+Scorer = Callable[[str, str, str], float]
+
+
+def classifier_scorer(classifier) -> Scorer:
+    """Pontuação barata de uma resposta: confiança do classificador no agente para pergunta + resposta"""
+    def score(agent_id: str, message: str, response: str) -> float:
+        if not response or response == ERROR_RESPONSE:
+            return 0.0
+        return classifier.scores(f"{message} {response}").get(agent_id, 0.0)
+    return score
+
+
+class SpeculativeFanout:
+    """Fan-out especulativo para rotas de baixa confiança
+
+    Quando o roteamento não decide entre agentes (nenhuma palavra-chave e confiança do
+    classificador abaixo do mínimo, ou os dois melhores separados por menos de `margin`),
+    os `max_candidates` agentes mais prováveis respondem em paralelo. A primeira resposta com
+    pontuação >= accept_score vence e as demais são canceladas; senão vence a maior pontuação
+    entre as que chegarem em `timeout` segundos. Candidatos extras só entram enquanto o custo
+    estimado somado ficar dentro de max_extra_tokens por mensagem.
+    """
+
+    def __init__(self, scorer: Scorer, max_candidates: int = 2, max_extra_tokens: int = 2000,
+                 accept_score: float = 0.8, margin: float = 0.1, timeout: float = 30, max_workers: int = 16):
+        self.scorer = scorer
+        self.max_candidates = max_candidates
+        self.max_extra_tokens = max_extra_tokens
+        self.accept_score = accept_score
+        self.margin = margin
+        self.timeout = timeout
+        # Corrida entre os candidatos (threads criadas sob demanda)
+        self.race = CallRace(max_workers=max_workers, thread_name_prefix='speculative')
+        self._lock = threading.Lock()
+        self.metrics: Dict[str, Any] = {
+            'fanouts': 0,
+            'early_accepts': 0,
+            'cancelled': 0,
+            'over_budget': 0,
+            'timeouts': 0,
+            'no_answer': 0,
+            'extra_tokens': 0,
+            'wins_by_rank': defaultdict(int),
+            'wins_by_agent': defaultdict(int)
+        }
+
+    # Seleção de candidatos
+
+    def candidates(self, scores: Dict[str, float], min_confidence: float, agents: Dict[str, Any]) -> List[str]:
+        """Agentes mais prováveis quando a rota é de baixa confiança (vazio se a rota é clara)"""
+        ranked = sorted((agent_id for agent_id in scores if agent_id in agents), key=lambda a: -scores[a])
+        if len(ranked) < 2 or self.max_candidates < 2:
+            return []
+        best, second = scores[ranked[0]], scores[ranked[1]]
+        if best >= min_confidence and best - second >= self.margin:
+            return []
+        return ranked[:self.max_candidates]
+
+    def within_budget(self, candidates: List[str], costs: Dict[str, int]) -> List[str]:
+        """Mantém o primeiro candidato e os extras cujo custo estimado cabe no limite da mensagem"""
+        selected, spent = candidates[:1], 0
+        for agent_id in candidates[1:]:
+            cost = costs.get(agent_id, 0)
+            if spent + cost > self.max_extra_tokens:
+                self._count('over_budget')
+                continue
+            spent += cost
+            selected.append(agent_id)
+        if len(selected) > 1:
+            self._count('extra_tokens', spent)
+        return selected
+
+    # Execução
+
+    def _count(self, key: str, amount: int = 1):
+        with self._lock:
+            self.metrics[key] += amount
+
+    def _score(self, agent_id: str, message: str, response: Optional[str]) -> float:
+        if not response:
+            return 0.0
+        try:
+            return self.scorer(agent_id, message, response)
+        except Exception as e:
+            logger.error(f"Erro ao pontuar resposta do agente {agent_id}: {e}")
+            return 0.0
+
+    def _finish(self, candidates: List[str], results: Dict[str, Tuple[float, Optional[str]]],
+                pending: int, early: bool) -> Tuple[Optional[str], Optional[str]]:
+        """Escolhe a melhor resposta (empate: candidato mais bem ranqueado) e registra as métricas"""
+        answered = [a for a in candidates if a in results and results[a][1]]
+        with self._lock:
+            self.metrics['fanouts'] += 1
+            self.metrics['cancelled'] += pending
+            if early:
+                self.metrics['early_accepts'] += 1
+            elif pending:
+                self.metrics['timeouts'] += 1
+            if not answered:
+                self.metrics['no_answer'] += 1
+                return None, None
+            winner = max(answered, key=lambda a: (results[a][0], -candidates.index(a)))
+            self.metrics['wins_by_rank'][str(candidates.index(winner) + 1)] += 1
+            self.metrics['wins_by_agent'][winner] += 1
+        logger.info(f"Fan-out especulativo entre {candidates}: vencedor {winner} "
+                    f"(pontuação {results[winner][0]:.2f})")
+        return winner, results[winner][1]
+
+    def _scoring(self, message: str, results: Dict[str, Tuple[float, Optional[str]]]) -> Dict[str, Any]:
+        """Parâmetros da corrida: cada resposta é pontuada e aceita a partir de accept_score"""
+        def accept(agent_id: str, response: Optional[str]) -> bool:
+            results[agent_id] = (self._score(agent_id, message, response), response)
+            return bool(response) and results[agent_id][0] >= self.accept_score
+
+        def on_error(agent_id: str, error: Exception):
+            logger.error(f"Erro no candidato especulativo {agent_id}: {error}")
+            results[agent_id] = (0.0, None)
+
+        return {'accept': accept, 'on_error': on_error, 'timeout': self.timeout}
+
+    def run(self, calls: Dict[str, Callable[[], Optional[str]]], message: str) -> Tuple[Optional[str], Optional[str]]:
+        """Executa os candidatos em threads (ver CallRace) e retorna (agente vencedor, resposta)"""
+        results: Dict[str, Tuple[float, Optional[str]]] = {}
+        outcome = self.race.run(calls, **self._scoring(message, results))
+        return self._finish(list(calls), results, outcome.unfinished, outcome.winner is not None)
+
+    async def arun(self, calls: Dict[str, Callable[[], Awaitable[Optional[str]]]],
+                   message: str) -> Tuple[Optional[str], Optional[str]]:
+        """Versão assíncrona de run; os candidatos perdedores são de fato cancelados"""
+        results: Dict[str, Tuple[float, Optional[str]]] = {}
+        outcome = await self.race.arun(calls, **self._scoring(message, results))
+        return self._finish(list(calls), results, outcome.unfinished, outcome.winner is not None)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Fan-outs, vitórias por posição no ranking e por agente, cancelamentos e custo extra"""
+        with self._lock:
+            metrics = dict(self.metrics)
+            metrics['wins_by_rank'] = dict(self.metrics['wins_by_rank'])
+            metrics['wins_by_agent'] = dict(self.metrics['wins_by_agent'])
+        return metrics
+
+    def shutdown(self):
+        """Encerra as threads dos candidatos"""
+        self.race.shutdown()
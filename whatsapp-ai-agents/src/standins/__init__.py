@@ -0,0 +1,9 @@
+"""
+Servidores substitutos locais (OpenAI e Chatwoot) para testes de carga e benchmarks
+"""
+
+from src.standins.latency import LatencyModel
+from src.standins.openai_server import OpenAIStandIn
+from src.standins.chatwoot_server import ChatwootStandIn
+
+__all__ = ['LatencyModel', 'OpenAIStandIn', 'ChatwootStandIn']
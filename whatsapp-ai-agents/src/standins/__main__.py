@@ -0,0 +1,64 @@
+"""
+Inicia os substitutos locais da OpenAI e do Chatwoot
+
+Executar com: python -m src.standins --latency-median 0.8 --latency-p95 2.5 --rate-limit-rate 0.02
+e apontar OPENAI_BASE_URL e CHATWOOT_BASE_URL para os endereços exibidos.
+"""
+
+import argparse
+import logging
+import signal
+import threading
+from src.standins import LatencyModel, OpenAIStandIn, ChatwootStandIn
+
+logger = logging.getLogger(__name__)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Substitutos locais da OpenAI e do Chatwoot')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--openai-port', type=int, default=8081)
+    parser.add_argument('--chatwoot-port', type=int, default=8082)
+    parser.add_argument('--latency', choices=['fixed', 'uniform', 'lognormal'], default='lognormal')
+    parser.add_argument('--latency-median', type=float, default=0.8, help='segundos até a resposta/primeiro token')
+    parser.add_argument('--latency-p95', type=float, default=2.5)
+    parser.add_argument('--latency-low', type=float, default=0.2, help='mínimo da distribuição uniforme')
+    parser.add_argument('--latency-high', type=float, default=1.5, help='máximo da distribuição uniforme')
+    parser.add_argument('--token-latency', type=float, default=0.02, help='segundos entre tokens no stream')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='fração das chamadas que recebe 429')
+    parser.add_argument('--retry-after', type=float, default=1)
+    parser.add_argument('--chatwoot-latency', type=float, default=0.03)
+    parser.add_argument('--seed', type=int, default=42)
+    return parser.parse_args(argv)
+
+
+def build(args):
+    """Cria os dois servidores a partir dos argumentos"""
+    latency = LatencyModel(args.latency, median=args.latency_median, p95=args.latency_p95,
+                           low=args.latency_low, high=args.latency_high, seed=args.seed)
+    openai_server = OpenAIStandIn(args.host, args.openai_port, latency=latency,
+                                  token_latency=LatencyModel.fixed(args.token_latency),
+                                  rate_limit_rate=args.rate_limit_rate, retry_after=args.retry_after, seed=args.seed)
+    chatwoot_server = ChatwootStandIn(args.host, args.chatwoot_port, latency=LatencyModel.fixed(args.chatwoot_latency))
+    return openai_server, chatwoot_server
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO)
+    openai_server, chatwoot_server = build(parse_args(argv))
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+    signal.signal(signal.SIGINT, lambda *_: stop_event.set())
+
+    with openai_server, chatwoot_server:
+        print(f"OPENAI_BASE_URL={openai_server.base_url}")
+        print(f"CHATWOOT_BASE_URL={chatwoot_server.base_url}")
+        while not stop_event.is_set():
+            stop_event.wait(1)
+        logger.info(f"Encerrando substitutos: openai={openai_server.get_stats()} "
+                    f"chatwoot={len(chatwoot_server.get_messages())} mensagens")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,93 @@
+import re
+import threading
+import time
+from typing import Any, Dict, List
+
+from src.standins.latency import LatencyModel
+from src.standins.server import StandInHandler, StandInServer
+
+_MESSAGES_PATH = re.compile(r'^/api/v1/accounts/(?P<account>[^/]+)/conversations/(?P<conversation>[^/]+)/messages/?$')
+
+
+class _ChatwootHandler(StandInHandler):
+    """API de mensagens do Chatwoot: POST grava a mensagem, GET lista as gravadas"""
+
+    def _route(self):
+        match = _MESSAGES_PATH.match(self.path.split('?')[0])
+        if not match:
+            self.send_json(404, {'error': f"Rota desconhecida: {self.path}"})
+        return match
+
+    def do_POST(self):
+        stand_in: ChatwootStandIn = self.server.stand_in
+        match = self._route()
+        if not match:
+            return
+        body = self.read_json()
+        time.sleep(stand_in.latency.sample())
+        if not self.headers.get('api_access_token'):
+            stand_in.reject()
+            self.send_json(401, {'error': 'Você precisa fazer login ou se registrar antes de continuar.'})
+            return
+        message = stand_in.record(match.group('account'), match.group('conversation'), body)
+        self.send_json(200, message)
+
+    def do_GET(self):
+        stand_in: ChatwootStandIn = self.server.stand_in
+        match = self._route()
+        if match:
+            self.send_json(200, {'payload': stand_in.get_messages(match.group('conversation'))})
+
+
+class ChatwootStandIn(StandInServer):
+    """Substituto local da API de mensagens do Chatwoot que registra tudo o que recebe"""
+
+    name = 'chatwoot-stand-in'
+    handler_class = _ChatwootHandler
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: LatencyModel = None):
+        super().__init__(host, port)
+        self.latency = latency or LatencyModel.fixed(0)
+        self.messages: List[Dict[str, Any]] = []
+        self.unauthorized = 0
+        self._received = threading.Condition(self._lock)
+
+    @property
+    def base_url(self) -> str:
+        """Valor para CHATWOOT_BASE_URL"""
+        return self.url
+
+    def reject(self):
+        with self._lock:
+            self.unauthorized += 1
+
+    def record(self, account_id: str, conversation_id: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        """Grava a mensagem recebida e retorna o objeto no formato do Chatwoot"""
+        with self._received:
+            message = {
+                'id': len(self.messages) + 1,
+                'account_id': account_id,
+                'conversation_id': conversation_id,
+                'content': body.get('content'),
+                'message_type': body.get('message_type'),
+                'private': body.get('private', False),
+                'received_at': time.time()
+            }
+            self.messages.append(message)
+            self._received.notify_all()
+            return message
+
+    def get_messages(self, conversation_id: str = None) -> List[Dict[str, Any]]:
+        """Mensagens gravadas (opcionalmente de uma conversa)"""
+        with self._lock:
+            return [m for m in self.messages if conversation_id is None or m['conversation_id'] == str(conversation_id)]
+
+    def wait_for(self, count: int, timeout: float = 10) -> bool:
+        """Aguarda até que `count` mensagens tenham sido gravadas"""
+        with self._received:
+            return self._received.wait_for(lambda: len(self.messages) >= count, timeout)
+
+    def clear(self):
+        with self._lock:
+            self.messages.clear()
+            self.unauthorized = 0
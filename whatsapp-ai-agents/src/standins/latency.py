@@ -0,0 +1,46 @@
+import math
+import random
+import threading
+
+
+class LatencyModel:
+    """Distribuição de latência determinística (semente fixa) para os servidores substitutos
+
+    kind: 'fixed' (sempre median), 'uniform' (entre low e high) ou 'lognormal' (mediana e p95,
+    com a cauda longa típica de APIs de LLM).
+    """
+
+    def __init__(self, kind: str = 'lognormal', median: float = 0.0, p95: float = None,
+                 low: float = 0.0, high: float = 0.0, seed: int = 42):
+        if kind not in ('fixed', 'uniform', 'lognormal'):
+            raise ValueError(f"Distribuição de latência desconhecida: {kind}")
+        self.kind = kind
+        self.median = median
+        self.p95 = p95 if p95 is not None else median
+        self.low = low
+        self.high = high
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        # Parâmetros da lognormal a partir da mediana e do p95 (z(0.95) = 1.645)
+        self._mu = math.log(median) if median > 0 else 0.0
+        self._sigma = max(0.0, math.log(self.p95 / median) / 1.645) if median > 0 and self.p95 > median else 0.0
+
+    @classmethod
+    def fixed(cls, seconds: float) -> 'LatencyModel':
+        return cls('fixed', median=seconds)
+
+    def sample(self) -> float:
+        """Próxima latência em segundos"""
+        if self.kind == 'fixed' or self.median <= 0 and self.kind == 'lognormal':
+            return self.median
+        with self._lock:
+            if self.kind == 'uniform':
+                return self._rng.uniform(self.low, self.high)
+            return self._rng.lognormvariate(self._mu, self._sigma)
+
+    def chance(self, probability: float) -> bool:
+        """Sorteio determinístico (usado na injeção de erros)"""
+        if probability <= 0:
+            return False
+        with self._lock:
+            return self._rng.random() < probability
@@ -0,0 +1,114 @@
+import json
+import time
+import zlib
+from typing import Any, Dict, List
+
+from src.standins.latency import LatencyModel
+from src.standins.server import StandInHandler, StandInServer
+
+_SENTENCES = [
+    "Posso ajudar com mais alguma coisa?",
+    "Verifiquei as informações da sua conta.",
+    "Vou encaminhar sua solicitação para a equipe responsável.",
+    "O prazo estimado é de até dois dias úteis.",
+    "Obrigado por entrar em contato conosco.",
+    "Se preferir, posso enviar os detalhes por e-mail.",
+]
+
+
+class _OpenAIHandler(StandInHandler):
+    """POST /v1/chat/completions no formato da API da OpenAI (com e sem stream)"""
+
+    def do_POST(self):
+        stand_in: OpenAIStandIn = self.server.stand_in
+        if self.path.rstrip('/') not in ('/v1/chat/completions', '/chat/completions'):
+            self.send_json(404, {'error': {'message': f"Rota desconhecida: {self.path}", 'type': 'invalid_request_error'}})
+            return
+
+        body = self.read_json()
+        if stand_in.rate_limited():
+            self.send_json(429, {'error': {'message': 'Rate limit reached (stand-in)', 'type': 'rate_limit_error',
+                                           'code': 'rate_limit_exceeded'}},
+                           headers={'Retry-After': str(stand_in.retry_after)})
+            return
+
+        content = stand_in.reply(body.get('messages') or [])
+        model = body.get('model', 'stand-in')
+        time.sleep(stand_in.latency.sample())
+        if body.get('stream'):
+            self._stream(stand_in, model, content)
+        else:
+            words = len(content.split())
+            self.send_json(200, {
+                'id': 'chatcmpl-standin', 'object': 'chat.completion', 'created': int(time.time()), 'model': model,
+                'choices': [{'index': 0, 'finish_reason': 'stop', 'message': {'role': 'assistant', 'content': content}}],
+                'usage': {'prompt_tokens': words, 'completion_tokens': words, 'total_tokens': 2 * words}
+            })
+
+    def _stream(self, stand_in: 'OpenAIStandIn', model: str, content: str):
+        def chunk(delta: Dict[str, Any], finish_reason: str = None) -> bytes:
+            payload = {'id': 'chatcmpl-standin', 'object': 'chat.completion.chunk', 'created': int(time.time()),
+                       'model': model, 'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}]}
+            return f"data: {json.dumps(payload)}\n\n".encode('utf-8')
+
+        self.start_chunked('text/event-stream')
+        self.write_chunk(chunk({'role': 'assistant', 'content': ''}))
+        for i, word in enumerate(content.split(' ')):
+            if i:
+                time.sleep(stand_in.token_latency.sample())
+            self.write_chunk(chunk({'content': word if i == 0 else f" {word}"}))
+        self.write_chunk(chunk({}, 'stop'))
+        self.write_chunk(b"data: [DONE]\n\n")
+        self.end_chunked()
+        stand_in.count('streamed')
+
+
+class OpenAIStandIn(StandInServer):
+    """Substituto local da API de chat da OpenAI para testes de carga
+
+    A latência até a resposta (ou até o primeiro token, com stream) segue `latency`; cada token
+    seguinte espera `token_latency`. Uma fração `rate_limit_rate` das chamadas recebe 429 com
+    Retry-After. Respostas e sorteios são determinísticos (dependem só da mensagem e da semente).
+    """
+
+    name = 'openai-stand-in'
+    handler_class = _OpenAIHandler
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: LatencyModel = None,
+                 token_latency: LatencyModel = None, rate_limit_rate: float = 0.0, retry_after: float = 1,
+                 reply_sentences: int = 2, seed: int = 42):
+        super().__init__(host, port)
+        self.latency = latency or LatencyModel.fixed(0)
+        self.token_latency = token_latency or LatencyModel.fixed(0)
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.reply_sentences = reply_sentences
+        self._errors = LatencyModel(seed=seed)
+        self.stats = {'requests': 0, 'rate_limited': 0, 'streamed': 0}
+
+    @property
+    def base_url(self) -> str:
+        """Valor para OPENAI_BASE_URL"""
+        return f"{self.url}/v1"
+
+    def count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def rate_limited(self) -> bool:
+        self.count('requests')
+        if self._errors.chance(self.rate_limit_rate):
+            self.count('rate_limited')
+            return True
+        return False
+
+    def reply(self, messages: List[Dict[str, Any]]) -> str:
+        """Resposta determinística para a última mensagem do usuário"""
+        last = next((m.get('content') or '' for m in reversed(messages) if m.get('role') == 'user'), '')
+        start = zlib.crc32(last.encode('utf-8'))
+        extra = [_SENTENCES[(start + i) % len(_SENTENCES)] for i in range(self.reply_sentences)]
+        return ' '.join([f"Resposta simulada para: {last[:80]}."] + extra)
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.stats)
@@ -0,0 +1,97 @@
+import json
+import logging
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Handler HTTP/1.1 (keep-alive) com utilitários de JSON e respostas em partes"""
+    protocol_version = 'HTTP/1.1'
+
+    def read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def send_json(self, status: int, payload: Any, headers: Dict[str, str] = None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def start_chunked(self, content_type: str):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+    def write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+        self.wfile.flush()
+
+    def end_chunked(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.server.name}: {format % args}")
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clientes que encerram a conexão keep-alive não são erro do substituto
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            logger.debug(f"{self.name}: conexão encerrada por {client_address}")
+            return
+        super().handle_error(request, client_address)
+
+
+class StandInServer:
+    """Servidor substituto em uma thread de fundo; usar com start/stop ou como context manager"""
+
+    name = 'stand-in'
+    handler_class = StandInHandler
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0):
+        self.host = host
+        self.port = port
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def start(self) -> 'StandInServer':
+        """Inicia o servidor (porta 0 escolhe uma porta livre)"""
+        self._server = _HTTPServer((self.host, self.port), self.handler_class)
+        self._server.stand_in = self
+        self._server.name = self.name
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name=self.name, daemon=True)
+        self._thread.start()
+        logger.info(f"Servidor substituto {self.name} ouvindo em {self.url}")
+        return self
+
+    def stop(self):
+        """Encerra o servidor"""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> 'StandInServer':
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
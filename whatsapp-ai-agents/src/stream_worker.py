@@ -0,0 +1,58 @@
+"""
+Worker que consome o stream de webhooks (INGESTION_MODE=stream)
+
+Executar com: python -m src.stream_worker
+Pode rodar em quantos processos/hosts forem necessários; todos compartilham o grupo de consumidores.
+"""
+
+import signal
+import logging
+import threading
+from src.config.config import Config
+from src.utils.stream_queue import StreamQueue
+from src.main import chatwoot_bot
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    """Inicia os consumidores e aguarda o sinal de encerramento"""
+    if not chatwoot_bot:
+        logger.error("ChatwootBot não foi inicializado corretamente")
+        return 1
+
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+    signal.signal(signal.SIGINT, lambda *_: stop_event.set())
+
+    threads = []
+    for i in range(Config.STREAM_CONSUMERS):
+        queue = StreamQueue(
+            chatwoot_bot.redis_client,
+            stream=Config.STREAM_NAME,
+            group=Config.STREAM_GROUP,
+            maxlen=Config.STREAM_MAXLEN,
+            max_deliveries=Config.STREAM_MAX_DELIVERIES,
+            claim_idle_ms=Config.STREAM_CLAIM_IDLE_MS
+        )
+        queue.consumer = f"{queue.consumer}-{i}"
+        thread = threading.Thread(
+            target=queue.run,
+            args=(chatwoot_bot.handle_message, stop_event),
+            name=f"stream-consumer-{i}"
+        )
+        thread.start()
+        threads.append(thread)
+
+    logger.info(f"{len(threads)} consumidores iniciados no stream {Config.STREAM_NAME}")
+    while not stop_event.is_set():
+        stop_event.wait(1)
+
+    logger.info("Encerrando consumidores (aguardando mensagens em processamento)")
+    for thread in threads:
+        thread.join()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
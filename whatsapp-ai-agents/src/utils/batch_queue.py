@@ -0,0 +1,277 @@
+import json
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from zoneinfo import ZoneInfo
+
+logger = logging.getLogger(__name__)
+
+BATCH_ENDPOINT = '/v1/chat/completions'
+# Estados finais de um job na API de batch
+_FAILED_STATUSES = ('failed', 'expired', 'cancelled')
+
+
+def is_business_hours(now: datetime = None, start_hour: int = 9, end_hour: int = 18,
+                      days: Iterable[int] = (0, 1, 2, 3, 4), timezone: str = None) -> bool:
+    """Indica se o momento está dentro do horário de atendimento (dias: segunda=0)"""
+    if now is None:
+        tz = ZoneInfo(timezone) if timezone else None
+        now = datetime.now(tz)
+    return now.weekday() in days and start_hour <= now.hour < end_hour
+
+
+class BatchQueue:
+    """Fila de mensagens adiadas, respondidas em lote pela API de batch da OpenAI
+
+    As requisições ficam em uma lista no Redis; submit envia o que estiver pendente como um
+    único job e poll entrega as respostas dos jobs concluídos ao handler. Requisições sem
+    resposta (job expirado/falho ou erro na linha) voltam para a fila até max_attempts; respostas
+    cuja entrega falhou (erro no handler) vão, com a resposta já gerada, para uma lista de
+    reentrega consultada a cada poll, também até max_attempts. Os turnos entregues ficam em
+    uma lista por usuário (save_turn) até o processo que atende o webhook, dono do histórico da
+    conversa, aplicá-los (pop_turns).
+    """
+
+    def __init__(self, redis_client, openai_client, prefix: str = 'batch', max_batch_size: int = 500,
+                 completion_window: str = '24h', max_attempts: int = 3, turns_ttl: int = 86400):
+        self.redis_client = redis_client
+        self.openai_client = openai_client
+        self.pending_key = f"{prefix}:pending"
+        self.jobs_key = f"{prefix}:jobs"
+        self.retry_key = f"{prefix}:retry"
+        self.turns_prefix = f"{prefix}:turns"
+        self.turns_ttl = turns_ttl
+        self.max_batch_size = max_batch_size
+        self.completion_window = completion_window
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self.metrics: Dict[str, Any] = {
+            'queued': 0,
+            'batches_submitted': 0,
+            'requests_submitted': 0,
+            'delivered': 0,
+            'requeued': 0,
+            'delivery_retries': 0,
+            'failed': 0,
+            'submit_errors': 0
+        }
+
+    def _incr(self, name: str, amount: int = 1):
+        with self._lock:
+            self.metrics[name] += amount
+
+    # Fila de requisições
+
+    def enqueue(self, request: Dict[str, Any]) -> bool:
+        """Adiciona uma requisição (model, messages, temperature + dados de entrega) à fila"""
+        request = dict(request)
+        request.setdefault('id', uuid.uuid4().hex)
+        request.setdefault('queued_at', time.time())
+        request.setdefault('attempts', 0)
+        try:
+            self.redis_client.rpush(self.pending_key, json.dumps(request))
+            self._incr('queued')
+            return True
+        except Exception as e:
+            logger.error(f"Erro ao enfileirar requisição em lote: {e}")
+            return False
+
+    def _pop(self, count: int, key: str = None) -> List[Dict[str, Any]]:
+        key = key or self.pending_key
+        pipe = self.redis_client.pipeline(transaction=True)
+        pipe.lrange(key, 0, count - 1)
+        pipe.ltrim(key, count, -1)
+        raw, _ = pipe.execute()
+        return [json.loads(item) for item in raw]
+
+    def _requeue(self, requests: List[Dict[str, Any]]):
+        retry = []
+        for request in requests:
+            request['attempts'] = request.get('attempts', 0) + 1
+            if request['attempts'] < self.max_attempts:
+                retry.append(request)
+            else:
+                logger.error(f"Requisição em lote {request['id']} descartada após {request['attempts']} tentativas")
+                self._incr('failed')
+        if retry:
+            self.redis_client.rpush(self.pending_key, *[json.dumps(r) for r in retry])
+            self._incr('requeued', len(retry))
+
+    # Entrega das respostas
+
+    def _deliver(self, handler: Callable[[Dict[str, Any], str], None], request: Dict[str, Any],
+                 response: str) -> bool:
+        """Entrega a resposta; se o handler falhar, guarda-a para reentrega até max_attempts"""
+        try:
+            handler(request, response)
+        except Exception as e:
+            logger.error(f"Erro ao entregar resposta em lote {request['id']}: {e}")
+            request['delivery_attempts'] = request.get('delivery_attempts', 0) + 1
+            if request['delivery_attempts'] < self.max_attempts:
+                request['response'] = response
+                self.redis_client.rpush(self.retry_key, json.dumps(request))
+                self._incr('delivery_retries')
+            else:
+                logger.error(f"Resposta em lote {request['id']} descartada após {request['delivery_attempts']} tentativas de entrega")
+                self._incr('failed')
+            return False
+        self._incr('delivered')
+        return True
+
+    def _retry_deliveries(self, handler: Callable[[Dict[str, Any], str], None]) -> int:
+        try:
+            requests = self._pop(self.max_batch_size, self.retry_key)
+        except Exception as e:
+            logger.error(f"Erro ao ler respostas em lote para reentrega: {e}")
+            return 0
+        return sum(self._deliver(handler, request, request.pop('response')) for request in requests)
+
+    # Turnos entregues, para o histórico do processo do webhook
+
+    def save_turn(self, request: Dict[str, Any], response: str) -> bool:
+        """Guarda a mensagem e a resposta entregue até o processo do webhook aplicá-las ao histórico"""
+        key = f"{self.turns_prefix}:{request['user_id']}"
+        turn = {'agent_id': request['agent_id'], 'user_id': request['user_id'],
+                'message': request['message'], 'response': response}
+        try:
+            pipe = self.redis_client.pipeline(transaction=True)
+            pipe.rpush(key, json.dumps(turn))
+            pipe.expire(key, self.turns_ttl)
+            pipe.execute()
+            return True
+        except Exception as e:
+            logger.error(f"Erro ao guardar turno em lote da conversa {request['user_id']}: {e}")
+            return False
+
+    def pop_turns(self, user_id: Any) -> List[Dict[str, Any]]:
+        """Turnos em lote entregues ao usuário e ainda fora do histórico (removidos ao ler)"""
+        key = f"{self.turns_prefix}:{user_id}"
+        try:
+            pipe = self.redis_client.pipeline(transaction=True)
+            pipe.lrange(key, 0, -1)
+            pipe.delete(key)
+            raw, _ = pipe.execute()
+        except Exception as e:
+            logger.error(f"Erro ao ler turnos em lote da conversa {user_id}: {e}")
+            return []
+        return [json.loads(item) for item in raw]
+
+    # Jobs na API de batch
+
+    @staticmethod
+    def _batch_line(request: Dict[str, Any]) -> str:
+        body = {'model': request['model'], 'messages': request['messages']}
+        if request.get('temperature') is not None:
+            body['temperature'] = request['temperature']
+        return json.dumps({'custom_id': request['id'], 'method': 'POST', 'url': BATCH_ENDPOINT, 'body': body})
+
+    def submit(self) -> Optional[str]:
+        """Envia as requisições pendentes como um job; retorna o ID do job ou None"""
+        try:
+            requests = self._pop(self.max_batch_size)
+        except Exception as e:
+            logger.error(f"Erro ao ler fila de requisições em lote: {e}")
+            return None
+        if not requests:
+            return None
+        try:
+            payload = '\n'.join(self._batch_line(r) for r in requests).encode('utf-8')
+            input_file = self.openai_client.files.create(file=('batch.jsonl', payload), purpose='batch')
+            batch = self.openai_client.batches.create(
+                input_file_id=input_file.id,
+                endpoint=BATCH_ENDPOINT,
+                completion_window=self.completion_window
+            )
+        except Exception as e:
+            logger.error(f"Erro ao enviar job em lote: {e}")
+            self._incr('submit_errors')
+            # Volta para o início da fila, na ordem original, sem contar como tentativa
+            self.redis_client.lpush(self.pending_key, *[json.dumps(r) for r in reversed(requests)])
+            return None
+        job = {'submitted_at': time.time(), 'requests': {r['id']: r for r in requests}}
+        self.redis_client.hset(self.jobs_key, batch.id, json.dumps(job))
+        self._incr('batches_submitted')
+        self._incr('requests_submitted', len(requests))
+        logger.info(f"Job em lote {batch.id} enviado com {len(requests)} requisições")
+        return batch.id
+
+    def _read_results(self, file_id: Optional[str]) -> Dict[str, Optional[str]]:
+        # custom_id -> conteúdo da resposta (None quando a linha veio com erro)
+        if not file_id:
+            return {}
+        results = {}
+        for line in self.openai_client.files.content(file_id).text.splitlines():
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            response = entry.get('response') or {}
+            content = None
+            if not entry.get('error') and response.get('status_code') == 200:
+                choices = response.get('body', {}).get('choices') or []
+                if choices:
+                    content = (choices[0].get('message', {}).get('content') or '').strip() or None
+            results[entry['custom_id']] = content
+        return results
+
+    def poll(self, handler: Callable[[Dict[str, Any], str], None]) -> int:
+        """Entrega ao handler(request, resposta) os resultados dos jobs concluídos; retorna quantos"""
+        delivered = self._retry_deliveries(handler)
+        for batch_id, raw in self.redis_client.hgetall(self.jobs_key).items():
+            try:
+                batch = self.openai_client.batches.retrieve(batch_id)
+            except Exception as e:
+                logger.error(f"Erro ao consultar job em lote {batch_id}: {e}")
+                continue
+            if batch.status != 'completed' and batch.status not in _FAILED_STATUSES:
+                continue
+            # Quem remove o job é quem entrega (vários workers podem consultar o mesmo job)
+            if not self.redis_client.hdel(self.jobs_key, batch_id):
+                continue
+            requests = json.loads(raw)['requests']
+            results = {}
+            if batch.status == 'completed':
+                try:
+                    results = self._read_results(batch.output_file_id)
+                except Exception as e:
+                    logger.error(f"Erro ao ler resultados do job em lote {batch_id}: {e}")
+            else:
+                logger.warning(f"Job em lote {batch_id} terminou com status {batch.status}")
+            unanswered = []
+            for request_id, request in requests.items():
+                response = results.get(request_id)
+                if response is None:
+                    unanswered.append(request)
+                    continue
+                delivered += self._deliver(handler, request, response)
+            if unanswered:
+                self._requeue(unanswered)
+        return delivered
+
+    def run(self, handler: Callable[[Dict[str, Any], str], None], stop_event: threading.Event,
+            interval: float = 60):
+        """Loop de envio e consulta de jobs até stop_event ser sinalizado"""
+        logger.info(f"Processamento em lote iniciado (intervalo: {interval}s)")
+        while not stop_event.is_set():
+            try:
+                self.poll(handler)
+                while self.submit():
+                    pass
+            except Exception as e:
+                logger.error(f"Erro no processamento em lote: {e}")
+            stop_event.wait(interval)
+        logger.info("Processamento em lote encerrado")
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Retorna contadores locais, requisições na fila e jobs em andamento"""
+        with self._lock:
+            metrics = dict(self.metrics)
+        try:
+            metrics['pending'] = self.redis_client.llen(self.pending_key)
+            metrics['jobs_in_progress'] = self.redis_client.hlen(self.jobs_key)
+            metrics['awaiting_delivery'] = self.redis_client.llen(self.retry_key)
+        except Exception as e:
+            logger.error(f"Erro ao obter métricas da fila em lote: {e}")
+        return metrics
@@ -0,0 +1,178 @@
+import copy
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _ConversationState:
+    """Mensagens acumuladas e estado de processamento de uma conversa"""
+
+    __slots__ = ('messages', 'first_at', 'deadline', 'busy')
+
+    def __init__(self):
+        self.messages: List[Dict[str, Any]] = []
+        self.first_at: float = 0.0
+        self.deadline: float = 0.0
+        self.busy = False
+
+
+class ConversationCoalescer:
+    """Serializa o processamento por conversa e agrupa rajadas de mensagens em um único turno"""
+
+    def __init__(self, dispatch: Callable[[Dict[str, Any]], bool], window: float = 1.5,
+                 max_wait: float = 5.0, max_buffered: int = 1000):
+        # dispatch recebe a mensagem combinada e retorna False se não conseguiu enfileirá-la
+        self.dispatch = dispatch
+        self.window = window
+        self.max_wait = max(window, max_wait)
+        self.max_buffered = max_buffered
+        self._buffered = 0
+        self._states: Dict[Any, _ConversationState] = {}
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+        self.metrics: Dict[str, Any] = {
+            'messages_received': 0,
+            'turns_dispatched': 0,
+            'messages_coalesced': 0,
+            'dispatch_failures': 0
+        }
+
+    @staticmethod
+    def _conversation_id(data: Dict[str, Any]):
+        return (data.get('conversation') or {}).get('id')
+
+    def start(self):
+        """Inicia a thread que despacha as conversas quando a janela expira"""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._scheduler_loop, name='conversation-coalescer', daemon=True)
+        self._thread.start()
+
+    def add(self, data: Dict[str, Any]) -> bool:
+        """Acumula uma mensagem na conversa; retorna False se o buffer estiver cheio"""
+        conversation_id = self._conversation_id(data)
+        if conversation_id is None or not self._running:
+            return self.dispatch(data)
+
+        now = time.monotonic()
+        with self._cond:
+            if self._buffered >= self.max_buffered:
+                return False
+            self._buffered += 1
+            self.metrics['messages_received'] += 1
+            state = self._states.get(conversation_id)
+            if state is None:
+                state = self._states[conversation_id] = _ConversationState()
+            if not state.messages:
+                state.first_at = now
+            state.messages.append(data)
+            state.deadline = min(now + self.window, state.first_at + self.max_wait)
+            self._cond.notify()
+        return True
+
+    def complete(self, data: Dict[str, Any]):
+        """Libera a conversa após o processamento do turno"""
+        conversation_id = self._conversation_id(data)
+        with self._cond:
+            state = self._states.get(conversation_id)
+            if state is None:
+                return
+            state.busy = False
+            if not state.messages:
+                del self._states[conversation_id]
+            self._cond.notify()
+
+    def wrap(self, handler: Callable[[Dict[str, Any]], None]) -> Callable[[Dict[str, Any]], None]:
+        """Envolve o handler do worker para liberar a conversa ao final de cada turno"""
+        def run_turn(data: Dict[str, Any]):
+            try:
+                handler(data)
+            finally:
+                self.complete(data)
+        return run_turn
+
+    @staticmethod
+    def merge(messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Combina uma rajada de mensagens em um único payload (base: a última mensagem)"""
+        if len(messages) == 1:
+            return messages[0]
+        merged = copy.deepcopy(messages[-1])
+        contents = [(m.get('message') or {}).get('content') for m in messages]
+        merged.setdefault('message', {})['content'] = '\n'.join(c for c in contents if c)
+        merged['coalesced_count'] = len(messages)
+        return merged
+
+    def _take_due(self, now: float):
+        """Retira as conversas prontas; retorna (lotes, próximo prazo)"""
+        due = []
+        next_deadline = None
+        for conversation_id, state in self._states.items():
+            if state.busy or not state.messages:
+                continue
+            if state.deadline <= now:
+                self._buffered -= len(state.messages)
+                due.append((conversation_id, state.messages))
+                state.messages = []
+                state.busy = True
+            elif next_deadline is None or state.deadline < next_deadline:
+                next_deadline = state.deadline
+        return due, next_deadline
+
+    def _dispatch_batch(self, conversation_id, messages: List[Dict[str, Any]]):
+        merged = self.merge(messages)
+        if self.dispatch(merged):
+            with self._cond:
+                self.metrics['turns_dispatched'] += 1
+                self.metrics['messages_coalesced'] += len(messages) - 1
+            return
+        # Fila cheia: devolver as mensagens e tentar de novo na próxima janela
+        with self._cond:
+            self.metrics['dispatch_failures'] += 1
+            state = self._states[conversation_id]
+            self._buffered += len(messages)
+            state.messages = messages + state.messages
+            state.busy = False
+            state.deadline = time.monotonic() + self.window
+        logger.warning(f"Não foi possível despachar a conversa {conversation_id}, nova tentativa em {self.window}s")
+
+    def _scheduler_loop(self):
+        while True:
+            with self._cond:
+                if not self._running:
+                    return
+                due, next_deadline = self._take_due(time.monotonic())
+                if not due:
+                    timeout = None if next_deadline is None else max(0.0, next_deadline - time.monotonic())
+                    self._cond.wait(timeout)
+                    continue
+            for conversation_id, messages in due:
+                self._dispatch_batch(conversation_id, messages)
+
+    def shutdown(self):
+        """Despacha imediatamente todas as mensagens acumuladas e para o agendador"""
+        with self._cond:
+            self._running = False
+            pending = [(cid, s.messages) for cid, s in self._states.items() if s.messages]
+            for _, state in self._states.items():
+                state.messages = []
+            self._buffered = 0
+            self._cond.notify_all()
+        for conversation_id, messages in pending:
+            self.dispatch(self.merge(messages))
+        if self._thread:
+            self._thread.join(5)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Retorna contadores de agrupamento e conversas em andamento"""
+        with self._cond:
+            metrics = dict(self.metrics)
+            metrics['active_conversations'] = len(self._states)
+            metrics['buffered_messages'] = self._buffered
+        metrics['window'] = self.window
+        return metrics
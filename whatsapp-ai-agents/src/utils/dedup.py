@@ -0,0 +1,161 @@
+import hashlib
+import logging
+import math
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from src.utils.lru_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """Filtro de Bloom com duas gerações para limitar a idade das entradas"""
+
+    def __init__(self, capacity: int = 100000, error_rate: float = 0.01, ttl: float = 86400):
+        self.capacity = max(1, capacity)
+        self.ttl = ttl
+        self.num_bits = max(8, int(-self.capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * math.log(2)))
+        self._current = bytearray((self.num_bits + 7) // 8)
+        self._previous = bytearray(len(self._current))
+        self._count = 0
+        self._rotated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _positions(self, key: str):
+        # Hashing duplo (Kirsch-Mitzenmacher) a partir de um único digest
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    @staticmethod
+    def _contains(bits: bytearray, positions) -> bool:
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in positions)
+
+    def _rotate_if_needed(self):
+        # Cada geração vive no máximo ttl segundos ou capacity entradas
+        if self._count >= self.capacity or time.monotonic() - self._rotated_at >= self.ttl:
+            self._previous = self._current
+            self._current = bytearray(len(self._previous))
+            self._count = 0
+            self._rotated_at = time.monotonic()
+
+    def check_and_add(self, key: str) -> bool:
+        """Adiciona a chave; retorna True se ela possivelmente já estava no filtro"""
+        positions = self._positions(key)
+        with self._lock:
+            self._rotate_if_needed()
+            seen = self._contains(self._current, positions) or self._contains(self._previous, positions)
+            if not self._contains(self._current, positions):
+                for p in positions:
+                    self._current[p >> 3] |= 1 << (p & 7)
+                self._count += 1
+            return seen
+
+
+class WebhookDeduplicator:
+    """Índice de deduplicação de webhooks: SET NX com TTL no Redis
+
+    Cada webhook custa uma ida ao Redis. O filtro de Bloom local não evita essa ida (um
+    "não visto" local não diz nada sobre os outros workers); ele só decide quando o Redis está
+    indisponível. Se o webhook não puder ser enfileirado, release desfaz o registro para que o
+    reenvio do Chatwoot seja processado.
+    """
+
+    def __init__(self, redis_client, ttl: int = 86400, capacity: int = 100000, prefix: str = 'dedup:webhook'):
+        self.redis_client = redis_client
+        self.ttl = ttl
+        self.prefix = prefix
+        self.local_filter = BloomFilter(capacity=capacity, ttl=ttl)
+        # Chaves liberadas: o filtro de Bloom não remove entradas, então o reenvio não é barrado por ele
+        self._released = LRUCache(max_size=capacity, ttl=ttl)
+        self._lock = threading.Lock()
+        self.metrics: Dict[str, Any] = {
+            'hits': 0,
+            'misses': 0,
+            'local_filter_hits': 0,
+            'redis_errors': 0,
+            'skipped': 0,
+            'released': 0
+        }
+
+    def key_for(self, data: Dict[str, Any]) -> Optional[str]:
+        """Monta a chave a partir dos IDs de conversa e mensagem do webhook"""
+        message_id = data.get('id') or (data.get('message') or {}).get('id')
+        conversation_id = (data.get('conversation') or {}).get('id')
+        if message_id is None:
+            return None
+        return f"{self.prefix}:{conversation_id}:{message_id}"
+
+    def _local_check(self, data: Dict[str, Any]):
+        key = self.key_for(data)
+        if key is None:
+            self._incr('skipped')
+            return None, False
+        seen_locally = self.local_filter.check_and_add(key)
+        if seen_locally and self._released.delete(key):
+            seen_locally = False
+        if seen_locally:
+            self._incr('local_filter_hits')
+        return key, seen_locally
+
+    def _result(self, created: bool) -> bool:
+        duplicate = not created
+        self._incr('hits' if duplicate else 'misses')
+        return duplicate
+
+    def _fallback(self, key: str, seen_locally: bool, error: Exception) -> bool:
+        # Sem Redis, o filtro local decide (pode descartar raríssimos falsos positivos)
+        logger.error(f"Erro ao consultar índice de deduplicação ({key}): {error}")
+        self._incr('redis_errors')
+        return self._result(not seen_locally)
+
+    def is_duplicate(self, data: Dict[str, Any]) -> bool:
+        """Registra o webhook e retorna True se ele já foi recebido dentro do TTL"""
+        key, seen_locally = self._local_check(data)
+        if key is None:
+            return False
+        try:
+            created = self.redis_client.set(key, 1, nx=True, ex=self.ttl)
+        except Exception as e:
+            return self._fallback(key, seen_locally, e)
+        return self._result(bool(created))
+
+    async def ais_duplicate(self, data: Dict[str, Any]) -> bool:
+        """Versão assíncrona de is_duplicate (cliente redis.asyncio)"""
+        key, seen_locally = self._local_check(data)
+        if key is None:
+            return False
+        try:
+            created = await self.redis_client.set(key, 1, nx=True, ex=self.ttl)
+        except Exception as e:
+            return self._fallback(key, seen_locally, e)
+        return self._result(bool(created))
+
+    def release(self, data: Dict[str, Any]):
+        """Desfaz o registro de um webhook que não chegou a ser enfileirado"""
+        key = self.key_for(data)
+        if key is None:
+            return
+        self._released.set(key, True)
+        self._incr('released')
+        try:
+            self.redis_client.delete(key)
+        except Exception as e:
+            logger.error(f"Erro ao liberar chave de deduplicação ({key}): {e}")
+            self._incr('redis_errors')
+
+    def _incr(self, name: str):
+        with self._lock:
+            self.metrics[name] += 1
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Retorna acertos (duplicatas evitadas) e erros do índice"""
+        with self._lock:
+            metrics = dict(self.metrics)
+        checked = metrics['hits'] + metrics['misses']
+        metrics['hit_rate'] = metrics['hits'] / checked if checked else 0
+        return metrics
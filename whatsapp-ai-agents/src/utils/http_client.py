@@ -0,0 +1,162 @@
+import logging
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+from src.config.config import Config
+
+logger = logging.getLogger(__name__)
+
+# Métodos que podem ser repetidos sem risco de efeito duplicado
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+
+# Status repetidos para métodos idempotentes
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Status em que o servidor garante que não processou a requisição (seguros até para POST)
+REJECTED_STATUSES = {429, 503}
+
+
+def _never_sent(error: requests.exceptions.RequestException) -> bool:
+    """Indica se a falha ocorreu antes de a requisição chegar ao servidor"""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+class HttpClient:
+    """Cliente HTTP com pool de conexões keep-alive, timeouts e retentativas"""
+
+    def __init__(self, pool_size: int = None, connect_timeout: float = None, read_timeout: float = None,
+                 max_retries: int = None, backoff_factor: float = None, max_backoff: float = 10.0):
+        self.pool_size = pool_size or Config.HTTP_POOL_SIZE
+        self.connect_timeout = connect_timeout or Config.HTTP_CONNECT_TIMEOUT
+        self.read_timeout = read_timeout or Config.HTTP_READ_TIMEOUT
+        self.max_retries = Config.HTTP_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff_factor = Config.HTTP_BACKOFF_FACTOR if backoff_factor is None else backoff_factor
+        self.max_backoff = max_backoff
+
+        # A sessão mantém as conexões abertas entre requisições (keep-alive)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=1000)
+        self.metrics: Dict[str, Any] = {
+            'requests': 0,
+            'retries': 0,
+            'errors': 0,
+            'status_codes': {}
+        }
+
+    def request(self, method: str, url: str, idempotent: Optional[bool] = None, **kwargs) -> requests.Response:
+        """Executa uma requisição com retentativas; levanta RequestException em caso de falha"""
+        method = method.upper()
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        kwargs.setdefault('timeout', (self.connect_timeout, self.read_timeout))
+
+        attempt = 0
+        while True:
+            start = time.monotonic()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.exceptions.RequestException as e:
+                self._record(start, None)
+                retryable = _never_sent(e) or (idempotent and isinstance(
+                    e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)))
+                if retryable and attempt < self.max_retries:
+                    attempt += 1
+                    self._sleep_before_retry(attempt, url, str(e))
+                    continue
+                with self._lock:
+                    self.metrics['errors'] += 1
+                raise
+
+            self._record(start, response.status_code)
+            retry_statuses = RETRY_STATUSES if idempotent else REJECTED_STATUSES
+            if response.status_code in retry_statuses and attempt < self.max_retries:
+                attempt += 1
+                self._sleep_before_retry(attempt, url, f"HTTP {response.status_code}",
+                                         response.headers.get('Retry-After'))
+                response.close()
+                continue
+            return response
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def _sleep_before_retry(self, attempt: int, url: str, reason: str, retry_after: str = None):
+        """Aguarda com backoff exponencial e jitter (full jitter) antes de repetir"""
+        delay = random.uniform(0, min(self.max_backoff, self.backoff_factor * (2 ** (attempt - 1))))
+        if retry_after:
+            try:
+                delay = max(delay, min(self.max_backoff, float(retry_after)))
+            except ValueError:
+                pass
+        with self._lock:
+            self.metrics['retries'] += 1
+        logger.warning(f"Repetindo requisição para {url} ({reason}), tentativa {attempt} em {delay:.2f}s")
+        time.sleep(delay)
+
+    def _record(self, start: float, status_code: Optional[int]):
+        """Registra latência e código de status de uma tentativa"""
+        latency = time.monotonic() - start
+        with self._lock:
+            self.metrics['requests'] += 1
+            self._latencies.append(latency)
+            if status_code is not None:
+                codes = self.metrics['status_codes']
+                codes[status_code] = codes.get(status_code, 0) + 1
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Retorna contadores de requisições, retentativas e latência"""
+        with self._lock:
+            metrics = dict(self.metrics)
+            metrics['status_codes'] = dict(self.metrics['status_codes'])
+            latencies = sorted(self._latencies)
+        if latencies:
+            metrics['avg_latency'] = sum(latencies) / len(latencies)
+            metrics['p95_latency'] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        else:
+            metrics['avg_latency'] = 0
+            metrics['p95_latency'] = 0
+        return metrics
+
+    def close(self):
+        """Fecha as conexões do pool"""
+        self.session.close()
+
+
+_clients: Dict[str, HttpClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_http_client(base_url: str) -> HttpClient:
+    """Retorna o cliente compartilhado do host (um pool de conexões por host)"""
+    parts = urlsplit(base_url or '')
+    host_key = f"{parts.scheme}://{parts.netloc}".lower()
+    with _clients_lock:
+        client = _clients.get(host_key)
+        if client is None:
+            client = HttpClient()
+            _clients[host_key] = client
+        return client
+
+
+def get_http_metrics() -> Dict[str, Dict[str, Any]]:
+    """Retorna as métricas de todos os clientes compartilhados, por host"""
+    with _clients_lock:
+        clients = dict(_clients)
+    return {host: client.get_metrics() for host, client in clients.items()}
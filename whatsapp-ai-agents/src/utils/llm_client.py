@@ -0,0 +1,150 @@
+import logging
+import threading
+from typing import Any, Dict, Optional, Tuple
+import openai
+from src.config.config import Config
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROVIDER = 'openai'
+DEFAULT_BASE_URL = 'https://api.openai.com/v1'
+# Classe de limites do transporte HTTP usado pelo SDK
+_Limits = type(openai.DEFAULT_CONNECTION_LIMITS)
+
+
+class LLMClientRegistry:
+    """Clientes OpenAI compartilhados pelo processo: um pool HTTP por provedor/base URL
+
+    Cada provedor é {'base_url': ..., 'api_key': ...}; qualquer servidor compatível com a API da
+    OpenAI (ex.: um substituto local) é usado apenas trocando a base_url. Todos os agentes que
+    apontam para a mesma base URL compartilham as conexões keep-alive do mesmo transporte.
+    Configurações por agente (provider, model, timeout) vêm de agent_settings.
+    """
+
+    def __init__(self, api_key: str = None, base_url: str = None, providers: Dict[str, Dict[str, Any]] = None,
+                 agent_settings: Dict[str, Dict[str, Any]] = None, timeout: float = 60, connect_timeout: float = 5,
+                 max_connections: int = 100, max_keepalive: int = 20, max_retries: int = 2):
+        self.providers = {DEFAULT_PROVIDER: {'api_key': api_key, 'base_url': base_url}, **(providers or {})}
+        self.agent_settings = dict(agent_settings or {})
+        self.timeout = openai.Timeout(timeout, connect=connect_timeout)
+        self.limits = _Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive)
+        self.max_retries = max_retries
+        self._transports: Dict[str, openai.DefaultHttpxClient] = {}
+        self._async_transports: Dict[str, openai.DefaultAsyncHttpxClient] = {}
+        self._clients: Dict[Tuple[str, str], openai.OpenAI] = {}
+        self._async_clients: Dict[Tuple[str, str], openai.AsyncOpenAI] = {}
+        self._lock = threading.Lock()
+
+    def _provider(self, provider: Optional[str]) -> Tuple[str, str]:
+        settings = self.providers.get(provider or DEFAULT_PROVIDER)
+        if settings is None:
+            raise ValueError(f"Provedor de LLM desconhecido: {provider}")
+        return settings.get('api_key'), settings.get('base_url')
+
+    @staticmethod
+    def _base_url(base_url: Optional[str]) -> str:
+        return (base_url or DEFAULT_BASE_URL).rstrip('/')
+
+    # Clientes
+
+    def client_for(self, api_key: str, base_url: str = None) -> openai.OpenAI:
+        """Cliente síncrono para a chave/base URL, sobre o transporte compartilhado da base URL"""
+        base_url = self._base_url(base_url)
+        with self._lock:
+            client = self._clients.get((base_url, api_key))
+            if client is None:
+                transport = self._transports.get(base_url)
+                if transport is None:
+                    transport = self._transports[base_url] = openai.DefaultHttpxClient(limits=self.limits, timeout=self.timeout)
+                    logger.info(f"Pool HTTP de LLM criado para {base_url}")
+                client = self._clients[(base_url, api_key)] = openai.OpenAI(
+                    api_key=api_key, base_url=base_url, http_client=transport,
+                    timeout=self.timeout, max_retries=self.max_retries
+                )
+            return client
+
+    def async_client_for(self, api_key: str, base_url: str = None) -> openai.AsyncOpenAI:
+        """Versão assíncrona de client_for"""
+        base_url = self._base_url(base_url)
+        with self._lock:
+            client = self._async_clients.get((base_url, api_key))
+            if client is None:
+                transport = self._async_transports.get(base_url)
+                if transport is None:
+                    transport = self._async_transports[base_url] = openai.DefaultAsyncHttpxClient(limits=self.limits, timeout=self.timeout)
+                    logger.info(f"Pool HTTP assíncrono de LLM criado para {base_url}")
+                client = self._async_clients[(base_url, api_key)] = openai.AsyncOpenAI(
+                    api_key=api_key, base_url=base_url, http_client=transport,
+                    timeout=self.timeout, max_retries=self.max_retries
+                )
+            return client
+
+    def client(self, provider: str = None) -> openai.OpenAI:
+        """Cliente síncrono do provedor"""
+        return self.client_for(*self._provider(provider))
+
+    def async_client(self, provider: str = None) -> openai.AsyncOpenAI:
+        """Cliente assíncrono do provedor"""
+        return self.async_client_for(*self._provider(provider))
+
+    # Agentes
+
+    def configure_agent(self, agent, agent_id: str = None, synchronous: bool = True, asynchronous: bool = False):
+        """Liga o agente aos clientes compartilhados, com o provedor, modelo e timeout configurados"""
+        settings = self.agent_settings.get(agent_id or agent.name, {})
+        provider = settings.get('provider')
+        timeout = settings.get('timeout')
+        if synchronous:
+            client = self.client(provider)
+            agent.openai_client = client.with_options(timeout=timeout) if timeout else client
+        if asynchronous:
+            client = self.async_client(provider)
+            agent.async_openai_client = client.with_options(timeout=timeout) if timeout else client
+        if settings.get('model'):
+            agent.set_model(settings['model'])
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Provedores, pools por base URL e quantidade de clientes"""
+        with self._lock:
+            return {
+                'providers': sorted(self.providers),
+                'pools': sorted(self._transports),
+                'async_pools': sorted(self._async_transports),
+                'clients': len(self._clients) + len(self._async_clients)
+            }
+
+    def close(self):
+        """Fecha os pools síncronos"""
+        with self._lock:
+            transports = list(self._transports.values())
+        for transport in transports:
+            transport.close()
+
+    async def aclose(self):
+        """Fecha os pools assíncronos"""
+        with self._lock:
+            transports = list(self._async_transports.values())
+        for transport in transports:
+            await transport.aclose()
+
+
+_registry: Optional[LLMClientRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_llm_registry() -> LLMClientRegistry:
+    """Retorna o registro de clientes de LLM do processo (criado a partir da configuração)"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = LLMClientRegistry(
+                api_key=Config.OPENAI_API_KEY,
+                base_url=Config.OPENAI_BASE_URL,
+                providers=Config.LLM_PROVIDERS,
+                agent_settings=Config.LLM_AGENT_SETTINGS,
+                timeout=Config.LLM_TIMEOUT,
+                connect_timeout=Config.LLM_CONNECT_TIMEOUT,
+                max_connections=Config.LLM_MAX_CONNECTIONS,
+                max_retries=Config.LLM_MAX_RETRIES
+            )
+        return _registry
@@ -0,0 +1,106 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable
+
+# Marcador para distinguir "ausente" de um valor None armazenado
+_MISSING = object()
+
+
+class LRUCache:
+    """Cache LRU limitado com expiração por TTL e estatísticas de acerto"""
+
+    def __init__(self, max_size: int = 10000, ttl: float = 300):
+        self.max_size = max(1, max_size)
+        self.ttl = ttl
+        self._entries: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.metrics: Dict[str, Any] = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'invalidations': 0
+        }
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Retorna o valor em cache (e o marca como recente) ou default"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                self.metrics['misses'] += 1
+                return default
+            value, expires_at = entry
+            if self.ttl and expires_at <= now:
+                del self._entries[key]
+                self.metrics['expirations'] += 1
+                self.metrics['misses'] += 1
+                return default
+            self._entries.move_to_end(key)
+            self.metrics['hits'] += 1
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        """Armazena o valor, descartando a entrada menos recente se o cache estiver cheio"""
+        expires_at = time.monotonic() + self.ttl if self.ttl else 0.0
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.metrics['evictions'] += 1
+
+    def setdefault(self, key: Hashable, default: Any) -> Any:
+        """Retorna o valor em cache ou armazena default; o acesso renova a validade da entrada"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is not _MISSING and not (self.ttl and entry[1] <= now):
+                value = entry[0]
+                self.metrics['hits'] += 1
+            else:
+                value = default
+                self.metrics['misses'] += 1
+            self._entries[key] = (value, now + self.ttl if self.ttl else 0.0)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.metrics['evictions'] += 1
+            return value
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """Retorna o valor em cache sem alterar a ordem nem as estatísticas"""
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING or (self.ttl and entry[1] <= time.monotonic()):
+                return default
+            return entry[0]
+
+    def delete(self, key: Hashable) -> bool:
+        """Invalida uma entrada"""
+        with self._lock:
+            if self._entries.pop(key, _MISSING) is _MISSING:
+                return False
+            self.metrics['invalidations'] += 1
+            return True
+
+    def clear(self):
+        """Invalida todas as entradas"""
+        with self._lock:
+            self._entries.clear()
+            self.metrics['invalidations'] += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Retorna tamanho, contadores e taxa de acerto"""
+        with self._lock:
+            metrics = dict(self.metrics)
+            metrics['size'] = len(self._entries)
+        lookups = metrics['hits'] + metrics['misses']
+        metrics['hit_rate'] = metrics['hits'] / lookups if lookups else 0
+        metrics['max_size'] = self.max_size
+        metrics['ttl'] = self.ttl
+        return metrics
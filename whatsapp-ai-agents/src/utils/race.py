@@ -0,0 +1,127 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional
+
+# Avalia o resultado de uma chamada: True encerra a corrida com esse vencedor
+Accept = Callable[[Any, Any], bool]
+OnError = Callable[[Any, Exception], None]
+
+
+class RaceOutcome(NamedTuple):
+    winner: Any            # chave da chamada aceita (None se nenhuma foi aceita)
+    result: Any            # resultado da chamada aceita
+    launched: int          # chamadas iniciadas (inclui as reservas)
+    unfinished: int        # chamadas descartadas ou canceladas sem terminar
+
+
+class CallRace:
+    """Corrida entre chamadas concorrentes: vence o primeiro resultado aceito
+
+    Cada resultado é avaliado por `accept` na ordem de chegada; erros vão para `on_error`.
+    As chamadas de `backups` só são iniciadas se nenhuma chamada terminar em `backup_after`
+    segundos (hedge). Com `timeout`, a corrida termina no prazo mesmo sem vencedor. Na versão
+    com threads uma chamada em andamento não pode ser interrompida e o resultado perdedor é
+    descartado; na versão assíncrona as tarefas restantes são canceladas.
+    """
+
+    def __init__(self, max_workers: int = 16, thread_name_prefix: str = 'race'):
+        self._max_workers = max_workers
+        self._thread_name_prefix = thread_name_prefix
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._max_workers,
+                                                    thread_name_prefix=self._thread_name_prefix)
+            return self._executor
+
+    @staticmethod
+    def _remaining(deadline: Optional[float]) -> Optional[float]:
+        return None if deadline is None else max(0, deadline - time.monotonic())
+
+    def run(self, calls: Dict[Any, Callable[[], Any]], accept: Accept, on_error: OnError = None,
+            timeout: float = None, backups: Dict[Any, Callable[[], Any]] = None,
+            backup_after: float = None, on_backup: Callable[[], None] = None) -> RaceOutcome:
+        """Executa as chamadas em threads e retorna o primeiro resultado aceito"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        futures = {self._pool().submit(call): key for key, call in calls.items()}
+        pending = set(futures)
+        done = set()
+        if backups and backup_after:
+            done, pending = wait(pending, timeout=backup_after)
+            if not done:
+                if on_backup is not None:
+                    on_backup()
+                for key, call in backups.items():
+                    futures[self._pool().submit(call)] = key
+                pending = set(futures)
+        while done or pending:
+            for future in done:
+                key = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    if on_error is not None:
+                        on_error(key, e)
+                    continue
+                if accept(key, result):
+                    for other in pending:
+                        other.cancel()
+                    return RaceOutcome(key, result, len(futures), len(pending))
+            if not pending:
+                break
+            done, pending = wait(pending, timeout=self._remaining(deadline), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+        for other in pending:
+            other.cancel()
+        return RaceOutcome(None, None, len(futures), len(pending))
+
+    async def arun(self, calls: Dict[Any, Callable[[], Awaitable[Any]]], accept: Accept, on_error: OnError = None,
+                   timeout: float = None, backups: Dict[Any, Callable[[], Awaitable[Any]]] = None,
+                   backup_after: float = None, on_backup: Callable[[], None] = None) -> RaceOutcome:
+        """Versão assíncrona de run; as chamadas restantes são de fato canceladas"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        tasks = {asyncio.ensure_future(call()): key for key, call in calls.items()}
+        pending = set(tasks)
+        done = set()
+        try:
+            if backups and backup_after:
+                done, pending = await asyncio.wait(pending, timeout=backup_after)
+                if not done:
+                    if on_backup is not None:
+                        on_backup()
+                    for key, call in backups.items():
+                        tasks[asyncio.ensure_future(call())] = key
+                    pending = set(tasks)
+            while done or pending:
+                for task in done:
+                    key = tasks[task]
+                    if task.exception() is not None:
+                        if on_error is not None:
+                            on_error(key, task.exception())
+                        continue
+                    if accept(key, task.result()):
+                        return RaceOutcome(key, task.result(), len(tasks), len(pending))
+                if not pending:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=self._remaining(deadline),
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    break
+            return RaceOutcome(None, None, len(tasks), len(pending))
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def shutdown(self):
+        """Encerra as threads das chamadas"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
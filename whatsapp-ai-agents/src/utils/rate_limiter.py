@@ -0,0 +1,352 @@
+import asyncio
+import inspect
+import logging
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Dict
+
+import redis
+import redis.asyncio as redis_asyncio
+from redis.asyncio.retry import Retry as AsyncRetry
+from redis.backoff import NoBackoff
+from redis.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+# Limites padrão por modelo (requisições/min, tokens/min, concorrência máxima)
+DEFAULT_MODEL_LIMITS: Dict[str, Dict[str, Any]] = {
+    'gpt-4': {'rpm': 500, 'tpm': 10000, 'max_concurrency': 8},
+    'gpt-3.5-turbo': {'rpm': 3500, 'tpm': 60000, 'max_concurrency': 32},
+}
+FALLBACK_LIMITS: Dict[str, Any] = {'rpm': 500, 'tpm': 30000, 'max_concurrency': 8}
+
+# Dois baldes (requisições e tokens) reabastecidos continuamente; retorna a espera em segundos
+# (0 = consumido). O relógio do Redis é usado para que todos os workers concordem.
+_TOKEN_BUCKET_SCRIPT = """
+local rpm = tonumber(ARGV[1])
+local tpm = tonumber(ARGV[2])
+local cost = math.min(tonumber(ARGV[3]), tpm)
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'requests', 'tokens', 'ts')
+local requests = tonumber(state[1]) or rpm
+local tokens = tonumber(state[2]) or tpm
+local elapsed = math.max(0, now - (tonumber(state[3]) or now))
+requests = math.min(rpm, requests + elapsed * rpm / 60)
+tokens = math.min(tpm, tokens + elapsed * tpm / 60)
+local wait = 0
+if requests < 1 then wait = (1 - requests) * 60 / rpm end
+if tokens < cost then wait = math.max(wait, (cost - tokens) * 60 / tpm) end
+if wait == 0 then
+    requests = requests - 1
+    tokens = tokens - cost
+end
+redis.call('HSET', KEYS[1], 'requests', tostring(requests), 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], 120)
+return tostring(wait)
+"""
+
+
+class RateLimitTimeout(Exception):
+    """A chamada não conseguiu vaga dentro do prazo da fila"""
+
+
+def limiter_redis_client(host: str = 'localhost', port: int = 6379, db: int = 0, timeout: float = 0.25,
+                         asynchronous: bool = False):
+    """Cliente Redis próprio do limitador: timeouts curtos e sem novas tentativas
+
+    Com o cliente padrão (timeouts de 5s e novas tentativas com backoff) um Redis fora do ar
+    atrasava cada chamada ao LLM em segundos antes de o balde local assumir.
+    """
+    if asynchronous:
+        return redis_asyncio.Redis(host=host, port=port, db=db, decode_responses=True, socket_timeout=timeout,
+                                   socket_connect_timeout=timeout, retry=AsyncRetry(NoBackoff(), 0))
+    return redis.Redis(host=host, port=port, db=db, decode_responses=True, socket_timeout=timeout,
+                       socket_connect_timeout=timeout, retry=Retry(NoBackoff(), 0))
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Identifica respostas 429 da API (RateLimitError ou status_code)"""
+    return getattr(error, 'status_code', None) == 429 or type(error).__name__ == 'RateLimitError'
+
+
+class _LocalBucket:
+    """Mesmos baldes do script Lua, em memória (usado quando o Redis não responde)"""
+
+    def __init__(self, rpm: float, tpm: float):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.requests = rpm
+        self.tokens = tpm
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self, cost: float) -> float:
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self.updated_at
+            self.updated_at = now
+            self.requests = min(self.rpm, self.requests + elapsed * self.rpm / 60)
+            self.tokens = min(self.tpm, self.tokens + elapsed * self.tpm / 60)
+            cost = min(cost, self.tpm)
+            wait = 0.0
+            if self.requests < 1:
+                wait = (1 - self.requests) * 60 / self.rpm
+            if self.tokens < cost:
+                wait = max(wait, (cost - self.tokens) * 60 / self.tpm)
+            if wait == 0:
+                self.requests -= 1
+                self.tokens -= cost
+            return wait
+
+
+class ModelRateLimiter:
+    """Limitador de um modelo: baldes de RPM/TPM compartilhados via Redis + concorrência adaptativa (AIMD)
+
+    A concorrência cresce 1/limite a cada chamada bem-sucedida e cai pela metade a cada 429
+    (ou 10% quando a latência passa de latency_target), no máximo uma vez por cooldown.
+    Chamadas sem vaga esperam na fila até o prazo (timeout) em vez de falhar na hora.
+    Depois de um erro do Redis os baldes locais são usados por redis_retry_interval segundos,
+    sem nova tentativa no Redis a cada chamada.
+    """
+
+    def __init__(self, model: str, redis_client=None, rpm: float = 500, tpm: float = 30000,
+                 max_concurrency: int = 8, min_concurrency: int = 1, latency_target: float = 0,
+                 cooldown: float = 1.0, prefix: str = 'ratelimit', redis_retry_interval: float = 30):
+        self.model = model
+        self.redis_client = redis_client
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.latency_target = latency_target
+        self.cooldown = cooldown
+        self.key = f"{prefix}:{model}"
+        self.limit = float(self.max_concurrency)
+        self.inflight = 0
+        self.waiting = 0
+        self._last_decrease = 0.0
+        self.redis_retry_interval = redis_retry_interval
+        self._redis_down_until = 0.0
+        self._cond = threading.Condition()
+        self._local_bucket = _LocalBucket(rpm, tpm)
+        self._script = redis_client.register_script(_TOKEN_BUCKET_SCRIPT) if redis_client is not None else None
+        self.metrics: Dict[str, Any] = {
+            'requests': 0,
+            'throttled': 0,
+            'throttle_time': 0.0,
+            'timeouts': 0,
+            'rate_limited': 0,
+            'slow_responses': 0,
+            'redis_errors': 0,
+            'local_bucket_calls': 0
+        }
+
+    # Baldes de RPM/TPM
+
+    def _bucket_args(self, tokens: int):
+        return {'keys': [self.key], 'args': [self.rpm, self.tpm, tokens]}
+
+    def _redis_available(self) -> bool:
+        # Disjuntor: depois de um erro, o Redis só é tentado de novo após redis_retry_interval
+        return self._script is not None and time.monotonic() >= self._redis_down_until
+
+    def _local_wait(self, tokens: int) -> float:
+        if self._script is not None:
+            with self._cond:
+                self.metrics['local_bucket_calls'] += 1
+        return self._local_bucket.take(tokens)
+
+    def _bucket_wait(self, tokens: int) -> float:
+        if self._redis_available():
+            try:
+                return float(self._script(**self._bucket_args(tokens)))
+            except Exception as e:
+                self._redis_error(e)
+        return self._local_wait(tokens)
+
+    async def _abucket_wait(self, tokens: int) -> float:
+        if self._redis_available():
+            try:
+                result = self._script(**self._bucket_args(tokens))
+                if inspect.isawaitable(result):
+                    result = await result
+                return float(result)
+            except Exception as e:
+                self._redis_error(e)
+        return self._local_wait(tokens)
+
+    def _redis_error(self, error: Exception):
+        logger.error(f"Erro no limitador de taxa do modelo {self.model} no Redis: {error}; "
+                     f"usando o balde local por {self.redis_retry_interval:.0f}s")
+        with self._cond:
+            self.metrics['redis_errors'] += 1
+            self._redis_down_until = time.monotonic() + self.redis_retry_interval
+
+    # Vagas de concorrência
+
+    def _try_slot(self) -> bool:
+        if self.inflight < max(self.min_concurrency, int(self.limit)):
+            self.inflight += 1
+            return True
+        return False
+
+    def _finish_wait(self, started: float, acquired: bool):
+        waited = time.monotonic() - started
+        with self._cond:
+            self.waiting -= 1
+            if acquired:
+                self.metrics['requests'] += 1
+                if waited > 0.001:
+                    self.metrics['throttled'] += 1
+                    self.metrics['throttle_time'] += waited
+            else:
+                self.metrics['timeouts'] += 1
+        if not acquired:
+            raise RateLimitTimeout(f"Sem vaga para o modelo {self.model} em {waited:.1f}s")
+        return waited
+
+    def acquire(self, tokens: int = 0, timeout: float = 30) -> float:
+        """Aguarda uma vaga de concorrência e saldo nos baldes; retorna o tempo de espera"""
+        started = time.monotonic()
+        deadline = started + timeout
+        with self._cond:
+            self.waiting += 1
+            acquired = self._try_slot()
+            while not acquired:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+                acquired = self._try_slot()
+        if not acquired:
+            return self._finish_wait(started, False)
+        while True:
+            wait = self._bucket_wait(tokens)
+            if wait <= 0:
+                return self._finish_wait(started, True)
+            if time.monotonic() + wait > deadline:
+                self._release_slot()
+                return self._finish_wait(started, False)
+            time.sleep(wait)
+
+    async def aacquire(self, tokens: int = 0, timeout: float = 30) -> float:
+        """Versão assíncrona de acquire (não bloqueia o event loop enquanto espera)"""
+        started = time.monotonic()
+        deadline = started + timeout
+        delay = 0.005
+        with self._cond:
+            self.waiting += 1
+        while True:
+            with self._cond:
+                if self._try_slot():
+                    break
+            if time.monotonic() + delay > deadline:
+                return self._finish_wait(started, False)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.1)
+        while True:
+            wait = await self._abucket_wait(tokens)
+            if wait <= 0:
+                return self._finish_wait(started, True)
+            if time.monotonic() + wait > deadline:
+                self._release_slot()
+                return self._finish_wait(started, False)
+            await asyncio.sleep(wait)
+
+    def _release_slot(self):
+        with self._cond:
+            self.inflight -= 1
+            self._cond.notify()
+
+    def release(self, latency: float, rate_limited: bool = False):
+        """Devolve a vaga e ajusta a concorrência com base no resultado da chamada"""
+        now = time.monotonic()
+        with self._cond:
+            self.inflight -= 1
+            slow = bool(self.latency_target) and latency > self.latency_target
+            if rate_limited or slow:
+                self.metrics['rate_limited' if rate_limited else 'slow_responses'] += 1
+                if now - self._last_decrease >= self.cooldown:
+                    factor = 0.5 if rate_limited else 0.9
+                    self.limit = max(self.min_concurrency, self.limit * factor)
+                    self._last_decrease = now
+            else:
+                self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+    @contextmanager
+    def limit_call(self, tokens: int = 0, timeout: float = 30):
+        """Envolve uma chamada à API: aguarda vaga, mede a latência e detecta 429"""
+        self.acquire(tokens, timeout)
+        started = time.monotonic()
+        rate_limited = False
+        try:
+            yield
+        except Exception as e:
+            rate_limited = is_rate_limit_error(e)
+            raise
+        finally:
+            # Também libera a vaga quando um stream é abandonado no meio (GeneratorExit)
+            self.release(time.monotonic() - started, rate_limited)
+
+    @asynccontextmanager
+    async def alimit_call(self, tokens: int = 0, timeout: float = 30):
+        """Versão assíncrona de limit_call"""
+        await self.aacquire(tokens, timeout)
+        started = time.monotonic()
+        rate_limited = False
+        try:
+            yield
+        except Exception as e:
+            rate_limited = is_rate_limit_error(e)
+            raise
+        finally:
+            self.release(time.monotonic() - started, rate_limited)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Retorna fila, vagas, limite atual e tempo total de espera"""
+        with self._cond:
+            metrics = dict(self.metrics)
+            metrics['queue_depth'] = self.waiting
+            metrics['inflight'] = self.inflight
+            metrics['concurrency_limit'] = round(self.limit, 2)
+        metrics['throttle_time'] = round(metrics['throttle_time'], 3)
+        metrics['avg_throttle_time'] = metrics['throttle_time'] / metrics['throttled'] if metrics['throttled'] else 0
+        return metrics
+
+
+class RateLimiterRegistry:
+    """Um limitador por modelo, compartilhado por todos os agentes do processo"""
+
+    def __init__(self, redis_client=None, limits: Dict[str, Dict[str, Any]] = None, queue_timeout: float = 30,
+                 redis_retry_interval: float = 30):
+        self.redis_client = redis_client
+        self.redis_retry_interval = redis_retry_interval
+        self.limits = {**DEFAULT_MODEL_LIMITS, **(limits or {})}
+        self.queue_timeout = queue_timeout
+        self._limiters: Dict[str, ModelRateLimiter] = {}
+        self._lock = threading.Lock()
+
+    def for_model(self, model: str) -> ModelRateLimiter:
+        """Retorna (criando se preciso) o limitador do modelo"""
+        with self._lock:
+            limiter = self._limiters.get(model)
+            if limiter is None:
+                settings = {'redis_retry_interval': self.redis_retry_interval,
+                            **FALLBACK_LIMITS, **self.limits.get(model, {})}
+                limiter = self._limiters[model] = ModelRateLimiter(model, self.redis_client, **settings)
+            return limiter
+
+    def limit_call(self, model: str, tokens: int = 0):
+        return self.for_model(model).limit_call(tokens, self.queue_timeout)
+
+    def alimit_call(self, model: str, tokens: int = 0):
+        return self.for_model(model).alimit_call(tokens, self.queue_timeout)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Métricas de cada modelo"""
+        with self._lock:
+            limiters = dict(self._limiters)
+        return {model: limiter.get_metrics() for model, limiter in limiters.items()}
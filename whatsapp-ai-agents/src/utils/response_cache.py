@@ -0,0 +1,329 @@
+import base64
+import hashlib
+import json
+import logging
+import threading
+import time
+import zlib
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import numpy as np
+from src.utils.text import normalize_text
+
+logger = logging.getLogger(__name__)
+
+
+class HashedNgramEmbedder:
+    """Vetor de n-gramas de caracteres com hashing determinístico (igual em todos os processos)"""
+
+    def __init__(self, dimensions: int = 1024, ngram_range: Tuple[int, int] = (3, 4)):
+        self.dimensions = dimensions
+        self.ngram_range = ngram_range
+
+    def __call__(self, text: str) -> np.ndarray:
+        padded = f" {text} ".encode('utf-8')
+        low, high = self.ngram_range
+        hashes = [
+            zlib.crc32(padded[i:i + n])
+            for n in range(low, high + 1)
+            for i in range(len(padded) - n + 1)
+        ]
+        return np.bincount(np.array(hashes, dtype=np.int64) % self.dimensions,
+                           minlength=self.dimensions).astype(np.float32)
+
+
+class _VectorIndex:
+    """Espelho local dos embeddings de um escopo (modelo + prompt de sistema)"""
+
+    def __init__(self):
+        self.digests: List[str] = []
+        self.matrix: Optional[np.ndarray] = None
+        self.loaded_at = 0.0
+
+    def replace(self, vectors: Dict[str, np.ndarray]):
+        self.digests = list(vectors)
+        self.matrix = np.vstack([vectors[d] for d in self.digests]) if vectors else None
+        self.loaded_at = time.monotonic()
+
+    def add(self, digest: str, vector: np.ndarray):
+        if digest in self.digests:
+            return
+        self.digests.append(digest)
+        row = vector[None, :]
+        self.matrix = row if self.matrix is None else np.vstack([self.matrix, row])
+
+    def remove(self, digest: str):
+        if digest in self.digests:
+            index = self.digests.index(digest)
+            del self.digests[index]
+            self.matrix = np.delete(self.matrix, index, axis=0) if self.digests else None
+
+    def search(self, vector: np.ndarray) -> Tuple[Optional[str], float]:
+        if self.matrix is None:
+            return None, 0.0
+        similarities = self.matrix @ vector
+        best = int(similarities.argmax())
+        return self.digests[best], float(similarities[best])
+
+
+class ResponseCache:
+    """Cache de respostas dos agentes compartilhado via Redis: camada exata + camada semântica opcional
+
+    A chave exata é modelo + prompt de sistema + última mensagem do usuário normalizada.
+    Com semantic_threshold > 0, mensagens diferentes cujo embedding tenha similaridade
+    de cosseno acima do limiar reaproveitam a resposta mais próxima.
+    """
+
+    def __init__(self, redis_client, ttl: int = 3600, max_entries: int = 5000,
+                 semantic_threshold: float = 0.0, embedder: Callable[[str], np.ndarray] = None,
+                 refresh_interval: float = 30, prefix: str = 'cache:response'):
+        self.redis_client = redis_client
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self.semantic_threshold = semantic_threshold
+        self.embedder = embedder or HashedNgramEmbedder()
+        self.refresh_interval = refresh_interval
+        self.prefix = prefix
+        self.index_key = f"{prefix}:index"
+        self._indexes: Dict[str, _VectorIndex] = {}
+        self._lock = threading.Lock()
+        self.metrics: Dict[str, Any] = {
+            'exact_hits': 0,
+            'semantic_hits': 0,
+            'misses': 0,
+            'stores': 0,
+            'evictions': 0,
+            'errors': 0,
+            'latency_saved': 0.0
+        }
+
+    @property
+    def semantic_enabled(self) -> bool:
+        return self.semantic_threshold > 0
+
+    # Chaves
+
+    @staticmethod
+    def _lookup_text(messages: List[Dict[str, str]]) -> Tuple[str, str]:
+        """Retorna (prompt de sistema, última mensagem do usuário normalizada)"""
+        system_prompt = ''
+        if messages and messages[0].get('role') == 'system':
+            system_prompt = messages[0].get('content') or ''
+        for message in reversed(messages):
+            if message.get('role') == 'user':
+                return system_prompt, normalize_text(message.get('content') or '')
+        return system_prompt, ''
+
+    def _keys(self, model: str, messages: List[Dict[str, str]]) -> Optional[Tuple[str, str, str]]:
+        """Retorna (escopo, digest, texto normalizado) ou None se não houver mensagem do usuário"""
+        system_prompt, text = self._lookup_text(messages)
+        if not text:
+            return None
+        scope = hashlib.sha256(f"{model}\0{system_prompt}".encode('utf-8')).hexdigest()[:16]
+        digest = hashlib.sha256(f"{scope}\0{text}".encode('utf-8')).hexdigest()[:32]
+        return scope, digest, text
+
+    def _entry_key(self, digest: str) -> str:
+        return f"{self.prefix}:{digest}"
+
+    def _vectors_key(self, scope: str) -> str:
+        return f"{self.prefix}:vectors:{scope}"
+
+    # Embeddings
+
+    def _embed(self, text: str) -> np.ndarray:
+        vector = np.asarray(self.embedder(text), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    @staticmethod
+    def _encode_vector(vector: np.ndarray) -> str:
+        return base64.b64encode(vector.astype(np.float16).tobytes()).decode('ascii')
+
+    @staticmethod
+    def _decode_vector(data) -> np.ndarray:
+        return np.frombuffer(base64.b64decode(data), dtype=np.float16).astype(np.float32)
+
+    def _index_for_locked(self, scope: str) -> _VectorIndex:
+        index = self._indexes.get(scope)
+        if index is None:
+            index = self._indexes[scope] = _VectorIndex()
+        return index
+
+    def _index_for(self, scope: str) -> _VectorIndex:
+        with self._lock:
+            return self._index_for_locked(scope)
+
+    def _needs_refresh(self, index: _VectorIndex) -> bool:
+        return time.monotonic() - index.loaded_at >= self.refresh_interval
+
+    def _load_index(self, index: _VectorIndex, raw: Dict[Any, Any]):
+        vectors = {}
+        for digest, data in raw.items():
+            digest = digest.decode() if isinstance(digest, bytes) else digest
+            vectors[digest] = self._decode_vector(data)
+        with self._lock:
+            index.replace(vectors)
+
+    def _semantic_candidate(self, index: _VectorIndex, vector: np.ndarray) -> Optional[str]:
+        with self._lock:
+            digest, similarity = index.search(vector)
+        return digest if digest and similarity >= self.semantic_threshold else None
+
+    # Leitura e escrita
+
+    def _decode_entry(self, raw, tier: str) -> Optional[str]:
+        if raw is None:
+            return None
+        entry = json.loads(raw)
+        with self._lock:
+            self.metrics[f'{tier}_hits'] += 1
+            self.metrics['latency_saved'] += entry.get('latency', 0.0)
+        return entry['response']
+
+    def _entry_payload(self, response: str, latency: float) -> str:
+        return json.dumps({'response': response, 'latency': latency, 'created_at': time.time()})
+
+    def _evicted(self, popped) -> List[Tuple[str, str]]:
+        """Converte membros removidos do índice em (escopo, digest)"""
+        members = [m.decode() if isinstance(m, bytes) else m for m, _ in popped]
+        with self._lock:
+            self.metrics['evictions'] += len(members)
+        return [tuple(member.split(':', 1)) for member in members]
+
+    def get(self, model: str, messages: List[Dict[str, str]]) -> Optional[str]:
+        """Retorna a resposta em cache para a conversa ou None"""
+        keys = self._keys(model, messages)
+        if keys is None:
+            return None
+        scope, digest, text = keys
+        try:
+            response = self._decode_entry(self.redis_client.get(self._entry_key(digest)), 'exact')
+            if response is None and self.semantic_enabled:
+                index = self._index_for(scope)
+                if self._needs_refresh(index):
+                    self._load_index(index, self.redis_client.hgetall(self._vectors_key(scope)))
+                candidate = self._semantic_candidate(index, self._embed(text))
+                if candidate:
+                    response = self._decode_entry(self.redis_client.get(self._entry_key(candidate)), 'semantic')
+                    if response is None:
+                        # Entrada expirada: remover o embedding órfão
+                        with self._lock:
+                            index.remove(candidate)
+                        self.redis_client.hdel(self._vectors_key(scope), candidate)
+        except Exception as e:
+            logger.error(f"Erro ao consultar cache de respostas: {e}")
+            self._incr('errors')
+            return None
+        if response is None:
+            self._incr('misses')
+        return response
+
+    def set(self, model: str, messages: List[Dict[str, str]], response: str, latency: float = 0.0):
+        """Armazena a resposta gerada para a conversa"""
+        keys = self._keys(model, messages)
+        if keys is None or not response:
+            return
+        scope, digest, text = keys
+        try:
+            pipe = self.redis_client.pipeline()
+            pipe.set(self._entry_key(digest), self._entry_payload(response, latency), ex=self.ttl)
+            pipe.zadd(self.index_key, {f"{scope}:{digest}": time.time()})
+            vector = None
+            if self.semantic_enabled:
+                vector = self._embed(text)
+                pipe.hset(self._vectors_key(scope), digest, self._encode_vector(vector))
+            pipe.zcard(self.index_key)
+            size = pipe.execute()[-1]
+            if size > self.max_entries:
+                self._evict_pipeline(self.redis_client.zpopmin(self.index_key, size - self.max_entries)).execute()
+            if vector is not None:
+                with self._lock:
+                    self._index_for_locked(scope).add(digest, vector)
+            self._incr('stores')
+        except Exception as e:
+            logger.error(f"Erro ao gravar cache de respostas: {e}")
+            self._incr('errors')
+
+    def _evict_pipeline(self, popped):
+        """Pipeline que apaga as entradas mais antigas removidas do índice"""
+        pipe = self.redis_client.pipeline()
+        for scope, digest in self._evicted(popped):
+            pipe.delete(self._entry_key(digest))
+            pipe.hdel(self._vectors_key(scope), digest)
+            self._forget(scope, digest)
+        return pipe
+
+    async def aget(self, model: str, messages: List[Dict[str, str]]) -> Optional[str]:
+        """Versão assíncrona de get (cliente redis.asyncio)"""
+        keys = self._keys(model, messages)
+        if keys is None:
+            return None
+        scope, digest, text = keys
+        try:
+            response = self._decode_entry(await self.redis_client.get(self._entry_key(digest)), 'exact')
+            if response is None and self.semantic_enabled:
+                index = self._index_for(scope)
+                if self._needs_refresh(index):
+                    self._load_index(index, await self.redis_client.hgetall(self._vectors_key(scope)))
+                candidate = self._semantic_candidate(index, self._embed(text))
+                if candidate:
+                    response = self._decode_entry(await self.redis_client.get(self._entry_key(candidate)), 'semantic')
+                    if response is None:
+                        with self._lock:
+                            index.remove(candidate)
+                        await self.redis_client.hdel(self._vectors_key(scope), candidate)
+        except Exception as e:
+            logger.error(f"Erro ao consultar cache de respostas: {e}")
+            self._incr('errors')
+            return None
+        if response is None:
+            self._incr('misses')
+        return response
+
+    async def aset(self, model: str, messages: List[Dict[str, str]], response: str, latency: float = 0.0):
+        """Versão assíncrona de set (cliente redis.asyncio)"""
+        keys = self._keys(model, messages)
+        if keys is None or not response:
+            return
+        scope, digest, text = keys
+        try:
+            pipe = self.redis_client.pipeline()
+            pipe.set(self._entry_key(digest), self._entry_payload(response, latency), ex=self.ttl)
+            pipe.zadd(self.index_key, {f"{scope}:{digest}": time.time()})
+            vector = None
+            if self.semantic_enabled:
+                vector = self._embed(text)
+                pipe.hset(self._vectors_key(scope), digest, self._encode_vector(vector))
+            pipe.zcard(self.index_key)
+            size = (await pipe.execute())[-1]
+            if size > self.max_entries:
+                popped = await self.redis_client.zpopmin(self.index_key, size - self.max_entries)
+                await self._evict_pipeline(popped).execute()
+            if vector is not None:
+                with self._lock:
+                    self._index_for_locked(scope).add(digest, vector)
+            self._incr('stores')
+        except Exception as e:
+            logger.error(f"Erro ao gravar cache de respostas: {e}")
+            self._incr('errors')
+
+    def _forget(self, scope: str, digest: str):
+        with self._lock:
+            index = self._indexes.get(scope)
+            if index is not None:
+                index.remove(digest)
+
+    def _incr(self, name: str):
+        with self._lock:
+            self.metrics[name] += 1
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Retorna acertos por camada, erros e tempo de geração economizado"""
+        with self._lock:
+            metrics = dict(self.metrics)
+        hits = metrics['exact_hits'] + metrics['semantic_hits']
+        lookups = hits + metrics['misses']
+        metrics['hit_rate'] = hits / lookups if lookups else 0
+        metrics['latency_saved'] = round(metrics['latency_saved'], 3)
+        metrics['semantic_enabled'] = self.semantic_enabled
+        return metrics
@@ -0,0 +1,71 @@
+import re
+from typing import AsyncIterable, AsyncIterator, Iterable, Iterator, List, Optional
+
+# Fim de frase: pontuação final (e aspas/parênteses de fechamento) seguida de espaço
+_SENTENCE_END = re.compile(r'[.!?…]+["\')\]]*\s')
+
+
+class SentenceChunker:
+    """Agrupa tokens em mensagens completas, cortando em parágrafos ou fins de frase"""
+
+    def __init__(self, min_chars: int = 80, max_chars: int = 1000):
+        # Frases mais curtas que min_chars são agrupadas com as seguintes;
+        # sem fim de frase, o texto é cortado no último espaço antes de max_chars
+        self.min_chars = min_chars
+        self.max_chars = max(max_chars, min_chars + 1)
+        self._buffer = ''
+
+    def _find_cut(self) -> Optional[int]:
+        buffer = self._buffer
+        paragraph = buffer.find('\n\n')
+        if paragraph != -1 and paragraph <= self.max_chars:
+            return paragraph + 2
+        if len(buffer) >= self.min_chars:
+            for match in _SENTENCE_END.finditer(buffer, self.min_chars - 1):
+                if match.end() <= self.max_chars:
+                    return match.end()
+                break
+        if len(buffer) > self.max_chars:
+            space = buffer.rfind(' ', 0, self.max_chars)
+            return space + 1 if space > 0 else self.max_chars
+        return None
+
+    def feed(self, token: str) -> List[str]:
+        """Adiciona um token e retorna as mensagens que ficaram completas"""
+        self._buffer += token
+        chunks = []
+        while True:
+            cut = self._find_cut()
+            if cut is None:
+                return chunks
+            chunk = self._buffer[:cut].strip()
+            self._buffer = self._buffer[cut:].lstrip()
+            if chunk:
+                chunks.append(chunk)
+
+    def flush(self) -> Optional[str]:
+        """Retorna o texto restante ao final do stream"""
+        chunk = self._buffer.strip()
+        self._buffer = ''
+        return chunk or None
+
+
+def chunk_stream(tokens: Iterable[str], min_chars: int = 80, max_chars: int = 1000) -> Iterator[str]:
+    """Converte um stream de tokens em um stream de mensagens"""
+    chunker = SentenceChunker(min_chars, max_chars)
+    for token in tokens:
+        yield from chunker.feed(token)
+    rest = chunker.flush()
+    if rest:
+        yield rest
+
+
+async def achunk_stream(tokens: AsyncIterable[str], min_chars: int = 80, max_chars: int = 1000) -> AsyncIterator[str]:
+    """Versão assíncrona de chunk_stream"""
+    chunker = SentenceChunker(min_chars, max_chars)
+    async for token in tokens:
+        for chunk in chunker.feed(token):
+            yield chunk
+    rest = chunker.flush()
+    if rest:
+        yield rest
@@ -0,0 +1,199 @@
+import asyncio
+import copy
+import logging
+import threading
+import uuid
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from src.utils.lru_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = 'session:invalidate'
+
+
+def _copy_session(session: Dict[str, Any]) -> Dict[str, Any]:
+    """Cópia em que a sessão, 'data' e os valores de 'data' são independentes (bem mais barata que deepcopy)"""
+    return {**session, 'data': {k: copy.copy(v) for k, v in (session.get('data') or {}).items()}}
+
+
+class SessionNearCache:
+    """Cache local (LRU por processo) de sessões já decodificadas, coerente entre workers
+
+    Leituras passam pelo cache (read-through) e escritas parciais o atualizam (write-through)
+    quando a versão devolvida pelo Redis é a seguinte à da cópia local; senão a cópia é
+    descartada. Toda escrita publica "<origem> <sessão>" em `channel` e os outros processos
+    descartam a cópia local ao receber a mensagem. Enquanto a assinatura do canal não está
+    ativa o cache não é usado, e ele é esvaziado a cada queda, pois invalidações podem ter
+    sido perdidas; `ttl` limita a idade de qualquer cópia.
+    """
+
+    def __init__(self, max_size: int = 1000, ttl: float = 30, channel: str = INVALIDATION_CHANNEL,
+                 retry_interval: float = 1.0):
+        self.cache = LRUCache(max_size=max_size, ttl=ttl)
+        self.channel = channel
+        self.origin = uuid.uuid4().hex
+        self.retry_interval = retry_interval
+        self.listening = False
+        # Leituras em andamento: só são guardadas se nenhuma escrita ou invalidação chegou no meio
+        self._pending: Dict[str, object] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._task: Optional[asyncio.Task] = None
+        self.metrics: Dict[str, Any] = {
+            'bypassed': 0,
+            'write_through': 0,
+            'out_of_order': 0,
+            'remote_invalidations': 0,
+            'subscriptions': 0
+        }
+
+    # Leitura e escrita
+
+    def notify(self, session_id: str) -> Tuple[str, str]:
+        """Canal e mensagem de invalidação publicados junto com a escrita"""
+        return self.channel, f"{self.origin} {session_id}"
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Cópia da sessão em cache, ou None (ausente ou cache fora de uso)"""
+        if not self.listening:
+            with self._lock:
+                self.metrics['bypassed'] += 1
+            return None
+        entry = self.cache.get(session_id)
+        return _copy_session(entry[0]) if entry is not None else None
+
+    def begin_read(self, session_id: str) -> object:
+        """Marca o início de uma leitura no Redis; o token é passado para put"""
+        token = object()
+        with self._lock:
+            self._pending[session_id] = token
+        return token
+
+    def put(self, session_id: str, session: Optional[Dict[str, Any]], version: int, token: object):
+        """Guarda a sessão lida, a menos que ela tenha sido alterada durante a leitura"""
+        with self._lock:
+            if self._pending.get(session_id) is not token:
+                return
+            del self._pending[session_id]
+            if session is not None and self.listening:
+                self.cache.set(session_id, (_copy_session(session), version))
+
+    def apply(self, session_id: str, version: int, mutate: Callable[[Dict[str, Any]], None]):
+        """Aplica à cópia local uma escrita já confirmada no Redis com a versão `version`"""
+        with self._lock:
+            self._pending.pop(session_id, None)
+            entry = self.cache.peek(session_id)
+            if entry is None:
+                return
+            session, cached_version = entry
+            if version != cached_version + 1:
+                # Outra escrita ficou no meio: a cópia local não é mais confiável
+                self.cache.delete(session_id)
+                self.metrics['out_of_order'] += 1
+                return
+            session = _copy_session(session)
+            mutate(session)
+            self.cache.set(session_id, (session, version))
+            self.metrics['write_through'] += 1
+
+    def invalidate(self, session_id: str):
+        """Descarta a cópia local (e leituras em andamento) de uma sessão"""
+        with self._lock:
+            self._pending.pop(session_id, None)
+            self.cache.delete(session_id)
+
+    def on_message(self, message: str):
+        """Invalidação recebida pelo canal; as publicadas por este processo são ignoradas"""
+        origin, _, session_id = message.partition(' ')
+        if origin == self.origin:
+            return
+        with self._lock:
+            self.metrics['remote_invalidations'] += 1
+        self.invalidate(session_id)
+
+    def _set_listening(self, listening: bool):
+        with self._lock:
+            if listening:
+                self.metrics['subscriptions'] += 1
+            else:
+                self._pending.clear()
+                self.cache.clear()
+            self.listening = listening
+
+    # Assinatura do canal de invalidação
+
+    def start(self, redis_client):
+        """Assina o canal de invalidação em uma thread (clientes redis síncronos)"""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._listen, args=(redis_client,),
+                                            name='session-cache', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Encerra a thread de assinatura"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _listen(self, redis_client):
+        while not self._stop.is_set():
+            pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(self.channel)
+                self._set_listening(True)
+                while not self._stop.is_set():
+                    message = pubsub.get_message(timeout=0.5)
+                    if message:
+                        self.on_message(message['data'])
+            except Exception as e:
+                logger.error(f"Erro na assinatura de invalidações de sessão: {e}")
+            finally:
+                self._set_listening(False)
+                pubsub.close()
+            self._stop.wait(self.retry_interval)
+
+    async def astart(self, redis_client):
+        """Assina o canal de invalidação em uma tarefa do loop (clientes redis.asyncio)"""
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._alisten(redis_client))
+
+    async def astop(self):
+        """Cancela a tarefa de assinatura"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _alisten(self, redis_client):
+        while True:
+            pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.channel)
+                self._set_listening(True)
+                while True:
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=0.5)
+                    if message:
+                        self.on_message(message['data'])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Erro na assinatura de invalidações de sessão: {e}")
+            finally:
+                self._set_listening(False)
+                await pubsub.aclose()
+            await asyncio.sleep(self.retry_interval)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Acertos, taxa de acerto, escritas aplicadas localmente e invalidações recebidas"""
+        metrics = self.cache.get_metrics()
+        with self._lock:
+            metrics.update(self.metrics)
+        metrics['listening'] = self.listening
+        return metrics
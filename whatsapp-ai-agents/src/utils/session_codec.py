@@ -0,0 +1,123 @@
+import base64
+import json
+import zlib
+from typing import Any, Callable, Dict, Tuple
+
+try:
+    import msgpack
+except ImportError:  # só JSON
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # só zlib
+    zstandard = None
+
+# Valores codificados com marca começam com '$' (nenhum texto JSON começa assim), seguido da
+# versão do formato, da serialização e da compressão: "$1mz:<base64>". Valores sem marca são
+# JSON puro, como os gravados antes dos codecs, e continuam legíveis com qualquer configuração.
+TAG_PREFIX = '$'
+FORMAT_VERSION = '1'
+
+
+# JSON compacto e com acentos em UTF-8 (o padrão escapa cada caractere acentuado em 6 bytes);
+# um encoder só, já que json.dumps com parâmetros cria um novo a cada chamada
+_JSON_ENCODER = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+
+def _json_dumps(value: Any) -> str:
+    return _JSON_ENCODER.encode(value)
+
+
+def _json_loads(payload: bytes) -> Any:
+    return json.loads(payload)
+
+
+def _msgpack_dumps(value: Any) -> bytes:
+    return msgpack.packb(value, use_bin_type=True)
+
+
+def _msgpack_loads(payload: bytes) -> Any:
+    return msgpack.unpackb(payload, raw=False)
+
+
+def _zstd_compress(payload: bytes) -> bytes:
+    return zstandard.ZstdCompressor().compress(payload)
+
+
+def _zstd_decompress(payload: bytes) -> bytes:
+    return zstandard.ZstdDecompressor().decompress(payload)
+
+
+# nome -> (marca, codificar, decodificar, disponível); para um novo codec basta uma entrada
+SERIALIZERS: Dict[str, Tuple[str, Callable, Callable, bool]] = {
+    'json': ('j', _json_dumps, _json_loads, True),
+    'msgpack': ('m', _msgpack_dumps, _msgpack_loads, msgpack is not None),
+}
+
+COMPRESSORS: Dict[str, Tuple[str, Callable, Callable, bool]] = {
+    'none': ('-', None, None, True),
+    'zlib': ('z', zlib.compress, zlib.decompress, True),
+    'zstd': ('s', _zstd_compress, _zstd_decompress, zstandard is not None),
+}
+
+
+class SessionCodec:
+    """Serialização dos valores de sessão (campos do hash e turnos do histórico) como texto
+
+    Os clientes Redis usam decode_responses=True, então valores binários (MessagePack ou
+    comprimidos) são gravados em base64 atrás de uma marca com a versão do formato. A
+    compressão só é aplicada a valores com pelo menos `threshold` bytes; JSON sem compressão é
+    gravado sem marca. A leitura reconhece qualquer marca, independente da configuração, e os
+    valores passam para o codec configurado à medida que são regravados.
+    """
+
+    def __init__(self, serializer: str = 'json', compression: str = 'none', threshold: int = 1024):
+        self.serializer = self._available(serializer, SERIALIZERS)
+        self.compression = self._available(compression, COMPRESSORS)
+        self.threshold = threshold
+        self._tag, self._dumps, _, _ = SERIALIZERS[self.serializer]
+        self._compression_tag, self._compress, _, _ = COMPRESSORS[self.compression]
+        # Leitura aceita todos os formatos cujas dependências estão instaladas
+        self._decoders = {tag: loads for tag, _, loads, ok in SERIALIZERS.values() if ok}
+        self._decompressors = {tag: decompress for tag, _, decompress, ok in COMPRESSORS.values() if ok}
+
+    @staticmethod
+    def _available(name: str, options: Dict[str, Tuple]) -> str:
+        # Erro na inicialização: um codec configurado e indisponível não cai silenciosamente para outro
+        if name not in options:
+            raise ValueError(f"Codec de sessão desconhecido: {name}")
+        if not options[name][3]:
+            raise ValueError(f"Codec de sessão {name} indisponível: instale a dependência (requirements.txt)")
+        return name
+
+    def encode(self, value: Any) -> str:
+        """Valor -> texto gravado no Redis"""
+        payload = self._dumps(value)
+        compression = '-'
+        if self._compress is not None and len(payload) >= self.threshold:
+            if isinstance(payload, str):
+                payload = payload.encode('utf-8')
+            payload, compression = self._compress(payload), self._compression_tag
+        elif self._tag == 'j':
+            return payload
+        encoded = base64.b64encode(payload).decode('ascii')
+        return f"{TAG_PREFIX}{FORMAT_VERSION}{self._tag}{compression}:{encoded}"
+
+    def decode(self, raw: str) -> Any:
+        """Texto lido do Redis (com ou sem marca) -> valor"""
+        if not raw.startswith(TAG_PREFIX):
+            return json.loads(raw)
+        header, _, encoded = raw.partition(':')
+        if len(header) != 4 or header[1] != FORMAT_VERSION:
+            raise ValueError(f"Formato de sessão não suportado: {header}")
+        loads, decompress = self._decoders.get(header[2]), self._decompressors.get(header[3], False)
+        if loads is None or decompress is False:
+            raise ValueError(f"Formato de sessão não suportado: {header}")
+        payload = base64.b64decode(encoded)
+        if decompress is not None:
+            payload = decompress(payload)
+        return loads(payload)
+
+
+JSON_CODEC = SessionCodec()
@@ -1,14 +1,27 @@
 import redis
-import json
 import logging
-import requests
-from typing import Dict, Any, Optional
+from src.utils.http_client import get_http_client
+from src.utils.session_codec import JSON_CODEC, SessionCodec
+from src.utils.session_schema import (
+    UPDATE_FIELDS_SCRIPT, decode_fields, encode_fields, history_key, is_wrong_type, migrate_history_field,
+    migrate_legacy, replace_history, update_args
+)
+from typing import Dict, Any, List, Optional
 
 class SessionManager:
-    """Gerenciador de sessões para armazenar o estado das conversas"""
+    """Gerenciador de sessões para armazenar o estado das conversas
 
-    def __init__(self, host: str = 'localhost', port: int = 6379, db: int = 0):
+    Os metadados ficam em um hash e o histórico em uma lista própria (session:<número>:history),
+    só com acréscimos e limitada aos últimos max_turns turnos.
+    """
+
+    def __init__(self, host: str = 'localhost', port: int = 6379, db: int = 0,
+                 max_turns: int = 200, history_window: int = 50, codec: SessionCodec = JSON_CODEC):
         self.redis_client = redis.Redis(host=host, port=port, db=db, decode_responses=True)
+        self._update_script = self.redis_client.register_script(UPDATE_FIELDS_SCRIPT)
+        self.max_turns = max_turns
+        self.history_window = history_window
+        self.codec = codec
         self.logger = logging.getLogger(__name__)
 
     def create_session(self, phone_number: str, initial_data: Dict[str, Any] = None) -> bool:
@@ -25,46 +38,111 @@ class SessionManager:
 
             if initial_data:
                 session_data.update(initial_data)
-
-            self.redis_client.set(f"session:{phone_number}", json.dumps(session_data))
+            history = session_data.pop('conversation_history') or []
+
+            # Um campo do hash por atributo: atualizações gravam só o que mudou
+            with self.redis_client.pipeline(transaction=True) as pipe:
+                pipe.delete(f"session:{phone_number}")
+                pipe.hset(f"session:{phone_number}", mapping=encode_fields(session_data, self.codec))
+                replace_history(pipe, f"session:{phone_number}", history, max_turns=self.max_turns, codec=self.codec)
+                pipe.execute()
             self.logger.info(f"Sessão criada para {phone_number}")
             return True
         except Exception as e:
             self.logger.error(f"Erro ao criar sessão para {phone_number}: {e}")
             return False
 
-    def get_session(self, phone_number: str) -> Optional[Dict[str, Any]]:
-        """Recupera os dados da sessão de um número de telefone"""
+    def _call(self, phone_number: str, operation):
+        """Executa a operação; sessões ainda gravadas como string JSON são migradas para hash"""
         try:
-            session_data = self.redis_client.get(f"session:{phone_number}")
+            return operation()
+        except redis.ResponseError as e:
+            key = f"session:{phone_number}"
+            if is_wrong_type(e) and migrate_legacy(self.redis_client, key, nested=False, codec=self.codec):
+                return operation()
+            raise
+
+    def get_session(self, phone_number: str, last_n: int = None) -> Optional[Dict[str, Any]]:
+        """Recupera os dados da sessão de um número de telefone com os últimos turnos do histórico"""
+        try:
+            key = f"session:{phone_number}"
+
+            def read():
+                with self.redis_client.pipeline(transaction=True) as pipe:
+                    pipe.hgetall(key)
+                    pipe.lrange(history_key(key), -(last_n or self.history_window), -1)
+                    return pipe.execute()
+            session_data, turns = self._call(phone_number, read)
+            if 'conversation_history' in session_data:
+                # Histórico ainda dentro do hash: passa para a lista própria
+                with self.redis_client.pipeline(transaction=True) as pipe:
+                    migrate_history_field(pipe, key, session_data, 'conversation_history', self.max_turns,
+                                          codec=self.codec)
+                    pipe.execute()
+                session_data, turns = read()
             if session_data:
-                return json.loads(session_data)
+                session = decode_fields(session_data, self.codec)
+                session['conversation_history'] = [self.codec.decode(t) for t in turns]
+                return session
             return None
         except Exception as e:
             self.logger.error(f"Erro ao recuperar sessão para {phone_number}: {e}")
             return None
 
-    def update_session(self, phone_number: str, data: Dict[str, Any]) -> bool:
-        """Atualiza os dados da sessão de um número de telefone"""
+    def get_history(self, phone_number: str, last_n: int = 10) -> List[Dict[str, Any]]:
+        """Últimos last_n turnos do histórico, sem ler os metadados da sessão"""
         try:
-            session_data = self.get_session(phone_number)
-            if not session_data:
-                return self.create_session(phone_number, data)
+            turns = self.redis_client.lrange(history_key(f"session:{phone_number}"), -last_n, -1)
+            return [self.codec.decode(t) for t in turns]
+        except Exception as e:
+            self.logger.error(f"Erro ao recuperar histórico para {phone_number}: {e}")
+            return []
+
+    def _write(self, phone_number: str, data: Dict[str, Any], turns: List[Dict[str, Any]] = ()) -> bool:
+        # Atualização atômica em uma ida ao servidor (0 = sessão não existe)
+        key = f"session:{phone_number}"
+        args = update_args(0, {**data, 'last_activity': self._get_timestamp()}, turns=turns,
+                           max_turns=self.max_turns, codec=self.codec)
+        return bool(self._call(phone_number, lambda: self._update_script(keys=[key, history_key(key)], args=args)))
+
+    def update_session(self, phone_number: str, data: Dict[str, Any]) -> bool:
+        """Atualiza os dados da sessão de um número de telefone (só os campos informados)
 
-            session_data.update(data)
-            session_data['last_activity'] = self._get_timestamp()
+        'conversation_history', se informado, substitui o histórico inteiro; para acrescentar
+        turnos use append_turn.
+        """
+        try:
+            data = dict(data)
+            history = data.pop('conversation_history', None)
+            if not self._write(phone_number, data):
+                return self.create_session(phone_number, {**data, 'conversation_history': history or []})
+            if history is not None:
+                with self.redis_client.pipeline(transaction=True) as pipe:
+                    replace_history(pipe, f"session:{phone_number}", history, max_turns=self.max_turns,
+                                    codec=self.codec)
+                    pipe.execute()
 
-            self.redis_client.set(f"session:{phone_number}", json.dumps(session_data))
             self.logger.info(f"Sessão atualizada para {phone_number}")
             return True
         except Exception as e:
             self.logger.error(f"Erro ao atualizar sessão para {phone_number}: {e}")
             return False
 
+    def append_turn(self, phone_number: str, turns: List[Dict[str, Any]]) -> bool:
+        """Acrescenta turnos ao fim do histórico (custo constante, qualquer que seja o tamanho da conversa)"""
+        try:
+            if not self._write(phone_number, {}, turns):
+                return self.create_session(phone_number, {'conversation_history': list(turns)})
+            return True
+        except Exception as e:
+            self.logger.error(f"Erro ao adicionar turno para {phone_number}: {e}")
+            return False
+
     def delete_session(self, phone_number: str) -> bool:
         """Deleta a sessão de um número de telefone"""
         try:
-            result = self.redis_client.delete(f"session:{phone_number}")
+            key = f"session:{phone_number}"
+            result = self.redis_client.delete(key, history_key(key))
             if result:
                 self.logger.info(f"Sessão deletada para {phone_number}")
                 return True
@@ -89,6 +167,7 @@ class ChatwootClient:
             'Content-Type': 'application/json'
         }
         self.logger = logging.getLogger(__name__)
+        self.http = get_http_client(self.base_url)
 
     def send_message(self, inbox_id: int, contact_identifier: str, message: str) -> Optional[Dict[str, Any]]:       
         """Envia uma mensagem através da API do Chatwoot"""
@@ -99,7 +178,7 @@ class ChatwootClient:
                 "body": message
             }
 
-            response = requests.post(url, headers=self.headers, json=payload)
+            response = self.http.post(url, headers=self.headers, json=payload)
             response.raise_for_status()
 
             self.logger.info(f"Mensagem enviada para {contact_identifier}")
@@ -112,7 +191,7 @@ class ChatwootClient:
         """Obtém a conversa de um contato específico"""
         try:
             url = f"{self.base_url}/api/v1/inboxes/{inbox_id}/contacts/{contact_identifier}/conversations"
-            response = requests.get(url, headers=self.headers)
+            response = self.http.get(url, headers=self.headers)
             response.raise_for_status()
 
             return response.json()
@@ -0,0 +1,247 @@
+import copy
+import json
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from src.utils.session_codec import JSON_CODEC, SessionCodec
+
+logger = logging.getLogger(__name__)
+
+# Campos de session['data'] ficam no mesmo hash, com este prefixo
+DATA_PREFIX = 'data:'
+
+# Contador incrementado a cada escrita parcial; usado pelo cache local para ordenar escritas
+VERSION_FIELD = '_version'
+
+# Total de turnos já acrescentados ao histórico (inclui os que saíram da lista pelo limite)
+HISTORY_LENGTH_FIELD = 'history_length'
+
+# Grava uma sessão existente em uma só ida ao servidor. ARGV: TTL (0 = sem TTL), canal e
+# mensagem de invalidação (canal vazio = não publica), limite da lista de histórico
+# (0 = sem limite), n + n campos a remover, m + m turnos codificados a acrescentar ao fim da lista
+# KEYS[2] e, por fim, pares campo/valor. Retorna a nova versão da sessão, ou 0 sem tocar em
+# nada se a sessão não existe.
+UPDATE_FIELDS_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then return 0 end
+local i = 5
+local removed = tonumber(ARGV[i])
+if removed > 0 then redis.call('HDEL', KEYS[1], unpack(ARGV, i + 1, i + removed)) end
+i = i + removed + 1
+local turns = tonumber(ARGV[i])
+if turns > 0 then
+    local length = redis.call('RPUSH', KEYS[2], unpack(ARGV, i + 1, i + turns))
+    local cap = tonumber(ARGV[4])
+    if cap > 0 and length > cap then redis.call('LTRIM', KEYS[2], -cap, -1) end
+    redis.call('HINCRBY', KEYS[1], 'history_length', turns)
+end
+i = i + turns + 1
+if #ARGV >= i then redis.call('HSET', KEYS[1], unpack(ARGV, i)) end
+local version = redis.call('HINCRBY', KEYS[1], '_version', 1)
+local ttl = tonumber(ARGV[1])
+if ttl > 0 then
+    redis.call('EXPIRE', KEYS[1], ttl)
+    redis.call('EXPIRE', KEYS[2], ttl)
+end
+if ARGV[2] ~= '' then redis.call('PUBLISH', ARGV[2], ARGV[3]) end
+return version
+"""
+
+
+def history_key(key: str) -> str:
+    """Chave da lista com o histórico da sessão `key` (só acréscimos, limitada)"""
+    return f"{key}:history"
+
+
+def encode_fields(values: Dict[str, Any], codec: SessionCodec = JSON_CODEC) -> Dict[str, str]:
+    """Serializa cada campo separadamente para HSET (contadores ficam como inteiros, para o HINCRBY)"""
+    return {field: str(value) if field == HISTORY_LENGTH_FIELD else codec.encode(value)
+            for field, value in values.items()}
+
+
+def decode_fields(raw: Dict[str, str], codec: SessionCodec = JSON_CODEC) -> Dict[str, Any]:
+    """Inverso de encode_fields (resultado de HGETALL/HMGET)"""
+    return {field: codec.decode(value) for field, value in raw.items()
+            if value is not None and field != VERSION_FIELD}
+
+
+def flatten_session(session: Dict[str, Any], codec: SessionCodec = JSON_CODEC) -> Dict[str, str]:
+    """Sessão do orquestrador -> campos do hash ('data' vira um campo por chave)"""
+    fields = {k: v for k, v in session.items() if k != 'data'}
+    fields.update({f"{DATA_PREFIX}{k}": v for k, v in (session.get('data') or {}).items()})
+    return encode_fields(fields, codec)
+
+
+def unflatten_session(raw: Dict[str, str], codec: SessionCodec = JSON_CODEC) -> Optional[Dict[str, Any]]:
+    """Campos do hash -> sessão do orquestrador (None se o hash não existe)"""
+    if not raw:
+        return None
+    session: Dict[str, Any] = {'data': {}}
+    for field, value in decode_fields(raw, codec).items():
+        if field.startswith(DATA_PREFIX):
+            session['data'][field[len(DATA_PREFIX):]] = value
+        else:
+            session[field] = value
+    return session
+
+
+def update_args(ttl: int, fields: Dict[str, Any], removed: Iterable[str] = (),
+                notify: Tuple[str, str] = ('', ''), turns: List[Dict[str, Any]] = (),
+                max_turns: int = 0, codec: SessionCodec = JSON_CODEC) -> List[Any]:
+    """Argumentos de UPDATE_FIELDS_SCRIPT (notify = canal e mensagem de invalidação)"""
+    removed = list(removed)
+    args: List[Any] = [ttl or 0, *notify, max_turns or 0, len(removed), *removed, len(turns)]
+    args.extend(codec.encode(turn) for turn in turns)
+    for field, value in encode_fields(fields, codec).items():
+        args.extend((field, value))
+    return args
+
+
+def replace_history(pipe, key: str, turns: List[Dict[str, Any]], covered: int = 0,
+                    max_turns: int = 0, ttl: int = 0, codec: SessionCodec = JSON_CODEC):
+    """Enfileira em `pipe` a troca da lista de histórico inteira (criação, regravação e migração)
+
+    `covered` é quantos turnos anteriores a `turns` já saíram do histórico (resumidos).
+    """
+    kept = turns[-max_turns:] if max_turns else turns
+    pipe.delete(history_key(key))
+    if kept:
+        pipe.rpush(history_key(key), *(codec.encode(turn) for turn in kept))
+        if ttl:
+            pipe.expire(history_key(key), ttl)
+    pipe.hset(key, HISTORY_LENGTH_FIELD, covered + len(turns))
+
+
+def summary_covered(session: Dict[str, Any]) -> int:
+    """Quantos turnos do início da conversa o resumo do histórico já incorpora"""
+    return ((session.get('data') or {}).get('history_summary') or {}).get('covered', 0)
+
+
+def unread_turns(raw: Dict[str, str], loaded: int, window: int, codec: SessionCodec = JSON_CODEC) -> int:
+    """Turnos ainda não resumidos que ficaram antes da janela lida (para uma segunda leitura)"""
+    if not window or loaded < window or not raw.get(HISTORY_LENGTH_FIELD):
+        return 0
+    summary_field = f"{DATA_PREFIX}history_summary"
+    summary = (codec.decode(raw[summary_field]) if raw.get(summary_field) else None) or {}
+    return max(0, int(raw[HISTORY_LENGTH_FIELD]) - summary.get('covered', 0) - loaded)
+
+
+def attach_history(session: Dict[str, Any], turns: List[Dict[str, Any]]):
+    """Coloca em data['conversation_history'] os turnos ainda não resumidos
+
+    O histórico em memória começa sempre no turno `covered` do resumo, para que new_turns saiba
+    o que ainda não foi gravado e o HistoryManager resuma os turnos antigos antes de descartá-los.
+    Só turnos que a lista já descartou pelo limite (e não podem mais ser resumidos) são dados
+    como cobertos sem passar pelo resumo.
+    """
+    total = session.get(HISTORY_LENGTH_FIELD, 0)
+    live = max(0, total - summary_covered(session))
+    turns = turns[-live:] if live else []
+    if total - len(turns) > summary_covered(session):
+        logger.warning(f"{total - len(turns) - summary_covered(session)} turnos da sessão "
+                       f"{session.get('session_id')} saíram da lista antes de serem resumidos")
+        summary = dict(session['data'].get('history_summary') or {'content': '', 'tokens': 0})
+        summary['covered'] = total - len(turns)
+        session['data']['history_summary'] = summary
+    session['data']['conversation_history'] = turns
+
+
+def new_turns(session: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Turnos de data['conversation_history'] acrescentados depois da leitura da sessão"""
+    history = (session.get('data') or {}).get('conversation_history') or []
+    return history[max(0, session.get(HISTORY_LENGTH_FIELD, 0) - summary_covered(session)):]
+
+
+def session_version(raw: Dict[str, str]) -> int:
+    """Versão de uma sessão lida com HGETALL (0 se nunca teve escrita parcial)"""
+    return int(raw.get(VERSION_FIELD) or 0)
+
+
+def apply_fields(session: Dict[str, Any], fields: Dict[str, Any], removed: Iterable[str] = ()):
+    """Aplica a uma sessão já decodificada a mesma escrita parcial feita no hash"""
+    data = session.setdefault('data', {})
+    for field in removed:
+        if field.startswith(DATA_PREFIX):
+            data.pop(field[len(DATA_PREFIX):], None)
+        else:
+            session.pop(field, None)
+    for field, value in fields.items():
+        if field.startswith(DATA_PREFIX):
+            data[field[len(DATA_PREFIX):]] = copy.copy(value)
+        else:
+            session[field] = copy.copy(value)
+
+
+def data_fields(keys: Iterable[str]) -> list:
+    """Nomes dos campos do hash para chaves de session['data']"""
+    return [f"{DATA_PREFIX}{key}" for key in keys]
+
+
+def is_wrong_type(error: Exception) -> bool:
+    """Erro de tipo do Redis: a chave ainda está no formato antigo (string JSON)"""
+    return 'WRONGTYPE' in str(error)
+
+
+def _legacy_fields(value: Optional[str], nested: bool, codec: SessionCodec):
+    if value is None:
+        return None, [], 0
+    session = json.loads(value)
+    if nested:
+        data = session.get('data') or {}
+        turns = data.pop('conversation_history', None) or []
+        return flatten_session(session, codec), turns, summary_covered(session)
+    turns = session.pop('conversation_history', None) or []
+    return encode_fields(session, codec), turns, 0
+
+
+def migrate_history_field(pipe, key: str, raw: Dict[str, str], field: str, max_turns: int = 0, ttl: int = 0,
+                          codec: SessionCodec = JSON_CODEC):
+    """Enfileira a passagem do histórico guardado no campo `field` do hash para a lista"""
+    summary_field = f"{DATA_PREFIX}history_summary"
+    summary = (codec.decode(raw[summary_field]) if raw.get(summary_field) else None) or {}
+    pipe.hdel(key, field)
+    replace_history(pipe, key, codec.decode(raw[field]) or [], summary.get('covered', 0), max_turns, ttl, codec)
+
+
+def migrate_legacy(redis_client, key: str, nested: bool = True, codec: SessionCodec = JSON_CODEC) -> bool:
+    """Converte uma sessão gravada como string JSON para o formato em hash, mantendo o TTL"""
+    with redis_client.pipeline(transaction=False) as pipe:
+        pipe.type(key)
+        pipe.get(key)
+        pipe.pttl(key)
+        # GET falha com WRONGTYPE se a chave já foi migrada; o TYPE decide
+        key_type, value, ttl = pipe.execute(raise_on_error=False)
+    if key_type != 'string':
+        return False
+    fields, turns, covered = _legacy_fields(value, nested, codec)
+    with redis_client.pipeline(transaction=True) as pipe:
+        _enqueue_migration(pipe, key, fields, turns, covered, ttl, codec)
+        pipe.execute()
+    logger.info(f"Sessão {key} migrada para o formato em hash")
+    return True
+
+
+async def amigrate_legacy(redis_client, key: str, nested: bool = True, codec: SessionCodec = JSON_CODEC) -> bool:
+    """Versão assíncrona de migrate_legacy"""
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.type(key)
+        pipe.get(key)
+        pipe.pttl(key)
+        key_type, value, ttl = await pipe.execute(raise_on_error=False)
+    if key_type != 'string':
+        return False
+    fields, turns, covered = _legacy_fields(value, nested, codec)
+    async with redis_client.pipeline(transaction=True) as pipe:
+        _enqueue_migration(pipe, key, fields, turns, covered, ttl, codec)
+        await pipe.execute()
+    logger.info(f"Sessão {key} migrada para o formato em hash")
+    return True
+
+
+def _enqueue_migration(pipe, key: str, fields, turns, covered: int, ttl, codec: SessionCodec):
+    pipe.delete(key)
+    if fields:
+        pipe.hset(key, mapping=fields)
+        replace_history(pipe, key, turns, covered, codec=codec)
+        if ttl and ttl > 0:
+            pipe.pexpire(key, ttl)
+            pipe.pexpire(history_key(key), ttl)
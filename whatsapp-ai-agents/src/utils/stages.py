@@ -0,0 +1,48 @@
+import asyncio
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict
+
+
+@contextmanager
+def timed_stage(metrics, stage: str):
+    """Mede a duração de um estágio do pipeline e registra no MetricsCollector (se houver)"""
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        if metrics is not None:
+            metrics.record_stage(stage, time.monotonic() - started)
+
+
+async def run_stages(stages: Dict[str, Callable[[], Awaitable[Any]]],
+                     cpu_stages: Dict[str, Callable[[], Any]] = None, metrics=None) -> Dict[str, Any]:
+    """Executa estágios independentes ao mesmo tempo e junta os resultados antes do próximo passo
+
+    Os estágios de I/O (`stages`) viram tarefas e enviam suas requisições primeiro; os estágios
+    de CPU (`cpu_stages`) rodam no próprio loop enquanto as respostas estão a caminho. Cada
+    estágio registra sua duração e 'prefetch' registra o tempo total até a junção.
+    """
+    started = time.monotonic()
+
+    async def timed(stage: str, call: Callable[[], Awaitable[Any]]):
+        with timed_stage(metrics, stage):
+            return await call()
+
+    tasks = {stage: asyncio.ensure_future(timed(stage, call)) for stage, call in stages.items()}
+    try:
+        # Deixa as tarefas chegarem ao primeiro ponto de espera (requisição enviada)
+        await asyncio.sleep(0)
+        results = {}
+        for stage, call in (cpu_stages or {}).items():
+            with timed_stage(metrics, stage):
+                results[stage] = call()
+        for stage, task in tasks.items():
+            results[stage] = await task
+    finally:
+        for task in tasks.values():
+            if not task.done():
+                task.cancel()
+    if metrics is not None:
+        metrics.record_stage('prefetch', time.monotonic() - started)
+    return results
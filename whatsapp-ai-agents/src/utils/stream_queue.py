@@ -0,0 +1,164 @@
+import json
+import logging
+import os
+import socket
+import threading
+from typing import Any, Callable, Dict, Optional
+import redis
+
+logger = logging.getLogger(__name__)
+
+
+class StreamQueue:
+    """Fila durável de mensagens em Redis Streams com grupos de consumidores"""
+
+    def __init__(self, redis_client: redis.Redis, stream: str = 'webhook:incoming',
+                 group: str = 'chatwoot-bot', consumer: str = None, maxlen: int = 100000,
+                 max_deliveries: int = 5, claim_idle_ms: int = 60000):
+        self.redis_client = redis_client
+        self.stream = stream
+        self.group = group
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+        self.maxlen = maxlen
+        self.dead_letter_stream = f"{stream}:dead"
+        self.max_deliveries = max_deliveries
+        self.claim_idle_ms = claim_idle_ms
+        self._lock = threading.Lock()
+        self.metrics: Dict[str, Any] = {
+            'published': 0,
+            'processed': 0,
+            'failed': 0,
+            'reclaimed': 0,
+            'dead_lettered': 0
+        }
+
+    def _incr(self, name: str, amount: int = 1):
+        with self._lock:
+            self.metrics[name] += amount
+
+    def ensure_group(self) -> bool:
+        """Cria o stream e o grupo de consumidores se ainda não existirem"""
+        try:
+            self.redis_client.xgroup_create(self.stream, self.group, id='0', mkstream=True)
+            logger.info(f"Grupo {self.group} criado no stream {self.stream}")
+        except redis.exceptions.ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                logger.error(f"Erro ao criar grupo {self.group}: {e}")
+                return False
+        return True
+
+    def publish(self, data: Dict[str, Any]) -> Optional[str]:
+        """Adiciona uma mensagem ao stream; retorna o ID ou None em caso de erro"""
+        try:
+            message_id = self.redis_client.xadd(
+                self.stream,
+                {'payload': json.dumps(data)},
+                maxlen=self.maxlen,
+                approximate=True
+            )
+            self._incr('published')
+            return message_id
+        except Exception as e:
+            logger.error(f"Erro ao publicar mensagem no stream {self.stream}: {e}")
+            return None
+
+    def _handle(self, message_id: str, fields: Dict[str, str], handler: Callable[[Dict[str, Any]], None]) -> bool:
+        """Processa uma entrada e confirma (XACK) em caso de sucesso"""
+        try:
+            data = json.loads(fields['payload'])
+        except (KeyError, TypeError, ValueError) as e:
+            logger.error(f"Entrada {message_id} inválida no stream {self.stream}: {e}")
+            self._dead_letter(message_id, fields, 'payload inválido')
+            return False
+        try:
+            handler(data)
+        except Exception as e:
+            # Sem XACK: a entrada continua pendente e será retomada por reclaim()
+            logger.error(f"Erro ao processar entrada {message_id}: {e}")
+            self._incr('failed')
+            return False
+        self.redis_client.xack(self.stream, self.group, message_id)
+        self._incr('processed')
+        return True
+
+    def _dead_letter(self, message_id: str, fields: Dict[str, str], reason: str):
+        """Move uma entrada para o stream de mensagens mortas e confirma a original"""
+        pipe = self.redis_client.pipeline()
+        pipe.xadd(self.dead_letter_stream, {**fields, 'original_id': message_id, 'reason': reason})
+        pipe.xack(self.stream, self.group, message_id)
+        pipe.execute()
+        self._incr('dead_lettered')
+        logger.warning(f"Entrada {message_id} movida para {self.dead_letter_stream}: {reason}")
+
+    def consume(self, handler: Callable[[Dict[str, Any]], None], count: int = 10, block_ms: int = 5000) -> int:
+        """Lê novas entradas do grupo e as processa; retorna quantas foram lidas"""
+        response = self.redis_client.xreadgroup(
+            self.group, self.consumer, {self.stream: '>'}, count=count, block=block_ms
+        )
+        total = 0
+        for _, entries in response or []:
+            for message_id, fields in entries:
+                total += 1
+                self._handle(message_id, fields, handler)
+        return total
+
+    def reclaim(self, handler: Callable[[Dict[str, Any]], None], count: int = 10) -> int:
+        """Retoma entradas pendentes há muito tempo (consumidor caiu ou falhou)"""
+        pending = self.redis_client.xpending_range(
+            self.stream, self.group, min='-', max='+', count=count, idle=self.claim_idle_ms
+        )
+        if not pending:
+            return 0
+
+        retry_ids = []
+        for entry in pending:
+            message_id = entry['message_id']
+            if entry['times_delivered'] >= self.max_deliveries:
+                entries = self.redis_client.xrange(self.stream, min=message_id, max=message_id)
+                fields = entries[0][1] if entries else {}
+                self._dead_letter(message_id, fields, f"{entry['times_delivered']} tentativas")
+            else:
+                retry_ids.append(message_id)
+
+        if not retry_ids:
+            return 0
+        claimed = self.redis_client.xclaim(
+            self.stream, self.group, self.consumer, self.claim_idle_ms, retry_ids
+        )
+        for message_id, fields in claimed:
+            if fields is None:
+                # Entrada removida do stream pelo MAXLEN
+                self.redis_client.xack(self.stream, self.group, message_id)
+                continue
+            self._incr('reclaimed')
+            self._handle(message_id, fields, handler)
+        return len(claimed)
+
+    def run(self, handler: Callable[[Dict[str, Any]], None], stop_event: threading.Event,
+            count: int = 10, block_ms: int = 5000):
+        """Loop de consumo até stop_event ser sinalizado"""
+        self.ensure_group()
+        logger.info(f"Consumidor {self.consumer} iniciado no stream {self.stream}")
+        while not stop_event.is_set():
+            try:
+                self.reclaim(handler, count)
+                self.consume(handler, count, block_ms)
+            except redis.exceptions.ConnectionError as e:
+                logger.error(f"Conexão com Redis perdida: {e}")
+                stop_event.wait(1)
+            except Exception as e:
+                logger.error(f"Erro no consumidor {self.consumer}: {e}")
+                stop_event.wait(1)
+        logger.info(f"Consumidor {self.consumer} encerrado")
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Retorna contadores locais, tamanho do stream e entradas pendentes"""
+        with self._lock:
+            metrics = dict(self.metrics)
+        try:
+            metrics['stream_length'] = self.redis_client.xlen(self.stream)
+            metrics['pending'] = self.redis_client.xpending(self.stream, self.group)['pending']
+            metrics['dead_letter_length'] = self.redis_client.xlen(self.dead_letter_stream)
+        except Exception as e:
+            logger.error(f"Erro ao obter métricas do stream {self.stream}: {e}")
+        return metrics
@@ -0,0 +1,19 @@
+import re
+import unicodedata
+
+# Marcas diacríticas combinantes (resultado da decomposição NFKD)
+_COMBINING_MARKS = re.compile('[̀-ͯ᪰-᫿᷀-᷿⃐-⃿︠-︯]')
+
+
+def strip_accents(text: str) -> str:
+    """Remove acentos mantendo as letras base ("técnico" -> "tecnico")"""
+    if text.isascii():
+        return text
+    return _COMBINING_MARKS.sub('', unicodedata.normalize('NFKD', text))
+
+
+def normalize_text(text: str) -> str:
+    """Normaliza texto para comparação: sem acentos, minúsculo e com espaços colapsados"""
+    if not text:
+        return ''
+    return ' '.join(strip_accents(text).lower().split())
@@ -0,0 +1,154 @@
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Marcador usado para encerrar os workers
+_STOP = object()
+
+
+class WorkerPool:
+    """Pool de workers com fila limitada para processamento em background"""
+
+    def __init__(self, handler: Callable[[Any], None], num_workers: int = 8,
+                 max_queue_size: int = 1000, name: str = 'worker'):
+        self.handler = handler
+        self.num_workers = max(1, num_workers)
+        self.max_queue_size = max(1, max_queue_size)
+        self.name = name
+        self._queue: queue.Queue = queue.Queue(maxsize=self.max_queue_size)
+        self._threads = []
+        self._lock = threading.Lock()
+        self._accepting = False
+        self._busy_workers = 0
+        self._wait_times = deque(maxlen=1000)
+        self.metrics: Dict[str, Any] = {
+            'submitted': 0,
+            'processed': 0,
+            'failed': 0,
+            'rejected': 0,
+            'max_wait_time': 0.0
+        }
+
+    def start(self):
+        """Inicia as threads do pool"""
+        with self._lock:
+            if self._accepting:
+                return
+            self._accepting = True
+            for i in range(self.num_workers):
+                thread = threading.Thread(
+                    target=self._worker_loop,
+                    name=f"{self.name}-{i}",
+                    daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+        logger.info(f"Pool {self.name} iniciado com {self.num_workers} workers (fila: {self.max_queue_size})")
+
+    def submit(self, item: Any) -> bool:
+        """Enfileira um item; retorna False se o pool estiver cheio ou encerrado"""
+        if not self._accepting:
+            with self._lock:
+                self.metrics['rejected'] += 1
+            return False
+        try:
+            self._queue.put_nowait((time.monotonic(), item))
+        except queue.Full:
+            with self._lock:
+                self.metrics['rejected'] += 1
+            logger.warning(f"Fila do pool {self.name} cheia, item rejeitado")
+            return False
+        with self._lock:
+            self.metrics['submitted'] += 1
+        return True
+
+    def _worker_loop(self):
+        """Consome itens da fila até receber o sinal de parada"""
+        while True:
+            entry = self._queue.get()
+            try:
+                if entry is _STOP:
+                    return
+                enqueued_at, item = entry
+                wait_time = time.monotonic() - enqueued_at
+                with self._lock:
+                    self._busy_workers += 1
+                    self._wait_times.append(wait_time)
+                    if wait_time > self.metrics['max_wait_time']:
+                        self.metrics['max_wait_time'] = wait_time
+                try:
+                    self.handler(item)
+                    with self._lock:
+                        self.metrics['processed'] += 1
+                except Exception as e:
+                    logger.error(f"Erro no worker do pool {self.name}: {e}")
+                    with self._lock:
+                        self.metrics['failed'] += 1
+                finally:
+                    with self._lock:
+                        self._busy_workers -= 1
+            finally:
+                self._queue.task_done()
+
+    def shutdown(self, timeout: Optional[float] = 30.0) -> bool:
+        """Para de aceitar itens, drena a fila e encerra os workers"""
+        with self._lock:
+            if not self._accepting and not self._threads:
+                return True
+            self._accepting = False
+            threads = list(self._threads)
+            self._threads = []
+
+        logger.info(f"Encerrando pool {self.name} ({self._queue.qsize()} itens pendentes)")
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        # Os sinais de parada entram depois dos itens pendentes, então a fila é drenada antes
+        for _ in threads:
+            while True:
+                try:
+                    remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+                    self._queue.put(_STOP, timeout=remaining)
+                    break
+                except queue.Full:
+                    logger.warning(f"Tempo esgotado ao drenar o pool {self.name}")
+                    return False
+
+        drained = True
+        for thread in threads:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            thread.join(remaining)
+            if thread.is_alive():
+                drained = False
+
+        if drained:
+            logger.info(f"Pool {self.name} encerrado")
+        else:
+            logger.warning(f"Pool {self.name} encerrado com itens ainda em processamento")
+        return drained
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Retorna profundidade da fila, tempos de espera e contadores"""
+        with self._lock:
+            metrics = dict(self.metrics)
+            wait_times = sorted(self._wait_times)
+            busy_workers = self._busy_workers
+
+        metrics.update({
+            'queue_depth': self._queue.qsize(),
+            'max_queue_size': self.max_queue_size,
+            'workers': self.num_workers,
+            'busy_workers': busy_workers,
+            'accepting': self._accepting
+        })
+        if wait_times:
+            metrics['avg_wait_time'] = sum(wait_times) / len(wait_times)
+            metrics['p95_wait_time'] = wait_times[min(len(wait_times) - 1, int(len(wait_times) * 0.95))]
+        else:
+            metrics['avg_wait_time'] = 0
+            metrics['p95_wait_time'] = 0
+        return metrics
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Testes do pipeline assíncrono de mensagens
+"""
+
+import sys
+import os
+import asyncio
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from src.orchestrator.orchestrator import AgentOrchestrator
+from src.orchestrator.specialized_agents import TechnicalSupportAgent, FinancialAgent
+from src.agents.customer_service_agent import CustomerServiceAgent
+
+
+class EchoAgent(CustomerServiceAgent):
+    """Agente de teste que não chama a API OpenAI"""
+
+    async def agenerate_response(self, messages, temperature=0.7):
+        await asyncio.sleep(0.05)
+        return f"eco: {messages[-1]['content']}"
+
+
+def _build_orchestrator():
+    orchestrator = AgentOrchestrator()
+    orchestrator.register_agent("customer_service", EchoAgent("customer_service"))
+    orchestrator.register_agent("technical_support", TechnicalSupportAgent("technical_support"))
+    orchestrator.register_agent("financial", FinancialAgent("financial"))
+    return orchestrator
+
+
+def test_async_agent_response_updates_context():
+    """A resposta assíncrona usa e atualiza o histórico do contexto"""
+    orchestrator = _build_orchestrator()
+    context = {}
+
+    agent_id = orchestrator.select_agent("Olá, preciso de ajuda")
+    response = asyncio.run(orchestrator.aget_agent_response(agent_id, "Olá, preciso de ajuda", "u1", context))
+
+    assert agent_id == "customer_service"
+    assert response == "eco: Olá, preciso de ajuda"
+    assert [turn['role'] for turn in context['conversation_history']] == ['user', 'assistant']
+
+
+def test_async_pipeline_runs_conversations_concurrently():
+    """Muitas conversas esperando o LLM não ocupam uma thread cada"""
+    orchestrator = _build_orchestrator()
+
+    async def run():
+        return await asyncio.gather(*[
+            orchestrator.aget_agent_response("customer_service", f"msg {i}", f"user_{i}", {})
+            for i in range(200)
+        ])
+
+    loop = asyncio.new_event_loop()
+    try:
+        start = loop.time()
+        responses = loop.run_until_complete(run())
+        elapsed = loop.time() - start
+    finally:
+        loop.close()
+
+    assert responses[10] == "eco: msg 10"
+    # 200 chamadas de 50ms em série levariam 10s
+    assert elapsed < 2
+
+
+def test_specialized_agent_accepts_text():
+    """Agentes especializados respondem a texto simples via orquestrador"""
+    orchestrator = _build_orchestrator()
+    response = orchestrator.get_agent_response("financial", "Quero meu reembolso", "u2")
+    assert "reembolso" in response
+
+
+def test_context_does_not_override_message():
+    """Uma chave 'content' no contexto não substitui a mensagem do usuário"""
+    orchestrator = _build_orchestrator()
+    response = orchestrator.get_agent_response("financial", "Quero meu reembolso", "u3", {'content': 'olá'})
+    assert "reembolso" in response
+
+
+def test_in_memory_contexts_are_bounded():
+    """Sem sessão informada, o orquestrador guarda o contexto só dos usuários mais recentes"""
+    orchestrator = AgentOrchestrator(context_cache_size=2)
+    orchestrator.register_agent("financial", FinancialAgent("financial"))
+    for user_id in ("u1", "u2", "u3"):
+        orchestrator.get_agent_response("financial", "Quero meu reembolso", user_id)
+    assert len(orchestrator.active_sessions) == 2
+    assert orchestrator.active_sessions.peek("u1") is None
+    assert orchestrator.active_sessions.peek("u3") == {'user_id': 'u3'}
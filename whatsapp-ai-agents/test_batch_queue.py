@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Testes do modo em lote (mensagens fora do horário de atendimento)
+"""
+
+import sys
+import os
+import json
+import itertools
+from datetime import datetime
+from types import SimpleNamespace
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from src.utils.batch_queue import BatchQueue, is_business_hours
+from src.orchestrator.orchestrator import AgentOrchestrator
+from src.agents.customer_service_agent import CustomerServiceAgent
+from src.orchestrator.specialized_agents import FinancialAgent
+
+fakeredis = pytest.importorskip('fakeredis')
+
+
+class LocalBatchAPI:
+    """Substituto local das APIs de arquivos e batch da OpenAI"""
+
+    def __init__(self, fail_ids=(), status='completed'):
+        self.fail_ids = set(fail_ids)
+        self.status = status
+        self.uploads = {}
+        self.jobs = {}
+        self._ids = itertools.count(1)
+        self.files = SimpleNamespace(create=self._create_file, content=self._content)
+        self.batches = SimpleNamespace(create=self._create_batch, retrieve=self._retrieve)
+
+    def _create_file(self, file, purpose):
+        assert purpose == 'batch'
+        file_id = f"file-{next(self._ids)}"
+        self.uploads[file_id] = file[1].decode('utf-8')
+        return SimpleNamespace(id=file_id)
+
+    def _create_batch(self, input_file_id, endpoint, completion_window):
+        batch_id = f"batch-{next(self._ids)}"
+        lines = []
+        for line in self.uploads[input_file_id].splitlines():
+            request = json.loads(line)
+            assert request['url'] == endpoint
+            if request['custom_id'] in self.fail_ids:
+                lines.append({'custom_id': request['custom_id'], 'response': None,
+                              'error': {'code': 'server_error'}})
+                continue
+            question = request['body']['messages'][-1]['content']
+            body = {'choices': [{'message': {'role': 'assistant', 'content': f"Resposta: {question}"}}]}
+            lines.append({'custom_id': request['custom_id'], 'response': {'status_code': 200, 'body': body},
+                          'error': None})
+        output_id = f"file-{next(self._ids)}"
+        self.uploads[output_id] = '\n'.join(json.dumps(line) for line in lines)
+        self.jobs[batch_id] = SimpleNamespace(id=batch_id, status='in_progress', output_file_id=output_id)
+        return self.jobs[batch_id]
+
+    def finish(self):
+        for job in self.jobs.values():
+            job.status = self.status
+
+    def _retrieve(self, batch_id):
+        return self.jobs[batch_id]
+
+    def _content(self, file_id):
+        return SimpleNamespace(text=self.uploads[file_id])
+
+
+def _request(message, request_id=None):
+    request = {'agent_id': 'customer_service', 'user_id': 'u1', 'conversation_id': 7, 'message': message,
+               'model': 'gpt-3.5-turbo', 'messages': [{'role': 'user', 'content': message}], 'temperature': 0.7}
+    if request_id:
+        request['id'] = request_id
+    return request
+
+
+def test_business_hours():
+    """Segunda a sexta, das 9h às 18h"""
+    assert is_business_hours(datetime(2024, 5, 6, 9, 0))
+    assert is_business_hours(datetime(2024, 5, 10, 17, 59))
+    assert not is_business_hours(datetime(2024, 5, 6, 18, 0))
+    assert not is_business_hours(datetime(2024, 5, 7, 3, 30))
+    assert not is_business_hours(datetime(2024, 5, 11, 12, 0))
+
+
+def test_submit_and_deliver():
+    """Requisições pendentes viram um único job e as respostas são entregues ao concluir"""
+    api = LocalBatchAPI()
+    queue = BatchQueue(fakeredis.FakeRedis(decode_responses=True), api)
+    for text in ['Qual o prazo de entrega?', 'Vocês abrem sábado?']:
+        assert queue.enqueue(_request(text))
+
+    batch_id = queue.submit()
+    assert batch_id is not None
+    assert queue.submit() is None
+    delivered = []
+    assert queue.poll(lambda request, response: delivered.append(response)) == 0
+
+    api.finish()
+    assert queue.poll(lambda request, response: delivered.append((request['conversation_id'], response))) == 2
+    assert delivered == [(7, 'Resposta: Qual o prazo de entrega?'), (7, 'Resposta: Vocês abrem sábado?')]
+    metrics = queue.get_metrics()
+    assert metrics['batches_submitted'] == 1
+    assert metrics['delivered'] == 2
+    assert metrics['pending'] == 0
+    assert metrics['jobs_in_progress'] == 0
+
+
+def test_failed_lines_are_requeued_until_max_attempts():
+    """Linhas com erro voltam para a fila e são descartadas após max_attempts"""
+    api = LocalBatchAPI(fail_ids={'r2'})
+    queue = BatchQueue(fakeredis.FakeRedis(decode_responses=True), api, max_attempts=2)
+    queue.enqueue(_request('primeira', 'r1'))
+    queue.enqueue(_request('segunda', 'r2'))
+    delivered = []
+
+    queue.submit()
+    api.finish()
+    assert queue.poll(lambda request, response: delivered.append(request['id'])) == 1
+    assert queue.get_metrics()['pending'] == 1
+
+    queue.submit()
+    api.finish()
+    assert queue.poll(lambda request, response: delivered.append(request['id'])) == 0
+    metrics = queue.get_metrics()
+    assert delivered == ['r1']
+    assert metrics['requeued'] == 1
+    assert metrics['failed'] == 1
+    assert metrics['pending'] == 0
+
+
+def test_expired_job_requeues_all():
+    """Jobs expirados devolvem todas as requisições à fila"""
+    api = LocalBatchAPI(status='expired')
+    queue = BatchQueue(fakeredis.FakeRedis(decode_responses=True), api)
+    queue.enqueue(_request('oi'))
+    queue.submit()
+    api.finish()
+    assert queue.poll(lambda request, response: None) == 0
+    assert queue.get_metrics()['pending'] == 1
+
+
+def test_submit_error_keeps_requests():
+    """Falha ao enviar o job mantém as requisições na fila, na ordem original"""
+    client = fakeredis.FakeRedis(decode_responses=True)
+
+    def broken(**kwargs):
+        raise ConnectionError("API indisponível")
+
+    api = SimpleNamespace(files=SimpleNamespace(create=broken))
+    queue = BatchQueue(client, api)
+    queue.enqueue(_request('a', 'r1'))
+    queue.enqueue(_request('b', 'r2'))
+    assert queue.submit() is None
+    assert [json.loads(item)['id'] for item in client.lrange(queue.pending_key, 0, -1)] == ['r1', 'r2']
+    assert queue.get_metrics()['submit_errors'] == 1
+
+
+def test_failed_delivery_is_retried_with_the_generated_response():
+    """Falha ao entregar (ex.: erro no Chatwoot) não perde a resposta: ela é reentregue sem novo job"""
+    api = LocalBatchAPI()
+    queue = BatchQueue(fakeredis.FakeRedis(decode_responses=True), api, max_attempts=3)
+    queue.enqueue(_request('Qual o prazo de entrega?', 'r1'))
+    queue.enqueue(_request('Vocês abrem sábado?', 'r2'))
+    queue.submit()
+    api.finish()
+    delivered, failures = [], {'r1': 1, 'r2': 5}
+
+    def handler(request, response):
+        if failures[request['id']]:
+            failures[request['id']] -= 1
+            raise RuntimeError("Chatwoot indisponível")
+        delivered.append((request['id'], response))
+
+    assert queue.poll(handler) == 0
+    assert queue.get_metrics()['awaiting_delivery'] == 2
+    assert queue.poll(handler) == 1
+    assert delivered == [('r1', 'Resposta: Qual o prazo de entrega?')]
+    assert queue.poll(handler) == 0
+    metrics = queue.get_metrics()
+    assert len(api.jobs) == 1
+    assert metrics['delivered'] == 1
+    assert metrics['delivery_retries'] == 3
+    assert metrics['failed'] == 1
+    assert metrics['awaiting_delivery'] == 0
+    assert metrics['pending'] == 0
+
+
+def test_orchestrator_batch_requests_update_history():
+    """O orquestrador monta o prompt do agente e registra a resposta em lote no histórico"""
+    orchestrator = AgentOrchestrator()
+    orchestrator.register_agent('customer_service', CustomerServiceAgent('customer_service'))
+    orchestrator.register_agent('financial', FinancialAgent('financial'))
+    context = {}
+
+    assert orchestrator.prepare_batch_request('financial', 'boleto', 'u1', context) is None
+    request = orchestrator.prepare_batch_request('customer_service', 'Qual o horário?', 'u1', context)
+    assert request['model'] == 'gpt-3.5-turbo'
+    assert request['messages'][0]['role'] == 'system'
+    assert request['messages'][-1] == {'role': 'user', 'content': 'Qual o horário?'}
+
+    assert orchestrator.complete_batch_request(request, 'Das 9h às 18h.', context) == 'Das 9h às 18h.'
+    assert [t['content'] for t in context['conversation_history']] == ['Qual o horário?', 'Das 9h às 18h.']
+
+
+def test_batch_turns_reach_the_webhook_process_history(monkeypatch, fake_redis):
+    """O turno entregue pelo worker de lote (outro processo) entra no histórico do processo do webhook"""
+    from src.config.config import Config
+    from src.utils.llm_client import LLMClientRegistry
+
+    # src.main valida a configuração ao ser importado
+    for name in ('OPENAI_API_KEY', 'CHATWOOT_API_KEY', 'CHATWOOT_ACCOUNT_ID', 'CHATWOOT_BASE_URL'):
+        monkeypatch.setattr(Config, name, getattr(Config, name) or 'teste')
+    from src.main import ChatwootBot
+
+    monkeypatch.setattr('src.utils.llm_client._registry', LLMClientRegistry(api_key='sk-test'))
+    monkeypatch.setattr(Config, 'BATCH_MODE_ENABLED', True)
+    monkeypatch.setattr('src.main.is_business_hours', lambda **kwargs: True)
+    webhook, worker = ChatwootBot(Config), ChatwootBot(Config)
+    prompts = []
+
+    def generate_response(messages, temperature=0.7):
+        prompts.append([m['content'] for m in messages if m['role'] != 'system'])
+        return 'Resposta do modelo'
+
+    for bot in (webhook, worker):
+        bot.chatwoot_client.send_message = lambda conversation_id, message: {'id': 1}
+    webhook.orchestrator.agents['customer_service'].generate_response = generate_response
+
+    request = webhook.orchestrator.prepare_batch_request('customer_service', 'Quero mudar meu endereço', 3)
+    request['conversation_id'] = 42
+    worker.deliver_batch_response(request, 'Claro! Qual o novo endereço?')
+    assert worker.orchestrator.active_sessions.get(3) is None
+
+    webhook.handle_message({'message': {'content': 'Rua das Flores, 10'},
+                            'conversation': {'id': 42}, 'contact': {'id': 3, 'name': 'Ana'}})
+    assert prompts == [['Quero mudar meu endereço', 'Claro! Qual o novo endereço?', 'Rua das Flores, 10']]
+    assert webhook.batch_queue.pop_turns(3) == []
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Testes da corrida entre chamadas concorrentes (hedge, prazo e cancelamento)
+"""
+
+import sys
+import os
+import asyncio
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from src.utils.race import CallRace
+
+
+def _slow(value, delay):
+    def call():
+        time.sleep(delay)
+        return value
+    return call
+
+
+def test_backup_starts_only_after_delay():
+    """A reserva só é iniciada se nada terminar no prazo; o primeiro resultado aceito vence"""
+    race = CallRace(max_workers=4)
+    backups = []
+    fast = race.run({'a': _slow('a', 0.0)}, accept=lambda key, result: True,
+                    backups={'b': _slow('b', 0.0)}, backup_after=0.5, on_backup=lambda: backups.append(1))
+    assert (fast.winner, fast.launched, backups) == ('a', 1, [])
+
+    hedged = race.run({'a': _slow('a', 0.5)}, accept=lambda key, result: True,
+                      backups={'b': _slow('b', 0.0)}, backup_after=0.05, on_backup=lambda: backups.append(1))
+    assert (hedged.winner, hedged.result, hedged.launched, hedged.unfinished) == ('b', 'b', 2, 1)
+    assert backups == [1]
+    race.shutdown()
+    # Depois do shutdown as threads são recriadas sob demanda
+    assert race.run({'a': _slow('a', 0.0)}, accept=lambda key, result: True).winner == 'a'
+    race.shutdown()
+
+
+def test_errors_rejections_and_timeout():
+    """Erros e resultados rejeitados não encerram a corrida; o prazo encerra sem vencedor"""
+    race = CallRace(max_workers=4)
+    errors = []
+
+    def failing():
+        raise RuntimeError("falhou")
+
+    outcome = race.run({'erro': failing, 'ruim': _slow('ruim', 0.01), 'lento': _slow('lento', 1)},
+                       accept=lambda key, result: result != 'ruim',
+                       on_error=lambda key, error: errors.append(key), timeout=0.1)
+    assert (outcome.winner, outcome.unfinished) == (None, 1)
+    assert errors == ['erro']
+    race.shutdown()
+
+
+def test_async_losers_are_cancelled():
+    """Na versão assíncrona as chamadas restantes são canceladas"""
+    cancelled = []
+
+    async def call(value, delay):
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            cancelled.append(value)
+            raise
+        return value
+
+    async def run():
+        outcome = await CallRace().arun({'lento': lambda: call('lento', 5), 'rápido': lambda: call('rápido', 0.01)},
+                                        accept=lambda key, result: True)
+        await asyncio.sleep(0)
+        return outcome
+
+    outcome = asyncio.run(run())
+    assert (outcome.winner, outcome.unfinished) == ('rápido', 1)
+    assert cancelled == ['lento']
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Testes do agrupamento de rajadas e da ordem por conversa
+"""
+
+import sys
+import os
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from src.utils.conversation_coalescer import ConversationCoalescer
+from src.utils.worker_pool import WorkerPool
+
+
+def _message(conversation_id, content):
+    return {'message': {'content': content}, 'conversation': {'id': conversation_id}}
+
+
+def _pipeline(handler, window=0.05, max_wait=1.0):
+    holder = {}
+    coalescer = ConversationCoalescer(lambda data: holder['pool'].submit(data), window=window, max_wait=max_wait)
+    pool = WorkerPool(coalescer.wrap(handler), num_workers=4, max_queue_size=100, name='test')
+    holder['pool'] = pool
+    pool.start()
+    coalescer.start()
+    return coalescer, pool
+
+
+def test_burst_becomes_single_turn():
+    """Uma rajada dentro da janela gera um único turno com o texto combinado"""
+    turns = []
+    coalescer, pool = _pipeline(turns.append)
+
+    for text in ['oi', 'tudo bem?', 'preciso da 2ª via do boleto']:
+        coalescer.add(_message(1, text))
+    time.sleep(0.3)
+    coalescer.shutdown()
+    pool.shutdown(timeout=5)
+
+    assert len(turns) == 1
+    assert turns[0]['message']['content'] == 'oi\ntudo bem?\npreciso da 2ª via do boleto'
+    assert coalescer.get_metrics()['messages_coalesced'] == 2
+
+
+def test_turns_are_serialized_per_conversation():
+    """Mensagens que chegam durante um turno esperam o fim dele e mantêm a ordem"""
+    active = {}
+    overlaps = []
+    order = []
+    lock = threading.Lock()
+
+    def handler(data):
+        conversation_id = data['conversation']['id']
+        with lock:
+            if active.get(conversation_id):
+                overlaps.append(conversation_id)
+            active[conversation_id] = True
+            order.append((conversation_id, data['message']['content']))
+        time.sleep(0.1)
+        with lock:
+            active[conversation_id] = False
+
+    coalescer, pool = _pipeline(handler, window=0.01)
+    coalescer.add(_message(1, 'a'))
+    coalescer.add(_message(2, 'x'))
+    time.sleep(0.05)
+    coalescer.add(_message(1, 'b'))
+    coalescer.add(_message(1, 'c'))
+    time.sleep(0.5)
+    coalescer.shutdown()
+    pool.shutdown(timeout=5)
+
+    assert overlaps == []
+    assert [content for cid, content in order if cid == 1] == ['a', 'b\nc']
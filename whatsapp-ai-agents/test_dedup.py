@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Testes da deduplicação de webhooks
+"""
+
+import sys
+import os
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from src.utils.dedup import BloomFilter, WebhookDeduplicator
+
+
+def _webhook(message_id, conversation_id=10):
+    return {'id': message_id, 'message_type': 'incoming', 'conversation': {'id': conversation_id}}
+
+
+def test_bloom_filter_has_no_false_negatives():
+    """Toda chave adicionada é reconhecida e a taxa de falsos positivos é baixa"""
+    bloom = BloomFilter(capacity=10000, error_rate=0.01)
+    for i in range(5000):
+        bloom.check_and_add(f"seen-{i}")
+    assert all(bloom.check_and_add(f"seen-{i}") for i in range(5000))
+
+    false_positives = sum(bloom.check_and_add(f"new-{i}") for i in range(5000))
+    assert false_positives < 150
+
+
+def test_redis_index_detects_retries():
+    """Reenvios do mesmo webhook são detectados e contados como acertos"""
+    fakeredis = pytest.importorskip('fakeredis')
+    dedup = WebhookDeduplicator(fakeredis.FakeRedis(), ttl=60)
+
+    assert not dedup.is_duplicate(_webhook(1))
+    assert dedup.is_duplicate(_webhook(1))
+    assert not dedup.is_duplicate(_webhook(1, conversation_id=11))
+    assert not dedup.is_duplicate({'message_type': 'incoming'})
+
+    metrics = dedup.get_metrics()
+    assert metrics['hits'] == 1
+    assert metrics['misses'] == 2
+    assert metrics['skipped'] == 1
+
+
+def test_shared_index_across_workers():
+    """Workers com filtros locais distintos compartilham o índice no Redis"""
+    fakeredis = pytest.importorskip('fakeredis')
+    server = fakeredis.FakeServer()
+    worker_a = WebhookDeduplicator(fakeredis.FakeRedis(server=server), ttl=60)
+    worker_b = WebhookDeduplicator(fakeredis.FakeRedis(server=server), ttl=60)
+
+    assert not worker_a.is_duplicate(_webhook(42))
+    assert worker_b.is_duplicate(_webhook(42))
+
+
+class _DownRedis:
+    def set(self, *args, **kwargs):
+        raise ConnectionError('redis indisponível')
+
+    def delete(self, *args):
+        raise ConnectionError('redis indisponível')
+
+
+def test_released_webhook_is_processed_on_retry():
+    """Um webhook que não foi enfileirado (503) é liberado e o reenvio não conta como duplicado"""
+    fakeredis = pytest.importorskip('fakeredis')
+    dedup = WebhookDeduplicator(fakeredis.FakeRedis(), ttl=60)
+    assert not dedup.is_duplicate(_webhook(7))
+    dedup.release(_webhook(7))
+    assert not dedup.is_duplicate(_webhook(7))
+    assert dedup.is_duplicate(_webhook(7))
+
+    # Sem Redis o filtro local decide, e também respeita a liberação
+    offline = WebhookDeduplicator(_DownRedis(), ttl=60)
+    assert not offline.is_duplicate(_webhook(8))
+    offline.release(_webhook(8))
+    assert not offline.is_duplicate(_webhook(8))
+    assert offline.is_duplicate(_webhook(8))
+    assert offline.get_metrics()['released'] == 1
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Testes do histórico com orçamento de tokens e resumo incremental
+"""
+
+import sys
+import os
+import asyncio
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from src.agents.history_manager import HistoryManager
+from src.agents.customer_service_agent import CustomerServiceAgent
+
+
+class RecordingSummarizer:
+    """Resumidor de teste que guarda as requisições recebidas"""
+
+    def __init__(self):
+        self.requests = []
+
+    def __call__(self, messages):
+        self.requests.append(messages[-1]['content'])
+        return f"resumo {len(self.requests)}"
+
+
+def _long_conversation(manager, context, turns=40):
+    for i in range(turns):
+        manager.append_turn(context, f"pergunta número {i} " + "detalhe " * 20, f"resposta número {i} " + "texto " * 20)
+        manager.compact(context)
+
+
+def test_history_stays_within_budget():
+    """O prompt do histórico nunca passa do orçamento, por mais longa que seja a conversa"""
+    summarizer = RecordingSummarizer()
+    manager = HistoryManager('gpt-3.5-turbo', token_budget=400, summarizer=summarizer)
+    context = {}
+    for i in range(40):
+        manager.append_turn(context, f"pergunta número {i} " + "detalhe " * 20, f"resposta número {i} " + "texto " * 20)
+        manager.compact(context)
+        assert manager.history_tokens(context) <= 400
+
+    assert context['conversation_history'][0]['role'] == 'user'
+    assert context['conversation_history'][-1]['content'].startswith("resposta número 39")
+    assert context['history_summary']['covered'] + len(context['conversation_history']) == 80
+
+
+def test_summary_is_incremental():
+    """Cada resumo parte do resumo anterior e recebe apenas as mensagens recém-removidas"""
+    summarizer = RecordingSummarizer()
+    manager = HistoryManager('gpt-3.5-turbo', token_budget=400, summarizer=summarizer)
+    context = {}
+    _long_conversation(manager, context)
+
+    assert len(summarizer.requests) > 2
+    for index, request in enumerate(summarizer.requests[1:], start=1):
+        assert f"Resumo anterior:\nresumo {index}" in request
+    # Nenhuma mensagem é enviada ao resumidor mais de uma vez
+    sent = [line for request in summarizer.requests for line in request.splitlines() if line.startswith('user:')]
+    assert len(sent) == len(set(sent))
+
+
+def test_summarizer_failure_falls_back_to_extract():
+    """Sem o modelo de resumo, as perguntas mais recentes removidas são mantidas de forma resumida"""
+    def failing(messages):
+        raise RuntimeError("API indisponível")
+
+    manager = HistoryManager('gpt-3.5-turbo', token_budget=300, summarizer=failing)
+    context = {}
+    _long_conversation(manager, context, turns=10)
+    assert "pergunta número 8" in context['history_summary']['content']
+    assert manager.history_tokens(context) <= 300
+
+
+def test_agent_prompt_uses_summary_and_plain_messages():
+    """O prompt enviado à API tem o resumo e mensagens sem campos extras"""
+    agent = CustomerServiceAgent('customer_service')
+    agent.configure_history(token_budget=300)
+    agent.summarize = RecordingSummarizer()
+    agent.history.summarizer = agent.summarize
+    context = {}
+    _long_conversation(agent.history, context, turns=10)
+
+    messages = agent.build_messages("nova pergunta", context)
+    assert messages[1]['role'] == 'system' and messages[1]['content'].startswith("Resumo da conversa")
+    assert all(set(m) == {'role', 'content'} for m in messages)
+    assert messages[-1] == {'role': 'user', 'content': 'nova pergunta'}
+
+
+def test_async_record_turn_uses_async_summarizer():
+    """A versão assíncrona resume sem chamar o cliente síncrono"""
+    calls = []
+
+    async def summarizer(messages):
+        calls.append(messages)
+        return "resumo assíncrono"
+
+    manager = HistoryManager('gpt-4', token_budget=300, async_summarizer=summarizer)
+    context = {}
+
+    async def scenario():
+        for i in range(10):
+            manager.append_turn(context, f"pergunta {i} " + "detalhe " * 20, f"resposta {i} " + "texto " * 20)
+            await manager.acompact(context)
+
+    asyncio.run(scenario())
+    assert calls and context['history_summary']['content'] == "resumo assíncrono"
+
+
+def test_summary_runs_after_the_reply():
+    """O agente responde sem chamar o resumidor; o resumo roda no compact, limitado em tokens"""
+    agent = CustomerServiceAgent('customer_service')
+    agent.configure_history(token_budget=300)
+    agent.generate_response = lambda messages, temperature=0.7: "resposta " + "texto " * 20
+    summaries = []
+
+    def summarizer(messages):
+        summaries.append(messages)
+        return "resumo muito longo " * 200
+
+    agent.history.summarizer = summarizer
+    context = {}
+    for i in range(10):
+        agent.process_message(f"pergunta {i} " + "detalhe " * 20, context)
+        # O prompt continua dentro do orçamento enquanto o resumo não roda
+        assert sum(len(m['content']) for m in agent.build_messages("nova", context)[1:-1]) // 4 <= 300
+    assert summaries == []
+
+    agent.compact_history(context)
+    assert len(summaries) == 1
+    assert context['history_summary']['tokens'] <= agent.history.summary_max_tokens()
+    assert agent.history.history_tokens(context) <= 300
+    assert context['history_summary']['covered'] + len(context['conversation_history']) == 20
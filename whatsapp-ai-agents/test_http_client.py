@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Testes do cliente HTTP compartilhado (pool, retentativas e métricas)
+"""
+
+import sys
+import os
+import requests
+from requests.adapters import BaseAdapter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from src.utils.http_client import HttpClient, get_http_client
+
+
+class ScriptedAdapter(BaseAdapter):
+    """Adaptador de transporte que devolve uma sequência fixa de status"""
+
+    def __init__(self, statuses):
+        super().__init__()
+        self.statuses = list(statuses)
+        self.calls = 0
+
+    def send(self, request, **kwargs):
+        self.calls += 1
+        status = self.statuses.pop(0)
+        if isinstance(status, Exception):
+            raise status
+        response = requests.Response()
+        response.status_code = status
+        response.request = request
+        response.url = request.url
+        response._content = b'{}'
+        return response
+
+    def close(self):
+        pass
+
+
+def _client_with(statuses):
+    client = HttpClient(max_retries=3, backoff_factor=0.001)
+    adapter = ScriptedAdapter(statuses)
+    client.session.mount('http://', adapter)
+    return client, adapter
+
+
+def test_get_retries_transient_5xx():
+    """GET é repetido em erros 5xx transitórios"""
+    client, adapter = _client_with([500, 502, 200])
+    response = client.get('http://chatwoot.local/api')
+    assert response.status_code == 200
+    assert adapter.calls == 3
+    assert client.get_metrics()['retries'] == 2
+
+
+def test_post_only_retries_when_not_processed():
+    """POST só é repetido quando o servidor garante que não processou"""
+    client, adapter = _client_with([503, 200])
+    assert client.post('http://chatwoot.local/api', json={}).status_code == 200
+    assert adapter.calls == 2
+
+    client, adapter = _client_with([500, 200])
+    assert client.post('http://chatwoot.local/api', json={}).status_code == 500
+    assert adapter.calls == 1
+
+    client, adapter = _client_with([requests.exceptions.ConnectTimeout(), 200])
+    assert client.post('http://chatwoot.local/api', json={}).status_code == 200
+
+    client, adapter = _client_with([requests.exceptions.ReadTimeout()])
+    try:
+        client.post('http://chatwoot.local/api', json={})
+        assert False, "ReadTimeout em POST não deve ser repetido"
+    except requests.exceptions.ReadTimeout:
+        pass
+    assert client.get_metrics()['errors'] == 1
+
+
+def test_shared_client_per_host():
+    """Clientes do mesmo host compartilham o pool de conexões"""
+    assert get_http_client('https://chat.example.com/') is get_http_client('https://CHAT.example.com/api')
+    assert get_http_client('https://chat.example.com') is not get_http_client('https://other.example.com')
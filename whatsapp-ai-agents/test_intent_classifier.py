@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Testes do classificador de intenções usado como fallback do roteamento
+"""
+
+import sys
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+import numpy as np
+from src.orchestrator import intent_classifier
+from src.orchestrator.intent_classifier import IntentClassifier, SEED_DATA_PATH, train_from_file
+from src.orchestrator.keyword_router import KeywordRouter
+from src.orchestrator.orchestrator import AgentOrchestrator
+from src.orchestrator.specialized_agents import TechnicalSupportAgent, FinancialAgent
+from src.agents.customer_service_agent import CustomerServiceAgent
+
+# Frases fora dos exemplos de treino
+HELD_OUT = [
+    ("boa noite, alguém pode me atender?", 'customer_service'),
+    ("minha entrega atrasou", 'customer_service'),
+    ("vocês vendem pela internet?", 'customer_service'),
+    ("o app trava quando abro", 'technical_support'),
+    ("não consigo entrar na minha conta", 'technical_support'),
+    ("o site dá erro", 'technical_support'),
+    ("cadê meu estorno?", 'financial'),
+    ("preciso pagar a fatura atrasada", 'financial'),
+    ("quero meu dinheiro de volta", 'financial'),
+]
+
+_model = train_from_file(SEED_DATA_PATH)
+
+
+def test_classifier_beats_keyword_routing_on_held_out_phrases():
+    """Mensagens sem palavras-chave são roteadas corretamente pelo classificador"""
+    router = KeywordRouter()
+    keyword_correct = sum((router.route(text) or 'customer_service') == label for text, label in HELD_OUT)
+    model_correct = sum(_model.classify(text)[0] == label for text, label in HELD_OUT)
+    # Limiar em vez de acerto total: o modelo é retreinado a cada ajuste dos exemplos
+    assert model_correct >= 0.8 * len(HELD_OUT)
+    assert model_correct > keyword_correct
+
+
+def test_batch_matches_single_predictions():
+    """O lote vetorizado produz as mesmas probabilidades que mensagens isoladas"""
+    texts = [text for text, _ in HELD_OUT] + ['', 'a']
+    batch = _model.predict_proba(texts)
+    single = np.vstack([_model.predict_proba([text]) for text in texts])
+    assert batch.shape == (len(texts), len(_model.classes))
+    assert np.allclose(batch, single, atol=1e-5)
+
+
+def test_power_tables_grow_safely_across_threads(monkeypatch):
+    """Threads que ampliam o cache de potências ao mesmo tempo sempre recebem tabelas do mesmo tamanho"""
+    monkeypatch.setattr(intent_classifier, '_power_cache', (np.ones(1, dtype=np.uint64), np.ones(1, dtype=np.uint64)))
+    texts = [' '.join(f"mensagem {i} sobre boleto" for _ in range(i)) for i in range(1, 200)]
+    expected = [_model.classify(text)[0] for text in texts]
+    monkeypatch.setattr(intent_classifier, '_power_cache', (np.ones(1, dtype=np.uint64), np.ones(1, dtype=np.uint64)))
+
+    sizes = []
+
+    def check(size):
+        powers, inverse = intent_classifier._powers(size)
+        sizes.append(len(powers) == len(inverse) >= size)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda text: _model.classify(text)[0], texts))
+        list(pool.map(check, range(1, 20000, 97)))
+    assert results == expected
+    assert all(sizes)
+
+
+def test_save_and_load_round_trip():
+    """O artefato salvo reproduz as previsões do modelo original"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'intent_model.npz')
+        _model.save(path)
+        loaded = IntentClassifier.load(path)
+    assert loaded.classes == _model.classes
+    for text, _ in HELD_OUT:
+        assert loaded.classify(text)[0] == _model.classify(text)[0]
+
+
+def test_orchestrator_uses_classifier_only_without_keyword_match():
+    """Palavras-chave continuam tendo prioridade; o classificador cobre o restante"""
+    orchestrator = AgentOrchestrator(intent_classifier=_model)
+    orchestrator.register_agent('customer_service', CustomerServiceAgent('customer_service'))
+    orchestrator.register_agent('technical_support', TechnicalSupportAgent('technical_support'))
+    orchestrator.register_agent('financial', FinancialAgent('financial'))
+
+    assert orchestrator.select_agent("quero meu dinheiro de volta") == 'financial'
+    assert orchestrator.select_agent("preciso de ajuda com o pagamento") == 'customer_service'
+
+    _model.min_confidence = 1.01
+    orchestrator.routing_cache.clear()
+    try:
+        assert orchestrator.select_agent("quero meu dinheiro de volta") == 'customer_service'
+    finally:
+        _model.min_confidence = 0.5
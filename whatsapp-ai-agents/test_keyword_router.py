@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Testes do roteador compilado por palavras-chave
+"""
+
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from src.orchestrator.keyword_router import AhoCorasick, KeywordRouter
+from src.orchestrator.orchestrator import AgentOrchestrator
+from src.orchestrator.specialized_agents import TechnicalSupportAgent, FinancialAgent
+from src.agents.customer_service_agent import CustomerServiceAgent
+
+
+def test_automaton_finds_overlapping_matches():
+    """Todas as ocorrências, inclusive sobrepostas, são encontradas em uma passada"""
+    automaton = AhoCorasick(['he', 'she', 'his', 'hers'])
+    found = sorted((position, automaton.keywords[index]) for position, index in automaton.iter_matches('ushers'))
+    assert found == [(3, 'he'), (3, 'she'), (5, 'hers')]
+
+
+def test_router_keeps_builtin_priority_and_normalizes():
+    """A prioridade original é mantida e acentos/maiúsculas não importam"""
+    router = KeywordRouter()
+    assert router.route("Tenho um PROBLEMA com o pagamento") == 'financial'
+    assert router.route("suporte tecnico") == 'customer_service'
+    assert router.route("Falar com o setor TÉCNICO") == 'technical_support'
+    assert router.route("bom dia") is None
+
+
+def test_custom_rules_are_consulted_and_recompiled():
+    """Regras personalizadas têm prioridade e o autômato é recompilado quando mudam"""
+    orchestrator = AgentOrchestrator()
+    orchestrator.register_agent("customer_service", CustomerServiceAgent("customer_service"))
+    orchestrator.register_agent("technical_support", TechnicalSupportAgent("technical_support"))
+    orchestrator.register_agent("financial", FinancialAgent("financial"))
+
+    message = {"content": "Preciso de ajuda com o boleto"}
+    assert orchestrator.route_request(message) == 'customer_service'
+
+    orchestrator.add_routing_rule("boleto", "financial")
+    assert orchestrator.route_request(message) == 'financial'
+
+    orchestrator.remove_routing_rule("boleto")
+    assert orchestrator.route_request(message) == 'customer_service'
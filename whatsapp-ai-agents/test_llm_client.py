@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Testes do registro de clientes de LLM compartilhados
+"""
+
+import sys
+import os
+import json
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+import openai
+import pytest
+
+from src.utils.llm_client import LLMClientRegistry
+from src.agents.customer_service_agent import CustomerServiceAgent, TechnicalSupportAgent
+
+
+class _ChatHandler(BaseHTTPRequestHandler):
+    """Endpoint /chat/completions compatível com a API da OpenAI"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.connections.add(self.client_address)
+        self.server.models.append(body['model'])
+        payload = json.dumps({
+            'id': 'chatcmpl-local', 'object': 'chat.completion', 'created': 0, 'model': body['model'],
+            'choices': [{'index': 0, 'finish_reason': 'stop',
+                         'message': {'role': 'assistant', 'content': f"eco: {body['messages'][-1]['content']}"}}],
+            'usage': {'prompt_tokens': 1, 'completion_tokens': 1, 'total_tokens': 2}
+        }).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def local_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _ChatHandler)
+    server.connections, server.models = set(), []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+    server.shutdown()
+    server.server_close()
+
+
+def test_agents_share_one_pool_per_base_url():
+    """Agentes do mesmo provedor usam o mesmo transporte; outra base URL tem o próprio pool"""
+    registry = LLMClientRegistry(api_key='sk-test', providers={'local': {'base_url': 'http://127.0.0.1:9/v1/', 'api_key': 'x'}},
+                                 agent_settings={'technical_support': {'provider': 'local'}})
+    a, b, c = CustomerServiceAgent('customer_service'), CustomerServiceAgent('sales'), TechnicalSupportAgent('technical_support')
+    for agent in (a, b, c):
+        registry.configure_agent(agent)
+
+    assert a.openai_client is b.openai_client
+    assert a.openai_client._client is not c.openai_client._client
+    assert registry.get_metrics()['pools'] == ['http://127.0.0.1:9/v1', 'https://api.openai.com/v1']
+    registry.close()
+
+
+def test_per_agent_model_and_timeout():
+    """Modelo e timeout configurados por agente, sem alterar a configuração global do SDK"""
+    api_key_before = openai.api_key
+    registry = LLMClientRegistry(api_key='sk-test', agent_settings={'customer_service': {'model': 'gpt-4', 'timeout': 7}})
+    agent = CustomerServiceAgent('customer_service')
+    registry.configure_agent(agent)
+
+    assert agent.model == 'gpt-4'
+    assert agent.history.token_budget == 3000
+    assert agent.openai_client.timeout == 7
+    assert registry.client().timeout.read == 60
+    assert openai.api_key == api_key_before
+
+
+def test_local_stand_in_reuses_connections(local_server):
+    """Chamadas de agentes diferentes reaproveitam a mesma conexão keep-alive"""
+    server, base_url = local_server
+    registry = LLMClientRegistry(api_key='local', base_url=base_url)
+    agents = [CustomerServiceAgent('customer_service'), TechnicalSupportAgent('technical_support')]
+    for agent in agents:
+        registry.configure_agent(agent)
+
+    for i in range(3):
+        for agent in agents:
+            assert agent.generate_response([{'role': 'user', 'content': f"oi {i}"}]) == f"eco: oi {i}"
+
+    assert server.models == ['gpt-3.5-turbo', 'gpt-4'] * 3
+    assert len(server.connections) == 1
+    registry.close()
+
+
+def test_async_client_against_local_stand_in(local_server):
+    """O cliente assíncrono compartilhado também atende os agentes"""
+    server, base_url = local_server
+    registry = LLMClientRegistry(api_key='local', base_url=base_url)
+    agent = CustomerServiceAgent('customer_service')
+    registry.configure_agent(agent, synchronous=False, asynchronous=True)
+
+    async def run():
+        try:
+            return await asyncio.gather(*[agent.agenerate_response([{'role': 'user', 'content': str(i)}]) for i in range(4)])
+        finally:
+            await registry.aclose()
+
+    assert asyncio.run(run()) == [f"eco: {i}" for i in range(4)]
+    assert agent.openai_client is None
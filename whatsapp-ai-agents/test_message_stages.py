@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Testes dos estágios concorrentes do recebimento de mensagens
+"""
+
+import sys
+import os
+import time
+import asyncio
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+import pytest
+
+from src.utils.stages import run_stages
+from src.orchestrator.metrics import MetricsCollector
+
+
+def test_stages_overlap_and_report_latency():
+    """Estágios de I/O e de CPU correm juntos; cada um registra a própria duração"""
+    metrics = MetricsCollector()
+
+    async def fetch(value):
+        await asyncio.sleep(0.1)
+        return value
+
+    def route():
+        time.sleep(0.1)
+        return 'financial'
+
+    started = time.monotonic()
+    results = asyncio.run(run_stages(
+        {'dedup': lambda: fetch(False), 'session': lambda: fetch({'data': {}})},
+        cpu_stages={'routing': route}, metrics=metrics
+    ))
+    elapsed = time.monotonic() - started
+
+    assert results == {'dedup': False, 'session': {'data': {}}, 'routing': 'financial'}
+    assert elapsed < 0.18
+    stages = metrics.get_stage_latency()
+    assert set(stages) == {'dedup', 'session', 'routing', 'prefetch'}
+    assert stages['session']['count'] == 1
+    assert 0.09 < stages['routing']['p50'] < stages['prefetch']['p50']
+
+
+def test_failed_stage_cancels_the_others():
+    """Um erro na junção cancela os estágios ainda pendentes"""
+    cancelled = []
+
+    async def slow():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append('session')
+            raise
+
+    async def failing():
+        raise RuntimeError('redis fora do ar')
+
+    async def run():
+        with pytest.raises(RuntimeError):
+            await run_stages({'dedup': failing, 'session': slow})
+        await asyncio.sleep(0)
+
+    asyncio.run(run())
+    assert cancelled == ['session']
+
+
+def test_async_bot_drops_duplicates_after_join(monkeypatch):
+    """O bot assíncrono lê sessão e deduplica em paralelo e descarta reenvios antes de criar a sessão"""
+    fakeredis = pytest.importorskip('fakeredis')
+    from src.config.config import Config
+    from src.utils.llm_client import LLMClientRegistry
+    from src.asgi import AsyncChatwootBot
+
+    monkeypatch.setattr('src.utils.llm_client._registry', LLMClientRegistry(api_key='sk-test'))
+    bot = AsyncChatwootBot(Config)
+    redis_client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    bot.sessions.redis_client = redis_client
+    bot.deduplicator.redis_client = redis_client
+    sent, calls = [], []
+
+    async def send_message(conversation_id, message):
+        sent.append((conversation_id, message))
+        return {'id': len(sent)}
+
+    async def agenerate_response(messages, temperature=0.7):
+        calls.append(messages[-1]['content'])
+        return 'Resposta do modelo'
+
+    bot.chatwoot_client.send_message = send_message
+    bot.orchestrator.agents['customer_service'].agenerate_response = agenerate_response
+    webhook = {'id': 7, 'message': {'content': 'Quero mudar meu endereço'},
+               'conversation': {'id': 42}, 'contact': {'id': 3, 'name': 'Ana'}}
+
+    async def run():
+        await bot.process_incoming_message(webhook)
+        await bot.process_incoming_message(webhook)
+        return await bot.sessions.get_session('42')
+
+    session = asyncio.run(run())
+    assert calls == ['Quero mudar meu endereço']
+    assert sent == [(42, 'Resposta do modelo')]
+    assert session['active_agent'] == 'customer_service'
+    assert len(session['data']['conversation_history']) == 2
+    stages = bot.metrics.get_stage_latency()
+    assert stages['dedup']['count'] == 2
+    assert stages['generation']['count'] == 1
+    assert {'session', 'routing', 'prefetch', 'delivery'} <= set(stages)
+    assert bot.deduplicator.get_metrics()['hits'] == 1
+
+    # Reenvio de uma conversa sem sessão: descartado sem criar a sessão
+    resent = {**webhook, 'id': 8, 'conversation': {'id': 43}}
+
+    async def run_resent():
+        await bot.deduplicator.ais_duplicate(resent)
+        await bot.process_incoming_message(resent)
+        return await bot.sessions.get_session('43')
+
+    assert asyncio.run(run_resent()) is None
+    assert bot.deduplicator.get_metrics()['hits'] == 2
+    assert len(sent) == 1
+
+
+@pytest.mark.parametrize('streaming', [False, True])
+def test_async_bot_does_not_save_undelivered_replies(monkeypatch, streaming):
+    """Se o Chatwoot recusa a resposta, ela não conta como sucesso nem entra no histórico da sessão"""
+    fakeredis = pytest.importorskip('fakeredis')
+    from src.config.config import Config
+    from src.utils.llm_client import LLMClientRegistry
+    from src.asgi import AsyncChatwootBot
+
+    monkeypatch.setattr('src.utils.llm_client._registry', LLMClientRegistry(api_key='sk-test'))
+    monkeypatch.setattr(Config, 'RESPONSE_STREAMING_ENABLED', streaming)
+    bot = AsyncChatwootBot(Config)
+    redis_client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    bot.sessions.redis_client = redis_client
+    bot.deduplicator.redis_client = redis_client
+    sent = []
+
+    async def send_message(conversation_id, message):
+        sent.append(message)
+        return None
+
+    async def agenerate_response(messages, temperature=0.7):
+        return 'Resposta do modelo'
+
+    async def astream_response(messages, temperature=0.7):
+        for token in ('Resposta ', 'do modelo. ', 'Mais uma frase.'):
+            yield token
+
+    agent = bot.orchestrator.agents['customer_service']
+    bot.chatwoot_client.send_message = send_message
+    agent.agenerate_response = agenerate_response
+    agent.astream_response = astream_response
+    webhook = {'id': 9, 'message': {'content': 'Quero mudar meu endereço'},
+               'conversation': {'id': 44}, 'contact': {'id': 5, 'name': 'Ana'}}
+
+    async def run():
+        await bot.process_incoming_message(webhook)
+        return await bot.sessions.get_session('44')
+
+    session = asyncio.run(run())
+    assert len(sent) == 1
+    assert session['data']['conversation_history'] == []
+    assert session['active_agent'] is None
+    metrics = bot.metrics.get_agent_metrics('customer_service')
+    assert (metrics['total_requests'], metrics['successful_requests']) == (1, 0)
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Testes do limitador de taxa e concorrência das chamadas à OpenAI
+"""
+
+import sys
+import os
+import asyncio
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+import pytest
+
+from types import SimpleNamespace
+from src.utils.rate_limiter import ModelRateLimiter, RateLimiterRegistry, RateLimitTimeout, limiter_redis_client
+from src.agents.customer_service_agent import CustomerServiceAgent
+
+
+class RateLimitError(Exception):
+    """Erro 429 simulado da API"""
+    status_code = 429
+
+
+def test_aimd_adjusts_concurrency():
+    """429 reduz a concorrência pela metade; sucessos a recuperam aos poucos"""
+    limiter = ModelRateLimiter('gpt-4', max_concurrency=8, cooldown=0)
+    limiter.acquire()
+    limiter.release(0.5, rate_limited=True)
+    assert limiter.limit == 4
+    for _ in range(4):
+        limiter.acquire()
+        limiter.release(0.5)
+    assert 4.5 < limiter.limit < 6
+    for _ in range(10):
+        limiter.acquire()
+        limiter.release(0.5, rate_limited=True)
+    assert limiter.limit == 1
+
+
+def test_slow_responses_reduce_concurrency():
+    """Respostas acima da meta de latência reduzem a concorrência suavemente"""
+    limiter = ModelRateLimiter('gpt-4', max_concurrency=10, latency_target=2, cooldown=0)
+    limiter.acquire()
+    limiter.release(5)
+    assert limiter.limit == 9
+    assert limiter.get_metrics()['slow_responses'] == 1
+
+
+def test_concurrency_limit_queues_callers():
+    """Chamadas acima do limite esperam na fila em vez de falhar"""
+    limiter = ModelRateLimiter('gpt-4', max_concurrency=2)
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    def call():
+        with limiter.limit_call(timeout=5):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.03)
+            with lock:
+                active[0] -= 1
+
+    threads = [threading.Thread(target=call) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    metrics = limiter.get_metrics()
+    assert peak[0] == 2
+    assert metrics['requests'] == 6 and metrics['timeouts'] == 0
+    assert metrics['throttled'] >= 3 and metrics['throttle_time'] > 0
+    assert metrics['queue_depth'] == 0 and metrics['inflight'] == 0
+
+
+def test_deadline_expires_in_queue():
+    """Sem vaga até o prazo, a chamada desiste com RateLimitTimeout"""
+    limiter = ModelRateLimiter('gpt-4', max_concurrency=1)
+    limiter.acquire()
+    with pytest.raises(RateLimitTimeout):
+        limiter.acquire(timeout=0.05)
+    assert limiter.get_metrics()['timeouts'] == 1
+
+
+def test_buckets_are_shared_between_workers_through_redis():
+    """RPM e TPM valem para todos os workers conectados ao mesmo Redis"""
+    fakeredis = pytest.importorskip('fakeredis')
+    server = fakeredis.FakeServer()
+    worker_a = ModelRateLimiter('gpt-4', fakeredis.FakeRedis(server=server), rpm=2, tpm=100000)
+    worker_b = ModelRateLimiter('gpt-4', fakeredis.FakeRedis(server=server), rpm=2, tpm=100000)
+    worker_a.acquire(timeout=0.1)
+    worker_b.acquire(timeout=0.1)
+    with pytest.raises(RateLimitTimeout):
+        worker_a.acquire(timeout=0.1)
+
+    tokens = ModelRateLimiter('gpt-3.5-turbo', fakeredis.FakeRedis(server=server), rpm=1000, tpm=1000)
+    tokens.acquire(tokens=600, timeout=0.1)
+    tokens.release(0.1)
+    with pytest.raises(RateLimitTimeout):
+        tokens.acquire(tokens=600, timeout=0.1)
+
+
+class _DownScript:
+    """Script do balde com o Redis fora do ar"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, **kwargs):
+        self.calls += 1
+        raise ConnectionError('Connection refused')
+
+
+def test_redis_outage_opens_the_breaker(monkeypatch):
+    """Depois de um erro do Redis, as chamadas seguintes usam o balde local sem tentar o Redis"""
+    fakeredis = pytest.importorskip('fakeredis')
+    limiter = ModelRateLimiter('gpt-4', fakeredis.FakeRedis(), redis_retry_interval=0.2)
+    limiter._script = script = _DownScript()
+    for _ in range(5):
+        with limiter.limit_call(timeout=0.1):
+            pass
+    assert script.calls == 1
+    metrics = limiter.get_metrics()
+    assert metrics['redis_errors'] == 1
+    assert metrics['local_bucket_calls'] == 5
+
+    # Passado o intervalo, o Redis volta a ser tentado
+    time.sleep(0.25)
+    limiter.acquire(timeout=0.1)
+    assert script.calls == 2
+
+
+def test_limiter_client_fails_fast():
+    """O cliente do limitador tem timeout curto e não faz novas tentativas"""
+    client = limiter_redis_client('127.0.0.1', 1, timeout=0.1)
+    options = client.connection_pool.connection_kwargs
+    assert options['socket_timeout'] == options['socket_connect_timeout'] == 0.1
+    registry = RateLimiterRegistry(client, redis_retry_interval=60)
+    started = time.monotonic()
+    for _ in range(3):
+        with registry.limit_call('gpt-4'):
+            pass
+    assert time.monotonic() - started < 1
+    assert registry.get_metrics()['gpt-4']['redis_errors'] == 1
+
+
+def test_async_acquire_with_async_redis():
+    """A versão assíncrona usa o cliente redis.asyncio e respeita a concorrência"""
+    fakeredis = pytest.importorskip('fakeredis')
+    import fakeredis.aioredis
+    limiter = ModelRateLimiter('gpt-4', fakeredis.aioredis.FakeRedis(), max_concurrency=1)
+
+    async def call(results):
+        async with limiter.alimit_call(timeout=2):
+            results.append(limiter.inflight)
+            await asyncio.sleep(0.01)
+
+    async def scenario():
+        results = []
+        await asyncio.gather(*(call(results) for _ in range(4)))
+        return results
+
+    assert asyncio.run(scenario()) == [1, 1, 1, 1]
+    assert limiter.get_metrics()['requests'] == 4
+
+
+def test_agent_calls_feed_the_limiter():
+    """Um 429 da API chega ao limitador e o agente responde com a mensagem de erro"""
+    registry = RateLimiterRegistry(limits={'gpt-3.5-turbo': {'max_concurrency': 4}})
+    agent = CustomerServiceAgent('customer_service')
+    agent.enable_rate_limiter(registry)
+
+    def create(model, messages, temperature):
+        raise RateLimitError("Rate limit reached")
+
+    agent.openai_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    assert agent.generate_response([{'role': 'user', 'content': 'oi'}]).startswith("Desculpe")
+    metrics = registry.get_metrics()['gpt-3.5-turbo']
+    assert metrics['rate_limited'] == 1 and metrics['concurrency_limit'] == 2
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Testes do cache de respostas dos agentes
+"""
+
+import sys
+import os
+import asyncio
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+import pytest
+
+fakeredis = pytest.importorskip('fakeredis')
+
+from src.utils.response_cache import ResponseCache
+from src.agents.customer_service_agent import CustomerServiceAgent
+
+
+class CountingAgent(CustomerServiceAgent):
+    """Agente de teste que conta as chamadas à API OpenAI"""
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.calls = 0
+
+        class _Completions:
+            @staticmethod
+            def create(model, messages, temperature):
+                self.calls += 1
+                choice = type('Choice', (), {'message': type('Message', (), {'content': f"resposta {self.calls}"})})
+                return type('Response', (), {'choices': [choice]})
+
+        self.openai_client = type('Client', (), {'chat': type('Chat', (), {'completions': _Completions})})
+
+
+def test_exact_hits_are_shared_between_processes():
+    """Mesma pergunta (normalizada) em outro processo não chama a API novamente"""
+    server = fakeredis.FakeServer()
+    agent_a, agent_b = CountingAgent('customer_service'), CountingAgent('customer_service')
+    agent_a.enable_response_cache(ResponseCache(fakeredis.FakeRedis(server=server, decode_responses=True)))
+    agent_b.enable_response_cache(ResponseCache(fakeredis.FakeRedis(server=server, decode_responses=True)))
+
+    assert agent_a.process_message("Qual o horário de atendimento?") == "resposta 1"
+    assert agent_b.process_message("qual o  horario de atendimento?") == "resposta 1"
+    assert agent_a.calls == 1 and agent_b.calls == 0
+
+    metrics = agent_b.response_cache.get_metrics()
+    assert metrics['exact_hits'] == 1 and metrics['hit_rate'] == 1.0
+
+
+def test_agents_without_opt_in_are_not_cached():
+    """Somente agentes com o cache ativado reaproveitam respostas"""
+    agent = CountingAgent('customer_service')
+    agent.process_message("oi")
+    agent.process_message("oi")
+    assert agent.calls == 2
+
+
+def test_semantic_tier_matches_similar_questions():
+    """Perguntas parecidas acima do limiar reaproveitam a resposta; diferentes não"""
+    cache = ResponseCache(fakeredis.FakeRedis(decode_responses=True), semantic_threshold=0.8)
+    agent = CountingAgent('customer_service')
+    agent.enable_response_cache(cache)
+
+    agent.process_message("como tiro a segunda via do boleto")
+    assert agent.process_message("como tirar segunda via do boleto?") == "resposta 1"
+    assert agent.process_message("quero cancelar meu pedido") == "resposta 2"
+    assert cache.get_metrics()['semantic_hits'] == 1
+
+
+def test_size_limit_evicts_oldest_entries():
+    """Acima de max_entries as respostas mais antigas são removidas"""
+    client = fakeredis.FakeRedis(decode_responses=True)
+    cache = ResponseCache(client, max_entries=2)
+    for question in ("um", "dois", "tres"):
+        cache.set('gpt', [{'role': 'user', 'content': question}], f"r-{question}")
+    assert cache.get('gpt', [{'role': 'user', 'content': 'um'}]) is None
+    assert cache.get('gpt', [{'role': 'user', 'content': 'tres'}]) == 'r-tres'
+    assert client.zcard(cache.index_key) == 2
+    assert cache.get_metrics()['evictions'] == 1
+
+
+def test_async_cache_round_trip():
+    """As versões assíncronas usam o mesmo formato de entrada"""
+    import fakeredis.aioredis
+
+    async def scenario():
+        cache = ResponseCache(fakeredis.aioredis.FakeRedis(decode_responses=True), semantic_threshold=0.8)
+        messages = [{'role': 'system', 'content': 'faq'}, {'role': 'user', 'content': 'segunda via do boleto'}]
+        assert await cache.aget('gpt', messages) is None
+        await cache.aset('gpt', messages, 'acesse o portal', latency=1.5)
+        similar = [messages[0], {'role': 'user', 'content': 'segunda via de boleto'}]
+        return await cache.aget('gpt', messages), await cache.aget('gpt', similar)
+
+    assert asyncio.run(scenario()) == ('acesse o portal', 'acesse o portal')
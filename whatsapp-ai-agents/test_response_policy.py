@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Testes da política de latência dos agentes (SLO, hedge e fallback)
+"""
+
+import sys
+import os
+import asyncio
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from src.agents.customer_service_agent import CustomerServiceAgent
+from src.agents.response_policy import ResponsePolicy
+from src.orchestrator.metrics import MetricsCollector
+
+MESSAGES = [{"role": "user", "content": "Meu roteador não conecta"}]
+
+
+def make_agent(delays, errors=()):
+    """Agente com chamadas simuladas: atraso por modelo e modelos que falham"""
+    agent = CustomerServiceAgent('customer_service')
+    agent.model = 'gpt-4'
+    calls, cancelled = [], []
+
+    def complete(messages, temperature=0.7, model=None):
+        model = model or agent.model
+        calls.append(model)
+        time.sleep(delays.get(model, 0))
+        if model in errors:
+            raise RuntimeError(f"{model} indisponível")
+        return f"resposta de {model}"
+
+    async def acomplete(messages, temperature=0.7, model=None):
+        model = model or agent.model
+        calls.append(model)
+        try:
+            await asyncio.sleep(delays.get(model, 0))
+        except asyncio.CancelledError:
+            cancelled.append(model)
+            raise
+        if model in errors:
+            raise RuntimeError(f"{model} indisponível")
+        return f"resposta de {model}"
+
+    agent._complete = complete
+    agent._acomplete = acomplete
+    return agent, calls, cancelled
+
+
+def make_policy(**kwargs):
+    metrics = MetricsCollector()
+    return ResponsePolicy(metrics=metrics, **kwargs), metrics
+
+
+def test_primary_within_slo_skips_hedge():
+    """Dentro do SLO só o modelo principal é chamado"""
+    agent, calls, _ = make_agent({'gpt-4': 0.01})
+    policy, metrics = make_policy(latency_slo=1, hedge_model='gpt-3.5-turbo')
+    agent.set_response_policy(policy)
+    assert agent.generate_response(MESSAGES) == "resposta de gpt-4"
+    assert calls == ['gpt-4']
+    assert metrics.get_policy_decisions() == {'customer_service': {'primary': 1}}
+
+
+def test_hedge_wins_after_slo():
+    """Passado o SLO o hedge é enviado e a primeira resposta vence"""
+    agent, calls, _ = make_agent({'gpt-4': 0.5, 'gpt-3.5-turbo': 0.01})
+    policy, metrics = make_policy(latency_slo=0.05, hedge_model='gpt-3.5-turbo')
+    agent.set_response_policy(policy)
+    started = time.monotonic()
+    assert agent.generate_response(MESSAGES) == "resposta de gpt-3.5-turbo"
+    assert time.monotonic() - started < 0.4
+    decisions = metrics.get_policy_decisions()['customer_service']
+    assert decisions == {'slo_exceeded': 1, 'hedge_sent': 1, 'hedge_won': 1}
+    policy.shutdown()
+
+
+def test_fallback_chain_on_errors():
+    """Erros seguem a cadeia de fallback em ordem até uma resposta válida"""
+    agent, calls, _ = make_agent({}, errors={'gpt-4', 'gpt-4o-mini'})
+    policy, metrics = make_policy(fallback_models=['gpt-4o-mini', 'gpt-3.5-turbo'])
+    agent.set_response_policy(policy)
+    assert agent.generate_response(MESSAGES) == "resposta de gpt-3.5-turbo"
+    assert calls == ['gpt-4', 'gpt-4o-mini', 'gpt-3.5-turbo']
+    decisions = metrics.get_policy_decisions()['customer_service']
+    assert decisions == {'error': 2, 'fallback': 1}
+
+
+def test_all_models_failing_returns_error_message():
+    """Sem resposta válida o agente mantém a mensagem de erro padrão"""
+    agent, calls, _ = make_agent({}, errors={'gpt-4', 'gpt-3.5-turbo'})
+    policy, _ = make_policy(fallback_models=['gpt-3.5-turbo'])
+    agent.set_response_policy(policy)
+    assert agent.generate_response(MESSAGES).startswith("Desculpe")
+
+
+def test_async_hedge_cancels_loser():
+    """Na versão assíncrona a chamada perdedora é cancelada"""
+    agent, calls, cancelled = make_agent({'gpt-4': 5, 'gpt-3.5-turbo': 0.01})
+    policy, metrics = make_policy(latency_slo=0.05, hedge_model='gpt-3.5-turbo')
+    agent.set_response_policy(policy)
+
+    async def run():
+        result = await agent.agenerate_response(MESSAGES)
+        await asyncio.sleep(0)
+        return result
+
+    started = time.monotonic()
+    assert asyncio.run(run()) == "resposta de gpt-3.5-turbo"
+    assert time.monotonic() - started < 1
+    assert cancelled == ['gpt-4']
+    assert metrics.get_policy_decisions()['customer_service']['hedge_won'] == 1
+
+
+def test_async_hedge_error_falls_back():
+    """Hedge e principal falhando levam ao fallback na versão assíncrona"""
+    agent, calls, _ = make_agent({'gpt-4': 0.1}, errors={'gpt-4', 'gpt-3.5-turbo'})
+    policy, metrics = make_policy(latency_slo=0.01, hedge_model='gpt-3.5-turbo', fallback_models=['gpt-4o-mini'])
+    agent.set_response_policy(policy)
+    assert asyncio.run(agent.agenerate_response(MESSAGES)) == "resposta de gpt-4o-mini"
+    decisions = metrics.get_policy_decisions()['customer_service']
+    assert decisions['error'] == 2
+    assert decisions['fallback'] == 1
+
+
+class _DictCache:
+    """Cache de respostas em memória com a mesma interface do ResponseCache"""
+
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, model, messages):
+        return self.entries.get((model, messages[-1]['content']))
+
+    def set(self, model, messages, content, latency):
+        self.entries[(model, messages[-1]['content'])] = content
+
+
+def test_cache_keeps_fallback_answer_under_its_model():
+    """Resposta de fallback não é servida depois como se fosse do modelo principal"""
+    agent, calls, _ = make_agent({}, errors={'gpt-4'})
+    policy, _ = make_policy(fallback_models=['gpt-3.5-turbo'])
+    agent.set_response_policy(policy)
+    agent.enable_response_cache(_DictCache())
+    assert agent.generate_response(MESSAGES) == "resposta de gpt-3.5-turbo"
+    assert agent.response_cache.entries == {('gpt-3.5-turbo', MESSAGES[-1]['content']): "resposta de gpt-3.5-turbo"}
+    # Com o principal de volta, a próxima chamada vai ao gpt-4 em vez de reaproveitar o fallback
+    agent._complete = lambda messages, temperature=0.7, model=None: f"resposta de {model or agent.model}"
+    assert agent.generate_response(MESSAGES) == "resposta de gpt-4"
+
+
+def test_rule_based_agent_escalates_with_policy():
+    """Sem regra que case, o agente de suporte técnico chama o LLM aplicando a sua política"""
+    from src.orchestrator.specialized_agents import TechnicalSupportAgent
+
+    agent = TechnicalSupportAgent('technical_support')
+    template, _, _ = make_agent({'gpt-4': 0.5, 'gpt-3.5-turbo': 0.01})
+    agent._complete = template._complete
+    policy, metrics = make_policy(latency_slo=0.05, hedge_model='gpt-3.5-turbo')
+    agent.set_response_policy(policy)
+    # Sem cliente da API configurado, o agente mantém a resposta padrão
+    assert agent.process_message('Meu roteador não conecta')['response'].startswith('Entendi que você precisa de ajuda')
+
+    agent.openai_client = object()
+    assert not agent.calls_model('O app está lento')
+    assert agent.process_message('O app está lento')['response'].startswith('Percebi que você está enfrentando lentidão')
+    context = {}
+    assert agent.process_message('Meu roteador não conecta', context)['response'] == "resposta de gpt-3.5-turbo"
+    assert metrics.get_policy_decisions()['technical_support']['hedge_won'] == 1
+    assert context['conversation_history'][-1]['content'] == "resposta de gpt-3.5-turbo"
+    policy.shutdown()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Testes do cache de decisões de roteamento
+"""
+
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from src.utils.lru_cache import LRUCache
+from src.orchestrator.orchestrator import AgentOrchestrator
+from src.orchestrator.specialized_agents import TechnicalSupportAgent, FinancialAgent
+from src.agents.customer_service_agent import CustomerServiceAgent
+
+
+def _orchestrator(**kwargs):
+    orchestrator = AgentOrchestrator(**kwargs)
+    orchestrator.register_agent('customer_service', CustomerServiceAgent('customer_service'))
+    orchestrator.register_agent('technical_support', TechnicalSupportAgent('technical_support'))
+    orchestrator.register_agent('financial', FinancialAgent('financial'))
+    return orchestrator
+
+
+def test_lru_evicts_least_recent_and_expires():
+    """Entradas menos recentes saem primeiro e entradas vencidas não são devolvidas"""
+    cache = LRUCache(max_size=2, ttl=0.05)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    time.sleep(0.06)
+    assert cache.get('a') is None
+    metrics = cache.get_metrics()
+    assert metrics['evictions'] == 1 and metrics['expirations'] == 1
+
+
+def test_near_identical_messages_share_cache_entry():
+    """Variações de acento, caixa e espaços reaproveitam a mesma decisão"""
+    orchestrator = _orchestrator()
+    assert orchestrator.select_agent("Problema  no PAGAMENTO") == 'financial'
+    assert orchestrator.select_agent("problema no pagamento") == 'financial'
+    assert orchestrator.select_agent("2ª via") == orchestrator.select_agent("2a via")
+
+    status = orchestrator.get_system_status()['routing_cache']
+    assert status['hits'] == 2 and status['misses'] == 2
+    assert status['hit_rate'] == 0.5
+
+
+def test_rule_changes_invalidate_cached_decisions():
+    """Adicionar ou remover regras não deixa decisões antigas no cache"""
+    orchestrator = _orchestrator()
+    assert orchestrator.select_agent("segunda via do boleto") == 'customer_service'
+
+    orchestrator.add_routing_rule('boleto', 'financial')
+    assert orchestrator.select_agent("segunda via do boleto") == 'financial'
+
+    orchestrator.remove_routing_rule('boleto')
+    assert orchestrator.select_agent("segunda via do boleto") == 'customer_service'
+    assert orchestrator.routing_cache.get_metrics()['invalidations'] == 2
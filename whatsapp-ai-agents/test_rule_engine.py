@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Testes da camada de respostas por regras
+"""
+
+import sys
+import os
+import json
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from src.orchestrator.rule_engine import RuleEngine
+from src.orchestrator.orchestrator import AgentOrchestrator
+from src.orchestrator.specialized_agents import TechnicalSupportAgent, FinancialAgent
+from src.agents.customer_service_agent import CustomerServiceAgent
+
+RULES = {
+    'min_confidence': 0.8,
+    'rules': [
+        {'id': 'horario', 'agent': 'customer_service', 'keywords': ['horário de atendimento'],
+         'response': 'Atendemos de segunda a sexta, das 9h às 18h.'},
+        {'id': 'boleto', 'agent': 'financial', 'keywords': ['boleto', 'fatura'],
+         'response': 'Segue a segunda via, $nome.'},
+        {'id': 'reembolso', 'agent': 'financial', 'keywords': ['reembolso'],
+         'response': 'Reembolsos levam até 10 dias úteis.'}
+    ]
+}
+
+
+def _write(path, rules):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(rules, f)
+
+
+def test_default_table_keeps_agent_answers():
+    """Os agentes baseados em regras mantêm as respostas e a prioridade das cadeias originais"""
+    technical = TechnicalSupportAgent('technical_support')
+    financial = FinancialAgent('financial')
+    assert technical.process_message('O app está lento')['response'].startswith('Percebi que você está enfrentando lentidão')
+    # 'acesso' tem prioridade sobre 'erro', como no if/elif original
+    assert technical.process_message('erro de acesso')['response'].startswith('Entendi que você está tendo problemas de acesso')
+    assert technical.process_message('Não funciona nada')['response'].startswith('Sinto que você está enfrentando um erro')
+    assert technical.process_message('olá')['response'].startswith('Entendi que você precisa de ajuda com um problema técnico')
+    assert financial.process_message('Cadê meu REEMBOLSO?')['response'].startswith('Sobre reembolsos')
+    assert financial.process_message('quero desconto')['response'].startswith('Temos várias opções de descontos')
+
+
+def test_confidence_gates_rule_answers(tmp_path):
+    """Só mensagens curtas com uma única intenção são respondidas pela regra"""
+    path = tmp_path / 'rules.json'
+    _write(path, RULES)
+    engine = RuleEngine(str(path))
+
+    assert engine.answer('financial', 'Preciso do boleto', {'nome': 'Ana'}) == 'Segue a segunda via, Ana.'
+    assert engine.answer('financial', 'boleto e reembolso do pedido') is None
+    assert engine.answer('financial', 'boleto ' + 'palavra ' * 30) is None
+    assert engine.answer('customer_service', 'boleto') is None
+    assert engine.answer('technical_support', 'boleto') is None
+
+    metrics = engine.get_metrics()
+    assert metrics['rule_hits'] == 1
+    assert metrics['escalations'] == 4
+    assert metrics['by_rule'] == {'boleto': 1}
+    assert metrics['by_agent']['financial']['rule_hit_rate'] == 1 / 3
+
+
+def test_rules_reload_without_restart(tmp_path):
+    """Alterações no arquivo são aplicadas; um arquivo inválido mantém a tabela atual"""
+    path = tmp_path / 'rules.json'
+    _write(path, RULES)
+    engine = RuleEngine(str(path), reload_interval=0.01)
+    assert engine.answer('financial', 'reembolso') == 'Reembolsos levam até 10 dias úteis.'
+
+    updated = json.loads(json.dumps(RULES))
+    updated['rules'][2]['response'] = 'Reembolsos levam até 5 dias úteis.'
+    _write(path, updated)
+    os.utime(path, (time.time() + 1, time.time() + 1))
+    time.sleep(0.02)
+    assert engine.answer('financial', 'reembolso') == 'Reembolsos levam até 5 dias úteis.'
+    assert engine.version == 2
+
+    path.write_text('{inválido')
+    os.utime(path, (time.time() + 2, time.time() + 2))
+    time.sleep(0.02)
+    assert engine.answer('financial', 'reembolso') == 'Reembolsos levam até 5 dias úteis.'
+    assert engine.get_metrics()['reload_errors'] == 1
+
+
+def test_orchestrator_answers_from_rules_before_llm(tmp_path):
+    """Intenções de alta confiança não chegam ao agente de LLM; as demais escalam"""
+    path = tmp_path / 'rules.json'
+    _write(path, RULES)
+    engine = RuleEngine(str(path))
+    orchestrator = AgentOrchestrator(rule_engine=engine)
+    agent = CustomerServiceAgent('customer_service')
+    calls = []
+
+    def generate_response(messages, temperature=0.7):
+        calls.append(messages[-1]['content'])
+        return 'Resposta do modelo'
+
+    agent.generate_response = generate_response
+    orchestrator.register_agent('customer_service', agent)
+    context = {}
+
+    assert orchestrator.get_agent_response('customer_service', 'Qual o horário de atendimento?', 'u1', context) \
+        == 'Atendemos de segunda a sexta, das 9h às 18h.'
+    assert calls == []
+    assert orchestrator.get_agent_response('customer_service', 'Quero mudar meu endereço', 'u1', context) \
+        == 'Resposta do modelo'
+    assert calls == ['Quero mudar meu endereço']
+    # A resposta da regra faz parte do histórico enviado ao modelo
+    assert [t['content'] for t in context['conversation_history']][:2] == \
+        ['Qual o horário de atendimento?', 'Atendemos de segunda a sexta, das 9h às 18h.']
+    assert orchestrator.prepare_batch_request('customer_service', 'horário de atendimento', 'u1', context) is None
+    assert orchestrator.get_system_status()['response_tiers']['by_agent']['customer_service']['rule_hits'] == 1
+
+
+def test_low_confidence_messages_reach_the_llm():
+    """Mensagens longas ou com várias intenções escalam até o LLM do agente baseado em regras (e são contadas assim)"""
+    engine = RuleEngine()
+    orchestrator = AgentOrchestrator(rule_engine=engine)
+    agent = TechnicalSupportAgent('technical_support', rule_engine=engine)
+    agent.openai_client = object()
+    calls = []
+
+    def generate_response(messages, temperature=0.7):
+        calls.append(messages[-1]['content'])
+        return 'Resposta do modelo'
+
+    agent.generate_response = generate_response
+    orchestrator.register_agent('technical_support', agent)
+    long_message = 'O sistema ficou muito lento ' + 'depois da atualização de ontem ' * 6
+    multi_intent = 'O app está lento e dá erro ao abrir'
+
+    for message in (long_message, multi_intent):
+        assert not engine.can_answer('technical_support', message)
+        assert agent.calls_model(message)
+        assert orchestrator.get_agent_response('technical_support', message, 'u1') == 'Resposta do modelo'
+    assert calls == [long_message, multi_intent]
+    # Mensagem curta com uma intenção continua respondida pela regra, sem o LLM
+    assert orchestrator.get_agent_response('technical_support', 'O app está lento', 'u1') \
+        .startswith('Percebi que você está enfrentando lentidão')
+    assert len(calls) == 2
+    # Os contadores da camada de regras batem com quem respondeu de fato
+    tiers = engine.get_metrics()['by_agent']['technical_support']
+    assert (tiers['escalations'], tiers['rule_hits']) == (len(calls), 1)
+    assert orchestrator.get_system_status()['response_tiers']['escalations'] == 2
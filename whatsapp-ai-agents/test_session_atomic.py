@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Testes das operações atômicas de sessão (scripts Lua) sob concorrência
+"""
+
+import sys
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+import pytest
+
+from src.config.config import Config
+from src.orchestrator.session_manager import SessionManager, AsyncSessionManager
+
+
+pytestmark = pytest.mark.usefixtures('fake_redis')
+
+
+def _turn(worker, index):
+    return {'role': 'user', 'content': f"w{worker}-{index} ação"}
+
+
+def test_concurrent_writers_lose_no_updates():
+    """Threads disputando a mesma sessão não sobrescrevem as escritas umas das outras"""
+    manager = SessionManager(Config)
+    manager.create_session('s1', 'u1')
+
+    def worker(n):
+        for i in range(10):
+            assert manager.append_turn('s1', [_turn(n, i)])
+            assert manager.update_session('s1', {f"key{n}": i})
+            assert manager.set_active_agent('s1', f"agent{n}")
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(worker, range(8)))
+
+    session = manager.get_session('s1')
+    # Nada foi resumido: todos os turnos ainda na lista são carregados, mesmo além da janela
+    assert len(session['data']['conversation_history']) == 80
+    history = manager.get_history('s1', 100)
+    assert len(history) == 80
+    assert session['history_length'] == 80
+    assert {t['content'] for t in history} == {_turn(n, i)['content'] for n in range(8) for i in range(10)}
+    # A ordem por worker é preservada
+    assert [t['content'] for t in history if t['content'].startswith('w3-')] == [f"w3-{i} ação" for i in range(10)]
+    assert {k: v for k, v in session['data'].items() if k.startswith('key')} == {f"key{n}": 9 for n in range(8)}
+    assert session['active_agent'] in {f"agent{n}" for n in range(8)}
+
+
+def test_each_operation_is_one_round_trip():
+    """set_active_agent, update_session, append_turn e touch_session fazem uma chamada cada"""
+    manager = SessionManager(Config)
+    manager.create_session('s1', 'u1', {'conversation_history': []})
+    manager.touch_session('s1')  # carrega os scripts no servidor
+    manager.append_turn('s1', [_turn(0, 0)])
+
+    commands = []
+    execute_command = manager.redis_client.execute_command
+
+    def counting(*args, **kwargs):
+        commands.append(args[0])
+        return execute_command(*args, **kwargs)
+
+    manager.redis_client.execute_command = counting
+    assert manager.set_active_agent('s1', 'financial')
+    assert manager.update_session('s1', {'language': 'pt'})
+    assert manager.append_turn('s1', [_turn(0, 1), _turn(0, 2)])
+    manager.redis_client.expire('session:s1', 10)
+    assert manager.touch_session('s1')
+    assert commands == ['EVALSHA', 'EVALSHA', 'EVALSHA', 'EXPIRE', 'EVALSHA']
+    assert manager.redis_client.ttl('session:s1') > 10
+
+    manager.redis_client.execute_command = execute_command
+    session = manager.get_session('s1')
+    assert [t['content'] for t in session['data']['conversation_history']] == ['w0-0 ação', 'w0-1 ação', 'w0-2 ação']
+
+
+def test_missing_sessions_are_not_recreated():
+    """Operações atômicas não ressuscitam uma sessão que expirou"""
+    manager = SessionManager(Config)
+    assert manager.append_turn('nope', [_turn(0, 0)]) is False
+    assert manager.touch_session('nope') is False
+    assert manager.update_session('nope', {'language': 'pt'}) is False
+    assert not manager.redis_client.exists('session:nope')
+
+
+def test_async_appends_under_contention():
+    """No modo assíncrono, appends e saves parciais concorrentes também são atômicos"""
+    manager = AsyncSessionManager(Config)
+
+    async def run():
+        session = await manager.create_session('s1', 'u1')
+        await asyncio.gather(*(manager.append_turn('s1', [_turn(n, 0)]) for n in range(50)),
+                             *(manager.update_session('s1', {f"key{n}": n}) for n in range(50)))
+        session['active_agent'] = 'financial'
+        await manager.save_session('s1', session, data_keys=['history_summary'])
+        return await manager.get_session('s1')
+
+    session = asyncio.run(run())
+    assert len(session['data']['conversation_history']) == 50
+    assert sum(1 for k in session['data'] if k.startswith('key')) == 50
+    assert session['active_agent'] == 'financial'
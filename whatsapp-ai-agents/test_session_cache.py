@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Testes do cache local de sessões com invalidação via Redis
+"""
+
+import sys
+import os
+import time
+import asyncio
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+import pytest
+
+from src.config.config import Config
+from src.orchestrator.session_manager import SessionManager, AsyncSessionManager
+from src.utils.session_cache import SessionNearCache
+
+
+pytestmark = pytest.mark.usefixtures('fake_redis')
+
+
+@pytest.fixture(autouse=True)
+def near_cache_enabled(monkeypatch):
+    """Near-cache ligado em todos os SessionManager do arquivo"""
+    monkeypatch.setattr(Config, 'SESSION_NEAR_CACHE_ENABLED', True)
+
+
+def _wait(condition, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+@pytest.fixture
+def workers():
+    managers = [SessionManager(Config), SessionManager(Config)]
+    assert all(_wait(lambda m=m: m.near_cache.listening) for m in managers)
+    yield managers
+    for manager in managers:
+        manager.near_cache.stop()
+
+
+def test_hot_session_is_served_locally(workers):
+    """Leituras repetidas não vão ao Redis e devolvem cópias independentes"""
+    manager = workers[0]
+    manager.create_session('s1', 'u1', {'conversation_history': [{'role': 'user', 'content': 'oi'}]})
+    first = manager.get_session('s1')
+    # Alteração direta no Redis, sem publicar invalidação: só aparece se a leitura for ao servidor
+    manager.redis_client.hset('session:s1', 'active_agent', '"financial"')
+
+    second = manager.get_session('s1')
+    assert second == first
+    assert second['active_agent'] is None
+    second['data']['conversation_history'].append({'role': 'assistant', 'content': 'olá'})
+    assert len(manager.get_session('s1')['data']['conversation_history']) == 1
+    metrics = manager.get_cache_metrics()
+    assert metrics['hits'] == 2
+    assert metrics['misses'] == 1
+
+
+def test_writes_update_the_local_copy(workers):
+    """Escritas parciais do próprio processo atualizam a cópia local (write-through)"""
+    manager = workers[0]
+    manager.create_session('s1', 'u1')
+    manager.get_session('s1')
+    assert manager.set_active_agent('s1', 'financial')
+    assert manager.update_session('s1', {'language': 'pt'})
+    assert manager.append_turn('s1', [{'role': 'user', 'content': 'oi'}])
+
+    session = manager.get_session('s1')
+    assert session['active_agent'] == 'financial'
+    assert session['data'] == {'language': 'pt', 'conversation_history': [{'role': 'user', 'content': 'oi'}]}
+    assert manager.get_active_agent('s1') == 'financial'
+    metrics = manager.get_cache_metrics()
+    assert metrics['write_through'] == 3
+    assert metrics['misses'] == 1
+    # Cópia local e Redis continuam iguais
+    manager.near_cache.invalidate('s1')
+    assert manager.get_session('s1') == session
+
+
+def test_writes_from_other_workers_invalidate(workers):
+    """Uma escrita em outro processo derruba a cópia local via pub/sub"""
+    first, second = workers
+    first.create_session('s1', 'u1')
+    assert first.get_session('s1')['active_agent'] is None
+
+    second.set_active_agent('s1', 'technical_support')
+    assert _wait(lambda: first.get_cache_metrics()['remote_invalidations'] == 1)
+    assert first.get_session('s1')['active_agent'] == 'technical_support'
+    # As próprias publicações são ignoradas: o segundo worker só recebeu a criação da sessão
+    assert _wait(lambda: second.get_cache_metrics()['remote_invalidations'] == 1)
+
+
+def test_out_of_order_write_drops_copy():
+    """Versão inesperada após uma escrita descarta a cópia em vez de aplicar fora de ordem"""
+    cache = SessionNearCache()
+    cache.listening = True
+    cache.put('s1', {'active_agent': None, 'data': {}}, 3, cache.begin_read('s1'))
+    cache.apply('s1', 5, lambda session: session.update(active_agent='financial'))
+    assert cache.get('s1') is None
+    assert cache.get_metrics()['out_of_order'] == 1
+
+    # Leitura concorrente com uma invalidação não é guardada
+    token = cache.begin_read('s1')
+    cache.on_message('outro-worker s1')
+    cache.put('s1', {'active_agent': 'stale', 'data': {}}, 1, token)
+    assert cache.get('s1') is None
+
+
+def test_cache_is_bypassed_without_subscription():
+    """Sem a assinatura do canal (ou após uma queda) o cache não é usado"""
+    cache = SessionNearCache()
+    cache.put('s1', {'data': {}}, 0, cache.begin_read('s1'))
+    assert cache.get('s1') is None
+    cache._set_listening(True)
+    cache.put('s1', {'data': {}}, 0, cache.begin_read('s1'))
+    assert cache.get('s1') == {'data': {}}
+    cache._set_listening(False)
+    assert len(cache.cache) == 0
+    assert cache.get_metrics()['bypassed'] == 1
+
+
+def test_async_workers_stay_coherent():
+    """No modo assíncrono a assinatura roda como tarefa e invalida cópias de outros workers"""
+    async def run():
+        first, second = AsyncSessionManager(Config), AsyncSessionManager(Config)
+        await first.start()
+        await second.start()
+        while not (first.near_cache.listening and second.near_cache.listening):
+            await asyncio.sleep(0.01)
+        session = await first.create_session('s1', 'u1')
+        await first.get_session('s1')
+        session['active_agent'] = 'financial'
+        session['data']['conversation_history'] = [{'role': 'user', 'content': 'oi'}]
+        await first.save_session('s1', session, data_keys=['conversation_history'])
+        cached = await first.get_session('s1')
+
+        await second.set_active_agent('s1', 'technical_support')
+        for _ in range(300):
+            if first.get_cache_metrics()['remote_invalidations']:
+                break
+            await asyncio.sleep(0.01)
+        refreshed = await first.get_session('s1')
+        metrics = first.get_cache_metrics()
+        await first.close()
+        await second.close()
+        return cached, refreshed, metrics
+
+    cached, refreshed, metrics = asyncio.run(run())
+    assert cached['active_agent'] == 'financial'
+    assert cached['data']['conversation_history'] == [{'role': 'user', 'content': 'oi'}]
+    assert refreshed['active_agent'] == 'technical_support'
+    assert metrics['write_through'] == 1
+    assert metrics['hits'] == 1
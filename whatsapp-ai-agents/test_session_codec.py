@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Testes dos codecs de sessão (JSON, MessagePack e compressão com marca de versão)
+"""
+
+import sys
+import os
+import base64
+import json
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+import pytest
+
+from src.utils.session_codec import COMPRESSORS, SERIALIZERS, SessionCodec
+
+SESSION = {
+    'user_id': 'u1',
+    'active_agent': 'financial',
+    'data': {'language': 'pt', 'history_summary': {'content': 'Cliente pediu a segunda via do boleto.', 'covered': 4}},
+    'turns': [{'role': 'user', 'content': 'Não consigo acessar minha conta, já tentei redefinir a senha três vezes'},
+              {'role': 'assistant', 'content': 'Entendo! Vou verificar o cadastro e o histórico de acessos.'}] * 20,
+}
+
+AVAILABLE = [(serializer, compression)
+             for serializer, entry in SERIALIZERS.items() if entry[3]
+             for compression, option in COMPRESSORS.items() if option[3]]
+
+
+@pytest.mark.parametrize('serializer,compression', AVAILABLE)
+def test_round_trip(serializer, compression):
+    """Todo codec disponível devolve o mesmo valor, e qualquer codec lê o que os outros gravaram"""
+    codec = SessionCodec(serializer, compression, threshold=64)
+    for value in (SESSION, 'pt', 3, None, [], {'ação': 'é'}):
+        encoded = codec.encode(value)
+        assert isinstance(encoded, str)
+        assert codec.decode(encoded) == value
+        assert SessionCodec().decode(encoded) == value
+
+
+def test_plain_json_stays_untagged():
+    """Sem compressão, JSON é gravado sem marca, compacto e com acentos em UTF-8"""
+    encoded = SessionCodec().encode(SESSION)
+    assert json.loads(encoded) == SESSION
+    assert len(encoded.encode('utf-8')) < len(json.dumps(SESSION).encode('utf-8'))
+    # Valores gravados antes dos codecs continuam legíveis
+    assert SessionCodec('json', 'zlib').decode(json.dumps(SESSION)) == SESSION
+
+
+def test_compression_only_above_threshold():
+    """Valores pequenos não pagam o custo da compressão (nem do base64)"""
+    codec = SessionCodec('json', 'zlib', threshold=512)
+    assert codec.encode({'role': 'user', 'content': 'oi'}) == '{"role":"user","content":"oi"}'
+    encoded = codec.encode(SESSION)
+    assert encoded.startswith('$1jz:')
+    assert len(encoded) < len(SessionCodec().encode(SESSION)) / 3
+
+
+def test_unknown_and_unavailable_codecs(monkeypatch):
+    """Nome desconhecido e dependência ausente são erros de configuração, não um codec diferente"""
+    with pytest.raises(ValueError):
+        SessionCodec('pickle')
+    monkeypatch.setitem(SERIALIZERS, 'msgpack', ('m', None, None, False))
+    monkeypatch.setitem(COMPRESSORS, 'zstd', ('s', None, None, False))
+    with pytest.raises(ValueError):
+        SessionCodec('msgpack')
+    with pytest.raises(ValueError):
+        SessionCodec('json', 'zstd')
+    codec = SessionCodec()
+    with pytest.raises(ValueError):
+        codec.decode('$1m-:gqR1c2Vy')
+    with pytest.raises(ValueError):
+        codec.decode(f"$2jz:{base64.b64encode(b'{}').decode()}")
+
+
+def test_sessions_migrate_between_codecs(monkeypatch, fake_redis):
+    """Sessões gravadas em JSON continuam legíveis com outro codec e passam a ele ao serem regravadas"""
+    from src.config.config import Config
+    from src.orchestrator.session_manager import SessionManager
+
+    old = SessionManager(Config)
+    old.create_session('s1', 'u1', {'notes': 'observação ' * 200})
+    old.append_turn('s1', [{'role': 'user', 'content': 'olá'}])
+
+    monkeypatch.setattr(Config, 'SESSION_COMPRESSION', 'zlib')
+    monkeypatch.setattr(Config, 'SESSION_COMPRESSION_THRESHOLD', 0)
+    new = SessionManager(Config)
+    assert new.get_session('s1') == old.get_session('s1')
+    assert new.append_turn('s1', [{'role': 'assistant', 'content': 'Olá! Como posso ajudar?'}])
+    assert new.update_session('s1', {'notes': 'observação ' * 300})
+
+    raw = new.redis_client.hgetall('session:s1')
+    assert raw['data:notes'].startswith('$1jz:')
+    assert raw['history_length'] == '2'
+    assert [t[:1] for t in new.redis_client.lrange('session:s1:history', 0, -1)] == ['{', '$']
+    session = old.get_session('s1')
+    assert session['data']['notes'] == 'observação ' * 300
+    assert [t['role'] for t in session['data']['conversation_history']] == ['user', 'assistant']
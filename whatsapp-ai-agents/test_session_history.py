@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Testes do histórico da conversa em lista própria (só acréscimos, limitada)
+"""
+
+import sys
+import os
+import json
+import asyncio
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+import pytest
+
+from src.config.config import Config
+from src.agents.history_manager import HISTORY_KEYS, HistoryManager
+from src.orchestrator.session_manager import SessionManager, AsyncSessionManager
+from src.utils.session_manager import SessionManager as PhoneSessionManager
+
+
+pytestmark = pytest.mark.usefixtures('fake_redis')
+
+
+@pytest.fixture(autouse=True)
+def history_limits(monkeypatch):
+    """Lista e janela pequenas para exercitar os limites do histórico"""
+    monkeypatch.setattr(Config, 'SESSION_HISTORY_MAX_TURNS', 20)
+    monkeypatch.setattr(Config, 'SESSION_HISTORY_WINDOW', 8)
+
+
+def _turn(index):
+    return {'role': 'user' if index % 2 == 0 else 'assistant', 'content': f"mensagem {index:03d}"}
+
+
+def test_append_cost_does_not_grow_with_history():
+    """O comando de acréscimo tem o mesmo tamanho no primeiro e no 200º turno; a lista é limitada"""
+    manager = SessionManager(Config)
+    manager.create_session('s1', 'u1')
+    sent = []
+    execute_command = manager.redis_client.execute_command
+
+    def recording(*args, **kwargs):
+        if args[0] == 'EVALSHA':
+            sent.append(sum(len(str(a)) for a in args))
+        return execute_command(*args, **kwargs)
+
+    manager.redis_client.execute_command = recording
+    for index in range(200):
+        assert manager.append_turn('s1', [_turn(index)])
+    # Só o timestamp de last_activity varia de tamanho; o histórico nunca é reenviado
+    assert max(sent) - min(sent) <= 8
+
+    assert manager.redis_client.llen('session:s1:history') == 20
+    assert manager.get_history('s1', 3) == [_turn(197), _turn(198), _turn(199)]
+    session = manager.get_session('s1')
+    assert session['history_length'] == 200
+    # Sem resumo, os turnos não resumidos ainda na lista são carregados além da janela; só os que
+    # o limite da lista descartou contam como cobertos
+    assert session['data']['conversation_history'] == [_turn(i) for i in range(180, 200)]
+    assert session['data']['history_summary']['covered'] == 180
+    # Os metadados não carregam o histórico
+    assert 'data:conversation_history' not in manager.redis_client.hkeys('session:s1')
+
+
+def test_summarized_turns_are_not_reloaded():
+    """Depois do resumo, a sessão recarregada traz só os turnos ainda não resumidos"""
+    manager = AsyncSessionManager(Config)
+    history = HistoryManager('gpt-3.5-turbo', token_budget=60)
+
+    async def run():
+        await manager.create_session('s1', 'u1')
+        for index in range(6):
+            session = await manager.get_session('s1')
+            history.append_turn(session['data'], f"pergunta {index} " * 3, f"resposta {index} " * 3)
+            history.compact(session['data'])
+            expected = session['data']['conversation_history']
+            await manager.save_session('s1', session, data_keys=HISTORY_KEYS)
+        return await manager.get_session('s1'), expected, await manager.get_history('s1', 100)
+
+    session, expected, stored = asyncio.run(run())
+    summary = session['data']['history_summary']
+    assert summary['covered'] > 0
+    assert session['data']['conversation_history'] == expected
+    assert session['history_length'] == 12
+    assert summary['covered'] + len(expected) == 12
+    # A lista guarda todos os turnos, inclusive os já resumidos
+    assert [t['content'] for t in stored[::2]] == [f"pergunta {i} " * 3 for i in range(6)]
+
+
+def test_history_inside_hash_moves_to_list():
+    """Sessões com o histórico ainda em um campo do hash são convertidas na leitura"""
+    manager = SessionManager(Config)
+    manager.create_session('s1', 'u1')
+    manager.redis_client.hset('session:s1', 'data:conversation_history', json.dumps([_turn(0), _turn(1)]))
+
+    session = manager.get_session('s1')
+    assert session['data']['conversation_history'] == [_turn(0), _turn(1)]
+    assert session['history_length'] == 2
+    assert [json.loads(t) for t in manager.redis_client.lrange('session:s1:history', 0, -1)] == [_turn(0), _turn(1)]
+    assert manager.append_turn('s1', [_turn(2)])
+    assert manager.get_session('s1')['data']['conversation_history'] == [_turn(0), _turn(1), _turn(2)]
+
+
+def test_phone_sessions_keep_history_in_a_list():
+    """O gerenciador por número de telefone também acrescenta turnos sem regravar o histórico"""
+    phones = PhoneSessionManager(max_turns=5, history_window=3)
+    phones.redis_client.set('session:5511', json.dumps({'phone_number': '5511', 'conversation_history': [_turn(0)]}))
+
+    for index in range(1, 7):
+        assert phones.append_turn('5511', [_turn(index)])
+    session = phones.get_session('5511')
+    assert session['conversation_history'] == [_turn(4), _turn(5), _turn(6)]
+    assert phones.get_history('5511', 10) == [_turn(i) for i in range(2, 7)]
+    assert phones.update_session('5511', {'agent_state': 'busy'})
+    assert phones.get_session('5511', last_n=1)['conversation_history'] == [_turn(6)]
+
+    assert phones.append_turn('novo', [_turn(0)])
+    assert phones.get_session('novo')['conversation_history'] == [_turn(0)]
+    assert phones.delete_session('novo')
+    assert not phones.redis_client.exists('session:novo:history')
+
+
+def test_unsummarized_turns_beyond_window_reach_the_summary():
+    """Turnos além da janela não são descartados sem resumo: voltam ao contexto e são resumidos"""
+    manager = AsyncSessionManager(Config)
+    history = HistoryManager('gpt-3.5-turbo', token_budget=60)
+    summarized = []
+
+    async def summarizer(messages):
+        summarized.append(messages[-1]['content'])
+        return "resumo"
+
+    history.async_summarizer = summarizer
+
+    async def run():
+        await manager.create_session('s1', 'u1')
+        for index in range(7):
+            await manager.append_turn('s1', [_turn(2 * index), _turn(2 * index + 1)])
+        session = await manager.get_session('s1')
+        loaded = [turn['content'] for turn in session['data']['conversation_history']]
+        await history.acompact(session['data'])
+        await manager.save_session('s1', session, data_keys=HISTORY_KEYS)
+        return loaded, await manager.get_session('s1')
+
+    loaded, session = asyncio.run(run())
+    # 14 turnos não resumidos, janela de 8: todos são carregados
+    assert loaded == [_turn(i)['content'] for i in range(14)]
+    assert 'mensagem 000' in summarized[0]
+    summary = session['data']['history_summary']
+    assert 0 < summary['covered'] < 14
+    assert summary['covered'] + len(session['data']['conversation_history']) == 14
+    assert [turn['content'] for turn in session['data']['conversation_history']] == \
+        [_turn(i)['content'] for i in range(summary['covered'], 14)]
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Testes do formato de sessão em hash do Redis
+"""
+
+import sys
+import os
+import json
+import asyncio
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+import pytest
+
+from src.config.config import Config
+from src.orchestrator.session_manager import SessionManager, AsyncSessionManager
+from src.utils.session_manager import SessionManager as PhoneSessionManager
+from src.utils.session_schema import flatten_session, migrate_legacy, unflatten_session
+
+
+pytestmark = pytest.mark.usefixtures('fake_redis')
+
+
+def _manager():
+    return SessionManager(Config)
+
+
+def test_flatten_roundtrip():
+    """Cada chave de 'data' vira um campo próprio do hash"""
+    session = {'session_id': 's1', 'active_agent': None, 'data': {'conversation_history': [{'role': 'user'}]}}
+    fields = flatten_session(session)
+    assert set(fields) == {'session_id', 'active_agent', 'data:conversation_history'}
+    assert unflatten_session(fields) == session
+    assert unflatten_session({}) is None
+
+
+def test_field_update_does_not_rewrite_session():
+    """Trocar o agente ativo grava só active_agent e last_activity, não o histórico"""
+    manager = _manager()
+    history = [{'role': 'user', 'content': 'x' * 1000}] * 20
+    assert manager.create_session('s1', 'u1', {'conversation_history': history})
+
+    # Marca a lista do histórico: se alguma atualização regravar a sessão inteira, a marca some
+    manager.redis_client.rpush('session:s1:history', json.dumps({'role': 'marca'}))
+    assert manager.set_active_agent('s1', 'financial')
+    assert manager.update_session('s1', {'language': 'pt'})
+
+    session = manager.get_session('s1')
+    assert session['active_agent'] == 'financial'
+    assert session['data']['language'] == 'pt'
+    assert manager.get_history('s1', 100) == history + [{'role': 'marca'}]
+    assert manager.get_active_agent('s1') == 'financial'
+    # Sessões inexistentes não são criadas por atualizações parciais
+    assert manager.set_active_agent('nope', 'financial') is False
+    assert not manager.redis_client.exists('session:nope')
+
+
+def test_reads_renew_ttl():
+    """Leituras renovam o TTL da sessão"""
+    manager = _manager()
+    manager.create_session('s1', 'u1')
+    manager.redis_client.expire('session:s1', 10)
+    manager.get_session('s1')
+    assert manager.redis_client.ttl('session:s1') > 10
+
+
+def test_legacy_json_sessions_are_migrated():
+    """Sessões antigas em string JSON são convertidas para hash na primeira leitura"""
+    manager = _manager()
+    legacy = {'session_id': 's1', 'user_id': 'u1', 'active_agent': 'financial', 'data': {'language': 'pt'}}
+    manager.redis_client.set('session:s1', json.dumps(legacy), ex=100)
+    manager.redis_client.set('session:s2', json.dumps(legacy), ex=100)
+
+    # A conversão mantém o TTL da chave antiga
+    assert migrate_legacy(manager.redis_client, 'session:s2')
+    assert 0 < manager.redis_client.ttl('session:s2') <= 100
+    assert not migrate_legacy(manager.redis_client, 'session:s2')
+
+    assert manager.get_session('s1') == {**legacy, 'history_length': 0,
+                                         'data': {'language': 'pt', 'conversation_history': []}}
+    assert manager.redis_client.type('session:s1') == 'hash'
+    assert manager.set_active_agent('s1', 'technical_support')
+    assert manager.get_active_agent('s1') == 'technical_support'
+
+    phones = PhoneSessionManager()
+    phones.redis_client.set('session:5511', json.dumps({'phone_number': '5511', 'agent_state': 'idle'}))
+    assert phones.update_session('5511', {'agent_state': 'busy'})
+    session = phones.get_session('5511')
+    assert session['phone_number'] == '5511'
+    assert session['agent_state'] == 'busy'
+
+
+def test_async_save_writes_only_listed_keys():
+    """save_session com data_keys grava só essas chaves e remove as que saíram do dicionário"""
+    manager = AsyncSessionManager(Config)
+
+    async def run():
+        session = await manager.create_session('s1', 'u1', {'language': 'pt', 'history_summary': {'text': 'a'}})
+        # Escrita concorrente em outra chave não pode ser desfeita pelo save parcial
+        await manager.update_session('s1', {'language': 'en'})
+        session['active_agent'] = 'financial'
+        session['data']['conversation_history'] = [{'role': 'user', 'content': 'oi'}]
+        del session['data']['history_summary']
+        await manager.save_session('s1', session, data_keys=['conversation_history', 'history_summary'])
+        return await manager.get_session('s1')
+
+    session = asyncio.run(run())
+    assert session['active_agent'] == 'financial'
+    assert session['data'] == {'language': 'en', 'conversation_history': [{'role': 'user', 'content': 'oi'}]}
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Testes do fan-out especulativo em rotas de baixa confiança
+"""
+
+import sys
+import os
+import time
+import asyncio
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from src.orchestrator.orchestrator import AgentOrchestrator
+from src.orchestrator.speculative import SpeculativeFanout, classifier_scorer
+from src.orchestrator.intent_classifier import load_intent_classifier
+from src.agents.customer_service_agent import CustomerServiceAgent
+
+
+class _Classifier:
+    """Classificador com confianças fixas por mensagem"""
+    min_confidence = 0.5
+
+    def scores(self, text):
+        if 'cartão' in text:
+            return {'customer_service': 0.1, 'financial': 0.45, 'technical_support': 0.45}
+        return {'customer_service': 0.9, 'financial': 0.05, 'technical_support': 0.05}
+
+
+def _agent(name, response, delay=0.0, log=None):
+    agent = CustomerServiceAgent(name)
+
+    def generate_response(messages, temperature=0.7):
+        time.sleep(delay)
+        if log is not None:
+            log.append(name)
+        return response
+
+    async def agenerate_response(messages, temperature=0.7):
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            log.append(f"{name} cancelado")
+            raise
+        return response
+
+    agent.generate_response = generate_response
+    agent.agenerate_response = agenerate_response
+    return agent
+
+
+def _orchestrator(scores, log=None, delays=(0.0, 0.0), **kwargs):
+    fanout = SpeculativeFanout(lambda agent_id, message, response: scores[agent_id], **kwargs)
+    orchestrator = AgentOrchestrator(intent_classifier=_Classifier(), speculative=fanout)
+    orchestrator.register_agent('customer_service', _agent('customer_service', 'geral', log=log))
+    orchestrator.register_agent('financial', _agent('financial', 'resposta financeira', delays[0], log))
+    orchestrator.register_agent('technical_support', _agent('technical_support', 'resposta técnica', delays[1], log))
+    return orchestrator
+
+
+def test_candidates_only_for_uncertain_routes():
+    """Palavras-chave e previsões claras não disparam o fan-out"""
+    orchestrator = _orchestrator({})
+    assert orchestrator.speculative_candidates('meu cartão foi recusado no app') == ['financial', 'technical_support']
+    assert orchestrator.speculative_candidates('quero falar com alguém') == []
+    assert orchestrator.speculative_candidates('problema no pagamento do cartão') == []  # palavras-chave
+    assert AgentOrchestrator(intent_classifier=_Classifier()).speculative_candidates('meu cartão') == []
+
+    # Com o classificador real: só a mensagem sem intenção clara vai para os candidatos
+    classifier = load_intent_classifier()
+    fanout = SpeculativeFanout(classifier_scorer(classifier))
+    orchestrator = AgentOrchestrator(intent_classifier=classifier, speculative=fanout)
+    for agent_id in ('customer_service', 'financial', 'technical_support'):
+        orchestrator.register_agent(agent_id, CustomerServiceAgent(agent_id))
+    assert orchestrator.speculative_candidates('o boleto não abre no aplicativo') == []
+    assert len(orchestrator.speculative_candidates('oi')) == 2
+
+
+def test_confident_answer_wins_early():
+    """A primeira resposta acima de accept_score vence sem esperar o outro candidato"""
+    log = []
+    orchestrator = _orchestrator({'financial': 0.3, 'technical_support': 0.9}, log, delays=(0.5, 0.0))
+    context = {}
+    started = time.monotonic()
+    agent_id, response = orchestrator.get_speculative_response(['financial', 'technical_support'], 'meu cartão', 'u1', context)
+
+    assert (agent_id, response) == ('technical_support', 'resposta técnica')
+    assert time.monotonic() - started < 0.4
+    # Só o histórico do vencedor fica no contexto
+    assert [t['content'] for t in context['conversation_history']] == ['meu cartão', 'resposta técnica']
+    metrics = orchestrator.get_system_status()['speculative']
+    assert metrics['early_accepts'] == 1
+    assert metrics['cancelled'] == 1
+    assert metrics['wins_by_rank'] == {'2': 1}
+
+
+def test_best_score_wins_when_none_is_confident():
+    """Sem resposta acima de accept_score, vence a maior pontuação entre as recebidas"""
+    orchestrator = _orchestrator({'financial': 0.6, 'technical_support': 0.4}, delays=(0.05, 0.0))
+    assert orchestrator.get_speculative_response(['financial', 'technical_support'], 'meu cartão', 'u1') == \
+        ('financial', 'resposta financeira')
+    assert orchestrator.speculative.get_metrics()['wins_by_agent'] == {'financial': 1}
+
+
+def test_extra_candidates_respect_spend_limit():
+    """Candidatos extras acima do limite de tokens por mensagem não são consultados"""
+    log = []
+    orchestrator = _orchestrator({'financial': 0.6, 'technical_support': 0.9}, log, max_extra_tokens=10)
+    assert orchestrator.get_speculative_response(['financial', 'technical_support'], 'meu cartão', 'u1') == \
+        ('financial', 'resposta financeira')
+    assert log == ['financial']
+    metrics = orchestrator.speculative.get_metrics()
+    assert metrics['over_budget'] == 1
+    assert metrics['fanouts'] == 0
+
+
+def test_async_loser_is_cancelled():
+    """No modo assíncrono o candidato perdedor é de fato cancelado"""
+    log = []
+    orchestrator = _orchestrator({'financial': 0.95, 'technical_support': 0.9}, log, delays=(0.0, 5.0))
+
+    async def run():
+        result = await orchestrator.aget_speculative_response(['financial', 'technical_support'], 'meu cartão', 'u1', {})
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(run()) == ('financial', 'resposta financeira')
+    assert log == ['technical_support cancelado']
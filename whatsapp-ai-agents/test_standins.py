@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Testes dos substitutos locais da OpenAI e do Chatwoot
+"""
+
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+import openai
+import pytest
+import requests
+
+from src.standins import LatencyModel, OpenAIStandIn, ChatwootStandIn
+
+
+def test_latency_model_is_deterministic():
+    """Mesma semente, mesma sequência; a lognormal respeita mediana e p95"""
+    a = LatencyModel('lognormal', median=0.8, p95=2.5, seed=7)
+    b = LatencyModel('lognormal', median=0.8, p95=2.5, seed=7)
+    samples = [a.sample() for _ in range(2000)]
+    assert samples[:20] == [b.sample() for _ in range(20)]
+
+    samples.sort()
+    assert 0.7 < samples[1000] < 0.9
+    assert 2.1 < samples[1900] < 2.9
+    assert LatencyModel.fixed(0.25).sample() == 0.25
+    assert all(1 <= LatencyModel('uniform', low=1, high=2).sample() <= 2 for _ in range(50))
+    with pytest.raises(ValueError):
+        LatencyModel('pareto')
+
+
+def test_openai_stand_in_completions_and_streaming():
+    """Respostas determinísticas pelo SDK, com e sem stream"""
+    with OpenAIStandIn(token_latency=LatencyModel.fixed(0.001)) as server:
+        client = openai.OpenAI(api_key='local', base_url=server.base_url, max_retries=0)
+        messages = [{'role': 'system', 'content': 'x'}, {'role': 'user', 'content': 'Onde está meu pedido?'}]
+
+        response = client.chat.completions.create(model='gpt-4', messages=messages)
+        content = response.choices[0].message.content
+        assert content.startswith('Resposta simulada para: Onde está meu pedido?.')
+        assert client.chat.completions.create(model='gpt-4', messages=messages).choices[0].message.content == content
+
+        stream = client.chat.completions.create(model='gpt-4', messages=messages, stream=True)
+        deltas = [chunk.choices[0].delta.content or '' for chunk in stream]
+        assert len(deltas) > 5
+        assert ''.join(deltas) == content
+        assert server.get_stats() == {'requests': 3, 'rate_limited': 0, 'streamed': 1}
+
+
+def test_openai_stand_in_injects_rate_limits():
+    """429 com Retry-After na fração configurada das chamadas"""
+    with OpenAIStandIn(rate_limit_rate=1.0, retry_after=3) as server:
+        client = openai.OpenAI(api_key='local', base_url=server.base_url, max_retries=0)
+        with pytest.raises(openai.RateLimitError) as error:
+            client.chat.completions.create(model='gpt-4', messages=[{'role': 'user', 'content': 'oi'}])
+        assert error.value.response.headers['retry-after'] == '3'
+
+    with OpenAIStandIn(rate_limit_rate=0.3, seed=1) as server:
+        url = f"{server.base_url}/chat/completions"
+        statuses = [requests.post(url, json={'messages': []}).status_code for _ in range(50)]
+    assert 5 <= statuses.count(429) <= 25
+    assert server.get_stats()['rate_limited'] == statuses.count(429)
+
+
+def test_chatwoot_stand_in_records_messages():
+    """Mensagens enviadas à API do Chatwoot ficam gravadas e podem ser consultadas"""
+    with ChatwootStandIn() as server:
+        url = f"{server.base_url}/api/v1/accounts/1/conversations/42/messages"
+        headers = {'api_access_token': 'token'}
+        assert requests.post(url, json={'content': 'Olá!', 'message_type': 'outgoing'}, headers=headers).json()['id'] == 1
+        assert requests.post(url, json={'content': 'sem token'}).status_code == 401
+        requests.post(url.replace('/42/', '/43/'), json={'content': 'Outra'}, headers=headers)
+
+        assert server.wait_for(2, timeout=1)
+        assert [m['content'] for m in server.get_messages('42')] == ['Olá!']
+        assert requests.get(url).json()['payload'][0]['message_type'] == 'outgoing'
+        assert server.unauthorized == 1
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Testes da entrega progressiva de respostas (streaming + chunker)
+"""
+
+import sys
+import os
+import asyncio
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from types import SimpleNamespace
+from src.utils.sentence_chunker import SentenceChunker, chunk_stream
+from src.orchestrator.orchestrator import AgentOrchestrator
+from src.orchestrator.metrics import MetricsCollector
+from src.orchestrator.specialized_agents import FinancialAgent
+from src.agents.customer_service_agent import TechnicalSupportAgent
+
+ANSWER = ("Entendi o problema.\n\nPrimeiro, reinicie o roteador e aguarde 30 segundos até a luz ficar verde. "
+          "Depois teste a conexão novamente. Se o erro continuar, abra um chamado.")
+
+
+def _tokens(text, size=4):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def _chunk(token):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=token))])
+
+
+class StreamingAgent(TechnicalSupportAgent):
+    """Agente de teste com stream simulado da API OpenAI"""
+
+    def __init__(self, name, delay=0.0):
+        super().__init__(name)
+        self.delay = delay
+
+        def create(model, messages, temperature, stream=False):
+            for token in _tokens(ANSWER):
+                time.sleep(self.delay)
+                yield _chunk(token)
+
+        self.openai_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+        async def acreate(model, messages, temperature, stream=False):
+            async def generator():
+                for token in _tokens(ANSWER):
+                    await asyncio.sleep(self.delay)
+                    yield _chunk(token)
+            return generator()
+
+        self.async_openai_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=acreate)))
+
+
+def _orchestrator(agent):
+    orchestrator = AgentOrchestrator()
+    orchestrator.register_agent('technical_support', agent)
+    orchestrator.register_agent('financial', FinancialAgent('financial'))
+    return orchestrator
+
+
+def test_chunker_cuts_at_paragraphs_and_sentences():
+    """Parágrafos sempre cortam; frases curtas são agrupadas; números não cortam"""
+    chunks = list(chunk_stream(_tokens(ANSWER), min_chars=40, max_chars=200))
+    assert chunks == [
+        "Entendi o problema.",
+        "Primeiro, reinicie o roteador e aguarde 30 segundos até a luz ficar verde.",
+        "Depois teste a conexão novamente. Se o erro continuar, abra um chamado.",
+    ]
+    assert list(chunk_stream(["Valor: R$ 3.50 por mês e mais texto"], min_chars=5)) == ["Valor: R$ 3.50 por mês e mais texto"]
+
+
+def test_chunker_forces_cut_at_max_chars():
+    """Texto sem pontuação é cortado no último espaço antes do limite"""
+    chunker = SentenceChunker(min_chars=10, max_chars=20)
+    assert chunker.feed("palavra " * 5) == ["palavra palavra", "palavra palavra"]
+    assert chunker.flush() == "palavra"
+
+
+def test_first_chunk_arrives_before_generation_finishes():
+    """A primeira mensagem fica pronta muito antes do fim do stream"""
+    agent = StreamingAgent('technical_support', delay=0.005)
+    orchestrator = _orchestrator(agent)
+    metrics = MetricsCollector()
+    context = {}
+
+    started = time.monotonic()
+    chunks = []
+    for chunk in orchestrator.stream_agent_response('technical_support', 'internet caiu', 'u1', context, min_chars=40):
+        if not chunks:
+            metrics.record_first_message('technical_support', time.monotonic() - started)
+        chunks.append(chunk)
+    total = time.monotonic() - started
+    metrics.record_request('technical_support', True, total)
+
+    latency = metrics.get_latency_summary()['technical_support']
+    assert latency['p50_time_to_first_message'] < total / 3
+    assert len(chunks) == 3
+    assert context['conversation_history'][-1]['content'] == ANSWER
+    assert orchestrator.metrics['agent_usage']['technical_support']['successful_requests'] == 1
+
+
+def test_async_stream_and_non_streaming_agents():
+    """O modo assíncrono produz as mesmas partes; agentes sem streaming entregam a resposta inteira"""
+    orchestrator = _orchestrator(StreamingAgent('technical_support'))
+
+    async def collect(agent_id, message):
+        return [c async for c in orchestrator.astream_agent_response(agent_id, message, 'u1', {}, min_chars=40)]
+
+    assert asyncio.run(collect('technical_support', 'internet caiu')) == list(
+        chunk_stream(_tokens(ANSWER), min_chars=40))
+    financial = list(orchestrator.stream_agent_response('financial', 'segunda via do boleto', 'u1', {}))
+    assert len(financial) == 1
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Testes do pool de workers usado pelo webhook
+"""
+
+import sys
+import os
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from src.utils.worker_pool import WorkerPool
+
+
+def test_worker_pool_processes_and_drains():
+    """Todos os itens enfileirados são processados antes do encerramento"""
+    processed = []
+    lock = threading.Lock()
+
+    def handler(item):
+        with lock:
+            processed.append(item)
+
+    pool = WorkerPool(handler, num_workers=4, max_queue_size=100, name='test')
+    pool.start()
+    for i in range(50):
+        assert pool.submit(i)
+
+    assert pool.shutdown(timeout=5)
+    assert sorted(processed) == list(range(50))
+
+    metrics = pool.get_metrics()
+    assert metrics['processed'] == 50
+    assert metrics['queue_depth'] == 0
+    assert not pool.submit(99)
+
+
+def test_worker_pool_rejects_when_full():
+    """A fila limitada rejeita itens em vez de crescer sem limite"""
+    release = threading.Event()
+    pool = WorkerPool(lambda item: release.wait(5), num_workers=1, max_queue_size=2, name='test')
+    pool.start()
+
+    results = [pool.submit(i) for i in range(10)]
+    release.set()
+    pool.shutdown(timeout=5)
+
+    # Um item em processamento + dois na fila, no máximo
+    assert results.count(True) <= 3
+    assert pool.get_metrics()['rejected'] == results.count(False)